@@ -1,6 +1,10 @@
+import time
+_import_started = time.perf_counter()
+
+import flask
 from flask import Flask
 from dotenv import load_dotenv
-import os
+import logging
 
 # Load environment variables FIRST
 load_dotenv()
@@ -9,21 +13,23 @@ load_dotenv()
 from routes.calendar_routes import calendar_bp
 from routes.health_routes import health_bp
 from routes.nlp_routes import nlp_bp
+from routes.job_routes import jobs_bp
+from app_setup import setup_app
+
+IMPORT_MS = (time.perf_counter() - _import_started) * 1000
+BLUEPRINTS = [(calendar_bp, '/calendar'), (health_bp, '/health'), (nlp_bp, '/nlp'), (jobs_bp, '/jobs')]
+
+def create_app(registry=None, warmup=None):
+    """
+    Builds the app around a shared ServiceRegistry.
 
-def create_app():
-    app = Flask(__name__)
-    
-    # Verify environment variables
-    if not os.getenv('OPENAI_API_KEY'):
-        raise ValueError("OPENAI_API_KEY environment variable is not set. Please add it to your .env file")
-    
-    # Register blueprints
-    app.register_blueprint(calendar_bp, url_prefix='/calendar')
-    app.register_blueprint(health_bp, url_prefix='/health')
-    app.register_blueprint(nlp_bp, url_prefix='/nlp')
-    
-    return app
+    Services are warmed up before the first request when warmup is True or,
+    if warmup is None, when WARMUP_ON_STARTUP=1.
+    """
+    started = time.perf_counter()
+    return setup_app(Flask(__name__), flask, BLUEPRINTS, registry, warmup, started, IMPORT_MS)
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
     app = create_app()
     app.run(debug=True)
\ No newline at end of file
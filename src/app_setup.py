@@ -0,0 +1,91 @@
+"""
+App setup shared by the Flask app in app.py and the Quart app in asgi.py,
+which differ only in their framework and blueprints.
+"""
+import logging
+import os
+import time
+from routes.common import request_timeout
+from services.registry import ServiceRegistry
+from services import deadline
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+def setup_app(app, web, blueprints, registry=None, warmup=None, started=None, import_ms=0.0):
+    """
+    Registers the blueprints, each a (blueprint, url_prefix) pair, and the
+    request timing, deadline and metrics hooks, then attaches a shared
+    ServiceRegistry to app and returns app.
+
+    web is the framework module (flask or quart) whose g, request and
+    jsonify the hooks use; Quart's hooks are registered as coroutines so
+    they run in the request's task. Services are warmed up when warmup is
+    True or, if warmup is None, when WARMUP_ON_STARTUP=1. started and
+    import_ms are only used for the startup log.
+    """
+    started = started or time.perf_counter()
+
+    # Verify environment variables
+    if not os.getenv('OPENAI_API_KEY'):
+        raise ValueError("OPENAI_API_KEY environment variable is not set. Please add it to your .env file")
+
+    # Register blueprints
+    for blueprint, url_prefix in blueprints:
+        app.register_blueprint(blueprint, url_prefix=url_prefix)
+
+    g, request, jsonify = web.g, web.request, web.jsonify
+    hook = _coroutine if web.__name__ == 'quart' else (lambda function: function)
+
+    @app.before_request
+    @hook
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.before_request
+    @hook
+    def start_request_deadline():
+        try:
+            deadline.set_deadline(request_timeout(request, app.view_functions.get(request.endpoint)))
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    @app.teardown_request
+    @hook
+    def clear_request_deadline(error):
+        deadline.clear_deadline()
+
+    @app.after_request
+    @hook
+    def record_request_time(response):
+        started = g.pop('request_started', None)
+        # Unmatched paths are skipped so they can't add arbitrary label values
+        if started is not None and request.url_rule is not None:
+            metrics.observe_request(request.url_rule.rule, response.status_code, time.perf_counter() - started)
+        return response
+
+    app.extensions['services'] = registry or ServiceRegistry(timezone='America/Los_Angeles')
+    # Finish event-creation jobs queued before a restart
+    app.extensions['services'].resume_jobs()
+    build_ms = (time.perf_counter() - started) * 1000
+
+    if warmup is None:
+        warmup = os.getenv('WARMUP_ON_STARTUP') == '1'
+    warmup_ms = 0.0
+    if warmup:
+        started = time.perf_counter()
+        app.extensions['services'].warmup()
+        warmup_ms = (time.perf_counter() - started) * 1000
+
+    logger.info("Startup: imports %.0fms, app %.0fms, warmup %.0fms", import_ms, build_ms, warmup_ms)
+    return app
+
+def _coroutine(function):
+    """
+    Wraps a hook for Quart, which would otherwise run a plain function in a
+    worker thread, where the deadline it sets wouldn't reach the request.
+    """
+    async def hook(*args):
+        return function(*args)
+    hook.__name__ = function.__name__
+    return hook
@@ -0,0 +1,42 @@
+"""
+Async entry point for running the Calendar Assistant under an ASGI server:
+
+    cd src && hypercorn "asgi:create_asgi_app()"
+
+The synchronous Flask app in app.py is unchanged and can still be used.
+"""
+import time
+_import_started = time.perf_counter()
+
+import quart
+from quart import Quart
+from dotenv import load_dotenv
+import logging
+
+# Load environment variables FIRST
+load_dotenv()
+
+# Then import routes that use those environment variables
+from routes.async_calendar_routes import calendar_bp
+from routes.async_health_routes import health_bp
+from routes.async_nlp_routes import nlp_bp
+from routes.async_job_routes import jobs_bp
+from app_setup import setup_app
+
+IMPORT_MS = (time.perf_counter() - _import_started) * 1000
+BLUEPRINTS = [(calendar_bp, '/calendar'), (health_bp, '/health'), (nlp_bp, '/nlp'), (jobs_bp, '/jobs')]
+
+def create_asgi_app(registry=None, warmup=None):
+    """
+    Builds the app around a shared ServiceRegistry.
+
+    Services are warmed up before the first request when warmup is True or,
+    if warmup is None, when WARMUP_ON_STARTUP=1.
+    """
+    started = time.perf_counter()
+    return setup_app(Quart(__name__), quart, BLUEPRINTS, registry, warmup, started, IMPORT_MS)
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    app = create_asgi_app()
+    app.run(debug=True)
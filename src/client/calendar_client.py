@@ -1,11 +1,37 @@
-import requests
+import argparse
+import hashlib
 import json
-from typing import Dict, Any
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Iterable, Iterator, List, Optional, TextIO, Tuple
 from datetime import datetime
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# The server's limit for /nlp/create/batch
+MAX_BATCH_SIZE = 100
 
 class CalendarClient:
-    def __init__(self, base_url: str = "http://localhost:5000"):
+    def __init__(self, base_url: str = "http://localhost:5000", user_id: Optional[str] = None,
+                 pool_size: int = 16, timeout: float = 120):
         self.base_url = base_url
+        self.timeout = timeout
+        self.session = requests.Session()
+        # One keep-alive pool for every request, sized for bulk concurrency. 429s and 503s are
+        # retried after their Retry-After. A 503 can mean the insert timed out after Google
+        # accepted it, so every POST carries an Idempotency-Key and a retry returns that event.
+        retry = Retry(total=3, status_forcelist=(429, 503), allowed_methods=frozenset({'GET', 'POST'}),
+                      backoff_factor=0.5, respect_retry_after_header=True, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if user_id:
+            self.session.headers['X-User-Id'] = user_id
 
     def create_event_from_query(self, query: str) -> Dict[str, Any]:
         """
@@ -15,19 +41,16 @@ class CalendarClient:
             client.create_event_from_query("Schedule a meeting tomorrow at 2pm for one hour")
         """
         try:
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}/nlp/create",
                 json={"query": query},
-                headers={"Content-Type": "application/json"}
+                headers={"Content-Type": "application/json", "Idempotency-Key": uuid.uuid4().hex},
+                timeout=self.timeout
             )
             
             if response.status_code == 200:
                 result = response.json()
-                print("\nEvent created successfully!")
-                print(f"Title: {result['event']['summary']}")
-                print(f"Start: {result['event']['start']['dateTime']}")
-                print(f"End: {result['event']['end']['dateTime']}")
-                print(f"Calendar Link: {result['event'].get('link', 'Not available')}")
+                self._print_event(result['event'])
                 return result
             else:
                 error_msg = response.json().get('message', 'Unknown error occurred')
@@ -41,8 +64,243 @@ class CalendarClient:
             print(f"\nError: {str(e)}")
             return None
 
+    def stream_event_from_query(self, query: str) -> Dict[str, Any]:
+        """
+        Like create_event_from_query, but streams progress from the server
+        and prints the event details as soon as they are parsed.
+        """
+        try:
+            with self.session.post(
+                f"{self.base_url}/nlp/create",
+                json={"query": query},
+                headers={"Content-Type": "application/json", "Accept": "text/event-stream",
+                         "Idempotency-Key": uuid.uuid4().hex},
+                stream=True,
+                timeout=self.timeout
+            ) as response:
+                if response.headers.get('Content-Type', '').startswith('text/event-stream'):
+                    return self._render_stream(response)
+
+                # Requests rejected before streaming starts get a plain JSON error
+                error_msg = response.json().get('message', 'Unknown error occurred')
+                print(f"\nError: {error_msg}")
+                return None
+
+        except requests.exceptions.ConnectionError:
+            print("\nError: Could not connect to server. Is it running?")
+            return None
+        except Exception as e:
+            print(f"\nError: {str(e)}")
+            return None
+
+    def bulk_create(self, queries: Iterable[str], output: TextIO, concurrency: int = 8,
+                    batch_size: Optional[int] = None, run_id: Optional[str] = None,
+                    progress: Optional[TextIO] = None) -> Dict[str, int]:
+        """
+        Creates an event for every query, writing one JSON result per line to
+        output in input order. Blank lines are skipped but keep their line numbers.
+
+        queries is consumed lazily, so files of any size use constant memory.
+        With batch_size, queries go to /nlp/create/batch in groups of that
+        size (falling back to one request per query if the server doesn't
+        have the endpoint); otherwise each query is its own request. Up to
+        concurrency requests are in flight at once.
+
+        Every request carries an Idempotency-Key derived from run_id: a batch's
+        is run_id and its first line number, a single query's is run_id, its
+        line number and its text. Rerunning an interrupted import with the
+        same run_id (and batch_size) doesn't create events twice. Without
+        run_id a random one is used, which still makes retries of 429s and
+        503s safe within the run.
+
+        Returns counts of succeeded and failed queries.
+        """
+        counts = {'succeeded': 0, 'failed': 0}
+        reporter = _Progress(progress)
+        lines = ((number, query.strip()) for number, query in enumerate(queries, 1) if query.strip())
+        batch_size = min(batch_size, MAX_BATCH_SIZE) if batch_size else None
+        run_id = run_id or uuid.uuid4().hex
+
+        if batch_size:
+            groups = _chunks(lines, batch_size)
+            run = lambda group: self._create_batch(group, run_id)
+        else:
+            groups = ([item] for item in lines)
+            run = lambda group: [self._create_single(group[0], run_id)]
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            pending = deque()
+            for group in groups:
+                pending.append(executor.submit(run, group))
+                # Keeps memory bounded and output in input order
+                while len(pending) >= concurrency * 2:
+                    self._write_results(pending.popleft().result(), output, counts, reporter)
+            while pending:
+                self._write_results(pending.popleft().result(), output, counts, reporter)
+
+        reporter.finish(counts)
+        return counts
+
+    def _create_single(self, item: Tuple[int, str], run_id: str) -> Dict[str, Any]:
+        number, query = item
+        digest = hashlib.sha256(query.encode()).hexdigest()[:16]
+        headers = {"Content-Type": "application/json", "Idempotency-Key": f"{run_id}:{number}:{digest}"}
+        try:
+            response = self.session.post(f"{self.base_url}/nlp/create", json={"query": query},
+                                         headers=headers, timeout=self.timeout)
+            body = response.json()
+        except (requests.RequestException, ValueError) as e:
+            return {'line': number, 'query': query, 'status': 'error', 'message': str(e)}
+        result = {'line': number, 'query': query, 'status': body.get('status', 'error')}
+        if response.status_code == 200:
+            result['event'] = body['event']
+        else:
+            result.update(status='error', code=response.status_code,
+                          message=body.get('message', 'Unknown error occurred'))
+        return result
+
+    def _create_batch(self, items: List[Tuple[int, str]], run_id: str) -> List[Dict[str, Any]]:
+        if getattr(self, '_batch_unsupported', False):
+            return [self._create_single(item, run_id) for item in items]
+        # The server derives each event's id from the key and its position in the batch
+        headers = {"Content-Type": "application/json", "Idempotency-Key": f"{run_id}:{items[0][0]}"}
+        try:
+            response = self.session.post(f"{self.base_url}/nlp/create/batch",
+                                         json={"queries": [query for _, query in items]},
+                                         headers=headers, timeout=self.timeout)
+            if response.status_code in (404, 405):
+                # An older server without the batch endpoint
+                self._batch_unsupported = True
+                return [self._create_single(item, run_id) for item in items]
+            body = response.json()
+        except (requests.RequestException, ValueError) as e:
+            return [{'line': number, 'query': query, 'status': 'error', 'message': str(e)} for number, query in items]
+
+        if response.status_code != 200:
+            message = body.get('message', 'Unknown error occurred')
+            return [{'line': number, 'query': query, 'status': 'error', 'code': response.status_code,
+                     'message': message} for number, query in items]
+        results = body.get('results') or []
+        rows = [dict(result, line=number, query=query) for (number, query), result in zip(items, results)]
+        # A short response must not make input lines disappear from the output
+        message = f'Server returned {len(results)} results for {len(items)} queries'
+        rows.extend({'line': number, 'query': query, 'status': 'error', 'message': message}
+                    for number, query in items[len(rows):])
+        return rows
+
+    def _write_results(self, results: List[Dict[str, Any]], output: TextIO,
+                       counts: Dict[str, int], reporter: '_Progress') -> None:
+        for result in results:
+            output.write(json.dumps(result) + '\n')
+            counts['succeeded' if result['status'] == 'success' else 'failed'] += 1
+        output.flush()
+        reporter.update(counts)
+
+    def _render_stream(self, response) -> Dict[str, Any]:
+        labels = {'event.summary': 'Title', 'event.start.dateTime': 'Start', 'event.end.dateTime': 'End'}
+        for event, data in self._read_events(response):
+            if event == 'progress':
+                if data.get('field') in labels:
+                    print(f"  {labels[data['field']]}: {data['value']}")
+                elif 'field' not in data:
+                    print(f"{data['stage'].capitalize()}...")
+            elif event == 'event':
+                self._print_event(data['event'])
+                return data
+            elif event == 'error':
+                print(f"\nError: {data.get('message', 'Unknown error occurred')}")
+                return None
+        print("\nError: Server closed the stream early")
+        return None
+
+    def _read_events(self, response) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Yields (event, data) pairs from a Server-Sent Events response."""
+        event, data = 'message', []
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith('event:'):
+                event = line[len('event:'):].strip()
+            elif line.startswith('data:'):
+                data.append(line[len('data:'):].strip())
+            elif not line and data:
+                yield event, json.loads('\n'.join(data))
+                event, data = 'message', []
+
+    def _print_event(self, event: Dict[str, Any]) -> None:
+        print("\nEvent created successfully!")
+        print(f"Title: {event['summary']}")
+        print(f"Start: {event['start']['dateTime']}")
+        print(f"End: {event['end']['dateTime']}")
+        print(f"Calendar Link: {event.get('link', 'Not available')}")
+
+def _chunks(items: Iterable, size: int) -> Iterator[List]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+class _Progress:
+    """Prints a running count to stream (normally stderr), at most a few times a second."""
+
+    def __init__(self, stream: Optional[TextIO]):
+        self.stream = stream
+        self.started = time.monotonic()
+        self.last = 0.0
+        self.lock = threading.Lock()
+
+    def update(self, counts: Dict[str, int], force: bool = False) -> None:
+        if self.stream is None:
+            return
+        now = time.monotonic()
+        with self.lock:
+            if not force and now - self.last < 0.25:
+                return
+            self.last = now
+        done = counts['succeeded'] + counts['failed']
+        rate = done / (now - self.started) if now > self.started else 0.0
+        self.stream.write(f"\r{done} done, {counts['failed']} failed, {rate:.1f}/s")
+        self.stream.flush()
+
+    def finish(self, counts: Dict[str, int]) -> None:
+        self.update(counts, force=True)
+        if self.stream is not None:
+            self.stream.write('\n')
+
+def bulk_main(args) -> int:
+    client = CalendarClient(args.url, user_id=args.user, pool_size=args.concurrency)
+    source = sys.stdin if args.bulk == '-' else open(args.bulk, encoding='utf-8')
+    output = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    progress = None if args.quiet else sys.stderr
+    try:
+        counts = client.bulk_create(source, output, concurrency=args.concurrency,
+                                    batch_size=args.batch_size, run_id=args.run_id, progress=progress)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+    return 1 if counts['failed'] else 0
+
 def main():
-    client = CalendarClient()
+    parser = argparse.ArgumentParser(description="Create calendar events from natural language.")
+    parser.add_argument('--url', default="http://localhost:5000", help="server address")
+    parser.add_argument('--user', help="X-User-Id to act as")
+    parser.add_argument('--bulk', metavar='FILE', help="create one event per line of FILE ('-' for stdin)")
+    parser.add_argument('--output', default='-', help="where bulk mode writes NDJSON results (default stdout)")
+    parser.add_argument('--concurrency', type=int, default=8, help="requests in flight in bulk mode")
+    parser.add_argument('--batch-size', type=int, default=50,
+                        help=f"queries per batch request (max {MAX_BATCH_SIZE}, 0 for one request per query)")
+    parser.add_argument('--run-id', help="make a bulk run safe to repeat: lines already created are not created again")
+    parser.add_argument('--quiet', action='store_true', help="no progress output")
+    args = parser.parse_args()
+
+    if args.bulk:
+        sys.exit(bulk_main(args))
+
+    client = CalendarClient(args.url, user_id=args.user)
     
     print("\nWelcome to Calendar Assistant!")
     print("Type 'quit' to exit")
@@ -55,7 +313,7 @@ def main():
             break
             
         if query:
-            client.create_event_from_query(query)
+            client.stream_event_from_query(query)
         else:
             print("Please enter a query or type 'quit' to exit")
 
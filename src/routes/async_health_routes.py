@@ -0,0 +1,60 @@
+import asyncio
+from quart import Blueprint, Response, current_app, jsonify
+from services.metrics import metrics
+from services.rate_governor import governors
+from services.http_pool import calendar_pool
+
+health_bp = Blueprint('health', __name__)
+
+@health_bp.route('/check', methods=['GET'])
+async def health_check():
+    """Simple health check endpoint."""
+    return jsonify({
+        'status': 'healthy',
+        'message': 'Service is running'
+    })
+
+@health_bp.route('/metrics', methods=['GET'])
+async def get_metrics():
+    """Per-stage latency histograms, error counts and request times in Prometheus text format."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@health_bp.route('/limits', methods=['GET'])
+async def get_limits():
+    """
+    Rate governor state for OpenAI and the Calendar API: concurrency limit,
+    calls in flight and waiting, time spent waiting, and calls shed or rate
+    limited. Also the Calendar API connection pool: connections open, in use
+    and idle, and how often requests reused a connection or waited for one.
+    """
+    return jsonify({
+        'status': 'success',
+        'limits': governors.get_stats(),
+        'connections': {'calendar': calendar_pool().get_stats()}
+    })
+
+@health_bp.route('/breakers', methods=['GET'])
+async def get_breakers():
+    """
+    Circuit breaker state per upstream: closed, open (calls fail fast until
+    retry_in_seconds has passed) or half_open (probing for recovery), with
+    consecutive failures and how often it opened and refused calls.
+    """
+    return jsonify({
+        'status': 'success',
+        'breakers': governors.breaker_stats()
+    })
+
+@health_bp.route('/watch', methods=['GET'])
+async def get_watch_stats():
+    """
+    Calendar push notifications in this process: calendars watched and
+    with a live channel, notifications accepted and rejected, refreshes
+    they triggered, and channels opened and stopped. null if disabled.
+    """
+    # Built on first use, which creates its tables
+    channels = await asyncio.to_thread(getattr, current_app.extensions['services'], 'watch_channels')
+    return jsonify({
+        'status': 'success',
+        'watch': channels.get_stats() if channels is not None else None
+    })
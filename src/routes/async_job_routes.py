@@ -0,0 +1,33 @@
+import asyncio
+from quart import Blueprint, current_app, request, jsonify
+from routes.common import request_user_id, job_response
+
+jobs_bp = Blueprint('jobs', __name__)
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+async def get_job(job_id):
+    """Async version of the job status endpoint in job_routes."""
+    try:
+        jobs = current_app.extensions['services'].jobs
+        job = await asyncio.to_thread(jobs.get, job_id, request_user_id(request))
+        if job is None:
+            return jsonify({
+                'status': 'error',
+                'message': 'Job not found'
+            }), 404
+
+        return jsonify({
+            'status': 'success',
+            'job': job_response(job)
+        })
+
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
@@ -0,0 +1,247 @@
+import asyncio
+from quart import Blueprint, Response, current_app, request, jsonify
+from services.credential_store import CredentialsNotFoundError
+from services.availability_service import SchedulingConflictError
+from services.rate_governor import UpstreamUnavailableError
+from routes.common import (request_user_id, event_response, validate_batch_queries, place_parsed_batch,
+                           merge_created_batch, wants_event_stream, sse_event, sse_error, SSE_HEADERS,
+                           wants_async, idempotency_key, job_response, job_location, retry_after_header)
+from services.event_jobs import event_id_for
+
+nlp_bp = Blueprint('nlp', __name__)
+
+@nlp_bp.route('/create', methods=['POST'])
+async def create_from_natural_language():
+    """
+    Creates an event from a natural language query.
+
+    With "Accept: text/event-stream" the response is a stream of
+    Server-Sent Events instead; see stream_create_events. With
+    "Prefer: respond-async" the query is queued and 202 is returned with the
+    job; see /jobs. An Idempotency-Key header makes retries of the same
+    request create the event only once.
+    """
+    try:
+        data = await request.get_json()
+        if not data or 'query' not in data:
+            return jsonify({
+                'status': 'error',
+                'message': 'Missing query in request'
+            }), 400
+
+        if wants_event_stream(request):
+            response = Response(
+                stream_create_events(current_app.extensions['services'], request_user_id(request), data, request.path,
+                                     idempotency_key(request)),
+                mimetype='text/event-stream',
+                headers=SSE_HEADERS
+            )
+            # Streams may outlive the default response timeout while the LLM is slow
+            response.timeout = None
+            return response
+
+        services = current_app.extensions['services']
+        user_id = request_user_id(request)
+        key = idempotency_key(request)
+        if wants_async(request):
+            if not isinstance(data['query'], str) or not data['query'].strip():
+                return jsonify({
+                    'status': 'error',
+                    'message': 'Query cannot be empty'
+                }), 400
+            # Parsed and inserted by a background worker; poll the Location for the result
+            job, _ = await asyncio.to_thread(services.jobs.enqueue, user_id, 'nlp_create', data, key)
+            return jsonify({
+                'status': 'accepted',
+                'job': job_response(job)
+            }), 202, {'Location': job_location(job)}
+
+        created_event = await create_event_from_query(services, user_id, data, request.path, key)
+        return jsonify({
+            'status': 'success',
+            'event': event_response(created_event)
+        })
+
+    except CredentialsNotFoundError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 401
+    except SchedulingConflictError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e),
+            'conflicts': e.conflicts
+        }), 409
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+    except UpstreamUnavailableError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 503, retry_after_header(e)
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+async def create_event_from_query(services, user_id, data, route, key=None):
+    """Async version of create_event_from_query in nlp_routes."""
+    calendar_service = await asyncio.to_thread(services.calendar_for, user_id)
+    parsed_event = await services.llm_service.aparse_calendar_query(data['query'], route=route)
+    event = await calendar_service.availability.aplace_event(
+        parsed_event['event'],
+        on_conflict=data.get('onConflict', 'allow'),
+        time_specified=parsed_event.get('timeSpecified', True)
+    )
+    created_event = await calendar_service.acreate_event(event, event_id_for(user_id, key))
+    calendar_service.availability.add_event(created_event)
+    return created_event
+
+@nlp_bp.route('/query', methods=['POST'])
+async def answer_natural_language_query():
+    """Answers a natural language query by intent; see nlp_routes."""
+    try:
+        data = await request.get_json()
+        if not data or 'query' not in data:
+            return jsonify({
+                'status': 'error',
+                'message': 'Missing query in request'
+            }), 400
+
+        services = current_app.extensions['services']
+        user_id = request_user_id(request)
+        calendar_service = await asyncio.to_thread(services.calendar_for, user_id)
+        # Reads hit the mirror and free/busy, which may sync with Google
+        answer = await asyncio.to_thread(services.nlp_service.answer_query, data['query'], calendar_service)
+        if answer is not None:
+            return jsonify({'status': 'success', **answer})
+
+        created_event = await create_event_from_query(services, user_id, data, request.path, idempotency_key(request))
+        return jsonify({
+            'status': 'success',
+            'intent': 'create',
+            'event': event_response(created_event)
+        })
+
+    except CredentialsNotFoundError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 401
+    except SchedulingConflictError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e),
+            'conflicts': e.conflicts
+        }), 409
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+    except UpstreamUnavailableError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 503, retry_after_header(e)
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+async def stream_create_events(services, user_id, data, route, key=None):
+    """Async version of the streamed /create event sequence in nlp_routes."""
+    yield sse_event('progress', {'stage': 'parsing'})
+    try:
+        calendar_service = await asyncio.to_thread(services.calendar_for, user_id)
+        parsed_event = None
+        async for update in services.llm_service.astream_calendar_query(data['query'], route=route):
+            if update['type'] == 'field':
+                yield sse_event('progress', {'stage': 'parsing', 'field': update['field'], 'value': update['value']})
+            else:
+                parsed_event = update['result']
+
+        yield sse_event('progress', {'stage': 'scheduling'})
+        event = await calendar_service.availability.aplace_event(
+            parsed_event['event'],
+            on_conflict=data.get('onConflict', 'allow'),
+            time_specified=parsed_event.get('timeSpecified', True)
+        )
+        created_event = await calendar_service.acreate_event(event, event_id_for(user_id, key))
+        calendar_service.availability.add_event(created_event)
+
+        yield sse_event('event', {'status': 'success', 'event': event_response(created_event)})
+    except Exception as e:
+        yield sse_error(e)
+
+@nlp_bp.route('/create/batch', methods=['POST'])
+async def create_batch_from_natural_language():
+    """Creates events from a list of natural language queries."""
+    try:
+        data = await request.get_json()
+        error = validate_batch_queries(data)
+        if error:
+            return jsonify({
+                'status': 'error',
+                'message': error
+            }), 400
+
+        services = current_app.extensions['services']
+        user_id = request_user_id(request)
+        key = idempotency_key(request)
+        calendar_service = await asyncio.to_thread(services.calendar_for, user_id)
+        parsed = await services.llm_service.aparse_calendar_queries(data['queries'], route=request.path)
+        # Placing untimed events and conflict checks may fetch free/busy
+        results, to_insert = await asyncio.to_thread(place_parsed_batch, calendar_service, parsed,
+                                                     data.get('onConflict', 'allow'), user_id, key)
+
+        if to_insert:
+            created = await calendar_service.acreate_events_batch([event for _, event in to_insert])
+            merge_created_batch(calendar_service, results, to_insert, created)
+
+        return jsonify({
+            'status': 'success',
+            'results': results
+        })
+
+    except CredentialsNotFoundError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 401
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+    except UpstreamUnavailableError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 503, retry_after_header(e)
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@nlp_bp.route('/stats', methods=['GET'])
+async def get_parse_stats():
+    """
+    Reports how often queries are served by the local parser instead of the
+    LLM, the LLM's token usage and latency per route, and how many /query
+    requests were routed to each intent.
+    """
+    services = current_app.extensions['services']
+    # The cache's counters may be read from SQLite
+    llm_stats = await asyncio.to_thread(services.llm_service.get_stats)
+    return jsonify({
+        'status': 'success',
+        'stats': {**llm_stats, **services.nlp_service.get_stats()}
+    })
@@ -1,12 +1,32 @@
-from flask import Blueprint, request, jsonify
-from services.calendar_service import CalendarService
+import itertools
+import logging
+from flask import Blueprint, Response, current_app, request, jsonify
+from services.credential_store import CredentialsNotFoundError
+from services.availability_service import SchedulingConflictError
+from services.rate_governor import UpstreamUnavailableError
+from services.event_jobs import event_id_for
+from services.ics import ICSImport, EXPORT_FIELDS, ics_lines
+from routes.common import (request_user_id, event_response, parse_event_range, wants_async, idempotency_key,
+                           job_response, job_location, retry_after_header, wants_ndjson, ndjson_chunks,
+                           no_deadline, parse_availability_request, IMPORT_CHUNK_SIZE, ICS_HEADERS, NDJSON_MIMETYPE)
+
+logger = logging.getLogger(__name__)
 
 calendar_bp = Blueprint('calendar', __name__)
-calendar_service = CalendarService(timezone='America/Los_Angeles')
 
 @calendar_bp.route('/schedule', methods=['POST'])
 def schedule_event():
-    """Creates a calendar event from a pre-formatted payload."""
+    """
+    Creates a calendar event from a pre-formatted payload.
+
+    An optional "onConflict" field controls overlapping events: "allow"
+    (default), "reject" (409 with the conflicts) or "shift" (move to the
+    first free slot after the requested start).
+
+    With "Prefer: respond-async" the event is queued and 202 is returned
+    with the job; see /jobs. An Idempotency-Key header makes retries of
+    the same request create the event only once, in either mode.
+    """
     try:
         data = request.get_json()
         
@@ -28,21 +48,51 @@ def schedule_event():
                 'message': f'Missing required fields: {", ".join(missing_fields)}'
             }), 400
 
+        services = current_app.extensions['services']
+        user_id = request_user_id(request)
+        key = idempotency_key(request)
+        if wants_async(request):
+            # Stored now and inserted by a background worker; poll the Location for the result
+            job, _ = services.jobs.enqueue(user_id, 'schedule', data, key)
+            return jsonify({
+                'status': 'accepted',
+                'job': job_response(job)
+            }), 202, {'Location': job_location(job)}
+
+        calendar_service = services.calendar_for(user_id)
+        event = calendar_service.availability.place_event(event, on_conflict=data.get('onConflict', 'allow'))
+
         # Create the event using our calendar service
-        created_event = calendar_service.create_event(event)
+        created_event = calendar_service.create_event(event, event_id=event_id_for(user_id, key))
+        calendar_service.availability.add_event(created_event)
         
         return jsonify({
             'status': 'success',
             'message': 'Event created successfully',
-            'event': {
-                'id': created_event['id'],
-                'summary': created_event['summary'],
-                'start': created_event['start'],
-                'end': created_event['end'],
-                'link': created_event.get('htmlLink', '')
-            }
+            'event': event_response(created_event)
         })
 
+    except CredentialsNotFoundError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 401
+    except SchedulingConflictError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e),
+            'conflicts': e.conflicts
+        }), 409
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+    except UpstreamUnavailableError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 503, retry_after_header(e)
     except Exception as e:
         return jsonify({
             'status': 'error',
@@ -51,15 +101,237 @@ def schedule_event():
 
 @calendar_bp.route('/events/upcoming', methods=['GET'])
 def get_upcoming_events():
-    """Gets the next 10 upcoming events."""
+    """
+    Gets upcoming events from the local event mirror.
+
+    Optional query parameters: timeMin, timeMax (RFC 3339) and limit (default 10).
+
+    With "Accept: application/x-ndjson" the events are streamed, one JSON
+    object per line, as they are read from the mirror; limit is then
+    optional, so whole ranges can be listed without building one large body.
+    """
+    try:
+        services = current_app.extensions['services']
+        calendar_service = services.calendar_for(request_user_id(request))
+        stream = wants_ndjson(request)
+        time_min, time_max, limit = parse_event_range(
+            request.args, calendar_service.timezone,
+            **({'default_limit': None, 'max_limit': None} if stream else {})
+        )
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+
     try:
-        events = calendar_service.get_upcoming_events()
+        if stream:
+            events = calendar_service.stream_events(time_min=time_min, time_max=time_max, limit=limit)
+            # Sync the mirror now, so errors get a proper status instead of an empty stream
+            first = list(itertools.islice(events, 1))
+            return Response(
+                ndjson_chunks(itertools.chain(first, events)),
+                mimetype=NDJSON_MIMETYPE
+            )
+
+        events = calendar_service.list_events(time_min=time_min, time_max=time_max, limit=limit)
         return jsonify({
             'status': 'success',
             'events': events
         })
+    except CredentialsNotFoundError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 401
+    except UpstreamUnavailableError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 503, retry_after_header(e)
     except Exception as e:
         return jsonify({
             'status': 'error',
             'message': str(e)
-        }), 500 
\ No newline at end of file
+        }), 500
+
+@calendar_bp.route('/availability', methods=['POST'])
+def find_group_availability():
+    """
+    Finds meeting times for a group of calendars.
+
+    Expected payload: {"attendees": [...], "durationMinutes": 30}, where each
+    attendee is a calendar id or {"id", "timeZone", "optional"}. Optional
+    fields: timeMin and timeMax (RFC 3339; default now and a week later),
+    granularityMinutes (default 30), limit (default 10), workingHours
+    ({"start": 8, "end": 20} in each attendee's time zone), includeWeekends
+    and includeSelf (default true).
+
+    Returns the best slots, ranked by how many optional attendees are free,
+    and any calendars whose free/busy couldn't be read.
+    """
+    try:
+        services = current_app.extensions['services']
+        calendar_service = services.calendar_for(request_user_id(request))
+        params = parse_availability_request(request.get_json(), calendar_service.timezone)
+        result = calendar_service.group_availability.find_slots(**params)
+        return jsonify({
+            'status': 'success',
+            'slots': result['slots'],
+            'errors': result['errors']
+        })
+    except CredentialsNotFoundError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 401
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+    except UpstreamUnavailableError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 503, retry_after_header(e)
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@calendar_bp.route('/notifications', methods=['POST'])
+def receive_notification():
+    """
+    Webhook for Calendar push notifications, at the address given in
+    WATCH_WEBHOOK_URL. Google identifies the channel and the change in
+    X-Goog-* headers; the body is empty. Notifications that don't match a
+    live channel get 404, which Google doesn't retry.
+    """
+    channels = current_app.extensions['services'].watch_channels
+    if channels is None:
+        return jsonify({
+            'status': 'error',
+            'message': 'Push notifications are not enabled'
+        }), 404
+
+    try:
+        accepted = channels.notify(
+            request.headers.get('X-Goog-Channel-ID', ''),
+            request.headers.get('X-Goog-Channel-Token', ''),
+            request.headers.get('X-Goog-Resource-ID', ''),
+            request.headers.get('X-Goog-Resource-State', '')
+        )
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+    if not accepted:
+        return jsonify({
+            'status': 'error',
+            'message': 'Unknown channel'
+        }), 404
+    return jsonify({'status': 'success'})
+
+@calendar_bp.route('/import', methods=['POST'])
+@no_deadline
+def import_events():
+    """
+    Imports the events of an iCalendar (.ics) file, sent as the request
+    body or as the "file" field of a multipart form.
+
+    The upload is parsed as it is read and events are inserted in batches,
+    so files of any size are handled in constant memory. Importing the same
+    file again skips events that already exist. Returns counts of imported,
+    skipped and failed events, with the reasons for failures.
+    """
+    try:
+        services = current_app.extensions['services']
+        calendar_service = services.calendar_for(request_user_id(request))
+        upload = request.files.get('file') if request.mimetype == 'multipart/form-data' else None
+        stream = upload.stream if upload else request.stream
+
+        importer = ICSImport(calendar_service)
+        for chunk in iter(lambda: stream.read(IMPORT_CHUNK_SIZE), b''):
+            importer.feed(chunk)
+        summary = importer.close()
+
+        return jsonify({
+            'status': 'success',
+            **summary
+        })
+
+    except CredentialsNotFoundError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 401
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+    except UpstreamUnavailableError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 503, retry_after_header(e)
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@calendar_bp.route('/export', methods=['GET'])
+@no_deadline
+def export_events():
+    """
+    Streams the events between timeMin and timeMax (RFC 3339, optional;
+    timeMin defaults to now) as an iCalendar file.
+
+    Events are fetched from the Calendar API a page at a time while the
+    response is written, so memory use doesn't grow with the calendar.
+    """
+    try:
+        services = current_app.extensions['services']
+        calendar_service = services.calendar_for(request_user_id(request))
+        time_min, time_max, _ = parse_event_range(request.args, calendar_service.timezone)
+        events = calendar_service.iter_events(time_min=time_min, time_max=time_max, fields=EXPORT_FIELDS)
+        # Fetch the first page now, so errors get a proper status instead of a cut-off file
+        first = list(itertools.islice(events, 1))
+
+        return Response(
+            stream_export(itertools.chain(first, events), calendar_service.timezone),
+            mimetype='text/calendar',
+            headers=ICS_HEADERS
+        )
+
+    except CredentialsNotFoundError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 401
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+    except UpstreamUnavailableError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 503, retry_after_header(e)
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+def stream_export(events, timezone_name):
+    """Renders the export; a failure after the first page ends the file without END:VCALENDAR."""
+    try:
+        yield from ics_lines(events, timezone_name)
+    except Exception:
+        logger.exception("Calendar export failed part way")
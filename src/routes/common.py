@@ -0,0 +1,279 @@
+"""Helpers shared by the sync and async blueprints."""
+import itertools
+import json
+import math
+import os
+from datetime import datetime, timedelta, timezone
+import pytz
+from services.credential_store import DEFAULT_USER, validate_user_id
+from services.availability_service import SchedulingConflictError
+from services.event_jobs import error_details, event_id_for
+
+MAX_BATCH_QUERIES = 100
+DEFAULT_EVENT_LIMIT = 10
+MAX_EVENT_LIMIT = 2500
+# Stops proxies from buffering the stream
+SSE_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+NDJSON_MIMETYPE = 'application/x-ndjson'
+# Bytes of an .ics upload read at a time
+IMPORT_CHUNK_SIZE = 64 * 1024
+ICS_HEADERS = {'Content-Disposition': 'attachment; filename="calendar.ics"', 'X-Accel-Buffering': 'no'}
+
+def event_response(created_event):
+    """Formats a created event the way the event-creating endpoints return it."""
+    return {
+        'id': created_event['id'],
+        'summary': created_event['summary'],
+        'start': created_event['start'],
+        'end': created_event['end'],
+        'link': created_event.get('htmlLink', '')
+    }
+
+def request_user_id(req):
+    """
+    Gets the calendar user for a request from the X-User-Id header,
+    falling back to the default single-user credentials.
+    """
+    return validate_user_id(req.headers.get('X-User-Id', DEFAULT_USER))
+
+def validate_batch_queries(data):
+    """Returns an error message if a batch payload is invalid, else None."""
+    queries = data.get('queries') if isinstance(data, dict) else None
+    if not isinstance(queries, list) or not queries:
+        return 'Missing queries list in request'
+    if len(queries) > MAX_BATCH_QUERIES:
+        return f'Too many queries in one batch (max {MAX_BATCH_QUERIES})'
+    if not all(isinstance(query, str) for query in queries):
+        return 'Every query must be a string'
+    return None
+
+def batch_error(e):
+    """Formats an exception as one item of a batch response, with the status /create would use in 'code'."""
+    return dict({'status': 'error'}, **error_details(e))
+
+def place_parsed_batch(calendar_service, parsed, on_conflict='allow', user_id=None, key=None):
+    """
+    Places each parsed batch item as /create would, and splits the results
+    into per-item errors and the events still to insert, as
+    (results, [(index, event), ...]).
+
+    Events placed earlier in the batch count as busy for later ones, so
+    untimed events don't all land in the same free slot. With key (the
+    request's Idempotency-Key), each event gets an id from the key and its
+    position, so a retried batch doesn't create duplicates.
+    """
+    availability = calendar_service.availability
+    results = [None] * len(parsed)
+    to_insert = []
+    for index, item in enumerate(parsed):
+        if isinstance(item, BaseException):
+            results[index] = batch_error(item)
+            continue
+        try:
+            event = availability.place_event(item['event'], on_conflict=on_conflict,
+                                             time_specified=item.get('timeSpecified', True))
+        except SchedulingConflictError as e:
+            results[index] = batch_error(e)
+            continue
+        if key is not None:
+            event = dict(event, id=event_id_for(user_id, f"{key}:{index}"))
+        availability.add_event(event)
+        to_insert.append((index, event))
+    return results, to_insert
+
+def merge_created_batch(calendar_service, results, to_insert, created):
+    """Fills in results with the outcome of each batch insert."""
+    for (index, _), item in zip(to_insert, created):
+        if isinstance(item, BaseException):
+            results[index] = batch_error(item)
+        else:
+            results[index] = {'status': 'success', 'event': event_response(item)}
+    if any(isinstance(item, BaseException) for item in created):
+        # Failed events were already marked busy by place_parsed_batch
+        calendar_service.availability.invalidate()
+    return results
+
+def wants_ndjson(req):
+    """True if the client asked for newline-delimited JSON, one item per line."""
+    return NDJSON_MIMETYPE in req.headers.get('Accept', '')
+
+def ndjson_line(item):
+    return json.dumps(item, separators=(',', ':')) + '\n'
+
+def ndjson_chunks(items, size=250):
+    """Renders an iterator as NDJSON, size items per chunk so each write carries a useful amount."""
+    for chunk in iter(lambda: list(itertools.islice(items, size)), []):
+        yield ''.join(ndjson_line(item) for item in chunk)
+
+def wants_event_stream(req):
+    """True if the client asked for a Server-Sent Events response."""
+    return 'text/event-stream' in req.headers.get('Accept', '')
+
+def sse_event(event, data):
+    """Formats one Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def sse_error(e):
+    """
+    Formats an exception as an SSE error event. The HTTP status is already
+    sent by then, so the status the plain endpoint would use goes in 'code'.
+    """
+    return sse_event('error', dict({'status': 'error'}, **error_details(e)))
+
+def retry_after_header(e):
+    """The Retry-After header for an UpstreamUnavailableError response."""
+    return {'Retry-After': str(max(1, math.ceil(e.retry_after)))}
+
+def no_deadline(view):
+    """Marks a view that may run longer than the request deadline, such as bulk import and export."""
+    view.no_deadline = True
+    return view
+
+def request_timeout(req, view):
+    """
+    Seconds a request may take before its upstream calls give up: the
+    X-Request-Timeout header if given, else REQUEST_TIMEOUT_SECONDS, capped
+    at REQUEST_TIMEOUT_MAX_SECONDS. None for views marked no_deadline.
+    Raises ValueError if the header isn't a positive number.
+    """
+    if view is None or getattr(view, 'no_deadline', False):
+        return None
+    maximum = float(os.getenv('REQUEST_TIMEOUT_MAX_SECONDS', '120'))
+    value = req.headers.get('X-Request-Timeout')
+    if value is None:
+        return min(float(os.getenv('REQUEST_TIMEOUT_SECONDS', '30')), maximum)
+    try:
+        seconds = float(value)
+    except ValueError:
+        seconds = float('nan')
+    if not 0 < seconds < float('inf'):
+        raise ValueError('X-Request-Timeout must be a positive number of seconds')
+    return min(seconds, maximum)
+
+def wants_async(req):
+    """True if the client asked for the event to be created in the background (Prefer: respond-async)."""
+    return 'respond-async' in req.headers.get('Prefer', '')
+
+def idempotency_key(req):
+    """The client's Idempotency-Key header, or None. Raises ValueError if it is unusable."""
+    key = req.headers.get('Idempotency-Key')
+    if key is not None and not 1 <= len(key) <= 255:
+        raise ValueError('Idempotency-Key must be 1 to 255 characters')
+    return key
+
+def job_response(job):
+    """Formats a queued event-creation job for the API."""
+    body = {
+        'id': job['id'],
+        'status': job['status'],
+        'attempts': job['attempts'],
+        'created_at': job['created_at'],
+        'updated_at': job['updated_at']
+    }
+    if job['result'] is not None:
+        body['event'] = event_response(job['result'])
+    if job['error'] is not None:
+        body['error'] = job['error']
+    return body
+
+def job_location(job):
+    return f"/jobs/{job['id']}"
+
+def parse_event_range(args, timezone_name='America/Los_Angeles', default_limit=DEFAULT_EVENT_LIMIT,
+                      max_limit=MAX_EVENT_LIMIT):
+    """
+    Reads timeMin, timeMax and limit query parameters for event listing.
+
+    Times are RFC 3339; values without an offset are taken to be in the
+    calendar's timezone. timeMin defaults to now. Without a limit parameter
+    the limit is default_limit, which may be None for no limit; max_limit
+    None allows any positive limit. Raises ValueError on bad input.
+    """
+    tz = pytz.timezone(timezone_name)
+    time_min = parse_timestamp(args, 'timeMin', tz) or datetime.now(timezone.utc)
+    time_max = parse_timestamp(args, 'timeMax', tz)
+    if time_max is not None and time_max <= time_min:
+        raise ValueError('timeMax must be after timeMin')
+
+    if 'limit' not in args:
+        return time_min, time_max, default_limit
+    try:
+        limit = int(args['limit'])
+    except ValueError:
+        raise ValueError('Invalid limit: expected an integer')
+    if limit < 1:
+        raise ValueError('limit must be at least 1')
+    if max_limit is not None and limit > max_limit:
+        raise ValueError(f'limit must be between 1 and {max_limit}')
+
+    return time_min, time_max, limit
+
+def parse_timestamp(args, name, tz):
+    """Reads an RFC 3339 timestamp, taking one without an offset to be in tz; None if missing."""
+    value = args.get(name)
+    if not value:
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f'Invalid {name}: expected an RFC 3339 timestamp')
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f'Invalid {name}: expected an RFC 3339 timestamp')
+    return tz.localize(parsed) if parsed.tzinfo is None else parsed
+
+def parse_availability_request(data, timezone_name='America/Los_Angeles'):
+    """
+    Reads a group availability request body into GroupAvailability.find_slots
+    arguments.
+
+    attendees is a list of calendar ids or {"id", "timeZone", "optional"}
+    objects; the caller's own calendar is added unless includeSelf is false.
+    timeMin defaults to now and timeMax to a week later. Raises ValueError
+    on bad input.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Invalid payload structure. Expected a JSON object.')
+    raw = data.get('attendees')
+    if not isinstance(raw, list):
+        raise ValueError('Missing attendees list in request')
+    attendees = {}
+    if data.get('includeSelf', True):
+        attendees['primary'] = {'id': 'primary'}
+    for item in raw:
+        attendee = {'id': item} if isinstance(item, str) else item
+        if not isinstance(attendee, dict) or not isinstance(attendee.get('id'), str) or not attendee['id']:
+            raise ValueError('Every attendee must be a calendar id or an object with an "id"')
+        attendees[attendee['id']] = {
+            'id': attendee['id'],
+            'timeZone': attendee.get('timeZone'),
+            'optional': bool(attendee.get('optional', False)),
+        }
+
+    tz = pytz.timezone(timezone_name)
+    time_min = parse_timestamp(data, 'timeMin', tz) or datetime.now(timezone.utc)
+    time_max = parse_timestamp(data, 'timeMax', tz) or time_min + timedelta(days=7)
+
+    def minutes(name, default):
+        value = data.get(name, default)
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise ValueError(f'Invalid {name}: expected a number of minutes')
+        return timedelta(minutes=value)
+
+    limit = data.get('limit', DEFAULT_EVENT_LIMIT)
+    if not isinstance(limit, int) or isinstance(limit, bool) or not 1 <= limit <= MAX_EVENT_LIMIT:
+        raise ValueError(f'limit must be between 1 and {MAX_EVENT_LIMIT}')
+    hours = data.get('workingHours') or {}
+    if not isinstance(hours, dict) or not all(isinstance(hours.get(key, 0), int) for key in ('start', 'end')):
+        raise ValueError('Invalid workingHours: expected {"start": hour, "end": hour}')
+
+    return {
+        'attendees': list(attendees.values()),
+        'time_min': time_min,
+        'time_max': time_max,
+        'duration': minutes('durationMinutes', 30),
+        'granularity': minutes('granularityMinutes', 30),
+        'limit': limit,
+        'day_start': hours.get('start'),
+        'day_end': hours.get('end'),
+        'weekends': bool(data.get('includeWeekends', False)),
+    }
@@ -0,0 +1,35 @@
+from flask import Blueprint, current_app, request, jsonify
+from routes.common import request_user_id, job_response
+
+jobs_bp = Blueprint('jobs', __name__)
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    Reports a queued event-creation job: its status (queued, running,
+    succeeded or failed), the created event once it succeeded, and the
+    last error with the status code the synchronous endpoint would have used.
+    """
+    try:
+        job = current_app.extensions['services'].jobs.get(job_id, user_id=request_user_id(request))
+        if job is None:
+            return jsonify({
+                'status': 'error',
+                'message': 'Job not found'
+            }), 404
+
+        return jsonify({
+            'status': 'success',
+            'job': job_response(job)
+        })
+
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
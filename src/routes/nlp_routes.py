@@ -1,14 +1,25 @@
-from flask import Blueprint, request, jsonify
-from services.llm_service import LLMService
-from services.calendar_service import CalendarService
+from flask import Blueprint, Response, current_app, request, jsonify
+from services.credential_store import CredentialsNotFoundError
+from services.availability_service import SchedulingConflictError
+from services.rate_governor import UpstreamUnavailableError
+from routes.common import (request_user_id, event_response, validate_batch_queries, place_parsed_batch,
+                           merge_created_batch, wants_event_stream, sse_event, sse_error, SSE_HEADERS,
+                           wants_async, idempotency_key, job_response, job_location, retry_after_header)
+from services.event_jobs import event_id_for
 
 nlp_bp = Blueprint('nlp', __name__)
-llm_service = LLMService()
-calendar_service = CalendarService()
 
 @nlp_bp.route('/create', methods=['POST'])
 def create_from_natural_language():
-    """Creates an event from a natural language query."""
+    """
+    Creates an event from a natural language query.
+
+    With "Accept: text/event-stream" the response is a stream of
+    Server-Sent Events instead; see stream_create_events. With
+    "Prefer: respond-async" the query is queued and 202 is returned with the
+    job; see /jobs. An Idempotency-Key header makes retries of the same
+    request create the event only once.
+    """
     try:
         data = request.get_json()
         if not data or 'query' not in data:
@@ -17,30 +28,242 @@ def create_from_natural_language():
                 'message': 'Missing query in request'
             }), 400
 
-        # Parse the natural language query
-        parsed_event = llm_service.parse_calendar_query(data['query'])
-        
-        # Create the event using the calendar service
-        created_event = calendar_service.create_event(parsed_event['event'])
-        
+        if wants_event_stream(request):
+            return Response(
+                stream_create_events(current_app.extensions['services'], request_user_id(request), data, request.path,
+                                     idempotency_key(request)),
+                mimetype='text/event-stream',
+                headers=SSE_HEADERS
+            )
+
+        services = current_app.extensions['services']
+        user_id = request_user_id(request)
+        key = idempotency_key(request)
+        if wants_async(request):
+            if not isinstance(data['query'], str) or not data['query'].strip():
+                return jsonify({
+                    'status': 'error',
+                    'message': 'Query cannot be empty'
+                }), 400
+            # Parsed and inserted by a background worker; poll the Location for the result
+            job, _ = services.jobs.enqueue(user_id, 'nlp_create', data, key)
+            return jsonify({
+                'status': 'accepted',
+                'job': job_response(job)
+            }), 202, {'Location': job_location(job)}
+
+        created_event = create_event_from_query(services, user_id, data, request.path, key)
         return jsonify({
             'status': 'success',
-            'event': {
-                'id': created_event['id'],
-                'summary': created_event['summary'],
-                'start': created_event['start'],
-                'end': created_event['end'],
-                'link': created_event.get('htmlLink', '')
-            }
+            'event': event_response(created_event)
         })
 
+    except CredentialsNotFoundError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 401
+    except SchedulingConflictError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e),
+            'conflicts': e.conflicts
+        }), 409
     except ValueError as e:
         return jsonify({
             'status': 'error',
             'message': str(e)
         }), 400
+    except UpstreamUnavailableError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 503, retry_after_header(e)
     except Exception as e:
         return jsonify({
             'status': 'error',
             'message': str(e)
-        }), 500 
\ No newline at end of file
+        }), 500
+
+def create_event_from_query(services, user_id, data, route, key=None):
+    """
+    Parses a query, places the event as the request's onConflict asks and
+    inserts it; key, if given, makes the insert idempotent.
+    """
+    calendar_service = services.calendar_for(user_id)
+
+    # Parse the natural language query
+    parsed_event = services.llm_service.parse_calendar_query(data['query'], route=route)
+
+    # Pick a free slot if no time was given, and handle conflicts as requested
+    event = calendar_service.availability.place_event(
+        parsed_event['event'],
+        on_conflict=data.get('onConflict', 'allow'),
+        time_specified=parsed_event.get('timeSpecified', True)
+    )
+
+    # Create the event using the calendar service
+    created_event = calendar_service.create_event(event, event_id=event_id_for(user_id, key))
+    calendar_service.availability.add_event(created_event)
+    return created_event
+
+@nlp_bp.route('/query', methods=['POST'])
+def answer_natural_language_query():
+    """
+    Answers a natural language query by intent.
+
+    Questions about the calendar ("what do I have tomorrow?", "am I free
+    Friday afternoon?") are answered from the event mirror and free/busy
+    data without calling the LLM; the response has the intent, the time
+    range asked about, the events in it and a sentence answering the
+    question. Anything else creates an event, as /create does.
+    """
+    try:
+        data = request.get_json()
+        if not data or 'query' not in data:
+            return jsonify({
+                'status': 'error',
+                'message': 'Missing query in request'
+            }), 400
+
+        services = current_app.extensions['services']
+        user_id = request_user_id(request)
+        calendar_service = services.calendar_for(user_id)
+        answer = services.nlp_service.answer_query(data['query'], calendar_service)
+        if answer is not None:
+            return jsonify({'status': 'success', **answer})
+
+        created_event = create_event_from_query(services, user_id, data, request.path, idempotency_key(request))
+        return jsonify({
+            'status': 'success',
+            'intent': 'create',
+            'event': event_response(created_event)
+        })
+
+    except CredentialsNotFoundError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 401
+    except SchedulingConflictError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e),
+            'conflicts': e.conflicts
+        }), 409
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+    except UpstreamUnavailableError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 503, retry_after_header(e)
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+def stream_create_events(services, user_id, data, route, key=None):
+    """
+    Yields the SSE events for a streamed /create: 'progress' events as the
+    query is parsed, then either 'event' with the created event or 'error'.
+    Invalid queries end the stream as soon as the LLM output shows it. key,
+    if given, makes the insert idempotent, so a client retrying after the
+    stream dropped gets the same event.
+    """
+    yield sse_event('progress', {'stage': 'parsing'})
+    try:
+        calendar_service = services.calendar_for(user_id)
+        parsed_event = None
+        for update in services.llm_service.stream_calendar_query(data['query'], route=route):
+            if update['type'] == 'field':
+                yield sse_event('progress', {'stage': 'parsing', 'field': update['field'], 'value': update['value']})
+            else:
+                parsed_event = update['result']
+
+        yield sse_event('progress', {'stage': 'scheduling'})
+        event = calendar_service.availability.place_event(
+            parsed_event['event'],
+            on_conflict=data.get('onConflict', 'allow'),
+            time_specified=parsed_event.get('timeSpecified', True)
+        )
+        created_event = calendar_service.create_event(event, event_id=event_id_for(user_id, key))
+        calendar_service.availability.add_event(created_event)
+
+        yield sse_event('event', {'status': 'success', 'event': event_response(created_event)})
+    except Exception as e:
+        yield sse_error(e)
+
+@nlp_bp.route('/create/batch', methods=['POST'])
+def create_batch_from_natural_language():
+    """
+    Creates events from a list of natural language queries.
+
+    Queries are parsed concurrently, placed as /create places them
+    (onConflict applies to every item) and inserted with batched Calendar
+    API requests. Each result has the same shape as a /create response;
+    failed items carry the status /create would return in 'code'. An
+    Idempotency-Key header makes a retried batch create each event only once.
+    """
+    try:
+        data = request.get_json()
+        error = validate_batch_queries(data)
+        if error:
+            return jsonify({
+                'status': 'error',
+                'message': error
+            }), 400
+
+        services = current_app.extensions['services']
+        user_id = request_user_id(request)
+        key = idempotency_key(request)
+        calendar_service = services.calendar_for(user_id)
+        parsed = services.llm_service.parse_calendar_queries(data['queries'], route=request.path)
+        results, to_insert = place_parsed_batch(calendar_service, parsed, data.get('onConflict', 'allow'), user_id, key)
+
+        if to_insert:
+            created = calendar_service.create_events_batch([event for _, event in to_insert])
+            merge_created_batch(calendar_service, results, to_insert, created)
+
+        return jsonify({
+            'status': 'success',
+            'results': results
+        })
+
+    except CredentialsNotFoundError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 401
+    except ValueError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 400
+    except UpstreamUnavailableError as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 503, retry_after_header(e)
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+@nlp_bp.route('/stats', methods=['GET'])
+def get_parse_stats():
+    """
+    Reports how often queries are served by the local parser instead of the
+    LLM, the LLM's token usage and latency per route, and how many /query
+    requests were routed to each intent.
+    """
+    services = current_app.extensions['services']
+    return jsonify({
+        'status': 'success',
+        'stats': {**services.llm_service.get_stats(), **services.nlp_service.get_stats()}
+    })
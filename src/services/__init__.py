@@ -1,4 +1,10 @@
 """Services for Calendar Assistant."""
-from .calendar_service import CalendarService
 
-__all__ = ['CalendarService'] 
\ No newline at end of file
+__all__ = ['CalendarService']
+
+def __getattr__(name):
+    # Resolved on first use so importing a light service module doesn't load the Google client libraries
+    if name == 'CalendarService':
+        from .calendar_service import CalendarService
+        return CalendarService
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,235 @@
+import asyncio
+import bisect
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import pytz
+
+SLOT_GRANULARITY_MINUTES = 15
+
+class SchedulingConflictError(Exception):
+    """Raised when an event overlaps existing busy time and conflicts are rejected."""
+    def __init__(self, conflicts: List[Dict[str, str]]):
+        super().__init__("Event conflicts with existing events")
+        self.conflicts = conflicts
+
+class BusyIntervals:
+    """
+    Disjoint, sorted busy intervals (as POSIX timestamps).
+
+    Overlapping and touching intervals are merged on insert, so both conflict
+    checks and free-slot searches start with a binary search.
+    """
+
+    def __init__(self, intervals=()):
+        self._starts = []
+        self._ends = []
+        for start, end in intervals:
+            self.add(start, end)
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def add(self, start: float, end: float) -> None:
+        if end <= start:
+            return
+        # Intervals [i, j) overlap or touch [start, end]
+        i = bisect.bisect_left(self._ends, start)
+        j = bisect.bisect_right(self._starts, end)
+        if i < j:
+            start = min(start, self._starts[i])
+            end = max(end, self._ends[j - 1])
+        self._starts[i:j] = [start]
+        self._ends[i:j] = [end]
+
+    def conflicts(self, start: float, end: float) -> List[Tuple[float, float]]:
+        """Returns the busy intervals overlapping [start, end)."""
+        found = []
+        i = bisect.bisect_right(self._ends, start)
+        while i < len(self._starts) and self._starts[i] < end:
+            found.append((self._starts[i], self._ends[i]))
+            i += 1
+        return found
+
+    def first_free(self, after: float, duration: float) -> float:
+        """Returns the earliest start >= after with duration seconds free."""
+        candidate = after
+        i = bisect.bisect_right(self._ends, candidate)
+        while i < len(self._starts) and self._starts[i] < candidate + duration:
+            candidate = max(candidate, self._ends[i])
+            i += 1
+        return candidate
+
+class AvailabilityService:
+    """
+    Answers "is this time free?" and "when is the next free slot?" from the
+    calendar's free/busy data instead of guessing.
+
+    Busy time is fetched with the freeBusy API for a rolling horizon and
+    refreshed periodically; events created through this process are added
+    immediately. With AVAILABILITY_SOURCE=mirror it is computed from the
+    calendar's event mirror instead, expanding recurring events locally.
+    """
+
+    def __init__(self, calendar_service, calendar_id: str = 'primary',
+                 clock: Callable[[], float] = time.monotonic):
+        self.calendar_service = calendar_service
+        self.calendar_id = calendar_id
+        self.horizon = timedelta(days=int(os.getenv('AVAILABILITY_HORIZON_DAYS', '14')))
+        self.refresh_interval = float(os.getenv('AVAILABILITY_REFRESH_SECONDS', '60'))
+        # While a watch channel reports changes, polling is only a safety net
+        self.watched_refresh_interval = float(os.getenv('WATCH_FALLBACK_SECONDS', '900'))
+        self.watched = False
+        self.day_start = int(os.getenv('AVAILABILITY_DAY_START', '8'))
+        self.day_end = int(os.getenv('AVAILABILITY_DAY_END', '20'))
+        self.source = os.getenv('AVAILABILITY_SOURCE', 'freebusy')
+        if self.source not in ('freebusy', 'mirror'):
+            raise ValueError("AVAILABILITY_SOURCE must be 'freebusy' or 'mirror'")
+        self._tz = pytz.timezone(calendar_service.timezone)
+        self._clock = clock
+        self._busy = BusyIntervals()
+        self._window = None
+        self._fetched_at = None
+        self._lock = threading.Lock()
+
+    def is_free(self, start: datetime, end: datetime) -> bool:
+        return not self.find_conflicts(start, end)
+
+    def find_conflicts(self, start: datetime, end: datetime) -> List[Dict[str, str]]:
+        """Returns busy periods overlapping [start, end) as RFC 3339 start/end pairs."""
+        busy = self._busy_for(start, end)
+        return [
+            {'start': self._format(s), 'end': self._format(e)}
+            for s, e in busy.conflicts(start.timestamp(), end.timestamp())
+        ]
+
+    def first_free_slot(self, duration: timedelta, after: Optional[datetime] = None) -> datetime:
+        """
+        Finds the earliest free slot of the given duration after a time, on a
+        15-minute grid and within working hours.
+        """
+        if after is None:
+            # "Next available time slot starting at the next hour"
+            now = datetime.now(self._tz)
+            after = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        if duration > timedelta(hours=self.day_end - self.day_start):
+            raise ValueError("Event is longer than the working day")
+
+        busy = self._busy_for(after, after + self.horizon)
+        candidate = self._round_up(after.astimezone(self._tz))
+        deadline = after + self.horizon
+        while candidate < deadline:
+            free_at = busy.first_free(candidate.timestamp(), duration.total_seconds())
+            candidate = self._round_up(datetime.fromtimestamp(free_at, self._tz))
+            day_open = self._at_hour(candidate, self.day_start)
+            day_close = self._at_hour(candidate, self.day_end)
+            if candidate < day_open:
+                candidate = day_open
+            elif candidate + duration > day_close:
+                candidate = self._at_hour(candidate + timedelta(days=1), self.day_start)
+            elif not busy.conflicts(candidate.timestamp(), (candidate + duration).timestamp()):
+                return candidate
+        raise ValueError("No free time slot found")
+
+    def place_event(self, event: Dict[str, Any], on_conflict: str = 'allow',
+                    time_specified: bool = True) -> Dict[str, Any]:
+        """
+        Returns the event body to insert, moved if needed.
+
+        Events without a specified time go in the next free slot. Otherwise
+        on_conflict decides: 'allow' keeps the time, 'reject' raises
+        SchedulingConflictError, and 'shift' moves the event to the first free
+        slot after its requested start.
+        """
+        if on_conflict not in ('allow', 'reject', 'shift'):
+            raise ValueError("onConflict must be one of: allow, reject, shift")
+        if time_specified and on_conflict == 'allow':
+            return event
+
+        start, end = self._event_bounds(event)
+        if not time_specified:
+            return self._move(event, self.first_free_slot(end - start), end - start)
+
+        conflicts = self.find_conflicts(start, end)
+        if not conflicts:
+            return event
+        if on_conflict == 'reject':
+            raise SchedulingConflictError(conflicts)
+        return self._move(event, self.first_free_slot(end - start, after=start), end - start)
+
+    async def aplace_event(self, event: Dict[str, Any], on_conflict: str = 'allow',
+                           time_specified: bool = True) -> Dict[str, Any]:
+        """Async version of place_event; a free/busy fetch, if due, runs in a worker thread."""
+        return await asyncio.to_thread(self.place_event, event, on_conflict, time_specified)
+
+    def add_event(self, event: Dict[str, Any]) -> None:
+        """Marks a newly created event as busy without waiting for a refresh."""
+        if event.get('transparency') == 'transparent' or 'dateTime' not in event.get('start', {}):
+            return
+        start, end = self._event_bounds(event)
+        with self._lock:
+            self._busy.add(start.timestamp(), end.timestamp())
+
+    def invalidate(self) -> None:
+        self._fetched_at = None
+
+    def _busy_for(self, start: datetime, end: datetime) -> BusyIntervals:
+        """Returns busy intervals covering [start, end), fetching if stale or out of range."""
+        with self._lock:
+            interval = self.refresh_interval
+            if self.watched:
+                interval = max(interval, self.watched_refresh_interval)
+            stale = self._fetched_at is None or self._clock() - self._fetched_at >= interval
+            covered = self._window is not None and self._window[0] <= start and end <= self._window[1]
+            if stale or not covered:
+                window_start = min(start, datetime.now(timezone.utc))
+                window_end = max(end, window_start + self.horizon)
+                if self.source == 'mirror':
+                    mirror = self.calendar_service.get_mirror(self.calendar_id)
+                    self._busy = BusyIntervals(mirror.busy_between(window_start, window_end))
+                else:
+                    busy = self.calendar_service.get_busy_intervals(window_start, window_end, self.calendar_id)
+                    self._busy = BusyIntervals(
+                        (self._parse(b['start']).timestamp(), self._parse(b['end']).timestamp()) for b in busy
+                    )
+                self._window = (window_start, window_end)
+                self._fetched_at = self._clock()
+            return self._busy
+
+    def _event_bounds(self, event: Dict[str, Any]) -> Tuple[datetime, datetime]:
+        try:
+            start = self._parse(event['start']['dateTime'], event['start'].get('timeZone'))
+            end = self._parse(event['end']['dateTime'], event['end'].get('timeZone'))
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("Event start and end must have a dateTime")
+        if end <= start:
+            raise ValueError("Event end must be after its start")
+        return start, end
+
+    def _move(self, event: Dict[str, Any], start: datetime, duration: timedelta) -> Dict[str, Any]:
+        moved = dict(event)
+        end = self._tz.normalize(start + duration)
+        moved['start'] = dict(event['start'], dateTime=start.isoformat(), timeZone=self._tz.zone)
+        moved['end'] = dict(event['end'], dateTime=end.isoformat(), timeZone=self._tz.zone)
+        return moved
+
+    def _parse(self, value: str, timezone_name: Optional[str] = None) -> datetime:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if parsed.tzinfo is None:
+            parsed = pytz.timezone(timezone_name or self._tz.zone).localize(parsed)
+        return parsed
+
+    def _format(self, timestamp: float) -> str:
+        return datetime.fromtimestamp(timestamp, self._tz).isoformat()
+
+    def _round_up(self, moment: datetime) -> datetime:
+        step = SLOT_GRANULARITY_MINUTES * 60
+        rounded = math.ceil(moment.timestamp() / step) * step
+        return datetime.fromtimestamp(rounded, self._tz)
+
+    def _at_hour(self, moment: datetime, hour: int) -> datetime:
+        local = moment.astimezone(self._tz)
+        return self._tz.localize(datetime(local.year, local.month, local.day, hour))
@@ -1,55 +1,437 @@
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
-import os.path
-import pickle
+from datetime import datetime, timedelta, timezone as dt_timezone
+import asyncio
+import json
+import os
+import threading
+from urllib.parse import urlsplit
+from .event_mirror import EventMirror, list_fields
+from .availability_service import AvailabilityService
+from .credential_store import DEFAULT_USER, CredentialsNotFoundError, FileCredentialStore
+from .http_pool import PooledHttp, calendar_pool
+from .metrics import metrics
+from .rate_governor import UpstreamUnavailableError, error_status, governors, is_rate_limited, retry_after
 
 SCOPES = ['https://www.googleapis.com/auth/calendar']
+# Google recommends at most 50 calls per batch request
+BATCH_SIZE = 50
+# Events per events.list page when streaming; small pages keep memory flat
+LIST_PAGE_SIZE = 250
+# Calendars one freeBusy query may ask about
+FREEBUSY_MAX_CALENDARS = 50
+DELETED_EVENT_MESSAGE = 'The event for this idempotency key was deleted; use a new key to create it again'
+
+_discovery_document = None
+_discovery_lock = threading.Lock()
+
+def load_discovery_document():
+    """
+    Loads the Calendar v3 discovery document once per process.
+
+    It comes from the file named by CALENDAR_DISCOVERY_DOCUMENT if set, else
+    from the copy bundled with google-api-python-client, so building a
+    service never fetches it over the network.
+    """
+    global _discovery_document
+    with _discovery_lock:
+        if _discovery_document is None:
+            path = os.getenv('CALENDAR_DISCOVERY_DOCUMENT')
+            if path:
+                with open(path) as document:
+                    _discovery_document = json.load(document)
+            else:
+                from googleapiclient.discovery_cache import get_static_doc
+                _discovery_document = json.loads(get_static_doc('calendar', 'v3'))
+        return _discovery_document
 
 class CalendarService:
-    def __init__(self, timezone='America/Los_Angeles'):
+    def __init__(self, timezone='America/Los_Angeles', user_id=DEFAULT_USER, credential_store=None, governor=None,
+                 http_pool=None):
         self.timezone = timezone
+        self.user_id = user_id
+        self.credential_store = credential_store or FileCredentialStore()
+        # Shared by every user's service; quota is also tracked per user
+        self.governor = governor or governors.calendar
+        # Also shared, so TLS connections are reused across users and threads
+        self.http_pool = http_pool or calendar_pool()
+        self._creds = None
+        self._creds_lock = threading.Lock()
         self._service = None
+        self._availability = None
+        self._group_availability = None
+        self._mirrors = {}
+        self._mirrors_lock = threading.Lock()
+        self.mirror_refresh_interval = float(os.getenv('EVENT_MIRROR_REFRESH_SECONDS', '30'))
+        # Calendars whose changes arrive as push notifications; see set_watched
+        self.watch_fallback_interval = float(os.getenv('WATCH_FALLBACK_SECONDS', '900'))
+        self._watched = set()
+
+    def get_service(self, interactive=True):
+        """
+        Get an authorized Calendar API service instance.
+
+        The instance is shared by all threads: its requests run over
+        connections borrowed from the HTTP pool, since the httplib2
+        connection underneath is not thread-safe.
+
+        With interactive=False, missing credentials raise
+        CredentialsNotFoundError instead of opening the browser OAuth flow.
+        """
+        service = self._service
+        if service is not None:
+            return service
 
-    def get_service(self):
-        """Get an authorized Calendar API service instance."""
-        if self._service:
+        from googleapiclient.discovery import build_from_document
+
+        with self._creds_lock:
+            if self._creds is None:
+                self._creds = self._load_credentials(interactive)
+            if self._service is None:
+                # CALENDAR_API_ENDPOINT points the client at another server, e.g. a local stand-in
+                endpoint = os.getenv('CALENDAR_API_ENDPOINT')
+                self._service = build_from_document(
+                    load_discovery_document(),
+                    http=PooledHttp(self.http_pool, self._creds),
+                    client_options={'api_endpoint': endpoint} if endpoint else None
+                )
             return self._service
 
-        creds = None
-        if os.path.exists('token.pickle'):
-            with open('token.pickle', 'rb') as token:
-                creds = pickle.load(token)
+    def _load_credentials(self, interactive):
+        """Loads stored credentials, refreshing or authorizing them as needed."""
+        from google.auth.transport.requests import Request
 
+        creds = self.credential_store.load(self.user_id)
         if not creds or not creds.valid:
             if creds and creds.expired and creds.refresh_token:
-                creds.refresh(Request())
-            else:
+                with metrics.time('oauth_refresh'):
+                    creds.refresh(Request())
+            elif self.user_id == DEFAULT_USER and interactive:
+                from google_auth_oauthlib.flow import InstalledAppFlow
                 flow = InstalledAppFlow.from_client_secrets_file(
                     'credentials.json', SCOPES)
                 creds = flow.run_local_server(port=0)
+            else:
+                # Other users must be authorized out of band
+                raise CredentialsNotFoundError(self.user_id)
+
+            self.credential_store.save(self.user_id, creds)
+        return creds
 
-            with open('token.pickle', 'wb') as token:
-                pickle.dump(creds, token)
+    def refresh_credentials(self, margin=timedelta(minutes=5)):
+        """
+        Refreshes the access token if it expires within margin, so requests
+        never have to wait for a refresh. Returns True if a refresh happened.
+        """
+        with self._creds_lock:
+            creds = self._creds
+            if creds is None or not creds.refresh_token or creds.expiry is None:
+                return False
+            # google-auth keeps expiry as naive UTC
+            if creds.expiry - datetime.now(dt_timezone.utc).replace(tzinfo=None) > margin:
+                return False
+            from google.auth.transport.requests import Request
+            with metrics.time('oauth_refresh'):
+                creds.refresh(Request())
+            self.credential_store.save(self.user_id, creds)
+            return True
 
-        self._service = build('calendar', 'v3', credentials=creds)
-        return self._service
+    @property
+    def availability(self):
+        """The AvailabilityService for this user's primary calendar, created on first use."""
+        if self._availability is None:
+            self._availability = AvailabilityService(self)
+            self._availability.watched = self._availability.calendar_id in self._watched
+        return self._availability
 
-    def create_event(self, event_data):
-        """Creates a calendar event."""
+    @property
+    def group_availability(self):
+        """The GroupAvailability for finding times across several calendars, created on first use."""
+        if self._group_availability is None:
+            # numpy is only loaded once group availability is used
+            from .group_availability import GroupAvailability
+            self._group_availability = GroupAvailability(self)
+        return self._group_availability
+
+    def create_event(self, event_data, event_id=None):
+        """
+        Creates a calendar event.
+
+        With event_id, the event is created with that id, and if it already
+        exists (an earlier attempt went through) the existing event is
+        returned instead, so retries don't create duplicates. If that event
+        has since been deleted, ValueError is raised rather than returning it.
+        """
+        from googleapiclient.errors import HttpError
+
+        service = self.get_service()
+        if event_id is not None:
+            event_data = dict(event_data, id=event_id)
+        try:
+            with self.governor.slot(key=self.user_id), metrics.time('calendar_insert'):
+                created_event = service.events().insert(calendarId='primary', body=event_data).execute()
+        except HttpError as e:
+            if event_id is None or e.resp.status != 409:
+                raise
+            created_event = self.get_event(event_id)
+            if created_event.get('status') == 'cancelled':
+                raise ValueError(DELETED_EVENT_MESSAGE)
+        self.get_mirror().upsert(created_event)
+        return created_event
+
+    def get_event(self, event_id, calendar_id='primary'):
+        """Gets one event from the Calendar API."""
+        service = self.get_service()
+        with self.governor.slot(key=self.user_id), metrics.time('calendar_get'):
+            return service.events().get(calendarId=calendar_id, eventId=event_id).execute()
+
+    def watch_events(self, body, calendar_id='primary'):
+        """
+        Opens a push channel (events.watch) for a calendar and returns it.
+        Used by the watcher thread, so it never starts an OAuth flow.
+        """
+        service = self.get_service(interactive=False)
+        with self.governor.slot(key=self.user_id), metrics.time('calendar_watch'):
+            return service.events().watch(calendarId=calendar_id, body=body).execute()
+
+    def stop_channel(self, channel_id, resource_id):
+        """Stops a push channel opened by watch_events."""
+        service = self.get_service(interactive=False)
+        with self.governor.slot(key=self.user_id), metrics.time('calendar_channel_stop'):
+            service.channels().stop(body={'id': channel_id, 'resourceId': resource_id}).execute()
+
+    def create_events_batch(self, events, max_wait=None, return_existing=True):
+        """
+        Creates several calendar events using batch HTTP requests.
+
+        Returns a list in the same order as events, holding either the created
+        event or the exception raised for that item. max_wait overrides how
+        long each batch may wait for quota. As in create_event, an event whose
+        id already exists comes back as the existing event, fetched with one
+        more batch request, or ValueError if it was deleted; with
+        return_existing False the 409 error is returned instead.
+        """
         service = self.get_service()
-        return service.events().insert(calendarId='primary', body=event_data).execute()
+        results = [None] * len(events)
+
+        def callback(request_id, response, exception):
+            results[int(request_id)] = exception if exception is not None else response
+
+        for offset in range(0, len(events), BATCH_SIZE):
+            end = min(offset + BATCH_SIZE, len(events))
+            batch = self._new_batch(service, callback)
+            for index in range(offset, end):
+                batch.add(
+                    service.events().insert(calendarId='primary', body=events[index]),
+                    request_id=str(index)
+                )
+            # Each call in a batch counts against the quota
+            with self.governor.slot({'requests': end - offset}, key=self.user_id, max_wait=max_wait):
+                with metrics.time('calendar_batch_insert'):
+                    batch.execute()
+            # Events created by an earlier attempt of the same request
+            taken = [index for index in range(offset, end)
+                     if return_existing and events[index].get('id') and error_status(results[index]) == 409]
+            if taken:
+                batch = self._new_batch(service, callback)
+                for index in taken:
+                    batch.add(service.events().get(calendarId='primary', eventId=events[index]['id']),
+                              request_id=str(index))
+                with self.governor.slot({'requests': len(taken)}, key=self.user_id, max_wait=max_wait):
+                    with metrics.time('calendar_batch_get'):
+                        batch.execute()
+                for index in taken:
+                    if isinstance(results[index], dict) and results[index].get('status') == 'cancelled':
+                        results[index] = ValueError(DELETED_EVENT_MESSAGE)
+            # Items can be rate limited on their own while the batch as a whole succeeds
+            limited = [result for result in results[offset:end]
+                       if isinstance(result, Exception) and is_rate_limited(result)]
+            if limited:
+                self.governor.penalize(retry_after(limited[0]) or self.governor.default_retry_after)
+
+        mirror = self.get_mirror()
+        for result in results:
+            if isinstance(result, dict):
+                mirror.upsert(result)
+        return results
+
+    def _new_batch(self, service, callback):
+        """
+        A batch request for service. googleapiclient takes the batch URL from
+        the discovery document, so it is pointed at CALENDAR_API_ENDPOINT's
+        server here when that is set.
+        """
+        endpoint = os.getenv('CALENDAR_API_ENDPOINT')
+        if not endpoint:
+            return service.new_batch_http_request(callback=callback)
+        from googleapiclient.http import BatchHttpRequest
+        parts = urlsplit(endpoint)
+        return BatchHttpRequest(callback=callback, batch_uri=f"{parts.scheme}://{parts.netloc}/batch/calendar/v3")
+
+    def iter_events(self, time_min=None, time_max=None, calendar_id='primary', page_size=LIST_PAGE_SIZE,
+                    fields=None, single_events=False):
+        """
+        Yields the events overlapping [time_min, time_max) straight from the
+        Calendar API, fetching one page at a time as the caller consumes them.
+
+        With fields, only those event fields are requested. By default
+        recurring events are returned once, with their recurrence rules, and
+        changed occurrences separately, as in an iCalendar file; with
+        single_events, each occurrence is returned in start order instead.
+        """
+        service = self.get_service()
+        params = {'calendarId': calendar_id, 'maxResults': page_size}
+        if fields:
+            params['fields'] = list_fields(fields, 'nextPageToken')
+        if single_events:
+            params.update(singleEvents=True, orderBy='startTime')
+        if time_min is not None:
+            params['timeMin'] = time_min.isoformat()
+        if time_max is not None:
+            params['timeMax'] = time_max.isoformat()
+        while True:
+            with self.governor.slot(key=self.user_id), metrics.time('calendar_list'):
+                response = service.events().list(**params).execute()
+            yield from response.get('items', [])
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                return
+            params['pageToken'] = page_token
+
+    def get_busy_intervals(self, time_min, time_max, calendar_id='primary'):
+        """Gets busy periods between time_min and time_max using the freeBusy API."""
+        calendar = self.get_free_busy([calendar_id], time_min, time_max)[calendar_id]
+        if calendar.get('errors'):
+            raise ValueError(f"Could not read free/busy for {calendar_id}: {calendar['errors'][0].get('reason')}")
+        return calendar.get('busy', [])
+
+    def get_free_busy(self, calendar_ids, time_min, time_max):
+        """
+        Gets free/busy data for several calendars between time_min and
+        time_max, as the freeBusy API reports each one: a dict holding either
+        its busy periods or its errors, by calendar id.
+
+        One query covers up to FREEBUSY_MAX_CALENDARS calendars; for more,
+        the queries are sent together in batch requests.
+        """
+        service = self.get_service()
+        calendar_ids = list(dict.fromkeys(calendar_ids))
+        queries = [
+            service.freebusy().query(body={
+                'timeMin': time_min.isoformat(),
+                'timeMax': time_max.isoformat(),
+                'timeZone': self.timezone,
+                'items': [{'id': calendar_id} for calendar_id in calendar_ids[offset:offset + FREEBUSY_MAX_CALENDARS]]
+            })
+            for offset in range(0, len(calendar_ids), FREEBUSY_MAX_CALENDARS)
+        ]
+        if len(queries) == 1:
+            with self.governor.slot(key=self.user_id), metrics.time('calendar_freebusy'):
+                responses = [queries[0].execute()]
+        else:
+            responses = [None] * len(queries)
+
+            def callback(request_id, response, exception):
+                responses[int(request_id)] = exception if exception is not None else response
+
+            for offset in range(0, len(queries), BATCH_SIZE):
+                end = min(offset + BATCH_SIZE, len(queries))
+                batch = self._new_batch(service, callback)
+                for index in range(offset, end):
+                    batch.add(queries[index], request_id=str(index))
+                with self.governor.slot({'requests': end - offset}, key=self.user_id):
+                    with metrics.time('calendar_freebusy'):
+                        batch.execute()
+            failed = [response for response in responses if isinstance(response, Exception)]
+            if failed:
+                # Without every query's answer the group's free time is unknown
+                if is_rate_limited(failed[0]):
+                    wait = retry_after(failed[0]) or self.governor.default_retry_after
+                    self.governor.penalize(wait)
+                    raise UpstreamUnavailableError('calendar', wait, 'rate limited') from failed[0]
+                raise failed[0]
+
+        calendars = {}
+        for response in responses:
+            calendars.update(response.get('calendars', {}))
+        return {
+            calendar_id: calendars.get(calendar_id, {'errors': [{'reason': 'notFound'}]})
+            for calendar_id in calendar_ids
+        }
+
+    def get_mirror(self, calendar_id='primary'):
+        """Gets the local event mirror for a calendar, creating it on first use."""
+        with self._mirrors_lock:
+            mirror = self._mirrors.get(calendar_id)
+            if mirror is None:
+                mirror = EventMirror(
+                    self.get_service,
+                    calendar_id=calendar_id,
+                    timezone_name=self.timezone,
+                    refresh_interval=self._mirror_interval(calendar_id),
+                    limiter=lambda: self.governor.slot(key=self.user_id)
+                )
+                self._mirrors[calendar_id] = mirror
+            return mirror
+
+    def set_watched(self, calendar_id, watched):
+        """
+        Switches a calendar between polling and push notifications. While
+        watched, its mirror and free/busy data are only re-read every
+        watch_fallback_interval seconds in case a notification is lost, and
+        refresh_calendar is called when it changes. Either way the mirror
+        and free/busy data are marked stale, so changes from before the
+        switch are pulled.
+        """
+        with self._mirrors_lock:
+            if watched:
+                self._watched.add(calendar_id)
+            else:
+                self._watched.discard(calendar_id)
+            mirror = self._mirrors.get(calendar_id)
+        if mirror is not None:
+            mirror.refresh_interval = self._mirror_interval(calendar_id)
+            mirror.invalidate()
+        if self._availability is not None and self._availability.calendar_id == calendar_id:
+            self._availability.watched = watched
+            self._availability.invalidate()
+
+    def refresh_calendar(self, calendar_id='primary'):
+        """Pulls changes to a calendar now: the mirror syncs incrementally and cached free/busy is dropped."""
+        self.get_mirror(calendar_id).sync(force=True)
+        if self._availability is not None and self._availability.calendar_id == calendar_id:
+            self._availability.invalidate()
+
+    def _mirror_interval(self, calendar_id):
+        if calendar_id in self._watched:
+            return max(self.mirror_refresh_interval, self.watch_fallback_interval)
+        return self.mirror_refresh_interval
+
+    def list_events(self, time_min=None, time_max=None, limit=None, calendar_id='primary'):
+        """
+        Lists events overlapping [time_min, time_max) in start order, served
+        from the local mirror.
+        """
+        return self.get_mirror(calendar_id).events_between(time_min, time_max, limit)
+
+    def stream_events(self, time_min=None, time_max=None, limit=None, calendar_id='primary'):
+        """Like list_events, but yields the events lazily; limit may be None for the whole range."""
+        return self.get_mirror(calendar_id).iter_between(time_min, time_max, limit)
 
     def get_upcoming_events(self, max_results=10):
         """Gets the upcoming events."""
-        service = self.get_service()
-        now = datetime.utcnow().isoformat() + 'Z'
-        events_result = service.events().list(
-            calendarId='primary',
-            timeMin=now,
-            maxResults=max_results,
-            singleEvents=True,
-            orderBy='startTime'
-        ).execute()
-        return events_result.get('items', []) 
\ No newline at end of file
+        return self.list_events(time_min=datetime.now(dt_timezone.utc), limit=max_results)
+
+    async def acreate_event(self, event_data, event_id=None):
+        """Async version of create_event; the blocking API call runs in a worker thread."""
+        return await asyncio.to_thread(self.create_event, event_data, event_id)
+
+    async def acreate_events_batch(self, events, max_wait=None, return_existing=True):
+        """Async version of create_events_batch."""
+        return await asyncio.to_thread(self.create_events_batch, events, max_wait, return_existing)
+
+    async def aget_upcoming_events(self, max_results=10):
+        """Async version of get_upcoming_events."""
+        return await asyncio.to_thread(self.get_upcoming_events, max_results)
+
+    async def alist_events(self, time_min=None, time_max=None, limit=None, calendar_id='primary'):
+        """Async version of list_events; a sync with Google, if due, runs in a worker thread."""
+        return await asyncio.to_thread(self.list_events, time_min, time_max, limit, calendar_id)
@@ -0,0 +1,145 @@
+import json
+import os
+import pickle
+import re
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, List, Optional
+from .sqlite_db import connect
+
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
+
+DEFAULT_USER = 'default'
+USER_ID_RE = re.compile(r'^[A-Za-z0-9@._-]{1,128}$')
+
+class CredentialsNotFoundError(Exception):
+    """Raised when a user has no stored Google credentials."""
+    def __init__(self, user_id: str):
+        super().__init__(f"No Google credentials stored for user '{user_id}'")
+        self.user_id = user_id
+
+def validate_user_id(user_id: str) -> str:
+    """Returns user_id if it is safe to use as a storage key, else raises ValueError."""
+    if not isinstance(user_id, str) or not USER_ID_RE.match(user_id) or user_id in ('.', '..'):
+        raise ValueError("Invalid user id")
+    return user_id
+
+class CredentialStore(ABC):
+    """Stores OAuth credentials per user."""
+
+    @abstractmethod
+    def load(self, user_id: str) -> Optional['Credentials']:
+        """The user's credentials, or None if none are stored."""
+
+    @abstractmethod
+    def save(self, user_id: str, creds: 'Credentials') -> None:
+        """Stores the user's credentials, replacing any already stored."""
+
+    @abstractmethod
+    def delete(self, user_id: str) -> None:
+        """Removes the user's credentials, if any."""
+
+    @abstractmethod
+    def list_users(self) -> List[str]:
+        """Ids of the users with stored credentials."""
+
+class FileCredentialStore(CredentialStore):
+    """
+    Pickled credentials, one file per user.
+
+    The default user keeps using token.pickle in the working directory so
+    existing single-user setups carry on working. Writes go through a temp
+    file and an atomic rename, so concurrent workers never see a torn file.
+    """
+
+    def __init__(self, directory: str = 'tokens', legacy_path: str = 'token.pickle'):
+        self.directory = directory
+        self.legacy_path = legacy_path
+        self._lock = threading.Lock()
+
+    def load(self, user_id: str) -> Optional['Credentials']:
+        path = self._path(user_id)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as token:
+            return pickle.load(token)
+
+    def save(self, user_id: str, creds: 'Credentials') -> None:
+        path = self._path(user_id)
+        directory = os.path.dirname(path) or '.'
+        with self._lock:
+            os.makedirs(directory, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.token-')
+            try:
+                with os.fdopen(fd, 'wb') as token:
+                    pickle.dump(creds, token)
+                os.replace(temp_path, path)
+            except Exception:
+                os.unlink(temp_path)
+                raise
+
+    def delete(self, user_id: str) -> None:
+        path = self._path(user_id)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def list_users(self) -> List[str]:
+        users = [DEFAULT_USER] if os.path.exists(self.legacy_path) else []
+        if os.path.isdir(self.directory):
+            users.extend(name[:-len('.pickle')] for name in os.listdir(self.directory)
+                         if name.endswith('.pickle'))
+        return users
+
+    def _path(self, user_id: str) -> str:
+        if user_id == DEFAULT_USER:
+            return self.legacy_path
+        return os.path.join(self.directory, f"{validate_user_id(user_id)}.pickle")
+
+class SQLiteCredentialStore(CredentialStore):
+    """Credentials stored as authorized-user JSON in a SQLite database."""
+
+    def __init__(self, path: str = 'credentials.db'):
+        self.path = path
+        with connect(self.path) as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS credentials ('
+                'user_id TEXT PRIMARY KEY, token TEXT NOT NULL, updated_at REAL NOT NULL)'
+            )
+
+    def load(self, user_id: str) -> Optional['Credentials']:
+        with connect(self.path) as conn:
+            row = conn.execute('SELECT token FROM credentials WHERE user_id = ?',
+                               (validate_user_id(user_id),)).fetchone()
+        if row is None:
+            return None
+        from google.oauth2.credentials import Credentials
+        return Credentials.from_authorized_user_info(json.loads(row[0]))
+
+    def save(self, user_id: str, creds: 'Credentials') -> None:
+        with connect(self.path) as conn:
+            conn.execute(
+                'INSERT INTO credentials (user_id, token, updated_at) VALUES (?, ?, ?) '
+                'ON CONFLICT(user_id) DO UPDATE SET token = excluded.token, updated_at = excluded.updated_at',
+                (validate_user_id(user_id), creds.to_json(), time.time())
+            )
+
+    def delete(self, user_id: str) -> None:
+        with connect(self.path) as conn:
+            conn.execute('DELETE FROM credentials WHERE user_id = ?', (validate_user_id(user_id),))
+
+    def list_users(self) -> List[str]:
+        with connect(self.path) as conn:
+            return [row[0] for row in conn.execute('SELECT user_id FROM credentials ORDER BY user_id')]
+
+
+def create_credential_store() -> CredentialStore:
+    """Builds the credential store selected by the CREDENTIAL_STORE environment variable."""
+    kind = os.getenv('CREDENTIAL_STORE', 'file')
+    if kind == 'file':
+        return FileCredentialStore(os.getenv('CREDENTIAL_STORE_PATH', 'tokens'))
+    if kind == 'sqlite':
+        return SQLiteCredentialStore(os.getenv('CREDENTIAL_STORE_PATH', 'credentials.db'))
+    raise ValueError(f"Unknown CREDENTIAL_STORE '{kind}'. Use 'file' or 'sqlite'")
@@ -0,0 +1,37 @@
+"""
+Per-request deadlines.
+
+The deadline is kept in a context variable, so it follows a request into
+asyncio tasks and asyncio.to_thread workers without being passed around.
+Upstream calls read remaining() to size their timeouts; background jobs
+run without one.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+_deadline: ContextVar[Optional[float]] = ContextVar('deadline', default=None)
+
+def set_deadline(seconds: Optional[float]) -> None:
+    """Starts a deadline seconds from now for the current request; None removes it."""
+    _deadline.set(time.monotonic() + seconds if seconds is not None else None)
+
+def clear_deadline() -> None:
+    _deadline.set(None)
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline (possibly negative), or None without one."""
+    deadline = _deadline.get()
+    return deadline - time.monotonic() if deadline is not None else None
+
+@contextmanager
+def deadline(seconds: float) -> Iterator[None]:
+    """Runs a block under a deadline; an earlier enclosing deadline still applies."""
+    current = _deadline.get()
+    new = time.monotonic() + seconds
+    token = _deadline.set(new if current is None else min(current, new))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
@@ -0,0 +1,66 @@
+"""Event-creating jobs run by the write-behind JobQueue."""
+import hashlib
+from typing import Any, Dict, Optional
+from .availability_service import SchedulingConflictError
+from .credential_store import CredentialsNotFoundError
+from .job_queue import client_key
+from .rate_governor import UpstreamUnavailableError
+
+def event_id_for(user_id: str, idempotency_key: Optional[str]) -> Optional[str]:
+    """
+    Calendar event id derived from an idempotency key, or None without one.
+    Hex digits are valid event id characters, and Google rejects a second
+    insert with the same id, so a retried insert can't create a duplicate.
+    """
+    if idempotency_key is None:
+        return None
+    return hashlib.sha256(f"{user_id}:{idempotency_key}".encode()).hexdigest()
+
+def job_event_id(job: Dict[str, Any]) -> str:
+    """
+    Event id for the event a job creates. It comes from the client's
+    idempotency key when there is one; otherwise from the job itself, so
+    retries of the job are still safe but separate requests never share an id.
+    """
+    key = client_key(job)
+    return event_id_for(job['user_id'], key if key is not None else f"job:{job['id']}")
+
+def error_details(e: BaseException) -> Dict[str, Any]:
+    """The message and HTTP status code the event endpoints use for an exception."""
+    details = {'message': str(e)}
+    if isinstance(e, CredentialsNotFoundError):
+        details['code'] = 401
+    elif isinstance(e, SchedulingConflictError):
+        details['code'] = 409
+        details['conflicts'] = e.conflicts
+    elif isinstance(e, UpstreamUnavailableError):
+        details['code'] = 503
+        details['retry_after'] = e.retry_after
+    elif isinstance(e, ValueError):
+        details['code'] = 400
+    else:
+        details['code'] = 500
+    return details
+
+def run_schedule_job(services, job: Dict[str, Any]) -> Dict[str, Any]:
+    """Inserts the event from a /calendar/schedule payload. Returns the created event."""
+    calendar_service = services.calendar_for(job['user_id'])
+    payload = job['payload']
+    event = calendar_service.availability.place_event(payload['event'], on_conflict=payload.get('onConflict', 'allow'))
+    created_event = calendar_service.create_event(event, event_id=job_event_id(job))
+    calendar_service.availability.add_event(created_event)
+    return created_event
+
+def run_nlp_create_job(services, job: Dict[str, Any]) -> Dict[str, Any]:
+    """Parses a /nlp/create query and inserts the event. Returns the created event."""
+    calendar_service = services.calendar_for(job['user_id'])
+    payload = job['payload']
+    parsed_event = services.llm_service.parse_calendar_query(payload['query'], route='/nlp/create')
+    event = calendar_service.availability.place_event(
+        parsed_event['event'],
+        on_conflict=payload.get('onConflict', 'allow'),
+        time_specified=parsed_event.get('timeSpecified', True)
+    )
+    created_event = calendar_service.create_event(event, event_id=job_event_id(job))
+    calendar_service.availability.add_event(created_event)
+    return created_event
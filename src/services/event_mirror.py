@@ -0,0 +1,266 @@
+import bisect
+import heapq
+import logging
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Optional, Tuple
+import pytz
+from .metrics import metrics
+from .recurrence import OccurrenceKey, RecurringSeries, occurrence_key
+
+logger = logging.getLogger(__name__)
+
+# Largest page the events.list API returns
+PAGE_SIZE = 2500
+# The event fields the app uses. Only these are requested (partial response) and kept.
+EVENT_FIELDS = ('id', 'status', 'summary', 'description', 'location', 'start', 'end', 'htmlLink',
+                'transparency', 'recurrence', 'recurringEventId', 'originalStartTime', 'updated')
+
+def list_fields(event_fields, *page_fields) -> str:
+    """A partial-response selector for events.list, e.g. 'nextPageToken,items(id,start)'."""
+    return ','.join(page_fields + (f"items({','.join(event_fields)})",))
+
+class EventMirror:
+    """
+    In-memory copy of one calendar's events, kept current with the Calendar
+    API's incremental sync (syncToken) and indexed by start time.
+
+    Range queries are answered from memory. A full resync only happens on the
+    first sync or when Google invalidates the sync token (410 Gone). Only the
+    EVENT_FIELDS of each event are fetched and kept.
+
+    Recurring events are fetched once, as their master event, and expanded
+    locally for each query; changed and cancelled occurrences, which Google
+    returns as events of their own, replace the occurrences they stand for.
+    """
+
+    def __init__(self, get_service: Callable[[], Any], calendar_id: str = 'primary',
+                 timezone_name: str = 'America/Los_Angeles', refresh_interval: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic,
+                 limiter: Callable[[], ContextManager] = nullcontext):
+        self.calendar_id = calendar_id
+        self.refresh_interval = refresh_interval
+        self._get_service = get_service
+        self._tz = pytz.timezone(timezone_name)
+        self._clock = clock
+        # Wraps each API call, e.g. with the Calendar rate governor
+        self._limiter = limiter
+        self._events = {}
+        self._bounds = {}
+        self._index = []
+        self._max_duration = 0.0
+        self._series: Dict[str, RecurringSeries] = {}
+        # Changed or cancelled occurrences: master id -> {exception event id: occurrence key}
+        self._exceptions: Dict[str, Dict[str, OccurrenceKey]] = {}
+        self._exception_of: Dict[str, str] = {}
+        self._sync_token = None
+        self._last_sync = None
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._stats = {'full_syncs': 0, 'incremental_syncs': 0}
+
+    def sync(self, force: bool = False) -> None:
+        """Pulls changes since the last sync, or everything on the first call."""
+        from googleapiclient.errors import HttpError
+
+        with self._sync_lock:
+            if not force and not self._is_stale():
+                return
+            if self._sync_token is None:
+                self._full_sync()
+            else:
+                try:
+                    self._incremental_sync()
+                except HttpError as e:
+                    if e.resp.status != 410:
+                        raise
+                    # Sync token expired or invalidated: start over
+                    self._full_sync()
+            self._last_sync = self._clock()
+
+    def invalidate(self) -> None:
+        """Marks the mirror stale so the next read pulls changes."""
+        self._last_sync = None
+
+    def events_between(self, time_min: Optional[datetime] = None, time_max: Optional[datetime] = None,
+                       limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Returns events overlapping [time_min, time_max) ordered by start time,
+        matching the semantics of events.list with singleEvents and orderBy=startTime.
+        """
+        return list(self.iter_between(time_min, time_max, limit))
+
+    def iter_between(self, time_min: Optional[datetime] = None, time_max: Optional[datetime] = None,
+                     limit: Optional[int] = None, page_size: int = PAGE_SIZE) -> Iterator[Dict[str, Any]]:
+        """
+        Yields the events of events_between lazily, merging stored events
+        with the occurrences of recurring series in start order. The index
+        is read a page at a time, so the lock isn't held while the caller
+        works and a large range is never copied into one list.
+        """
+        self.sync()
+        low = time_min.timestamp() if time_min else float('-inf')
+        high = time_max.timestamp() if time_max else float('inf')
+        with self._lock:
+            series = [(item, frozenset(self._exceptions.get(item.id, {}).values()))
+                      for item in self._series.values()]
+
+        sources = [self._iter_indexed(low, high, page_size)]
+        sources.extend(item.occurrences(low, high, skip) for item, skip in series
+                       if item.first_start() < high and item.last_end() > low)
+        for count, (_, _, event) in enumerate(heapq.merge(*sources, key=lambda entry: entry[:2]), 1):
+            yield event
+            if limit is not None and count >= limit:
+                return
+
+    def busy_between(self, time_min: datetime, time_max: datetime) -> List[Tuple[float, float]]:
+        """Busy periods as (start, end) timestamps: timed events that aren't marked as free."""
+        return [
+            (self._to_datetime(event['start']).timestamp(), self._to_datetime(event['end']).timestamp())
+            for event in self.iter_between(time_min, time_max)
+            if event.get('transparency') != 'transparent' and 'dateTime' in event['start']
+        ]
+
+    def _iter_indexed(self, low: float, high: float, page_size: int) -> Iterator[Tuple[float, str, Dict[str, Any]]]:
+        """Yields (start, id, event) for non-recurring events and changed occurrences overlapping [low, high)."""
+        with self._lock:
+            # Events starting up to the longest known duration before low may still overlap it
+            after = (low - self._max_duration,)
+        while True:
+            page = []
+            with self._lock:
+                position = bisect.bisect_right(self._index, after)
+                entries = self._index[position:position + page_size]
+                finished = len(entries) < page_size
+                for start, event_id in entries:
+                    if start >= high:
+                        finished = True
+                        break
+                    after = (start, event_id)
+                    if self._bounds[event_id][1] > low:
+                        page.append((start, event_id, self._events[event_id]))
+            yield from page
+            if finished:
+                return
+
+    def upsert(self, event: Dict[str, Any]) -> None:
+        """Applies a single changed event, e.g. one this process just created."""
+        with self._lock:
+            self._apply(event)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['events'] = len(self._events)
+            stats['recurring_series'] = len(self._series)
+        stats['has_sync_token'] = self._sync_token is not None
+        return stats
+
+    def _is_stale(self) -> bool:
+        return self._last_sync is None or self._clock() - self._last_sync >= self.refresh_interval
+
+    def _full_sync(self) -> None:
+        events, sync_token = self._list_all()
+        with self._lock:
+            self._events = {}
+            self._bounds = {}
+            self._index = []
+            self._max_duration = 0.0
+            self._series = {}
+            self._exceptions = {}
+            self._exception_of = {}
+            for event in events:
+                self._apply(event)
+            self._sync_token = sync_token
+            self._stats['full_syncs'] += 1
+
+    def _incremental_sync(self) -> None:
+        events, sync_token = self._list_all(self._sync_token)
+        with self._lock:
+            for event in events:
+                self._apply(event)
+            self._sync_token = sync_token
+            self._stats['incremental_syncs'] += 1
+
+    def _list_all(self, sync_token: Optional[str] = None):
+        """Fetches every page of events.list, returning (events, next_sync_token)."""
+        service = self._get_service()
+        # Recurring events come back once, not once per occurrence
+        params = {'calendarId': self.calendar_id, 'singleEvents': False, 'maxResults': PAGE_SIZE,
+                  'fields': list_fields(EVENT_FIELDS, 'nextPageToken', 'nextSyncToken')}
+        if sync_token:
+            params['syncToken'] = sync_token
+
+        events = []
+        page_token = None
+        while True:
+            if page_token:
+                params['pageToken'] = page_token
+            with self._limiter(), metrics.time('calendar_list'):
+                response = service.events().list(**params).execute()
+            events.extend(response.get('items', []))
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                return events, response.get('nextSyncToken')
+
+    def _apply(self, event: Dict[str, Any]) -> None:
+        """Inserts, replaces or removes an event; the caller must hold the lock."""
+        event_id = event['id']
+        self._remove(event_id)
+
+        master_id = event.get('recurringEventId')
+        if master_id and 'originalStartTime' in event:
+            # Hides the generated occurrence; a changed one is stored below as an event of its own
+            self._exceptions.setdefault(master_id, {})[event_id] = occurrence_key(event['originalStartTime'])
+            self._exception_of[event_id] = master_id
+
+        if event.get('status') == 'cancelled' or 'start' not in event:
+            return
+
+        # Events this process created arrive as full resources
+        event = {field: event[field] for field in EVENT_FIELDS if field in event}
+        if event.get('recurrence'):
+            series = RecurringSeries(event, self._tz.zone)
+            try:
+                series.first_start()
+                series.last_end()
+            except (ValueError, TypeError) as e:
+                logger.warning("Can't expand recurring event %s, listing it once: %s", event_id, e)
+            else:
+                self._series[event_id] = series
+                return
+
+        start = self._to_datetime(event['start']).timestamp()
+        end = self._to_datetime(event.get('end', event['start'])).timestamp()
+        self._events[event_id] = event
+        self._bounds[event_id] = (start, end)
+        bisect.insort(self._index, (start, event_id))
+        self._max_duration = max(self._max_duration, end - start)
+
+    def _remove(self, event_id: str) -> None:
+        self._events.pop(event_id, None)
+        self._series.pop(event_id, None)
+        bounds = self._bounds.pop(event_id, None)
+        if bounds is not None:
+            key = (bounds[0], event_id)
+            position = bisect.bisect_left(self._index, key)
+            if position < len(self._index) and self._index[position] == key:
+                del self._index[position]
+        master_id = self._exception_of.pop(event_id, None)
+        if master_id is not None:
+            exceptions = self._exceptions[master_id]
+            exceptions.pop(event_id, None)
+            if not exceptions:
+                del self._exceptions[master_id]
+
+    def _to_datetime(self, value: Dict[str, str]) -> datetime:
+        """Converts an event start/end object, timed or all-day, to an aware datetime."""
+        if 'dateTime' in value:
+            parsed = datetime.fromisoformat(value['dateTime'].replace('Z', '+00:00'))
+            if parsed.tzinfo is None:
+                parsed = pytz.timezone(value.get('timeZone', self._tz.zone)).localize(parsed)
+            return parsed
+        day = datetime.fromisoformat(value['date'])
+        return self._tz.localize(day)
@@ -0,0 +1,190 @@
+import math
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+import pytz
+
+# Minutes per bitmap cell; meeting lengths and start times are multiples of it
+RESOLUTION_MINUTES = 5
+MAX_GROUP_CALENDARS = 200
+MAX_RANGE_DAYS = 62
+# 1970-01-01 was a Thursday
+EPOCH_WEEKDAY = 3
+
+def busy_bitmap(busy: Sequence[np.ndarray], start: int, cells: int, resolution: int) -> np.ndarray:
+    """
+    Rasterizes busy intervals into a (calendars, cells) boolean array.
+
+    busy holds one (n, 2) array of POSIX start/end times per calendar; cell
+    i covers [start + i * resolution, start + (i + 1) * resolution) and is
+    set if any interval overlaps it. Every interval of every calendar is
+    marked in a single pass over a difference array.
+    """
+    counts = np.array([len(intervals) for intervals in busy], dtype=np.intp)
+    diff = np.zeros((len(busy), cells + 1), dtype=np.int32)
+    if counts.sum():
+        intervals = np.concatenate([intervals for intervals in busy if len(intervals)])
+        rows = np.repeat(np.arange(len(busy)), counts)
+        first = np.clip(np.floor((intervals[:, 0] - start) / resolution), 0, cells).astype(np.intp)
+        last = np.clip(np.ceil((intervals[:, 1] - start) / resolution), 0, cells).astype(np.intp)
+        np.add.at(diff, (rows, first), 1)
+        np.add.at(diff, (rows, last), -1)
+    return np.cumsum(diff[:, :cells], axis=1) > 0
+
+def local_seconds(tz: Any, times: np.ndarray) -> np.ndarray:
+    """
+    POSIX times shifted by tz's UTC offset at each, so local dates and
+    times of day follow with integer arithmetic.
+    """
+    # Offsets are looked up once per hour, so DST changes are picked up
+    # without converting every time
+    first_hour = int(times[0]) // 3600
+    hours = range(first_hour, int(times[-1]) // 3600 + 1)
+    offsets = np.array([datetime.fromtimestamp(hour * 3600, tz).utcoffset().total_seconds() for hour in hours],
+                       dtype=np.int64)
+    return times + offsets[times // 3600 - first_hour]
+
+def working_hours_mask(tz: Any, times: np.ndarray, resolution: int, day_start: int, day_end: int,
+                       weekends: bool = False) -> np.ndarray:
+    """
+    Marks the cells starting at times that lie within working hours
+    (day_start to day_end o'clock) in tz, on weekdays unless weekends.
+    """
+    local = local_seconds(tz, times)
+    second_of_day = local % 86400
+    mask = (second_of_day >= day_start * 3600) & (second_of_day + resolution <= day_end * 3600)
+    if not weekends:
+        mask &= (local // 86400 + EPOCH_WEEKDAY) % 7 < 5
+    return mask
+
+def free_windows(free: np.ndarray, length: int) -> np.ndarray:
+    """
+    For a (calendars, cells) free bitmap, marks where each calendar is free
+    for length cells in a row, as a (calendars, cells - length + 1) array.
+    """
+    counts = np.zeros((free.shape[0], free.shape[1] + 1), dtype=np.int32)
+    np.cumsum(free, axis=1, out=counts[:, 1:])
+    return counts[:, length:] - counts[:, :-length] == length
+
+class GroupAvailability:
+    """
+    Finds meeting times across many calendars.
+
+    Busy time for every attendee comes from batched freeBusy queries and is
+    rasterized into one boolean row per calendar at RESOLUTION_MINUTES;
+    working hours in each attendee's time zone become masks of the same
+    shape. Candidate slots are then checked for everyone at once with array
+    operations, so the cost grows with the range and the number of
+    attendees rather than with how full their calendars are.
+    """
+
+    def __init__(self, calendar_service, resolution_minutes: int = RESOLUTION_MINUTES):
+        self.calendar_service = calendar_service
+        self.resolution = resolution_minutes * 60
+        self.day_start = int(os.getenv('AVAILABILITY_DAY_START', '8'))
+        self.day_end = int(os.getenv('AVAILABILITY_DAY_END', '20'))
+        self._tz = pytz.timezone(calendar_service.timezone)
+
+    def find_slots(self, attendees: List[Dict[str, Any]], time_min: datetime, time_max: datetime,
+                   duration: timedelta, granularity: timedelta = timedelta(minutes=30), limit: int = 10,
+                   day_start: Optional[int] = None, day_end: Optional[int] = None, weekends: bool = False,
+                   now: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Ranks meeting slots between time_min and time_max.
+
+        attendees are dicts with an 'id' (a calendar id or email), and
+        optionally a 'timeZone' for their working hours (default: this
+        calendar's) and 'optional'. A slot needs every required attendee
+        free and within their working hours; slots are ranked by how many
+        optional attendees can also make it, then by start time. Start
+        times fall on the granularity grid in this calendar's time zone.
+
+        Calendars whose free/busy can't be read are left out and reported
+        under 'errors'. Raises ValueError on bad input.
+        """
+        day_start = self.day_start if day_start is None else day_start
+        day_end = self.day_end if day_end is None else day_end
+        self._validate(attendees, time_min, time_max, duration, granularity, day_start, day_end)
+
+        now = time.time() if now is None else now
+        start = math.ceil(max(time_min.timestamp(), now) / self.resolution) * self.resolution
+        end = math.floor(time_max.timestamp() / self.resolution) * self.resolution
+        length = int(duration.total_seconds()) // self.resolution
+        if end - start < length * self.resolution:
+            return {'slots': [], 'errors': {}}
+
+        free_busy = self.calendar_service.get_free_busy(
+            [attendee['id'] for attendee in attendees],
+            datetime.fromtimestamp(start, timezone.utc), datetime.fromtimestamp(end, timezone.utc)
+        )
+        errors = {}
+        known = []
+        for attendee in attendees:
+            calendar = free_busy[attendee['id']]
+            if calendar.get('errors'):
+                errors[attendee['id']] = calendar['errors'][0].get('reason', 'unknown')
+            else:
+                known.append((attendee, calendar.get('busy', [])))
+        if not known:
+            return {'slots': [], 'errors': errors}
+
+        cells = (end - start) // self.resolution
+        times = start + np.arange(cells, dtype=np.int64) * self.resolution
+        busy = busy_bitmap([self._intervals(periods) for _, periods in known], start, cells, self.resolution)
+        zones = [attendee.get('timeZone') or self.calendar_service.timezone for attendee, _ in known]
+        masks = {zone: working_hours_mask(pytz.timezone(zone), times, self.resolution, day_start, day_end, weekends)
+                 for zone in set(zones)}
+        work = np.stack([masks[zone] for zone in zones])
+        fits = free_windows(work & ~busy, length)
+
+        optional = np.array([bool(attendee.get('optional')) for attendee, _ in known])
+        starts = times[:fits.shape[1]]
+        on_grid = local_seconds(self._tz, starts) % int(granularity.total_seconds()) == 0
+        candidates = fits[~optional].all(axis=0) & on_grid
+        scores = fits[optional].sum(axis=0)
+        indexes = np.flatnonzero(candidates)
+        ranked = indexes[np.lexsort((indexes, -scores[indexes]))][:limit]
+
+        ids = [attendee['id'] for attendee, _ in known]
+        slots = []
+        for index in ranked:
+            slot_start = datetime.fromtimestamp(int(starts[index]), self._tz)
+            slots.append({
+                'start': slot_start.isoformat(),
+                'end': (slot_start + duration).isoformat(),
+                'available': [ids[row] for row in np.flatnonzero(fits[:, index])],
+                'unavailable': [ids[row] for row in np.flatnonzero(~fits[:, index])],
+            })
+        return {'slots': slots, 'errors': errors}
+
+    def _validate(self, attendees, time_min, time_max, duration, granularity, day_start, day_end) -> None:
+        if not attendees:
+            raise ValueError("At least one attendee is needed")
+        if len(attendees) > MAX_GROUP_CALENDARS:
+            raise ValueError(f"Too many attendees (max {MAX_GROUP_CALENDARS})")
+        for attendee in attendees:
+            zone = attendee.get('timeZone')
+            if zone is not None and zone not in pytz.all_timezones_set:
+                raise ValueError(f"Unknown time zone '{zone}' for {attendee['id']}")
+        if time_max <= time_min:
+            raise ValueError("timeMax must be after timeMin")
+        if time_max - time_min > timedelta(days=MAX_RANGE_DAYS):
+            raise ValueError(f"The range can be at most {MAX_RANGE_DAYS} days")
+        if not 0 <= day_start < day_end <= 24:
+            raise ValueError("Working hours must satisfy 0 <= start < end <= 24")
+        minutes = self.resolution // 60
+        for name, value in (('duration', duration), ('granularity', granularity)):
+            if value <= timedelta(0) or value.total_seconds() % self.resolution:
+                raise ValueError(f"{name} must be a positive multiple of {minutes} minutes")
+        if duration > timedelta(hours=day_end - day_start):
+            raise ValueError("Meeting is longer than the working day")
+
+    @staticmethod
+    def _intervals(periods: List[Dict[str, str]]) -> np.ndarray:
+        """freeBusy periods as an (n, 2) array of POSIX start/end times."""
+        return np.array([
+            (datetime.fromisoformat(period['start']).timestamp(), datetime.fromisoformat(period['end']).timestamp())
+            for period in periods
+        ], dtype=np.float64).reshape(-1, 2)
@@ -0,0 +1,166 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+from . import deadline as request_deadline
+from .metrics import metrics
+from .rate_governor import UpstreamUnavailableError
+
+class HttpPool:
+    """
+    Bounded pool of keep-alive httplib2.Http objects.
+
+    httplib2.Http isn't thread-safe, so each request borrows one for its
+    duration and returns it afterwards, keeping its TLS connection open for
+    the next borrower. At most size requests run at once; others wait up to
+    max_wait seconds for a connection, then fail with
+    UpstreamUnavailableError. The most recently returned connection is
+    lent first, so idle ones stay warm and the number of open connections
+    follows actual concurrency.
+    """
+
+    def __init__(self, name: str = 'calendar', size: Optional[int] = None, timeout: Optional[float] = None,
+                 max_wait: Optional[float] = None):
+        self.name = name
+        self.size = size or int(os.getenv('CALENDAR_HTTP_POOL_SIZE', '32'))
+        self.timeout = timeout or float(os.getenv('CALENDAR_HTTP_TIMEOUT', '60'))
+        self.max_wait = max_wait if max_wait is not None else float(os.getenv('CALENDAR_HTTP_POOL_WAIT_SECONDS', '30'))
+        self._idle: List[Any] = []
+        self._in_use = 0
+        self._created = 0
+        self._condition = threading.Condition()
+        self._stats = {'requests': 0, 'reused': 0, 'waits': 0, 'wait_seconds': 0.0, 'timeouts': 0,
+                       'discarded': 0, 'peak_in_use': 0}
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        """
+        Lends an httplib2.Http; one whose request failed is closed rather than
+        reused. Under a request deadline its socket timeout is cut to the
+        time left for the duration of the loan.
+        """
+        http = self._acquire()
+        left = request_deadline.remaining()
+        bounded = left is not None and left < self.timeout
+        if bounded:
+            _set_timeout(http, max(left, 0.001))
+        reusable = False
+        try:
+            yield http
+            reusable = True
+        finally:
+            if bounded:
+                _set_timeout(http, self.timeout)
+            self._release(http, reusable)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Connections open, in use and idle, plus how often requests reused one or had to wait."""
+        with self._condition:
+            stats = dict(self._stats)
+            stats.update(size=self.size, open=self._created, in_use=self._in_use, idle=len(self._idle))
+        stats['utilization'] = stats['in_use'] / self.size
+        stats['wait_seconds'] = round(stats['wait_seconds'], 3)
+        return stats
+
+    def close(self) -> None:
+        """Closes the idle connections; ones in use are closed when returned."""
+        with self._condition:
+            idle, self._idle = self._idle, []
+            self._created -= len(idle)
+        for http in idle:
+            http.close()
+
+    def _acquire(self) -> Any:
+        with self._condition:
+            self._stats['requests'] += 1
+            if not self._idle and self._created >= self.size:
+                self._stats['waits'] += 1
+                started = time.monotonic()
+                available = self._condition.wait_for(lambda: self._idle or self._created < self.size,
+                                                     timeout=self.max_wait)
+                self._stats['wait_seconds'] += time.monotonic() - started
+                if not available:
+                    self._stats['timeouts'] += 1
+                    raise UpstreamUnavailableError(self.name, 1.0, 'out of connections')
+            self._in_use += 1
+            self._stats['peak_in_use'] = max(self._stats['peak_in_use'], self._in_use)
+            if self._idle:
+                self._stats['reused'] += 1
+                return self._idle.pop()
+            self._created += 1
+
+        try:
+            return self._new_http()
+        except Exception:
+            with self._condition:
+                self._in_use -= 1
+                self._created -= 1
+                self._condition.notify()
+            raise
+
+    def _release(self, http: Any, reusable: bool) -> None:
+        with self._condition:
+            self._in_use -= 1
+            if reusable:
+                self._idle.append(http)
+            else:
+                self._created -= 1
+                self._stats['discarded'] += 1
+            self._condition.notify()
+        if not reusable:
+            http.close()
+
+    def _new_http(self) -> Any:
+        import httplib2
+        http = httplib2.Http(timeout=self.timeout)
+        # As googleapiclient's build_http: 308 means "resume incomplete" to Google, not a redirect
+        http.redirect_codes = http.redirect_codes - {308}
+        return http
+
+def _set_timeout(http: Any, timeout: float) -> None:
+    """Sets the timeout of an httplib2.Http, including on the connections it keeps open."""
+    http.timeout = timeout
+    for conn in getattr(http, 'connections', {}).values():
+        conn.timeout = timeout
+        if getattr(conn, 'sock', None) is not None:
+            conn.sock.settimeout(timeout)
+
+class PooledHttp:
+    """
+    Stands in for an authorized httplib2.Http in googleapiclient: each
+    request borrows a connection from the pool and is authorized with the
+    user's credentials, so one service object can be used from any thread.
+    """
+
+    def __init__(self, pool: HttpPool, credentials):
+        self.pool = pool
+        # googleapiclient reads this to authorize batch requests
+        self.credentials = credentials
+
+    def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+        from google_auth_httplib2 import AuthorizedHttp
+        with self.pool.connection() as http:
+            return AuthorizedHttp(self.credentials, http=http).request(
+                uri, method=method, body=body, headers=headers, **kwargs
+            )
+
+    def close(self) -> None:
+        # The connections belong to the pool
+        pass
+
+_calendar_pool = None
+_calendar_pool_lock = threading.Lock()
+
+def calendar_pool() -> HttpPool:
+    """The process-wide pool of Calendar API connections, shared by every user's CalendarService."""
+    global _calendar_pool
+    with _calendar_pool_lock:
+        if _calendar_pool is None:
+            pool = HttpPool('calendar')
+            metrics.register_gauge(
+                'http_pool_connections', 'Pooled upstream HTTP connections by state.',
+                lambda: [({'pool': pool.name, 'state': state}, pool.get_stats()[state]) for state in ('in_use', 'idle')]
+            )
+            _calendar_pool = pool
+        return _calendar_pool
@@ -0,0 +1,396 @@
+"""
+iCalendar (RFC 5545) reading and writing for calendar import and export.
+
+Both directions are incremental: ICSParser is fed the upload in chunks and
+hands back each VEVENT as soon as it is complete, and ics_lines renders
+events one at a time, so neither holds a whole calendar in memory.
+"""
+from datetime import date, datetime, timedelta
+import math
+import os
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import pytz
+from .calendar_service import BATCH_SIZE
+from .event_jobs import event_id_for
+from .rate_governor import error_status
+
+PRODID = '-//Personal Assistant//Calendar Export//EN'
+# RFC 5545 lines are at most 75 octets, excluding the line break
+MAX_LINE_OCTETS = 75
+# Failed events listed in an import summary; the rest are only counted
+MAX_IMPORT_ERRORS = 100
+# Event fields an export reads from the Calendar API
+EXPORT_FIELDS = ('id', 'iCalUID', 'status', 'summary', 'description', 'location', 'start', 'end',
+                 'originalStartTime', 'recurrence', 'transparency', 'updated')
+# Properties copied into an event's recurrence list as they are
+RECURRENCE_PROPERTIES = ('RRULE', 'EXRULE', 'RDATE', 'EXDATE')
+
+DURATION = re.compile(r'^([+-])?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$')
+
+class ICSProperty:
+    """One content line: NAME;PARAM=value:VALUE, with the raw line kept for recurrence rules."""
+    __slots__ = ('name', 'params', 'value', 'raw')
+
+    def __init__(self, name: str, params: Dict[str, str], value: str, raw: str):
+        self.name = name
+        self.params = params
+        self.value = value
+        self.raw = raw
+
+class ICSParser:
+    """
+    Incremental iCalendar parser.
+
+    feed() takes raw bytes in chunks of any size and returns the VEVENTs
+    completed so far, each as a dict of property name to a list of
+    ICSProperty. Components nested in an event (such as VALARM) are
+    skipped. Call close() at the end of the input.
+    """
+
+    def __init__(self):
+        self._buffer = b''
+        self._pending: Optional[str] = None
+        self._stack: List[str] = []
+        self._event: Optional[Dict[str, List[ICSProperty]]] = None
+        self._first = True
+        self.calendar_timezone: Optional[str] = None
+
+    def feed(self, chunk: bytes) -> List[Dict[str, List[ICSProperty]]]:
+        self._buffer += chunk
+        *lines, self._buffer = self._buffer.split(b'\n')
+        events = []
+        for line in lines:
+            self._feed_line(line, events)
+        return events
+
+    def close(self) -> List[Dict[str, List[ICSProperty]]]:
+        events = []
+        if self._buffer:
+            self._feed_line(self._buffer, events)
+            self._buffer = b''
+        if self._pending is not None:
+            self._process(self._pending, events)
+            self._pending = None
+        if self._stack:
+            raise ValueError(f"Unexpected end of calendar inside {self._stack[-1]}")
+        return events
+
+    def _feed_line(self, raw: bytes, events: List) -> None:
+        line = raw.decode('utf-8', errors='replace').rstrip('\r')
+        if self._first:
+            line = line.lstrip('\ufeff')
+            self._first = False
+        if line[:1] in (' ', '\t'):
+            # A folded line continues the previous one
+            if self._pending is not None:
+                self._pending += line[1:]
+            return
+        if self._pending is not None:
+            self._process(self._pending, events)
+        self._pending = line if line else None
+
+    def _process(self, line: str, events: List) -> None:
+        prop = parse_content_line(line)
+        if prop.name == 'BEGIN':
+            component = prop.value.upper()
+            if not self._stack and component != 'VCALENDAR':
+                raise ValueError('Not an iCalendar file: expected BEGIN:VCALENDAR')
+            self._stack.append(component)
+            if self._stack == ['VCALENDAR', 'VEVENT']:
+                self._event = {}
+        elif prop.name == 'END':
+            if not self._stack or self._stack[-1] != prop.value.upper():
+                raise ValueError(f"Unexpected END:{prop.value}")
+            if self._stack == ['VCALENDAR', 'VEVENT']:
+                events.append(self._event)
+                self._event = None
+            self._stack.pop()
+        elif self._stack == ['VCALENDAR', 'VEVENT']:
+            self._event.setdefault(prop.name, []).append(prop)
+        elif self._stack == ['VCALENDAR'] and prop.name == 'X-WR-TIMEZONE':
+            self.calendar_timezone = prop.value
+
+def parse_content_line(line: str) -> ICSProperty:
+    """Splits a content line into name, parameters and value; colons in quoted parameters are allowed."""
+    in_quotes = False
+    for index, char in enumerate(line):
+        if char == '"':
+            in_quotes = not in_quotes
+        elif char == ':' and not in_quotes:
+            head, value = line[:index], line[index + 1:]
+            break
+    else:
+        raise ValueError(f"Invalid iCalendar line: {line[:80]!r}")
+
+    name, *param_parts = _split_unquoted(head, ';')
+    params = {}
+    for part in param_parts:
+        key, _, param_value = part.partition('=')
+        params[key.upper()] = param_value.strip('"')
+    return ICSProperty(name.upper(), params, value, line)
+
+def _split_unquoted(text: str, separator: str) -> List[str]:
+    parts, current, in_quotes = [], '', False
+    for char in text:
+        if char == '"':
+            in_quotes = not in_quotes
+        if char == separator and not in_quotes:
+            parts.append(current)
+            current = ''
+        else:
+            current += char
+    parts.append(current)
+    return parts
+
+def unescape_text(value: str) -> str:
+    return re.sub(r'\\([\\;,nN])', lambda m: '\n' if m.group(1) in 'nN' else m.group(1), value)
+
+def escape_text(value: str) -> str:
+    return (value.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+def parse_duration(value: str) -> timedelta:
+    match = DURATION.match(value.strip())
+    if not match or not any(match.groups()[1:]):
+        raise ValueError(f"Invalid DURATION '{value}'")
+    sign, weeks, days, hours, minutes, seconds = match.groups()
+    duration = timedelta(weeks=int(weeks or 0), days=int(days or 0), hours=int(hours or 0),
+                         minutes=int(minutes or 0), seconds=int(seconds or 0))
+    return -duration if sign == '-' else duration
+
+def _parse_time(prop: ICSProperty, default_timezone: str) -> Tuple[Dict[str, str], Any]:
+    """Converts a DTSTART/DTEND property to an event start/end object and the parsed value."""
+    value = prop.value.strip()
+    if prop.params.get('VALUE', '').upper() == 'DATE' or len(value) == 8:
+        day = datetime.strptime(value, '%Y%m%d').date()
+        return {'date': day.isoformat()}, day
+
+    if value.endswith('Z'):
+        moment = pytz.utc.localize(datetime.strptime(value, '%Y%m%dT%H%M%SZ'))
+        return {'dateTime': moment.isoformat()}, moment
+
+    local = datetime.strptime(value, '%Y%m%dT%H%M%S')
+    timezone_name = prop.params.get('TZID', default_timezone)
+    try:
+        zone = pytz.timezone(timezone_name)
+    except pytz.UnknownTimeZoneError:
+        # Non-IANA names (e.g. from Outlook) fall back to the calendar's time zone
+        timezone_name = default_timezone
+        zone = pytz.timezone(default_timezone)
+    return {'dateTime': local.isoformat(), 'timeZone': timezone_name}, zone.localize(local)
+
+def _shift(start: Dict[str, str], parsed: Any, delta: timedelta) -> Dict[str, str]:
+    if isinstance(parsed, datetime):
+        moved = parsed + delta
+        if 'timeZone' in start:
+            moved = moved.astimezone(pytz.timezone(start['timeZone'])).replace(tzinfo=None)
+            return {'dateTime': moved.isoformat(), 'timeZone': start['timeZone']}
+        return {'dateTime': moved.isoformat()}
+    return {'date': (parsed + delta).isoformat()}
+
+def vevent_to_event(vevent: Dict[str, List[ICSProperty]], default_timezone: str) -> Dict[str, Any]:
+    """
+    Maps a parsed VEVENT to an events.insert body.
+
+    Attendees are deliberately left out: inserting them would email
+    invitations to everyone on an imported calendar. Raises ValueError for
+    events that can't be imported.
+    """
+    def text(name):
+        props = vevent.get(name)
+        return unescape_text(props[0].value) if props else None
+
+    if 'DTSTART' not in vevent:
+        raise ValueError('Event has no DTSTART')
+    if 'RECURRENCE-ID' in vevent:
+        raise ValueError('Changed occurrences of recurring events are not supported')
+
+    start, parsed_start = _parse_time(vevent['DTSTART'][0], default_timezone)
+    if 'DTEND' in vevent:
+        end, _ = _parse_time(vevent['DTEND'][0], default_timezone)
+        if 'timeZone' in start and 'timeZone' not in end and 'dateTime' in end:
+            end['timeZone'] = start['timeZone']
+    elif 'DURATION' in vevent:
+        duration = parse_duration(vevent['DURATION'][0].value)
+        if not isinstance(parsed_start, datetime):
+            # An all-day event must end on a later date, so parts of a day count as a whole one
+            duration = timedelta(days=max(1, math.ceil(duration / timedelta(days=1))))
+        end = _shift(start, parsed_start, duration)
+    else:
+        # RFC 5545: a date event lasts one day, a date-time event has no duration
+        end = _shift(start, parsed_start, timedelta(days=1) if isinstance(parsed_start, date)
+                     and not isinstance(parsed_start, datetime) else timedelta(0))
+
+    event = {'summary': text('SUMMARY') or '(No title)', 'start': start, 'end': end}
+    for name, field in (('DESCRIPTION', 'description'), ('LOCATION', 'location')):
+        value = text(name)
+        if value:
+            event[field] = value
+    if vevent.get('TRANSP') and vevent['TRANSP'][0].value.upper() == 'TRANSPARENT':
+        event['transparency'] = 'transparent'
+    recurrence = [prop.raw for name in RECURRENCE_PROPERTIES for prop in vevent.get(name, [])]
+    if recurrence:
+        event['recurrence'] = recurrence
+        # Calendar can't expand a recurring event without a time zone; UTC times recur in UTC
+        for bound in (start, end):
+            if 'dateTime' in bound and 'timeZone' not in bound:
+                bound['timeZone'] = 'UTC'
+    return event
+
+def vevent_uid(vevent: Dict[str, List[ICSProperty]]) -> Optional[str]:
+    props = vevent.get('UID')
+    return props[0].value.strip() if props else None
+
+def vevent_is_cancelled(vevent: Dict[str, List[ICSProperty]]) -> bool:
+    props = vevent.get('STATUS')
+    return bool(props) and props[0].value.upper() == 'CANCELLED'
+
+def fold(line: str) -> str:
+    """Folds a content line at 75 octets without splitting a UTF-8 character."""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= MAX_LINE_OCTETS:
+        return line + '\r\n'
+    parts = []
+    limit = MAX_LINE_OCTETS
+    while encoded:
+        cut = min(limit, len(encoded))
+        # Continuation bytes look like 0b10xxxxxx
+        while cut < len(encoded) and encoded[cut] & 0xC0 == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+        # Continuation lines start with a space, which counts toward the limit
+        limit = MAX_LINE_OCTETS - 1
+    return '\r\n '.join(parts) + '\r\n'
+
+def _format_time(name: str, value: Dict[str, str]) -> str:
+    if 'date' in value:
+        return f"{name};VALUE=DATE:{value['date'].replace('-', '')}"
+    moment = datetime.fromisoformat(value['dateTime'].replace('Z', '+00:00'))
+    timezone_name = value.get('timeZone')
+    if timezone_name:
+        if moment.tzinfo is not None:
+            moment = moment.astimezone(pytz.timezone(timezone_name))
+        return f"{name};TZID={timezone_name}:{moment.strftime('%Y%m%dT%H%M%S')}"
+    if moment.tzinfo is None:
+        return f"{name}:{moment.strftime('%Y%m%dT%H%M%S')}"
+    return f"{name}:{moment.astimezone(pytz.utc).strftime('%Y%m%dT%H%M%SZ')}"
+
+def _format_stamp(value: Optional[str]) -> str:
+    moment = datetime.fromisoformat(value.replace('Z', '+00:00')) if value else datetime.now(pytz.utc)
+    return moment.astimezone(pytz.utc).strftime('%Y%m%dT%H%M%SZ')
+
+def event_lines(event: Dict[str, Any]) -> Iterator[str]:
+    """Renders one Calendar API event as VEVENT lines."""
+    yield 'BEGIN:VEVENT\r\n'
+    yield fold(f"UID:{event.get('iCalUID') or event['id'] + '@google.com'}")
+    yield fold(f"DTSTAMP:{_format_stamp(event.get('updated'))}")
+    yield fold(_format_time('DTSTART', event['start']))
+    yield fold(_format_time('DTEND', event.get('end', event['start'])))
+    if 'originalStartTime' in event:
+        yield fold(_format_time('RECURRENCE-ID', event['originalStartTime']))
+    for rule in event.get('recurrence', []):
+        yield fold(rule)
+    for field, name in (('summary', 'SUMMARY'), ('description', 'DESCRIPTION'), ('location', 'LOCATION')):
+        if event.get(field):
+            yield fold(f"{name}:{escape_text(event[field])}")
+    if event.get('status') in ('confirmed', 'tentative'):
+        yield f"STATUS:{event['status'].upper()}\r\n"
+    if event.get('transparency') == 'transparent':
+        yield 'TRANSP:TRANSPARENT\r\n'
+    if event.get('updated'):
+        yield fold(f"LAST-MODIFIED:{_format_stamp(event['updated'])}")
+    yield 'END:VEVENT\r\n'
+
+CALENDAR_FOOTER = 'END:VCALENDAR\r\n'
+
+def calendar_header(timezone_name: Optional[str] = None) -> str:
+    lines = ['BEGIN:VCALENDAR\r\n', 'VERSION:2.0\r\n', fold(f"PRODID:{PRODID}"), 'CALSCALE:GREGORIAN\r\n']
+    if timezone_name:
+        lines.append(fold(f"X-WR-TIMEZONE:{timezone_name}"))
+    return ''.join(lines)
+
+def render_event(event: Dict[str, Any]) -> str:
+    """One event as a VEVENT, or nothing for cancelled events."""
+    if event.get('status') == 'cancelled' or 'start' not in event:
+        return ''
+    return ''.join(event_lines(event))
+
+def ics_lines(events: Iterable[Dict[str, Any]], timezone_name: Optional[str] = None) -> Iterator[str]:
+    """Renders a VCALENDAR around events, lazily."""
+    yield calendar_header(timezone_name)
+    for event in events:
+        rendered = render_event(event)
+        if rendered:
+            yield rendered
+    yield CALENDAR_FOOTER
+
+class ICSImport:
+    """
+    Imports an iCalendar upload into a user's calendar as it arrives.
+
+    Events are inserted with batched API requests as soon as a batch fills
+    up, so only one batch is held in memory. Each event's id is derived from
+    its UID, so importing the same file again skips the events that already
+    exist instead of duplicating them. Batches wait up to max_wait for
+    Calendar quota, so a large import is paced rather than rejected.
+    """
+
+    def __init__(self, calendar_service, batch_size: int = BATCH_SIZE, max_wait: Optional[float] = None):
+        self.calendar_service = calendar_service
+        self.batch_size = batch_size
+        self.max_wait = max_wait or float(os.getenv('IMPORT_MAX_WAIT_SECONDS', '120'))
+        self.parser = ICSParser()
+        self.summary = {'imported': 0, 'skipped': 0, 'failed': 0, 'errors': []}
+        self._batch: List[Tuple[Dict[str, Any], Dict[str, Any]]] = []
+
+    def feed(self, chunk: bytes) -> None:
+        self._add(self.parser.feed(chunk))
+
+    def close(self) -> Dict[str, Any]:
+        """Inserts what is left and returns the counts, with details of up to MAX_IMPORT_ERRORS failures."""
+        self._add(self.parser.close())
+        self._flush()
+        # Imported events can be anywhere in the calendar
+        self.calendar_service.availability.invalidate()
+        return self.summary
+
+    def _add(self, vevents: List[Dict[str, List[ICSProperty]]]) -> None:
+        timezone_name = self.parser.calendar_timezone or self.calendar_service.timezone
+        for vevent in vevents:
+            uid = vevent_uid(vevent)
+            if vevent_is_cancelled(vevent):
+                self.summary['skipped'] += 1
+                continue
+            try:
+                event = vevent_to_event(vevent, timezone_name)
+            except ValueError as e:
+                self._fail(uid, None, str(e))
+                continue
+            event_id = event_id_for(self.calendar_service.user_id, f"ics:{uid}") if uid else None
+            if event_id:
+                event['id'] = event_id
+            self._batch.append(({'uid': uid, 'summary': event['summary']}, event))
+            if len(self._batch) >= self.batch_size:
+                self._flush()
+
+    def _flush(self) -> None:
+        if not self._batch:
+            return
+        batch, self._batch = self._batch, []
+        results = self.calendar_service.create_events_batch([event for _, event in batch], max_wait=self.max_wait,
+                                                            return_existing=False)
+        for (item, _), result in zip(batch, results):
+            if isinstance(result, dict):
+                self.summary['imported'] += 1
+            elif error_status(result) == 409:
+                # Already imported by an earlier run
+                self.summary['skipped'] += 1
+            else:
+                self._fail(item['uid'], item['summary'], str(result))
+
+    def _fail(self, uid: Optional[str], summary: Optional[str], message: str) -> None:
+        self.summary['failed'] += 1
+        if len(self.summary['errors']) < MAX_IMPORT_ERRORS:
+            self.summary['errors'].append({'uid': uid, 'summary': summary, 'message': message})
@@ -0,0 +1,200 @@
+import re
+from datetime import date, datetime, time, timedelta
+from typing import Optional, Tuple
+import pytz
+from .local_parser import (COMMAND_RE, ISO_DATE_RE, SLASH_DATE_RE, MONTH_DAY_RE, MONTHS, RELATIVE_DAY_RE,
+                           WEEKDAY_RE, WEEKDAYS, WEEKEND_RE, TIME_RANGE_RE, CLOCK_RE, CLOCK_24H_RE,
+                           NAMED_TIME_RE, BARE_AT_RE, DURATION_RES, _hour_24, _number, clock_hour)
+
+INTENTS = ('create', 'list', 'availability')
+
+AVAILABILITY_RE = re.compile(
+    r"\b(?:am\s+i|are\s+we|i'?m|is\s+(?:my\s+)?(?:calendar|schedule))\s+(?:\w+\s+)?(?:free|available|busy|booked)\b|"
+    r"\b(?:when|what\s+time)\s+(?:am|is|are)\s+(?:\w+\s+){0,3}(?:free|available)\b|"
+    r"\b(?:do|does)\s+(?:i|we|my\s+calendar)\s+have\s+(?:any\s+)?(?:free\s+time|time|openings?|room)\b|"
+    r"\b(?:free|available)\s+(?:time|slots?)\b|\bany\s+openings?\b",
+    re.IGNORECASE)
+LIST_RE = re.compile(
+    r"^\s*(?:(?:and|so|ok|okay|hey),?\s+)?"
+    r"(?:what(?:'s|s|\s+is|\s+are|\s+do|\s+does)?|show(?:\s+me)?|list|tell\s+me|do\s+i\s+have|have\s+i\s+got|"
+    r"is\s+there|are\s+there|any(?:thing)?|when(?:'s|\s+is|\s+are)?|how\s+(?:busy|many))\b",
+    re.IGNORECASE)
+# "What time is ...?" and "When are ...?" ask about the calendar even without a topic word
+WHEN_RE = re.compile(
+    r"^\s*(?:(?:and|so|ok|okay|hey),?\s+)?(?:what\s+time|when)(?:'s|\s+(?:is|are|was|were|do|does|did))\b",
+    re.IGNORECASE)
+LIST_TOPIC_RE = re.compile(
+    r"\b(?:calendar|schedule|agenda|meetings?|events?|appointments?|plans?|planned|on|up|have|busy|booked|next)\b",
+    re.IGNORECASE)
+WEEK_RE = re.compile(r'\b(?P<mod>this|next|the)\s+week\b', re.IGNORECASE)
+
+# Hours covered by vaguer times of day; the end may be 24 for midnight
+PART_OF_DAY_RANGES = {'morning': (8, 12), 'afternoon': (12, 17), 'evening': (17, 22), 'tonight': (17, 24),
+                      'night': (17, 24)}
+PART_OF_DAY_RE = re.compile(r'\b(?:in\s+the\s+|this\s+)?(?P<part>morning|afternoon|evening|tonight|night)\b',
+                            re.IGNORECASE)
+# How long "am I free at 3pm?" asks about when no duration is given
+DEFAULT_CHECK_MINUTES = 60
+
+
+class IntentRouter:
+    """
+    Cheap, local classification of queries into create, list and
+    availability intents, and of the time range a read query asks about.
+
+    Queries that don't clearly ask about the calendar are classified as
+    create, so anything this router doesn't understand takes the usual
+    parsing path.
+    """
+
+    def __init__(self, timezone: str = 'America/Los_Angeles'):
+        self.timezone = timezone
+        self._tz = pytz.timezone(timezone)
+
+    def classify(self, query: str) -> str:
+        if not query or not query.strip():
+            raise ValueError("Query cannot be empty")
+        if COMMAND_RE.match(query):
+            return 'create'
+        if AVAILABILITY_RE.search(query):
+            return 'availability'
+        if WHEN_RE.match(query):
+            return 'list'
+        if LIST_RE.match(query) and (LIST_TOPIC_RE.search(query) or query.rstrip().endswith('?')):
+            return 'list'
+        return 'create'
+
+    def time_range(self, query: str, now: Optional[datetime] = None) -> Tuple[datetime, datetime]:
+        """
+        The [start, end) range a read query is about.
+
+        A day without a time means the whole day, a time of day ("afternoon")
+        its usual hours, and a single time an hour or the given duration.
+        Without any date the range is today, or from now on for queries that
+        only ask what's next. Raises ValueError for dates that don't exist.
+        """
+        now = now.astimezone(self._tz) if now is not None else datetime.now(self._tz)
+        text = ' ' + query.strip() + ' '
+
+        match = WEEK_RE.search(text)
+        if match:
+            monday = now.date() - timedelta(days=now.weekday())
+            if match['mod'].lower() == 'next':
+                return self._at(monday + timedelta(days=7)), self._at(monday + timedelta(days=14))
+            return max(now, self._at(monday)), self._at(monday + timedelta(days=7))
+
+        day = self._day(text, now)
+        match = WEEKEND_RE.search(text)
+        if day is None and match:
+            modifier = (match['mod'] or '').lower()
+            saturday = now.date() + timedelta(days=(5 - now.weekday()) % 7)
+            if now.weekday() == 6 and modifier != 'next':
+                saturday -= timedelta(days=7)
+            elif modifier == 'next' and saturday == now.date():
+                saturday += timedelta(days=7)
+            return max(now, self._at(saturday)), self._at(saturday + timedelta(days=2))
+
+        hours = self._hours(text)
+        if day is None:
+            if hours is None and re.search(r'\bnext\b', text, re.IGNORECASE):
+                # "What's next?": the rest of today and tomorrow
+                return now, self._at(now.date() + timedelta(days=2))
+            day = now.date()
+            if hours is not None and hours[1] <= (now.hour, now.minute):
+                # "Am I free at 9?" asked in the afternoon means tomorrow
+                day += timedelta(days=1)
+        if hours is None:
+            return self._at(day), self._at(day + timedelta(days=1))
+        start = self._at(day, hours[0])
+        end = self._at(day, hours[1]) if hours[1] > hours[0] else self._at(day + timedelta(days=1), hours[1])
+        return start, end
+
+    def _day(self, text: str, now: datetime) -> Optional[date]:
+        match = ISO_DATE_RE.search(text)
+        if match:
+            return self._date(int(match['y']), int(match['mo']), int(match['d']), now, True)
+        match = SLASH_DATE_RE.search(text)
+        if match:
+            year = int(match['y']) if match['y'] else now.year
+            return self._date(year + 2000 if year < 100 else year, int(match['mo']), int(match['d']), now,
+                              bool(match['y']))
+        match = MONTH_DAY_RE.search(text)
+        if match:
+            month = [m[:3] for m in MONTHS].index((match['month'] or match['month2']).lower()[:3]) + 1
+            year = int(match['y']) if match['y'] else now.year
+            return self._date(year, month, int(match['d1'] or match['d2']), now, bool(match['y']))
+        match = RELATIVE_DAY_RE.search(text)
+        if match:
+            if match['dat']:
+                return now.date() + timedelta(days=2)
+            if match['today']:
+                return now.date()
+            if match['tomorrow']:
+                return now.date() + timedelta(days=1)
+            amount = int(_number(match['n']))
+            return now.date() + timedelta(days=amount * (7 if match['unit'].lower().startswith('week') else 1))
+        if re.search(r'\btonight\b', text, re.IGNORECASE):
+            return now.date()
+        match = WEEKDAY_RE.search(text)
+        if match:
+            weekday = [d[:3] for d in WEEKDAYS].index(match['wd'].lower()[:3])
+            days_ahead = (weekday - now.weekday()) % 7
+            if days_ahead == 0 and (match['mod'] or '').lower() == 'next':
+                days_ahead = 7
+            return now.date() + timedelta(days=days_ahead)
+        return None
+
+    def _date(self, year: int, month: int, day: int, now: datetime, explicit_year: bool) -> date:
+        try:
+            value = date(year, month, day)
+        except ValueError:
+            raise ValueError("Query mentions a date that doesn't exist")
+        if not explicit_year and value < now.date():
+            value = value.replace(year=year + 1)
+        return value
+
+    def _hours(self, text: str) -> Optional[Tuple[Tuple[int, int], Tuple[int, int]]]:
+        """The (hour, minute) start and end of the time of day asked about, if any."""
+        match = TIME_RANGE_RE.search(text)
+        if match:
+            end_hour = _hour_24(int(match['eh']), match['e'])
+            start_hour = _hour_24(int(match['sh']), match['sap'] or match['e'])
+            if not match['sap'] and start_hour > end_hour:
+                start_hour -= 12
+            return (start_hour, int(match['sm'] or 0)), (end_hour, int(match['em'] or 0))
+
+        part = PART_OF_DAY_RE.search(text)
+        start = None
+        match = CLOCK_RE.search(text)
+        if match:
+            start = (_hour_24(int(match['th']), match['t']), int(match['tm'] or 0))
+        else:
+            match = NAMED_TIME_RE.search(text)
+            if match:
+                start = (0, 0) if match['name'].lower() == 'midnight' else (12, 0)
+            else:
+                match = CLOCK_24H_RE.search(text) or BARE_AT_RE.search(text)
+                if match and int(match['th']) <= 23:
+                    # No meridiem: read it like the local parser does
+                    hour, _ = clock_hour(int(match['th']), part['part'].lower() if part else None,
+                                         padded=match['th'].startswith('0'))
+                    start = (hour, int(match['tm'] or 0))
+        if start is not None:
+            minutes = DEFAULT_CHECK_MINUTES
+            for pattern, duration in DURATION_RES:
+                match = pattern.search(text)
+                if match:
+                    minutes = int(duration(match))
+                    break
+            end = start[0] * 60 + start[1] + minutes
+            return start, (min(end // 60, 24), end % 60 if end < 24 * 60 else 0)
+
+        if part:
+            first, last = PART_OF_DAY_RANGES[part['part'].lower()]
+            return (first, 0), (last, 0)
+        return None
+
+    def _at(self, day: date, hour_minute: Tuple[int, int] = (0, 0)) -> datetime:
+        if hour_minute[0] == 24:
+            day, hour_minute = day + timedelta(days=1), (0, 0)
+        return self._tz.localize(datetime.combine(day, time(*hour_minute)))
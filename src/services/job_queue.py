@@ -0,0 +1,271 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .metrics import metrics
+from .rate_governor import error_status, retry_after
+from .sqlite_db import connect
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+# Prefix of the keys given to jobs enqueued without a client-supplied idempotency key
+AUTO_KEY_PREFIX = 'auto:'
+
+def payload_key(kind: str, payload: Any) -> str:
+    """Hash of a request, to tell whether a reused idempotency key came with the same request."""
+    canonical = json.dumps({'kind': kind, 'payload': payload}, sort_keys=True, separators=(',', ':'))
+    return 'sha256:' + hashlib.sha256(canonical.encode()).hexdigest()
+
+def client_key(job: Dict[str, Any]) -> Optional[str]:
+    """The idempotency key the client sent for a job, or None if it sent none."""
+    key = job['idempotency_key']
+    return None if key.startswith(AUTO_KEY_PREFIX) else key
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    True for rate limiting, server errors and network failures, including
+    when they are the cause of a wrapping exception such as the LLM
+    service's ValueError.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        status = error_status(error)
+        if status is not None:
+            return status == 429 or status >= 500
+        if isinstance(error, OSError) or type(error).__name__ in ('APIConnectionError', 'APITimeoutError'):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+class JobQueue:
+    """
+    Durable write-behind queue in SQLite with a pool of worker threads.
+
+    Jobs are stored before the request returns, so they survive restarts.
+    Each (user, idempotency key) pair maps to one job: enqueuing it again
+    returns the existing job instead of running the work twice. Requests
+    without a key only collapse with an identical one from the last
+    dedupe_window seconds, since the same request sent later (say, a
+    relative date on another day) is meant as a new one. Handlers
+    that fail with a retryable error are retried with exponential backoff;
+    any other error fails the job. A running job holds a lease, so one
+    abandoned by a crashed process is picked up again once the lease expires.
+    """
+
+    def __init__(self, handlers: Dict[str, Callable[[Dict[str, Any]], Any]], path: Optional[str] = None,
+                 workers: Optional[int] = None, max_attempts: Optional[int] = None,
+                 base_delay: float = 1.0, max_delay: float = 60.0, lease_seconds: float = 300.0,
+                 retention: Optional[float] = None, dedupe_window: Optional[float] = None,
+                 poll_interval: float = 1.0,
+                 describe_error: Optional[Callable[[BaseException], Dict[str, Any]]] = None):
+        self.handlers = handlers
+        self.path = path or os.getenv('JOB_QUEUE_PATH', 'jobs.db')
+        self.workers = workers or int(os.getenv('JOB_WORKERS', '4'))
+        self.max_attempts = max_attempts or int(os.getenv('JOB_MAX_ATTEMPTS', '5'))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lease_seconds = lease_seconds
+        self.retention = retention or float(os.getenv('JOB_RETENTION_SECONDS', '86400'))
+        self.dedupe_window = dedupe_window or float(os.getenv('JOB_DEDUPE_SECONDS', '60'))
+        self.poll_interval = poll_interval
+        self.describe_error = describe_error or (lambda e: {'message': str(e)})
+        self._wakeup = threading.Condition()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._last_prune = 0.0
+        with connect(self.path) as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS jobs ('
+                'id TEXT PRIMARY KEY, user_id TEXT NOT NULL, idempotency_key TEXT NOT NULL, '
+                'payload_hash TEXT NOT NULL, kind TEXT NOT NULL, payload TEXT NOT NULL, '
+                'status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, run_at REAL NOT NULL, '
+                'lease_until REAL, result TEXT, error TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL, '
+                'UNIQUE (user_id, idempotency_key))'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, run_at)')
+            conn.execute('CREATE INDEX IF NOT EXISTS jobs_payload ON jobs (user_id, payload_hash, created_at)')
+
+    def start(self) -> 'JobQueue':
+        """Starts the worker threads."""
+        if not self._threads:
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'job-worker-{index}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        return self
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Stops the workers; jobs they were running are retried after their lease expires."""
+        self._stop.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def enqueue(self, user_id: str, kind: str, payload: Any,
+                idempotency_key: Optional[str] = None) -> Tuple[Dict[str, Any], bool]:
+        """
+        Stores a job and wakes a worker. Returns (job, created); created is
+        False when the idempotency key matched an existing job.
+
+        Without an idempotency key, an identical request enqueued in the last
+        dedupe_window seconds is returned instead, and otherwise the job gets
+        a key of its own. Reusing a key for a different payload raises ValueError.
+        """
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind '{kind}'")
+        payload_hash = payload_key(kind, payload)
+        key = idempotency_key or f"{AUTO_KEY_PREFIX}{uuid.uuid4().hex}"
+        now = time.time()
+        with connect(self.path) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            if idempotency_key is None:
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE user_id = ? AND payload_hash = ? AND created_at > ? "
+                    "AND idempotency_key LIKE ? ORDER BY created_at DESC LIMIT 1",
+                    (user_id, payload_hash, now - self.dedupe_window, f"{AUTO_KEY_PREFIX}%")
+                ).fetchone()
+                if row is not None:
+                    return self._to_job(row), False
+            cursor = conn.execute(
+                'INSERT OR IGNORE INTO jobs (id, user_id, idempotency_key, payload_hash, kind, payload, '
+                'status, run_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (uuid.uuid4().hex, user_id, key, payload_hash, kind, json.dumps(payload), QUEUED, now, now, now)
+            )
+            created = cursor.rowcount == 1
+            row = conn.execute('SELECT * FROM jobs WHERE user_id = ? AND idempotency_key = ?',
+                               (user_id, key)).fetchone()
+        if not created and row['payload_hash'] != payload_hash:
+            raise ValueError('Idempotency key was already used for a different request')
+        if created:
+            with self._wakeup:
+                self._wakeup.notify()
+        return self._to_job(row), created
+
+    def get(self, job_id: str, user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Gets a job by id; with user_id, only if it belongs to that user."""
+        with connect(self.path) as conn:
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None or (user_id is not None and row['user_id'] != user_id):
+            return None
+        return self._to_job(row)
+
+    def run_pending(self) -> int:
+        """Runs ready jobs in the calling thread until none are left. Returns how many ran."""
+        count = 0
+        while True:
+            job = self._claim()
+            if job is None:
+                return count
+            self._run(job)
+            count += 1
+
+    def get_stats(self) -> Dict[str, int]:
+        """Number of jobs in each status."""
+        with connect(self.path) as conn:
+            rows = conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall()
+        stats = {QUEUED: 0, RUNNING: 0, SUCCEEDED: 0, FAILED: 0}
+        stats.update({row[0]: row[1] for row in rows})
+        return stats
+
+    def _work(self) -> None:
+        while not self._stop.is_set():
+            try:
+                job = self._claim()
+                if job is None:
+                    self._prune()
+                    with self._wakeup:
+                        self._wakeup.wait(self.poll_interval)
+                    continue
+                self._run(job)
+            except Exception:
+                logger.exception("Job worker error")
+                self._stop.wait(self.poll_interval)
+
+    def _claim(self) -> Optional[Dict[str, Any]]:
+        """Takes the oldest ready job (or one whose lease ran out) and marks it running."""
+        now = time.time()
+        with connect(self.path) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(
+                'SELECT * FROM jobs WHERE (status = ? AND run_at <= ?) OR (status = ? AND lease_until < ?) '
+                'ORDER BY run_at LIMIT 1',
+                (QUEUED, now, RUNNING, now)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                'UPDATE jobs SET status = ?, attempts = attempts + 1, lease_until = ?, updated_at = ? WHERE id = ?',
+                (RUNNING, now + self.lease_seconds, now, row['id'])
+            )
+        metrics.observe('job_wait', max(0.0, now - row['run_at']))
+        job = self._to_job(row)
+        job['attempts'] += 1
+        return job
+
+    def _run(self, job: Dict[str, Any]) -> None:
+        try:
+            with metrics.time('job_run'):
+                result = self.handlers[job['kind']](job)
+        except Exception as e:
+            if is_retryable(e) and job['attempts'] < self.max_attempts:
+                delay = retry_after(e) or min(self.max_delay, self.base_delay * 2 ** (job['attempts'] - 1))
+                # Jitter spreads out retries of jobs that failed together
+                delay *= random.uniform(0.5, 1.0)
+                logger.info("Job %s failed (attempt %d), retrying in %.1fs: %s", job['id'], job['attempts'], delay, e)
+                self._finish(job['id'], QUEUED, run_at=time.time() + delay, error=self.describe_error(e))
+            else:
+                logger.warning("Job %s failed: %s", job['id'], e)
+                self._finish(job['id'], FAILED, error=self.describe_error(e))
+            return
+        self._finish(job['id'], SUCCEEDED, result=result)
+
+    def _finish(self, job_id: str, status: str, result: Any = None, error: Any = None,
+                run_at: Optional[float] = None) -> None:
+        now = time.time()
+        with connect(self.path) as conn:
+            conn.execute(
+                'UPDATE jobs SET status = ?, result = ?, error = ?, run_at = COALESCE(?, run_at), '
+                'lease_until = NULL, updated_at = ? WHERE id = ?',
+                (status, json.dumps(result) if result is not None else None,
+                 json.dumps(error) if error is not None else None, run_at, now, job_id)
+            )
+
+    def _prune(self) -> None:
+        """Deletes finished jobs older than the retention period, at most once a minute."""
+        now = time.time()
+        if now - self._last_prune < 60:
+            return
+        self._last_prune = now
+        with connect(self.path) as conn:
+            conn.execute('DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?',
+                         (SUCCEEDED, FAILED, now - self.retention))
+
+    def _to_job(self, row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            'id': row['id'],
+            'user_id': row['user_id'],
+            'idempotency_key': row['idempotency_key'],
+            'kind': row['kind'],
+            'payload': json.loads(row['payload']),
+            'status': row['status'],
+            'attempts': row['attempts'],
+            'result': json.loads(row['result']) if row['result'] else None,
+            'error': json.loads(row['error']) if row['error'] else None,
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at'],
+        }
@@ -1,18 +1,31 @@
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
+import asyncio
+import contextvars
+import copy
 import os
-from typing import Dict, Any
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Any, AsyncIterator, Iterator, List, Optional, Union
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
+import pytz
+from .local_parser import LocalQueryParser
+from .parse_cache import ParseCache
+from .shared_cache import SQLiteCache, create_cache
+from .stream_parser import StreamingJSONValidator
+from .llm_usage import LLMUsageStats
+from .model_cascade import InvalidCompletionError, ModelCascade
+from . import deadline as request_deadline
+from .metrics import metrics
+from .rate_governor import RateGovernor, UpstreamUnavailableError, governors, is_rate_limited
 
-class LLMService:
-    def __init__(self):
-        self.client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-        
-    def parse_calendar_query(self, query: str) -> Dict[str, Any]:
-        """
-        Uses GPT-3.5-turbo to parse natural language into structured data.
-        """
-        system_prompt = """
+# Queries relative to the current time of day can't be reused within a day
+TIME_RELATIVE_RE = re.compile(r'\b(?:now|right away|in\s+(?:an?|\d+|a few)\s+(?:minutes?|mins?|hours?|hrs?))\b', re.IGNORECASE)
+
+# The original prompt, kept as the default until compact mode is evaluated
+VERBOSE_SYSTEM_PROMPT = """
         You are a calendar assistant that helps parse natural language queries into structured data.
         You should extract event details and return them in a JSON format.
         
@@ -36,6 +49,7 @@ class LLMService:
         
         For valid queries, return JSON with this structure:
         {
+            "timeSpecified": true,
             "event": {
                 "summary": "string",
                 "description": "string",
@@ -50,13 +64,571 @@ class LLMService:
             }
         }
 
+        Set "timeSpecified" to false when the query gives no time or date at all.
+
         For invalid queries, return JSON with this structure:
         {
             "error": "error message string"
         }
         """
 
-        user_prompt = f"""
+# Same rules as the verbose prompt without the indentation and prose. It never
+# changes between calls, so the provider can serve it from its prompt cache.
+COMPACT_SYSTEM_PROMPT = (
+    'Parse a calendar request into JSON, using the time zone given with the current time. '
+    'Times: use explicit times as given; "morning" 9am; "evening" 6pm; date only 10am; '
+    'no time or date: the next hour, with "timeSpecified": false. '
+    'Durations: as given, else 2 hours for shopping/errands, else 1 hour. '
+    'Valid reply: {"timeSpecified":true,"event":{"summary":"","description":"",'
+    '"start":{"dateTime":"ISO-8601","timeZone":"<zone>"},"end":{"dateTime":"ISO-8601","timeZone":"<zone>"}}}. '
+    'Invalid reply: {"error":"Query cannot be empty"|"Query must specify an event purpose"|'
+    '"Query is not a valid calendar request"}.'
+)
+
+PROMPT_MODES = ('verbose', 'compact')
+# Completion tokens counted against the tokens-per-minute quota before the real count is known
+COMPLETION_TOKEN_ESTIMATE = 200
+# How far from now a parsed event may start before the reply is treated as a misparse
+PLAUSIBLE_PAST = timedelta(days=1)
+PLAUSIBLE_FUTURE = timedelta(days=2 * 366)
+
+class LLMService:
+    def __init__(self, client: Optional[OpenAI] = None, local_parser: Optional[LocalQueryParser] = None,
+                 cache: Optional[Union[ParseCache, SQLiteCache]] = None, timezone: str = 'America/Los_Angeles',
+                 async_client: Optional[AsyncOpenAI] = None, prompt_mode: Optional[str] = None,
+                 governor: Optional[RateGovernor] = None, cascade: Optional[ModelCascade] = None):
+        self.timezone = timezone
+        self.prompt_mode = prompt_mode or os.getenv('LLM_PROMPT_MODE', 'verbose')
+        if self.prompt_mode not in PROMPT_MODES:
+            raise ValueError(f"Unknown prompt mode '{self.prompt_mode}'. Use one of: {', '.join(PROMPT_MODES)}")
+        self.usage = LLMUsageStats()
+        self.governor = governor or governors.openai
+        self.cascade = cascade or ModelCascade()
+        self._hedge_executor = None
+        self._hedge_executor_lock = threading.Lock()
+        self.client = client or OpenAI(api_key=os.getenv('OPENAI_API_KEY'), **self._client_options())
+        self._async_client = async_client
+        self._async_in_flight = {}
+        self.local_parser = local_parser or LocalQueryParser(timezone=timezone)
+        self.cache = cache or create_cache(
+            'parse',
+            max_size=int(os.getenv('PARSE_CACHE_SIZE', '1024')),
+            ttl=float(os.getenv('PARSE_CACHE_TTL', '600'))
+        )
+        self.fast_path_min_confidence = float(os.getenv('LOCAL_PARSER_MIN_CONFIDENCE', '0.8'))
+        self._stats_lock = threading.Lock()
+        self._stats = {'fast_path_hits': 0, 'llm_calls': 0}
+
+    def parse_calendar_query(self, query: str, route: str = 'default') -> Dict[str, Any]:
+        """
+        Parses natural language into structured data.
+
+        Simple queries are handled by the local rule-based parser; the LLM is
+        only called when the local parser is not confident in its result.
+        Token usage and latency of LLM calls are recorded under route.
+        """
+        result = self._parse_locally(query)
+        if result is not None:
+            return result
+
+        if TIME_RELATIVE_RE.search(query):
+            self._record('llm_calls')
+            return self._parse_with_llm(query, route)
+
+        def compute():
+            self._record('llm_calls')
+            return self._parse_with_llm(query, route)
+
+        return self.cache.get_or_compute(self._cache_key(query), compute)
+
+    async def aparse_calendar_query(self, query: str, route: str = 'default') -> Dict[str, Any]:
+        """
+        Async version of parse_calendar_query for the ASGI app.
+
+        Uses the same fast path and cache, with concurrent identical LLM calls
+        coalesced on the event loop instead of blocking a thread.
+        """
+        result = self._parse_locally(query)
+        if result is not None:
+            return result
+
+        if TIME_RELATIVE_RE.search(query):
+            self._record('llm_calls')
+            return await self._aparse_with_llm(query, route)
+
+        key = self._cache_key(query)
+        cached = await self.cache.aget(key)
+        if cached is not None:
+            return cached
+
+        task = self._async_in_flight.get(key)
+        if task is None:
+            self._record('llm_calls')
+            task = asyncio.ensure_future(self._aparse_and_store(key, query, route))
+            self._async_in_flight[key] = task
+            task.add_done_callback(lambda done: self._async_in_flight.pop(key, None))
+        # Shielded so one cancelled caller doesn't cancel the call for everyone waiting on it
+        result = await asyncio.shield(task)
+        return copy.deepcopy(result)
+
+    def stream_calendar_query(self, query: str, route: str = 'default') -> Iterator[Dict[str, Any]]:
+        """
+        Streaming version of parse_calendar_query.
+
+        Yields {'type': 'field', 'field': ..., 'value': ...} for each field of
+        the LLM's JSON as it arrives, then {'type': 'result', 'result': ...}.
+        Raises ValueError as soon as the output is malformed or reports an
+        error, without waiting for the rest of the completion.
+        """
+        result = self._cached_result(query)
+        if result is not None:
+            yield {'type': 'result', 'result': result}
+            return
+
+        self._record('llm_calls')
+        model = self.cascade.models[0]
+        validator = StreamingJSONValidator()
+        request = self._completion_request(query, stream=True, model=model)
+        usage = None
+        started = time.perf_counter()
+        try:
+            # The slot is held until the stream ends
+            with self.governor.slot(self._quota_cost(request)):
+                started = time.perf_counter()
+                try:
+                    stream = self._bounded(self.client).chat.completions.create(**request)
+                except Exception as e:
+                    metrics.count_error('llm_call', e)
+                    self.cascade.record(model, 'error', time.perf_counter() - started)
+                    if is_rate_limited(e):
+                        raise
+                    raise ValueError(f"Failed to parse query with LLM: {str(e)}")
+                try:
+                    for chunk in stream:
+                        usage = getattr(chunk, 'usage', None) or usage
+                        for field, value in validator.feed(self._chunk_text(chunk)):
+                            yield {'type': 'field', 'field': field, 'value': value}
+                except Exception as e:
+                    metrics.count_error('llm_call', e)
+                    self._record_stream_failure(model, e, time.perf_counter() - started)
+                    raise
+                finally:
+                    stream.close()
+                    elapsed = time.perf_counter() - started
+                    metrics.observe('llm_call', elapsed)
+                    self.usage.record(route, usage, elapsed)
+            with metrics.time('llm_decode'):
+                result = self._finish_stream(query, validator)
+        except InvalidCompletionError:
+            self.cascade.record(model, 'invalid', time.perf_counter() - started)
+            if len(self.cascade.models) == 1:
+                raise
+            # The fields sent so far came from the first model; the result is the next one's
+            result = self._parse_with_llm(query, route, first_tier=1)
+            self._store(query, result)
+        else:
+            self.cascade.record(model, 'valid', time.perf_counter() - started)
+            self.cascade.record_used(model)
+        yield {'type': 'result', 'result': result}
+
+    async def astream_calendar_query(self, query: str, route: str = 'default') -> AsyncIterator[Dict[str, Any]]:
+        """Async version of stream_calendar_query using the AsyncOpenAI client."""
+        result = self._parse_locally(query)
+        if result is None and not TIME_RELATIVE_RE.search(query):
+            result = await self.cache.aget(self._cache_key(query))
+        if result is not None:
+            yield {'type': 'result', 'result': result}
+            return
+
+        self._record('llm_calls')
+        model = self.cascade.models[0]
+        validator = StreamingJSONValidator()
+        request = self._completion_request(query, stream=True, model=model)
+        usage = None
+        started = time.perf_counter()
+        try:
+            async with self.governor.aslot(self._quota_cost(request)):
+                started = time.perf_counter()
+                try:
+                    stream = await self._bounded(self.async_client).chat.completions.create(**request)
+                except Exception as e:
+                    metrics.count_error('llm_call', e)
+                    self.cascade.record(model, 'error', time.perf_counter() - started)
+                    if is_rate_limited(e):
+                        raise
+                    raise ValueError(f"Failed to parse query with LLM: {str(e)}")
+                try:
+                    async for chunk in stream:
+                        usage = getattr(chunk, 'usage', None) or usage
+                        for field, value in validator.feed(self._chunk_text(chunk)):
+                            yield {'type': 'field', 'field': field, 'value': value}
+                except Exception as e:
+                    metrics.count_error('llm_call', e)
+                    self._record_stream_failure(model, e, time.perf_counter() - started)
+                    raise
+                finally:
+                    await stream.close()
+                    elapsed = time.perf_counter() - started
+                    metrics.observe('llm_call', elapsed)
+                    self.usage.record(route, usage, elapsed)
+            with metrics.time('llm_decode'):
+                result = self._check_result(validator.result())
+        except InvalidCompletionError:
+            self.cascade.record(model, 'invalid', time.perf_counter() - started)
+            if len(self.cascade.models) == 1:
+                raise
+            result = await self._aparse_with_llm(query, route, first_tier=1)
+            await self._astore(query, result)
+        else:
+            self.cascade.record(model, 'valid', time.perf_counter() - started)
+            self.cascade.record_used(model)
+            await self._astore(query, result)
+        yield {'type': 'result', 'result': result}
+
+    def _cached_result(self, query: str) -> Optional[Dict[str, Any]]:
+        """Returns a result from the local parser or the cache, if there is one."""
+        result = self._parse_locally(query)
+        if result is None and not TIME_RELATIVE_RE.search(query):
+            result = self.cache.get(self._cache_key(query))
+        return result
+
+    def _chunk_text(self, chunk) -> str:
+        if not chunk.choices:
+            return ''
+        return chunk.choices[0].delta.content or ''
+
+    def _finish_stream(self, query: str, validator: StreamingJSONValidator) -> Dict[str, Any]:
+        """Validates a fully streamed response and caches it."""
+        result = self._check_result(validator.result())
+        self._store(query, result)
+        return result
+
+    def _store(self, query: str, result: Dict[str, Any]) -> None:
+        if not TIME_RELATIVE_RE.search(query):
+            self.cache.set(self._cache_key(query), result)
+
+    async def _astore(self, query: str, result: Dict[str, Any]) -> None:
+        if not TIME_RELATIVE_RE.search(query):
+            await self.cache.aset(self._cache_key(query), result)
+
+    def _record_stream_failure(self, model: str, error: Exception, latency: float) -> None:
+        """Records a stream that ended in an error other than an invalid reply, which the caller handles."""
+        if not isinstance(error, InvalidCompletionError):
+            # The validator raises plain ValueError only for the model's own error replies
+            self.cascade.record(model, 'valid' if type(error) is ValueError else 'error', latency)
+
+    def _parse_locally(self, query: str) -> Optional[Dict[str, Any]]:
+        """Returns the local parser's result if it is confident enough, else None."""
+        if not query or not query.strip():
+            raise ValueError("Query cannot be empty")
+
+        with metrics.time('local_parse'):
+            result, confidence = self.local_parser.parse(query)
+        if result is not None and confidence >= self.fast_path_min_confidence and self._validate_response(result):
+            self._record('fast_path_hits')
+            return result
+        return None
+
+    async def _aparse_and_store(self, key: str, query: str, route: str) -> Dict[str, Any]:
+        result = await self._aparse_with_llm(query, route)
+        await self.cache.aset(key, result)
+        return result
+
+    async def aparse_calendar_queries(self, queries: List[str],
+                                      route: str = 'default') -> List[Union[Dict[str, Any], Exception]]:
+        """Async version of parse_calendar_queries."""
+        return await asyncio.gather(*(self.aparse_calendar_query(q, route) for q in queries), return_exceptions=True)
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        """The AsyncOpenAI client, created on first use."""
+        if self._async_client is None:
+            self._async_client = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'), **self._client_options())
+        return self._async_client
+
+    def parse_calendar_queries(self, queries: List[str],
+                               route: str = 'default') -> List[Union[Dict[str, Any], Exception]]:
+        """
+        Parses several queries concurrently.
+
+        Returns a list in the same order as queries, holding either the parsed
+        result or the exception raised for that query.
+        """
+        def parse(query):
+            try:
+                return self.parse_calendar_query(query, route)
+            except Exception as e:
+                return e
+
+        if not queries:
+            return []
+        workers = min(len(queries), int(os.getenv('LLM_BATCH_CONCURRENCY', '8')))
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            # Each worker runs in a copy of this context, so it keeps the request's deadline
+            futures = [executor.submit(contextvars.copy_context().run, parse, query) for query in queries]
+            return [future.result() for future in futures]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Returns fast-path, LLM call, cache and per-route token usage counters."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        total = stats['fast_path_hits'] + stats['llm_calls']
+        stats['fast_path_hit_rate'] = stats['fast_path_hits'] / total if total else 0.0
+        stats['cache'] = self.cache.get_stats()
+        stats['prompt_mode'] = self.prompt_mode
+        stats['usage'] = self.usage.get_stats()
+        stats['cascade'] = self.cascade.get_stats()
+        return stats
+
+    def _cache_key(self, query: str) -> str:
+        """
+        Builds a cache key from the normalized query, today's date and the timezone,
+        so relative dates like "tomorrow" are never served across midnight.
+        """
+        normalized = ' '.join(query.lower().split()).strip(' .!?')
+        reference_date = datetime.now(pytz.timezone(self.timezone)).date().isoformat()
+        return f"{self.timezone}|{reference_date}|{normalized}"
+
+    @staticmethod
+    def _client_options() -> Dict[str, Any]:
+        return {'timeout': float(os.getenv('OPENAI_TIMEOUT_SECONDS', '30')),
+                'max_retries': int(os.getenv('OPENAI_MAX_RETRIES', '2'))}
+
+    @staticmethod
+    def _bounded(client):
+        """
+        The client as is, or under a request deadline a copy whose timeout
+        is the time left and that doesn't retry, since retries couldn't
+        finish in time anyway.
+        """
+        left = request_deadline.remaining()
+        if left is None:
+            return client
+        return client.with_options(timeout=max(left, 0.001), max_retries=0)
+
+    def _record(self, counter: str) -> None:
+        with self._stats_lock:
+            self._stats[counter] += 1
+
+    def _parse_with_llm(self, query: str, route: str = 'default', first_tier: int = 0) -> Dict[str, Any]:
+        """
+        Parses a query with the model cascade, from first_tier on.
+
+        Each model's reply is checked, and only a malformed or implausible one
+        is passed on to the next model, so most queries are answered by the
+        cheapest. In hedged mode the next model is also started when a tier
+        is slow to answer. Calls go through the OpenAI rate governor; when it
+        is rate limited or saturated, UpstreamUnavailableError is raised as is.
+        """
+        models = self.cascade.models[first_tier:]
+        if self.cascade.hedge_after is not None and len(models) > 1:
+            return self._parse_hedged(query, route, models)
+        for model in models:
+            try:
+                result = self._call_model(query, route, model)
+            except InvalidCompletionError:
+                if model == models[-1]:
+                    raise
+                continue
+            self.cascade.record_used(model)
+            return result
+
+    async def _aparse_with_llm(self, query: str, route: str = 'default', first_tier: int = 0) -> Dict[str, Any]:
+        """Async version of _parse_with_llm using the AsyncOpenAI client."""
+        models = self.cascade.models[first_tier:]
+        if self.cascade.hedge_after is not None and len(models) > 1:
+            return await self._aparse_hedged(query, route, models)
+        for model in models:
+            try:
+                result = await self._acall_model(query, route, model)
+            except InvalidCompletionError:
+                if model == models[-1]:
+                    raise
+                continue
+            self.cascade.record_used(model)
+            return result
+
+    def _parse_hedged(self, query: str, route: str, models: List[str]) -> Dict[str, Any]:
+        """
+        Runs the cascade with hedging: the next model is started when the
+        latest one hasn't answered within hedge_after, or has answered with
+        an invalid reply. The first valid answer wins; calls still running
+        then finish in the background and their replies are dropped. If none
+        is valid, the last error is raised.
+        """
+        pending = {}
+        error = None
+        started_models = []
+
+        def start():
+            model = models[len(started_models)]
+            started_models.append(model)
+            # Each call runs in a copy of this context, so it keeps the request's deadline
+            future = self._hedge_pool().submit(contextvars.copy_context().run, self._call_model, query, route, model)
+            pending[future] = model
+
+        start()
+        while True:
+            more = len(started_models) < len(models)
+            done, _ = wait(pending, timeout=self.cascade.hedge_after if more else None, return_when=FIRST_COMPLETED)
+            if not done:
+                self.cascade.record_hedge(models[len(started_models)])
+                start()
+                continue
+            for future in done:
+                model = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                self.cascade.record_used(model)
+                for other, other_model in pending.items():
+                    # Only calls still queued for a thread can be cancelled
+                    if other.cancel():
+                        self.cascade.record(other_model, 'abandoned')
+                return result
+            if not pending:
+                if isinstance(error, InvalidCompletionError) and more:
+                    start()
+                else:
+                    raise error
+
+    async def _aparse_hedged(self, query: str, route: str, models: List[str]) -> Dict[str, Any]:
+        """Async version of _parse_hedged; calls that lose the race are cancelled."""
+        pending = {}
+        error = None
+        started_models = []
+
+        def start():
+            model = models[len(started_models)]
+            started_models.append(model)
+            pending[asyncio.ensure_future(self._acall_model(query, route, model))] = model
+
+        start()
+        try:
+            while True:
+                more = len(started_models) < len(models)
+                done, _ = await asyncio.wait(pending, timeout=self.cascade.hedge_after if more else None,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self.cascade.record_hedge(models[len(started_models)])
+                    start()
+                    continue
+                for task in done:
+                    model = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        error = e
+                        continue
+                    self.cascade.record_used(model)
+                    return result
+                if not pending:
+                    if isinstance(error, InvalidCompletionError) and more:
+                        start()
+                    else:
+                        raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _hedge_pool(self) -> ThreadPoolExecutor:
+        """Threads for hedged calls, created on first use; more than the governor admits at once would only wait."""
+        if self._hedge_executor is None:
+            with self._hedge_executor_lock:
+                if self._hedge_executor is None:
+                    self._hedge_executor = ThreadPoolExecutor(max_workers=self.governor.max_concurrency,
+                                                              thread_name_prefix='llm-hedge')
+        return self._hedge_executor
+
+    def _call_model(self, query: str, route: str, model: str) -> Dict[str, Any]:
+        """One checked completion from model, with the outcome recorded for its tier."""
+        request = self._completion_request(query, model=model)
+        started = time.perf_counter()
+        try:
+            with self.governor.slot(self._quota_cost(request)):
+                started = time.perf_counter()
+                with metrics.time('llm_call'):
+                    response = self._bounded(self.client).chat.completions.create(**request)
+            self.usage.record(route, getattr(response, 'usage', None), time.perf_counter() - started)
+            with metrics.time('llm_decode'):
+                result = self._parse_completion(response)
+        except Exception as e:
+            raise self._call_failed(model, e, time.perf_counter() - started)
+        self.cascade.record(model, 'valid', time.perf_counter() - started)
+        return result
+
+    async def _acall_model(self, query: str, route: str, model: str) -> Dict[str, Any]:
+        """Async version of _call_model using the AsyncOpenAI client."""
+        request = self._completion_request(query, model=model)
+        started = time.perf_counter()
+        try:
+            async with self.governor.aslot(self._quota_cost(request)):
+                started = time.perf_counter()
+                with metrics.time('llm_call'):
+                    response = await self._bounded(self.async_client).chat.completions.create(**request)
+            self.usage.record(route, getattr(response, 'usage', None), time.perf_counter() - started)
+            with metrics.time('llm_decode'):
+                result = self._parse_completion(response)
+        except asyncio.CancelledError:
+            self.cascade.record(model, 'abandoned')
+            raise
+        except Exception as e:
+            raise self._call_failed(model, e, time.perf_counter() - started)
+        self.cascade.record(model, 'valid', time.perf_counter() - started)
+        return result
+
+    def _call_failed(self, model: str, error: Exception, latency: float) -> Exception:
+        """Records a call to model that raised error and returns the exception for the caller to raise."""
+        if isinstance(error, InvalidCompletionError):
+            self.cascade.record(model, 'invalid', latency)
+            return error
+        if isinstance(error, UpstreamUnavailableError):
+            self.cascade.record(model, 'error', latency)
+            return error
+        if isinstance(error, ValueError):
+            # The model's own error reply, e.g. for a query that isn't a calendar request
+            self.cascade.record(model, 'valid', latency)
+            return error
+        self.cascade.record(model, 'error', latency)
+        return ValueError(f"Failed to parse query with LLM: {str(error)}")
+
+    def _completion_request(self, query: str, stream: bool = False, model: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Builds the chat completion arguments for a query, for the cascade's
+        first model unless another is given. The system prompt is a constant,
+        so everything that varies is in the user message.
+        """
+        if self.prompt_mode == 'compact':
+            system_prompt = COMPACT_SYSTEM_PROMPT
+            now = datetime.now(pytz.timezone(self.timezone)).replace(second=0, microsecond=0)
+            user_prompt = f"Now: {now.isoformat()} ({self.timezone})\nQuery: {json.dumps(query)}"
+        else:
+            system_prompt = VERBOSE_SYSTEM_PROMPT
+            user_prompt = self._verbose_user_prompt(query)
+
+        request = {
+            'model': model or self.cascade.models[0],
+            'messages': [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            'temperature': 0,
+            'response_format': { "type": "json_object" }
+        }
+        if stream:
+            # The last chunk then carries the token counts
+            request.update(stream=True, stream_options={'include_usage': True})
+        return request
+
+    def _quota_cost(self, request: Dict[str, Any]) -> Dict[str, float]:
+        """Estimates a request's cost against the requests and tokens per minute limits (about 4 characters a token)."""
+        prompt_chars = sum(len(message['content']) for message in request['messages'])
+        return {'requests': 1, 'tokens': prompt_chars / 4 + COMPLETION_TOKEN_ESTIMATE}
+
+    def _verbose_user_prompt(self, query: str) -> str:
+        return f"""
         Parse this calendar query: "{query}"
         Current time: {datetime.now().isoformat()}
         
@@ -68,34 +640,49 @@ class LLMService:
         Return the JSON response.
         """
 
+    def _parse_completion(self, response) -> Dict[str, Any]:
+        """Decodes and validates a chat completion response."""
+        # Parse the response
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0,
-                response_format={ "type": "json_object" }
-            )
-            
-            # Parse the response
             result = json.loads(response.choices[0].message.content)
-            
-            # Check if the response contains an error
-            if 'error' in result:
-                raise ValueError(result['error'])
-                
-            # Validate the response structure
-            if not self._validate_response(result):
-                raise ValueError("Invalid response structure from LLM")
-                
-            return result
+        except (TypeError, json.JSONDecodeError):
+            raise InvalidCompletionError("Failed to parse LLM response")
+        return self._check_result(result)
 
-        except json.JSONDecodeError:
-            raise ValueError("Failed to parse LLM response")
-        except Exception as e:
-            raise ValueError(f"Failed to parse query with LLM: {str(e)}")
+    def _check_result(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Raises ValueError for error replies, and InvalidCompletionError for
+        malformed results and events that end before they start or start
+        implausibly far from now.
+        """
+        # Check if the response contains an error
+        if isinstance(result, dict) and 'error' in result:
+            raise ValueError(result['error'])
+
+        # Validate the response structure
+        if not isinstance(result, dict) or not self._validate_response(result):
+            raise InvalidCompletionError("Invalid response structure from LLM")
+
+        try:
+            start = self._event_time(result['event']['start'])
+            end = self._event_time(result['event']['end'])
+        except (AttributeError, KeyError, TypeError, ValueError):
+            raise InvalidCompletionError("Invalid event time from LLM")
+        if end <= start:
+            raise InvalidCompletionError("LLM returned an event that ends before it starts")
+        now = datetime.now(pytz.utc)
+        if not now - PLAUSIBLE_PAST <= start <= now + PLAUSIBLE_FUTURE:
+            raise InvalidCompletionError("LLM returned an event date too far from today")
+
+        return result
+
+    def _event_time(self, field: Dict[str, Any]) -> datetime:
+        """An event's start or end as an aware datetime, in its timeZone if it has no offset."""
+        moment = datetime.fromisoformat(field['dateTime'].replace('Z', '+00:00'))
+        if moment.tzinfo is None:
+            # pytz's UnknownTimeZoneError is a KeyError
+            moment = pytz.timezone(field.get('timeZone') or self.timezone).localize(moment)
+        return moment
     
     def _validate_response(self, response: Dict[str, Any]) -> bool:
         """Validates the LLM response has the correct structure."""
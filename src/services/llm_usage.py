@@ -0,0 +1,44 @@
+import threading
+from typing import Any, Dict
+
+class LLMUsageStats:
+    """
+    Token and latency totals for LLM calls, kept per route.
+
+    Counts come from the usage block of each OpenAI response; cached prompt
+    tokens are the part of the prompt the provider served from its prompt
+    cache.
+    """
+
+    def __init__(self):
+        self._routes = {}
+        self._lock = threading.Lock()
+
+    def record(self, route: str, usage: Any, latency: float) -> None:
+        """Adds one call's usage (an OpenAI CompletionUsage, or None) and latency in seconds."""
+        prompt_tokens = getattr(usage, 'prompt_tokens', None) or 0
+        completion_tokens = getattr(usage, 'completion_tokens', None) or 0
+        details = getattr(usage, 'prompt_tokens_details', None)
+        cached_tokens = getattr(details, 'cached_tokens', None) or 0
+
+        with self._lock:
+            totals = self._routes.setdefault(route, {
+                'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0,
+                'cached_prompt_tokens': 0, 'latency_seconds': 0.0
+            })
+            totals['calls'] += 1
+            totals['prompt_tokens'] += prompt_tokens
+            totals['completion_tokens'] += completion_tokens
+            totals['cached_prompt_tokens'] += cached_tokens
+            totals['latency_seconds'] += latency
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Returns totals and per-call averages for each route."""
+        with self._lock:
+            routes = {route: dict(totals) for route, totals in self._routes.items()}
+        for totals in routes.values():
+            calls = totals['calls']
+            totals['avg_prompt_tokens'] = totals['prompt_tokens'] / calls
+            totals['avg_completion_tokens'] = totals['completion_tokens'] / calls
+            totals['avg_latency_ms'] = totals['latency_seconds'] * 1000 / calls
+        return routes
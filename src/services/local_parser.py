@@ -0,0 +1,355 @@
+import re
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Tuple
+import pytz
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+MONTHS = ['january', 'february', 'march', 'april', 'may', 'june', 'july',
+          'august', 'september', 'october', 'november', 'december']
+
+NUMBER_WORDS = {
+    'a': 1, 'an': 1, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5,
+    'six': 6, 'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10, 'eleven': 11,
+    'twelve': 12, 'fifteen': 15, 'twenty': 20, 'thirty': 30, 'forty five': 45,
+    'forty-five': 45, 'ninety': 90,
+}
+NUMBER = r'(?:\d+(?:\.\d+)?|' + '|'.join(sorted(NUMBER_WORDS, key=len, reverse=True)) + r')'
+
+# Defaults mirror the rules in the LLM system prompt
+PART_OF_DAY_HOURS = {'morning': 9, 'evening': 18, 'tonight': 18}
+DATE_ONLY_HOUR = 10
+LONG_EVENT_KEYWORDS = ('shopping', 'groceries', 'grocery', 'errand', 'errands')
+LONG_EVENT_MINUTES = 120
+DEFAULT_MINUTES = 60
+
+# Words that mean the query is vaguer or richer than this parser understands
+VAGUE_WORDS = {
+    'sometime', 'someday', 'later', 'soon', 'maybe', 'whenever', 'asap', 'afternoon',
+    'every', 'daily', 'weekly', 'monthly', 'yearly', 'each', 'recurring', 'around',
+    'before', 'after', 'between', 'ish', 'earliest', 'free', 'available', 'night',
+    'week', 'month', 'year', 'until', 'till', 'and', 'or', 'not', 'cancel', 'delete',
+    'move', 'reschedule', 'what', 'when', 'am', 'do',
+}
+GENERIC_TITLES = {'', 'event', 'events', 'something', 'thing', 'stuff', 'reminder', 'task'}
+
+MERIDIEM = r'(?P<{0}>a\.?m\.?|p\.?m\.?)'
+CLOCK = r'(?P<{0}h>\d{{1,2}})(?::(?P<{0}m>[0-5]\d))?\s*' + MERIDIEM
+
+COMMAND_RE = re.compile(
+    r'^\s*(?:please\s+)?(?:can\s+you\s+|could\s+you\s+)?'
+    r'(?:remind\s+me\s+(?:to|about)|schedule|set\s+up|setup|create|add)\b'
+    r'\s*(?:(?:an?|my)\s+)?(?:(?:new\s+)?(?:calendar\s+)?events?\s+(?:for|to|called|named)\s+)?',
+    re.IGNORECASE)
+CALENDAR_PHRASE_RE = re.compile(r'\b(?:to|on|in|into)\s+(?:my\s+|the\s+)?calendar\b', re.IGNORECASE)
+ISO_DATE_RE = re.compile(r'\b(?:on\s+)?(?P<y>\d{4})-(?P<mo>\d{2})-(?P<d>\d{2})\b', re.IGNORECASE)
+SLASH_DATE_RE = re.compile(r'\b(?:on\s+)?(?P<mo>\d{1,2})/(?P<d>\d{1,2})(?:/(?P<y>\d{2}|\d{4}))?\b', re.IGNORECASE)
+MONTH_NAME = r'(?P<month>' + '|'.join(m[:3] + r'(?:' + m[3:] + r')?' for m in MONTHS) + r')\.?'
+MONTH_DAY_RE = re.compile(
+    r'\b(?:on\s+)?(?:(?:' + MONTH_NAME + r'\s+(?P<d1>\d{1,2})(?:st|nd|rd|th)?)|'
+    r'(?:(?:the\s+)?(?P<d2>\d{1,2})(?:st|nd|rd|th)?\s+(?:of\s+)?' + MONTH_NAME.replace('month', 'month2') + r'))'
+    r'(?:,?\s*(?P<y>\d{4}))?\b', re.IGNORECASE)
+DURATION_RES = [
+    (re.compile(r'\bfor\s+(?:an?\s+)?hour\s+and\s+a\s+half\b', re.IGNORECASE), lambda m: 90),
+    (re.compile(r'\bfor\s+half\s+an?\s+hour\b', re.IGNORECASE), lambda m: 30),
+    (re.compile(
+        r'\bfor\s+(?P<h>' + NUMBER + r')\s*(?:hours?|hrs?|h)\b'
+        r'(?:\s*(?:and\s+)?(?P<m>\d+)\s*(?:minutes?|mins?|m)\b)?', re.IGNORECASE),
+     lambda m: _number(m.group('h')) * 60 + (int(m.group('m')) if m.group('m') else 0)),
+    (re.compile(r'\bfor\s+(?P<m>' + NUMBER + r')\s*(?:minutes?|mins?|m)\b', re.IGNORECASE),
+     lambda m: _number(m.group('m'))),
+]
+TIME_RANGE_RE = re.compile(
+    r'\b(?:from\s+|between\s+)?(?P<sh>\d{1,2})(?::(?P<sm>[0-5]\d))?\s*(?P<sap>a\.?m\.?|p\.?m\.?)?\s*'
+    r'(?:-|–|to|until|till|and)\s*' + CLOCK.format('e') + r'(?!\w)', re.IGNORECASE)
+CLOCK_RE = re.compile(r'\b(?:at\s+)?' + CLOCK.format('t') + r'(?!\w)', re.IGNORECASE)
+CLOCK_24H_RE = re.compile(r'\b(?:at\s+)?(?P<th>[01]?\d|2[0-3]):(?P<tm>[0-5]\d)\b', re.IGNORECASE)
+BARE_AT_RE = re.compile(r'\bat\s+(?P<th>\d{1,2})(?::(?P<tm>[0-5]\d))?\b(?!\s*(?:/|-|\d))', re.IGNORECASE)
+NAMED_TIME_RE = re.compile(r'\b(?:at\s+)?(?P<name>noon|midday|midnight)\b', re.IGNORECASE)
+PART_OF_DAY_RE = re.compile(r'\b(?:in\s+the\s+|this\s+)?(?P<part>morning|evening|tonight)\b', re.IGNORECASE)
+RELATIVE_DAY_RE = re.compile(
+    r'\b(?:(?P<dat>(?:the\s+)?day\s+after\s+tomorrow)|(?P<today>today)|(?P<tomorrow>tomorrow)|'
+    r'in\s+(?P<n>' + NUMBER + r')\s+(?P<unit>days?|weeks?))\b', re.IGNORECASE)
+WEEKDAY_RE = re.compile(
+    r'\b(?:on\s+)?(?:(?P<mod>next|this|coming|upcoming)\s+)?'
+    r'(?P<wd>' + '|'.join(d[:3] + r'(?:' + d[3:] + r')?' for d in WEEKDAYS) + r')\b', re.IGNORECASE)
+WEEKEND_RE = re.compile(r'\b(?:on\s+|over\s+)?(?:(?P<mod>next|this|the)\s+)?weekend\b', re.IGNORECASE)
+EDGE_WORDS_RE = re.compile(
+    r'^(?:(?:at|on|for|from|in|by|to|of|the|this|next|and|with|,|-)\s+)+|'
+    r'(?:\s+(?:at|on|for|from|in|by|to|of|the|this|next|and|with|,|-))+$', re.IGNORECASE)
+
+
+def _number(text: str) -> float:
+    text = text.lower().strip()
+    if text in NUMBER_WORDS:
+        return NUMBER_WORDS[text]
+    return float(text)
+
+
+def _hour_24(hour: int, meridiem: Optional[str]) -> int:
+    """Converts a 12-hour clock reading to 24-hour."""
+    if not meridiem:
+        return hour
+    if meridiem.lower().startswith('p'):
+        return hour if hour == 12 else hour + 12
+    return 0 if hour == 12 else hour
+
+
+def clock_hour(hour: int, part_of_day: Optional[str] = None, padded: bool = False) -> Tuple[int, bool]:
+    """
+    Reads an hour written without am/pm ("at 3", "1:30") as 24-hour.
+    Returns (hour, guessed). Hours past 12, 0 and ones with a leading zero
+    ("09:30") are 24-hour already; otherwise a part of the day decides, or
+    failing that the hour is assumed to be within waking hours, and guessed
+    is True.
+    """
+    if hour > 12 or hour == 0 or padded:
+        return hour, False
+    if part_of_day in ('afternoon', 'evening', 'tonight', 'night'):
+        return _hour_24(hour, 'pm'), False
+    if part_of_day == 'morning':
+        return hour, False
+    return _hour_24(hour, 'pm' if hour < 8 or hour == 12 else 'am'), True
+
+
+class LocalQueryParser:
+    """
+    Deterministic parser for simple calendar queries such as
+    "dentist next Friday at 2pm" or "meeting tomorrow 10am for 45 minutes".
+
+    It follows the same defaulting rules as the LLM system prompt and returns
+    the same {"event": {...}} structure, together with a confidence score so
+    callers can fall back to the LLM for anything it does not understand.
+    """
+
+    def __init__(self, timezone: str = 'America/Los_Angeles'):
+        self.timezone = timezone
+        self._tz = pytz.timezone(timezone)
+
+    def parse(self, query: str, now: Optional[datetime] = None) -> Tuple[Optional[Dict[str, Any]], float]:
+        """
+        Parses a query into event data.
+
+        Returns a (result, confidence) tuple. result is None when the query
+        cannot be handled locally at all.
+        """
+        if not query or not query.strip():
+            return None, 0.0
+
+        if now is None:
+            now = datetime.now(self._tz)
+        elif now.tzinfo is None:
+            now = self._tz.localize(now)
+        else:
+            now = now.astimezone(self._tz)
+
+        text = ' ' + query.strip() + ' '
+        confidence = 1.0
+        date = None
+        start_time = None
+        end_time = None
+        part_of_day = None
+        duration = None
+
+        def consume(match) -> None:
+            nonlocal text
+            text = text[:match.start()] + ' ' + text[match.end():]
+
+        # Explicit dates
+        match = ISO_DATE_RE.search(text)
+        if match:
+            try:
+                date = datetime(int(match['y']), int(match['mo']), int(match['d'])).date()
+            except ValueError:
+                return None, 0.0
+            consume(match)
+
+        if date is None:
+            match = SLASH_DATE_RE.search(text)
+            if match:
+                year = int(match['y']) if match['y'] else now.year
+                if year < 100:
+                    year += 2000
+                try:
+                    date = datetime(year, int(match['mo']), int(match['d'])).date()
+                except ValueError:
+                    return None, 0.0
+                if not match['y'] and date < now.date():
+                    date = date.replace(year=year + 1)
+                consume(match)
+
+        if date is None:
+            match = MONTH_DAY_RE.search(text)
+            if match:
+                month_name = (match['month'] or match['month2']).lower()[:3]
+                month = [m[:3] for m in MONTHS].index(month_name) + 1
+                day = int(match['d1'] or match['d2'])
+                year = int(match['y']) if match['y'] else now.year
+                try:
+                    date = datetime(year, month, day).date()
+                except ValueError:
+                    return None, 0.0
+                if not match['y'] and date < now.date():
+                    date = date.replace(year=year + 1)
+                consume(match)
+
+        # Durations
+        for pattern, minutes in DURATION_RES:
+            match = pattern.search(text)
+            if match:
+                duration = timedelta(minutes=minutes(match))
+                consume(match)
+                break
+
+        # Times
+        match = TIME_RANGE_RE.search(text)
+        if match:
+            end_hour = _hour_24(int(match['eh']), match['e'])
+            start_meridiem = match['sap'] or match['e']
+            start_hour = _hour_24(int(match['sh']), start_meridiem)
+            if not match['sap'] and start_hour > end_hour:
+                # "11-1pm": the start belongs to the other half of the day
+                start_hour -= 12
+            start_time = (start_hour, int(match['sm'] or 0))
+            end_time = (end_hour, int(match['em'] or 0))
+            consume(match)
+
+        if start_time is None:
+            match = CLOCK_RE.search(text)
+            if match:
+                start_time = (_hour_24(int(match['th']), match['t']), int(match['tm'] or 0))
+                consume(match)
+
+        if start_time is None:
+            match = NAMED_TIME_RE.search(text)
+            if match:
+                start_time = (0, 0) if match['name'].lower() == 'midnight' else (12, 0)
+                consume(match)
+
+        match = PART_OF_DAY_RE.search(text)
+        if match:
+            part_of_day = match['part'].lower()
+            if part_of_day == 'tonight' and date is None:
+                date = now.date()
+            consume(match)
+
+        if start_time is None:
+            # "1:30" is as ambiguous as "at 1" without am/pm
+            match = CLOCK_24H_RE.search(text) or BARE_AT_RE.search(text)
+            if match:
+                hour = int(match['th'])
+                if hour > 23:
+                    return None, 0.0
+                hour, guessed = clock_hour(hour, part_of_day, padded=match['th'].startswith('0'))
+                if guessed:
+                    confidence = min(confidence, 0.85)
+                start_time = (hour, int(match['tm'] or 0))
+                consume(match)
+
+        if start_time is None and part_of_day:
+            start_time = (PART_OF_DAY_HOURS[part_of_day], 0)
+
+        # Relative dates
+        if date is None:
+            match = RELATIVE_DAY_RE.search(text)
+            if match:
+                if match['dat']:
+                    offset = timedelta(days=2)
+                elif match['today']:
+                    offset = timedelta(0)
+                elif match['tomorrow']:
+                    offset = timedelta(days=1)
+                else:
+                    amount = int(_number(match['n']))
+                    unit_days = 7 if match['unit'].lower().startswith('week') else 1
+                    offset = timedelta(days=amount * unit_days)
+                date = (now + offset).date()
+                consume(match)
+
+        if date is None:
+            match = WEEKDAY_RE.search(text)
+            if match:
+                weekday = [d[:3] for d in WEEKDAYS].index(match['wd'].lower()[:3])
+                days_ahead = (weekday - now.weekday()) % 7
+                if days_ahead == 0 and (match['mod'] or '').lower() != 'this':
+                    days_ahead = 7
+                date = (now + timedelta(days=days_ahead)).date()
+                consume(match)
+
+        if date is None:
+            match = WEEKEND_RE.search(text)
+            if match:
+                modifier = (match['mod'] or '').lower()
+                days_ahead = (5 - now.weekday()) % 7
+                if now.weekday() == 6 and modifier != 'next':
+                    days_ahead = 0
+                elif modifier == 'next' and days_ahead == 0:
+                    days_ahead = 7
+                date = (now + timedelta(days=days_ahead)).date()
+                consume(match)
+
+        # Title
+        summary = CALENDAR_PHRASE_RE.sub(' ', COMMAND_RE.sub('', text))
+        summary = re.sub(r'\s+', ' ', summary).strip(' ,.!?')
+        previous = None
+        while previous != summary:
+            previous = summary
+            summary = EDGE_WORDS_RE.sub('', summary).strip(' ,.!?')
+        summary = re.sub(r'^(?:an?|my|the)\s+', '', summary, flags=re.IGNORECASE)
+
+        if summary.lower() in GENERIC_TITLES:
+            return None, 0.0
+
+        words = re.findall(r"[\w']+", summary.lower())
+        if any(word in VAGUE_WORDS for word in words):
+            confidence = min(confidence, 0.3)
+        if re.search(r'\d', summary):
+            # Digits left in the title are probably a date or time we missed
+            confidence = min(confidence, 0.5)
+        if len(words) > 8:
+            confidence = min(confidence, 0.6)
+
+        if date is None and start_time is None:
+            # "Next available time slot" needs calendar knowledge; leave it to the LLM
+            return None, 0.3
+
+        if date is None:
+            date = now.date()
+            if start_time < (now.hour, now.minute):
+                date += timedelta(days=1)
+            confidence = min(confidence, 0.9)
+        if start_time is None:
+            start_time = (DATE_ONLY_HOUR, 0)
+
+        start = self._tz.localize(datetime(date.year, date.month, date.day, *start_time))
+        if start < now:
+            confidence = min(confidence, 0.5)
+        if end_time is not None:
+            end = self._tz.localize(datetime(date.year, date.month, date.day, *end_time))
+            if end <= start:
+                end += timedelta(days=1)
+                confidence = min(confidence, 0.5)
+        else:
+            if duration is None:
+                lowered = summary.lower()
+                minutes = LONG_EVENT_MINUTES if any(k in lowered for k in LONG_EVENT_KEYWORDS) else DEFAULT_MINUTES
+                duration = timedelta(minutes=minutes)
+            if duration <= timedelta(0):
+                return None, 0.0
+            end = self._tz.normalize(start + duration)
+
+        summary = summary[0].upper() + summary[1:]
+        return {
+            'timeSpecified': True,
+            'event': {
+                'summary': summary,
+                'description': query.strip(),
+                'start': {
+                    'dateTime': start.isoformat(),
+                    'timeZone': self.timezone
+                },
+                'end': {
+                    'dateTime': end.isoformat(),
+                    'timeZone': self.timezone
+                }
+            }
+        }, confidence
@@ -0,0 +1,149 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Tuple
+
+# Upper bounds in seconds, from a fast cache hit to a slow LLM call
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PREFIX = 'calendar_assistant'
+
+class Histogram:
+    """Fixed-bucket latency histogram; not thread-safe on its own."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        # The last slot counts observations above every bucket (le="+Inf")
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> Iterator[Tuple[str, int]]:
+        """Yields (le, count) pairs the way Prometheus expects them."""
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield repr(bound), total
+        yield '+Inf', self.count
+
+class MetricsRegistry:
+    """
+    Per-stage latency histograms, error counters by exception type and
+    per-route request histograms, rendered in the Prometheus text format.
+
+    Recording is a perf_counter call, a lock and a bisect, so it is cheap
+    enough to leave on.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Histogram] = {}
+        self._errors: Dict[Tuple[str, str], int] = {}
+        self._requests: Dict[Tuple[str, str], Histogram] = {}
+        self._gauges: Dict[str, Tuple[str, Callable[[], List[Tuple[Dict[str, str], float]]]]] = {}
+
+    def observe(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            histogram = self._stages.get(stage)
+            if histogram is None:
+                histogram = self._stages[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def count_error(self, stage: str, error: BaseException) -> None:
+        key = (stage, type(error).__name__)
+        with self._lock:
+            self._errors[key] = self._errors.get(key, 0) + 1
+
+    @contextmanager
+    def time(self, stage: str):
+        """Times the block as stage and counts any exception it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.count_error(stage, e)
+            raise
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def observe_request(self, route: str, status: int, seconds: float) -> None:
+        key = (route, str(status))
+        with self._lock:
+            histogram = self._requests.get(key)
+            if histogram is None:
+                histogram = self._requests[key] = Histogram()
+            histogram.observe(seconds)
+
+    def register_gauge(self, name: str, help_text: str,
+                       collect: Callable[[], List[Tuple[Dict[str, str], float]]]) -> None:
+        """Adds a gauge whose (labels, value) samples are read from collect() at render time."""
+        with self._lock:
+            self._gauges[name] = (help_text, collect)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stages.clear()
+            self._errors.clear()
+            self._requests.clear()
+
+    def render(self) -> str:
+        """Returns every metric in the Prometheus text exposition format."""
+        with self._lock:
+            stages = {stage: self._copy(h) for stage, h in self._stages.items()}
+            errors = dict(self._errors)
+            requests = {key: self._copy(h) for key, h in self._requests.items()}
+
+        lines = [
+            f'# HELP {PREFIX}_stage_duration_seconds Time spent in each processing stage.',
+            f'# TYPE {PREFIX}_stage_duration_seconds histogram',
+        ]
+        for stage, histogram in sorted(stages.items()):
+            lines.extend(self._histogram_lines(f'{PREFIX}_stage_duration_seconds', {'stage': stage}, histogram))
+
+        lines.append(f'# HELP {PREFIX}_errors_total Exceptions raised in each stage, by type.')
+        lines.append(f'# TYPE {PREFIX}_errors_total counter')
+        for (stage, error_type), count in sorted(errors.items()):
+            lines.append(f'{PREFIX}_errors_total{self._labels({"stage": stage, "type": error_type})} {count}')
+
+        lines.append(f'# HELP {PREFIX}_request_duration_seconds HTTP request time by route and status.')
+        lines.append(f'# TYPE {PREFIX}_request_duration_seconds histogram')
+        for (route, status), histogram in sorted(requests.items()):
+            lines.extend(self._histogram_lines(f'{PREFIX}_request_duration_seconds',
+                                               {'route': route, 'status': status}, histogram))
+
+        with self._lock:
+            gauges = dict(self._gauges)
+        for name, (help_text, collect) in sorted(gauges.items()):
+            lines.append(f'# HELP {PREFIX}_{name} {help_text}')
+            lines.append(f'# TYPE {PREFIX}_{name} gauge')
+            for labels, value in collect():
+                lines.append(f'{PREFIX}_{name}{self._labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def _copy(self, histogram: Histogram) -> Histogram:
+        copied = Histogram(histogram.buckets)
+        copied.counts = list(histogram.counts)
+        copied.sum = histogram.sum
+        copied.count = histogram.count
+        return copied
+
+    def _histogram_lines(self, name: str, labels: Dict[str, str], histogram: Histogram):
+        for le, count in histogram.cumulative():
+            yield f'{name}_bucket{self._labels(dict(labels, le=le))} {count}'
+        yield f'{name}_sum{self._labels(labels)} {histogram.sum}'
+        yield f'{name}_count{self._labels(labels)} {histogram.count}'
+
+    def _labels(self, labels: Dict[str, str]) -> str:
+        pairs = []
+        for key, value in labels.items():
+            value = value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+            pairs.append(f'{key}="{value}"')
+        return '{' + ','.join(pairs) + '}'
+
+# Shared by the services and the /health/metrics endpoint
+metrics = MetricsRegistry()
@@ -0,0 +1,88 @@
+import os
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+# Recent call latencies kept per tier for the p95
+LATENCY_WINDOW = 1000
+OUTCOMES = ('valid', 'invalid', 'error', 'abandoned')
+
+class InvalidCompletionError(ValueError):
+    """
+    Raised for an LLM reply that isn't a usable answer: malformed JSON, a
+    missing field, or an event ending before it starts or far from now.
+    A cascade escalates these to the next model, unlike the model's own
+    error replies for queries it can't parse.
+    """
+
+class ModelCascade:
+    """
+    The models to parse queries with, cheapest first, and how each tier is
+    doing.
+
+    A query goes to the first model; only a reply that fails validation is
+    escalated to the next. With hedge_after set, the next model is also
+    started when a tier hasn't answered within that many seconds, and the
+    first valid answer wins. Configured from LLM_MODELS (comma-separated)
+    and LLM_HEDGE_MS.
+    """
+
+    def __init__(self, models: Optional[List[str]] = None, hedge_after: Optional[float] = None):
+        if models is None:
+            models = [model.strip() for model in os.getenv('LLM_MODELS', 'gpt-3.5-turbo').split(',') if model.strip()]
+        if not models:
+            raise ValueError("At least one model is needed")
+        if hedge_after is None and os.getenv('LLM_HEDGE_MS'):
+            hedge_after = float(os.getenv('LLM_HEDGE_MS')) / 1000
+        self.models = models
+        self.hedge_after = hedge_after if hedge_after and len(models) > 1 else None
+        self._lock = threading.Lock()
+        self._tiers = {model: dict({outcome: 0 for outcome in OUTCOMES}, calls=0, used=0, hedged=0,
+                                   latency_seconds=0.0)
+                       for model in models}
+        self._latencies = {model: deque(maxlen=LATENCY_WINDOW) for model in models}
+
+    def record(self, model: str, outcome: str, latency: Optional[float] = None) -> None:
+        """
+        Records one call to model: valid (including the model's own error
+        replies), invalid (escalated), error (the call failed) or abandoned
+        (a hedge that lost or was cancelled).
+        """
+        with self._lock:
+            tier = self._tiers[model]
+            tier['calls'] += 1
+            tier[outcome] += 1
+            if latency is not None and outcome != 'abandoned':
+                tier['latency_seconds'] += latency
+                self._latencies[model].append(latency)
+
+    def record_used(self, model: str) -> None:
+        """Records that model's answer was the one returned."""
+        with self._lock:
+            self._tiers[model]['used'] += 1
+
+    def record_hedge(self, model: str) -> None:
+        """Records that model was started before the tier below had answered."""
+        with self._lock:
+            self._tiers[model]['hedged'] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Per tier: calls by outcome, how many answers were used, the share of
+        replies that passed validation, and average and p95 latency.
+        """
+        with self._lock:
+            tiers = {model: dict(tier) for model, tier in self._tiers.items()}
+            latencies = {model: sorted(values) for model, values in self._latencies.items()}
+        for model, tier in tiers.items():
+            replies = tier['valid'] + tier['invalid']
+            tier['hit_rate'] = tier['valid'] / replies if replies else 0.0
+            timed = tier['valid'] + tier['invalid'] + tier['error']
+            tier['avg_latency_ms'] = tier.pop('latency_seconds') * 1000 / timed if timed else 0.0
+            values = latencies[model]
+            tier['p95_latency_ms'] = values[min(len(values) - 1, int(len(values) * 0.95))] * 1000 if values else 0.0
+        return {
+            'models': self.models,
+            'hedge_after_ms': self.hedge_after * 1000 if self.hedge_after is not None else None,
+            'tiers': tiers,
+        }
@@ -1,11 +1,75 @@
-from datetime import datetime
-from typing import Dict, Any, Optional
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+import pytz
+from .intent_router import INTENTS, IntentRouter
 from .llm_service import LLMService
 
+# Most events a list answer includes
+MAX_LISTED_EVENTS = 50
+
 class NLPService:
-    def __init__(self, timezone: str = 'America/Los_Angeles'):
+    """
+    Answers natural language queries by intent.
+
+    An IntentRouter classifies each query locally. Questions about the
+    calendar ("what do I have tomorrow?", "am I free Friday afternoon?") are
+    answered from the calendar service's data without calling the LLM; only
+    queries that create events are left to the LLM service.
+    """
+
+    def __init__(self, timezone: str = 'America/Los_Angeles', llm: Optional[LLMService] = None,
+                 router: Optional[IntentRouter] = None):
         self.timezone = timezone
-        self.llm = LLMService()
+        self._tz = pytz.timezone(timezone)
+        self._llm = llm
+        self.router = router or IntentRouter(timezone=timezone)
+        self._stats_lock = threading.Lock()
+        self._stats = {intent: 0 for intent in INTENTS}
+
+    @property
+    def llm(self) -> LLMService:
+        """The LLM service, created on first use so read queries never need it."""
+        if self._llm is None:
+            self._llm = LLMService(timezone=self.timezone)
+        return self._llm
+
+    def answer_query(self, query: str, calendar_service, now: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+        """
+        Answers a list or availability query from calendar data.
+
+        Returns None for queries that create an event, which the caller
+        handles as before. Raises ValueError for empty queries.
+        """
+        if not isinstance(query, str) or not query.strip():
+            raise ValueError("Query cannot be empty")
+        intent = self.router.classify(query)
+        with self._stats_lock:
+            self._stats[intent] += 1
+        if intent == 'create':
+            return None
+
+        start, end = self.router.time_range(query, now)
+        events = calendar_service.list_events(time_min=start, time_max=end, limit=MAX_LISTED_EVENTS)
+        result = {
+            'intent': intent,
+            'timeMin': start.isoformat(),
+            'timeMax': end.isoformat(),
+        }
+        if intent == 'list':
+            result.update(events=events, answer=self._describe_events(events, start, end))
+            return result
+
+        busy = calendar_service.availability.find_conflicts(start, end)
+        blocking = [e for e in events if 'dateTime' in e['start'] and e.get('transparency') != 'transparent']
+        result.update(free=not busy, busy=busy, events=blocking,
+                      answer=self._describe_availability(busy, blocking, start, end))
+        return result
+
+    def get_stats(self) -> Dict[str, Dict[str, int]]:
+        """How many queries the router sent each way."""
+        with self._stats_lock:
+            return {'intents': dict(self._stats)}
 
     def parse_event_creation(self, query: str) -> Dict[str, Any]:
         """
@@ -20,12 +84,66 @@ class NLPService:
         """Validates the parsed event structure."""
         if not event or 'event' not in event:
             return "Invalid event structure"
-            
+
         event_data = event['event']
         required_fields = ['summary', 'start', 'end']
-        
+
         for field in required_fields:
             if field not in event_data:
                 return f"Missing required field: {field}"
-                
-        return None 
\ No newline at end of file
+
+        return None
+
+    def _describe_events(self, events: List[Dict[str, Any]], start: datetime, end: datetime) -> str:
+        if not events:
+            return f"You have nothing scheduled {self._describe_range(start, end)}."
+        multi_day = self._spans_days(start, end)
+        items = ', '.join(self._describe_event(event, multi_day) for event in events)
+        plural = 'event' if len(events) == 1 else 'events'
+        more = ' (showing the first ones)' if len(events) == MAX_LISTED_EVENTS else ''
+        return f"You have {len(events)} {plural} {self._describe_range(start, end)}{more}: {items}."
+
+    def _describe_availability(self, busy: List[Dict[str, str]], events: List[Dict[str, Any]],
+                               start: datetime, end: datetime) -> str:
+        when = self._describe_range(start, end)
+        if not busy:
+            return f"You're free {when}."
+        if events:
+            return f"You're busy {when}: " + ', '.join(self._describe_event(e, False) for e in events) + '.'
+        periods = ', '.join(
+            f"{self._clock(self._parse(b['start']))} to {self._clock(self._parse(b['end']))}" for b in busy
+        )
+        return f"You're busy {when}: {periods}."
+
+    def _describe_event(self, event: Dict[str, Any], with_day: bool) -> str:
+        summary = event.get('summary', '(no title)')
+        if 'date' in event['start']:
+            day = datetime.strptime(event['start']['date'], '%Y-%m-%d')
+            return f"{summary} on {self._day(day)} (all day)" if with_day else f"{summary} (all day)"
+        start = self._parse(event['start']['dateTime'])
+        return f"{summary} on {self._day(start)} at {self._clock(start)}" if with_day else \
+            f"{summary} at {self._clock(start)}"
+
+    def _describe_range(self, start: datetime, end: datetime) -> str:
+        start, end = start.astimezone(self._tz), end.astimezone(self._tz)
+        whole_days = start.time() == datetime.min.time() and end.time() == datetime.min.time()
+        if not self._spans_days(start, end):
+            if whole_days:
+                return f"on {self._day(start)}"
+            return f"on {self._day(start)} from {self._clock(start)} to {self._clock(end)}"
+        if whole_days:
+            return f"from {self._day(start)} to {self._day(end - timedelta(days=1))}"
+        return f"from {self._day(start)} {self._clock(start)} to {self._day(end)} {self._clock(end)}"
+
+    def _spans_days(self, start: datetime, end: datetime) -> bool:
+        last = end.astimezone(self._tz) - timedelta(microseconds=1)
+        return start.astimezone(self._tz).date() != last.date()
+
+    def _parse(self, value: str) -> datetime:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).astimezone(self._tz)
+
+    def _day(self, moment: datetime) -> str:
+        return moment.strftime('%a %b ') + str(moment.day)
+
+    def _clock(self, moment: datetime) -> str:
+        return moment.strftime('%I:%M %p').lstrip('0')
@@ -0,0 +1,117 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+class _Flight:
+    """An in-progress computation that concurrent callers can wait on."""
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+class ParseCache:
+    """
+    Bounded LRU cache with a TTL for parsed queries.
+
+    Concurrent misses for the same key are coalesced: the first caller
+    computes the value and the others wait for its result instead of issuing
+    their own upstream call.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 600.0, clock: Callable[[], float] = time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'evictions': 0, 'expirations': 0}
+
+    def get(self, key: Hashable) -> Any:
+        """Returns a copy of the cached value, or None if missing or expired."""
+        with self._lock:
+            value = self._lookup(key)
+            if value is None:
+                self._stats['misses'] += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Stores a value, evicting the least recently used entries if full."""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (self._clock() + self.ttl, copy.deepcopy(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    async def aget(self, key: Hashable) -> Any:
+        """Async version of get; the cache is in memory, so it runs on the event loop."""
+        return self.get(key)
+
+    async def aset(self, key: Hashable, value: Any) -> None:
+        """Async version of set."""
+        self.set(key, value)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """Returns the cached value for key, computing it at most once across threads."""
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                return value
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._in_flight[key] = flight
+                self._stats['misses'] += 1
+            else:
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return copy.deepcopy(flight.value)
+
+        try:
+            flight.value = compute()
+            self.set(key, flight.value)
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            flight.done.set()
+        return copy.deepcopy(flight.value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Returns hit/miss/eviction counters and the current size."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses'] + stats['coalesced']
+        stats['hit_rate'] = (stats['hits'] + stats['coalesced']) / lookups if lookups else 0.0
+        return stats
+
+    def _lookup(self, key: Hashable) -> Any:
+        """Looks up key; the caller must hold the lock."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._entries[key]
+            self._stats['expirations'] += 1
+            return None
+        self._entries.move_to_end(key)
+        self._stats['hits'] += 1
+        return copy.deepcopy(value)
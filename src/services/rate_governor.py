@@ -0,0 +1,498 @@
+import asyncio
+import math
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Callable, Dict, Optional, Tuple
+from . import deadline as request_deadline
+from .metrics import metrics
+
+# OpenAI enforces per-minute limits over shorter windows, so its buckets only hold this many seconds' worth
+OPENAI_BURST_SECONDS = 6.0
+# How long async callers sleep between checks while every slot is taken
+ASYNC_POLL_SECONDS = 0.05
+# Least time a call needs left before a request deadline to be worth starting
+MIN_CALL_SECONDS = 0.1
+BREAKER_STATES = ('closed', 'half_open', 'open')
+
+class UpstreamUnavailableError(Exception):
+    """
+    Raised when an upstream API is rate limiting us, or a request would have
+    to wait longer than allowed for quota or a free slot. Maps to 503.
+    """
+    status_code = 503
+
+    def __init__(self, upstream: str, retry_after: float, reason: str):
+        super().__init__(f"Upstream '{upstream}' is {reason}, retry in {max(1, math.ceil(retry_after))}s")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+class DeadlineExceededError(UpstreamUnavailableError):
+    """
+    Raised instead of calling an upstream when the request's deadline
+    leaves too little time for the call to finish. Maps to 503 like the
+    other upstream errors.
+    """
+
+    def __init__(self, upstream: str, remaining: float):
+        super().__init__(upstream, 1.0, 'too slow for the time left in this request')
+        self.remaining = remaining
+
+def error_status(error: BaseException) -> Optional[int]:
+    """The HTTP status of an OpenAI or googleapiclient error, if it has one."""
+    status = getattr(getattr(error, 'resp', None), 'status', None) or getattr(error, 'status_code', None)
+    return int(status) if status is not None else None
+
+def is_rate_limited(error: BaseException) -> bool:
+    """True for 429s and for Google's 403 rateLimitExceeded/userRateLimitExceeded."""
+    status = error_status(error)
+    return status == 429 or (status == 403 and 'ratelimitexceeded' in str(error).lower())
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Seconds to wait before retrying, from the error or its Retry-After header, if known."""
+    value = getattr(error, 'retry_after', None)
+    if value is None:
+        # openai errors keep the httpx response; googleapiclient's HttpError keeps an httplib2 one in .resp
+        headers = getattr(getattr(error, 'response', None), 'headers', None) or getattr(error, 'resp', None)
+        value = headers.get('retry-after') if hasattr(headers, 'get') else None
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """
+    True for server errors, timeouts and network failures, including as the
+    cause of a wrapping exception: the errors that say an upstream is down
+    rather than that the request was wrong or rate limited.
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        status = error_status(error)
+        if status is not None:
+            return status >= 500
+        if isinstance(error, OSError) or type(error).__name__ in ('APIConnectionError', 'APITimeoutError'):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+class CircuitBreaker:
+    """
+    Fails calls fast while an upstream is down.
+
+    After failure_threshold consecutive failed calls the breaker opens and
+    calls are refused with UpstreamUnavailableError without reaching the
+    upstream. Once reset_timeout has passed it half-opens and lets one
+    probe call through at a time: a success closes it again, a failure
+    reopens it for another reset_timeout.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._state = 'closed'
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self._stats = {'opened': 0, 'rejected': 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state(self._clock())
+
+    def allow(self) -> bool:
+        """
+        Raises UpstreamUnavailableError unless a call may go ahead. Returns
+        True if the call is the half-open probe, which must be followed by
+        record().
+        """
+        with self._lock:
+            now = self._clock()
+            state = self._current_state(now)
+            if state == 'closed':
+                return False
+            if state == 'half_open' and not self._probing:
+                self._probing = True
+                return True
+            self._stats['rejected'] += 1
+            retry = self._opened_at + self.reset_timeout - now if state == 'open' else 1.0
+        raise UpstreamUnavailableError(self.name, retry, 'failing (circuit open)')
+
+    def record(self, failed: Optional[bool], probe: bool = False) -> None:
+        """
+        Records how a call went: failed is None when the call says nothing
+        about the upstream's health, e.g. it was rate limited or never made.
+        """
+        with self._lock:
+            if probe:
+                self._probing = False
+            if failed is None:
+                return
+            if not failed:
+                self._failures = 0
+                self._state = 'closed'
+                return
+            self._failures += 1
+            state = self._current_state(self._clock())
+            if state == 'half_open' or (state == 'closed' and self._failures >= self.failure_threshold):
+                self._state = 'open'
+                self._opened_at = self._clock()
+                self._stats['opened'] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = self._clock()
+            stats = dict(self._stats)
+            stats.update(state=self._current_state(now), consecutive_failures=self._failures)
+            stats['retry_in_seconds'] = max(0.0, self._opened_at + self.reset_timeout - now) \
+                if stats['state'] == 'open' else 0.0
+        return stats
+
+    def _current_state(self, now: float) -> str:
+        """The state, half-opening an open breaker whose timeout has passed; the caller must hold the lock."""
+        if self._state == 'open' and now - self._opened_at >= self.reset_timeout:
+            self._state = 'half_open'
+        return self._state
+
+class TokenBucket:
+    """Refills at rate tokens per second up to capacity; not thread-safe on its own."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def wait_time(self, cost: float, now: float) -> float:
+        """Seconds until cost tokens are available (costs above capacity wait for a full bucket)."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        missing = min(cost, self.capacity) - self.tokens
+        return missing / self.rate if missing > 0 else 0.0
+
+    def take(self, cost: float) -> None:
+        self.tokens -= min(cost, self.capacity)
+
+class RateGovernor:
+    """
+    Client-side quota and concurrency control for one upstream API.
+
+    Each call takes tokens from every bucket in limits (e.g. requests and
+    LLM tokens per second) and, with a key, from that key's own buckets in
+    per_key_limits (e.g. a per-user quota), plus one concurrency slot.
+    Callers wait up to max_wait for these; if that isn't enough the call is
+    shed with UpstreamUnavailableError instead of adding to the overload.
+
+    A 429 from the upstream pauses every caller until its Retry-After has
+    passed and halves the concurrency limit. Otherwise the limit grows by
+    about one per round of calls while latency stays near the fastest
+    observed, and shrinks by 10% per call when latency passes
+    latency_tolerance times that.
+
+    Under a request deadline (see deadline.py) callers only wait as long as
+    still leaves time for the call, and a call that can't finish in the
+    time left, judging by the fastest observed latency, fails at once with
+    DeadlineExceededError. With a breaker, calls fail fast while the
+    upstream keeps failing.
+    """
+
+    def __init__(self, name: str, limits: Dict[str, Tuple[float, float]],
+                 per_key_limits: Optional[Dict[str, Tuple[float, float]]] = None,
+                 max_wait: float = 2.0, max_concurrency: int = 32, min_concurrency: int = 1,
+                 latency_tolerance: float = 2.0, default_retry_after: float = 1.0,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.name = name
+        self.breaker = breaker
+        self.limits = limits
+        self.per_key_limits = per_key_limits or {}
+        self.max_wait = max_wait
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.latency_tolerance = latency_tolerance
+        self.default_retry_after = default_retry_after
+        self._buckets = {bucket: TokenBucket(*limit) for bucket, limit in limits.items()}
+        self._key_buckets: Dict[Any, Dict[str, TokenBucket]] = {}
+        self._limit = float(max_concurrency)
+        self._baseline = None
+        self._in_flight = 0
+        self._waiting = 0
+        self._blocked_until = 0.0
+        self._cond = threading.Condition()
+        self._stats = {'admitted': 0, 'shed': 0, 'rate_limited': 0, 'deadline_exceeded': 0, 'wait_seconds': 0.0,
+                       'max_wait_seconds': 0.0}
+
+    @contextmanager
+    def slot(self, cost: Optional[Dict[str, float]] = None, key: Any = None, max_wait: Optional[float] = None):
+        """
+        Holds quota and a concurrency slot for one upstream call; blocks for
+        at most max_wait (by default the governor's), e.g. longer for bulk work.
+        """
+        started = time.monotonic()
+        deadline = started + self._wait_budget(max_wait)
+        probe = self.breaker.allow() if self.breaker is not None else False
+        with self._cond:
+            self._waiting += 1
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = self._try_admit(cost, key, now, deadline)
+                    if wait is None:
+                        break
+                    self._cond.wait(wait)
+            except BaseException:
+                if probe:
+                    self.breaker.record(None, probe)
+                raise
+            finally:
+                self._waiting -= 1
+        self._admitted(time.monotonic() - started)
+        with self._track(probe):
+            yield
+
+    @asynccontextmanager
+    async def aslot(self, cost: Optional[Dict[str, float]] = None, key: Any = None, max_wait: Optional[float] = None):
+        """Async version of slot; waits on the event loop instead of blocking a thread."""
+        started = time.monotonic()
+        deadline = started + self._wait_budget(max_wait)
+        probe = self.breaker.allow() if self.breaker is not None else False
+        with self._cond:
+            self._waiting += 1
+        try:
+            while True:
+                with self._cond:
+                    wait = self._try_admit(cost, key, time.monotonic(), deadline)
+                if wait is None:
+                    break
+                await asyncio.sleep(min(wait, ASYNC_POLL_SECONDS))
+        except BaseException:
+            if probe:
+                self.breaker.record(None, probe)
+            raise
+        finally:
+            with self._cond:
+                self._waiting -= 1
+        self._admitted(time.monotonic() - started)
+        with self._track(probe):
+            yield
+
+    def penalize(self, seconds: float) -> None:
+        """Stops admitting calls for seconds, e.g. after a 429, and halves the concurrency limit."""
+        with self._cond:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            self._limit = max(float(self.min_concurrency), self._limit / 2)
+            self._stats['rate_limited'] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                'concurrency_limit': int(self._limit),
+                'in_flight': self._in_flight,
+                'queue_depth': self._waiting,
+                'blocked_for_seconds': max(0.0, self._blocked_until - time.monotonic()),
+                'baseline_latency_ms': self._baseline * 1000 if self._baseline is not None else None,
+            })
+        wait_seconds = stats.pop('wait_seconds')
+        stats['avg_wait_ms'] = wait_seconds / stats['admitted'] * 1000 if stats['admitted'] else 0.0
+        stats['max_wait_ms'] = stats.pop('max_wait_seconds') * 1000
+        if self.breaker is not None:
+            stats['breaker'] = self.breaker.get_stats()
+        return stats
+
+    def _wait_budget(self, max_wait: Optional[float]) -> float:
+        """
+        How long the call may wait for admission: max_wait, cut short to leave
+        time for the call itself under a request deadline. Raises
+        DeadlineExceededError if there isn't enough time left for the call.
+        """
+        budget = self.max_wait if max_wait is None else max_wait
+        left = request_deadline.remaining()
+        if left is None:
+            return budget
+        with self._cond:
+            needed = max(MIN_CALL_SECONDS, self._baseline or 0.0)
+            if left < needed:
+                self._stats['deadline_exceeded'] += 1
+                error = DeadlineExceededError(self.name, left)
+                metrics.count_error(f'{self.name}_queue_wait', error)
+                raise error
+        return min(budget, left - needed)
+
+    def _try_admit(self, cost, key, now, deadline) -> Optional[float]:
+        """
+        Admits the call if quota and a slot are free (returns None), else
+        returns how long to wait before checking again. Sheds the call if
+        the wait can't finish before deadline. The caller must hold the lock.
+        """
+        remaining = deadline - now
+        if self._blocked_until > now:
+            wait = self._blocked_until - now
+            reason = 'rate limited'
+        elif self._in_flight >= max(self.min_concurrency, int(self._limit)):
+            # Slots free up when calls finish, which can't be predicted
+            wait = min(remaining, 0.1) if remaining > 0 else float('inf')
+            reason = 'at capacity'
+        else:
+            buckets = self._buckets_for(key)
+            cost = cost or {}
+            wait = max((bucket.wait_time(cost.get(name, 1.0), now) for name, bucket in buckets), default=0.0)
+            reason = 'over quota'
+            if wait == 0.0:
+                for name, bucket in buckets:
+                    bucket.take(cost.get(name, 1.0))
+                self._in_flight += 1
+                return None
+
+        if wait > remaining:
+            self._stats['shed'] += 1
+            retry = max(wait if wait != float('inf') else 0.0, self.default_retry_after)
+            error = UpstreamUnavailableError(self.name, retry, reason)
+            metrics.count_error(f'{self.name}_queue_wait', error)
+            raise error
+        return wait
+
+    def _buckets_for(self, key):
+        buckets = list(self._buckets.items())
+        if key is not None and self.per_key_limits:
+            key_buckets = self._key_buckets.get(key)
+            if key_buckets is None:
+                key_buckets = self._key_buckets[key] = {
+                    name: TokenBucket(*limit) for name, limit in self.per_key_limits.items()
+                }
+            buckets.extend(key_buckets.items())
+        return buckets
+
+    def _admitted(self, waited: float) -> None:
+        metrics.observe(f'{self.name}_queue_wait', waited)
+        with self._cond:
+            self._stats['admitted'] += 1
+            self._stats['wait_seconds'] += waited
+            self._stats['max_wait_seconds'] = max(self._stats['max_wait_seconds'], waited)
+
+    @contextmanager
+    def _track(self, probe: bool = False):
+        """
+        Releases the slot after the call and adapts the concurrency limit and
+        the breaker to how it went.
+        """
+        started = time.monotonic()
+        latency = None
+        failed = None
+        try:
+            yield
+            latency = time.monotonic() - started
+            failed = False
+        except Exception as e:
+            if is_rate_limited(e):
+                wait = retry_after(e) or self.default_retry_after
+                self.penalize(wait)
+                raise UpstreamUnavailableError(self.name, wait, 'rate limited') from e
+            left = request_deadline.remaining()
+            if left is None or left > 0:
+                failed = is_upstream_failure(e)
+            elif is_upstream_failure(e):
+                # Cut short by the request's own deadline, which says nothing about the upstream
+                raise DeadlineExceededError(self.name, left) from e
+            raise
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                if latency is not None:
+                    self._adapt(latency)
+                self._cond.notify()
+            if self.breaker is not None:
+                self.breaker.record(failed, probe)
+
+    def _adapt(self, latency: float) -> None:
+        """AIMD on latency against a slowly rising minimum; the caller must hold the lock."""
+        if self._baseline is None or latency < self._baseline:
+            self._baseline = latency
+        else:
+            # Drift up so one unusually fast call doesn't set the bar forever
+            self._baseline += (latency - self._baseline) * 0.01
+        if latency > self._baseline * self.latency_tolerance:
+            self._limit = max(float(self.min_concurrency), self._limit * 0.9)
+        else:
+            self._limit = min(float(self.max_concurrency), self._limit + 1 / self._limit)
+
+def _per_minute(limit: float, burst_seconds: float = 60.0) -> Tuple[float, float]:
+    """(rate, capacity) for a per-minute quota, allowing bursts of up to burst_seconds' worth."""
+    return limit / 60, max(1.0, limit / 60 * burst_seconds)
+
+def _breaker(name: str) -> CircuitBreaker:
+    return CircuitBreaker(name, failure_threshold=int(os.getenv('BREAKER_FAILURE_THRESHOLD', '5')),
+                          reset_timeout=float(os.getenv('BREAKER_RESET_SECONDS', '30')))
+
+class UpstreamGovernors:
+    """The process-wide governors for OpenAI and the Calendar API, configured from the environment on first use."""
+
+    def __init__(self):
+        self._openai = None
+        self._calendar = None
+        self._lock = threading.Lock()
+        metrics.register_gauge('upstream_queue_depth', 'Upstream calls waiting for quota or a free slot.',
+                               lambda: self._samples('queue_depth'))
+        metrics.register_gauge('upstream_in_flight', 'Upstream calls in progress.',
+                               lambda: self._samples('in_flight'))
+        metrics.register_gauge('upstream_concurrency_limit', 'Current adaptive concurrency limit per upstream.',
+                               lambda: self._samples('concurrency_limit'))
+        metrics.register_gauge('upstream_circuit_state', 'Circuit breaker state per upstream: 0 closed, 1 half-open, '
+                               '2 open.', self._breaker_samples)
+
+    @property
+    def openai(self) -> RateGovernor:
+        if self._openai is None:
+            with self._lock:
+                if self._openai is None:
+                    self._openai = RateGovernor(
+                        'openai',
+                        limits={
+                            'requests': _per_minute(float(os.getenv('OPENAI_RPM', '500')), OPENAI_BURST_SECONDS),
+                            'tokens': _per_minute(float(os.getenv('OPENAI_TPM', '200000')), OPENAI_BURST_SECONDS),
+                        },
+                        max_wait=float(os.getenv('UPSTREAM_MAX_WAIT_SECONDS', '2')),
+                        max_concurrency=int(os.getenv('OPENAI_MAX_CONCURRENCY', '32')),
+                        breaker=_breaker('openai')
+                    )
+        return self._openai
+
+    @property
+    def calendar(self) -> RateGovernor:
+        if self._calendar is None:
+            with self._lock:
+                if self._calendar is None:
+                    self._calendar = RateGovernor(
+                        'calendar',
+                        # Google's Calendar quotas are per minute, per project and per user
+                        limits={'requests': _per_minute(float(os.getenv('CALENDAR_QPM', '10000')))},
+                        per_key_limits={'requests': _per_minute(float(os.getenv('CALENDAR_USER_QPM', '600')))},
+                        max_wait=float(os.getenv('UPSTREAM_MAX_WAIT_SECONDS', '2')),
+                        max_concurrency=int(os.getenv('CALENDAR_MAX_CONCURRENCY', '32')),
+                        breaker=_breaker('calendar')
+                    )
+        return self._calendar
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        return {'openai': self.openai.get_stats(), 'calendar': self.calendar.get_stats()}
+
+    def breaker_stats(self) -> Dict[str, Dict[str, Any]]:
+        return {governor.name: governor.breaker.get_stats() for governor in (self.openai, self.calendar)}
+
+    def _samples(self, field: str):
+        # Governors that haven't been used yet have nothing to report
+        built = [governor for governor in (self._openai, self._calendar) if governor is not None]
+        return [({'upstream': governor.name}, governor.get_stats()[field]) for governor in built]
+
+    def _breaker_samples(self):
+        built = [governor for governor in (self._openai, self._calendar) if governor is not None]
+        return [({'upstream': governor.name}, BREAKER_STATES.index(governor.breaker.state)) for governor in built]
+
+# Shared by every LLMService and CalendarService in the process
+governors = UpstreamGovernors()
@@ -0,0 +1,172 @@
+"""Local expansion of recurring events: RRULE, EXRULE, RDATE and EXDATE, plus changed occurrences."""
+from datetime import date, datetime
+import re
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Iterator, Optional, Tuple, Union
+import pytz
+
+if TYPE_CHECKING:
+    from dateutil.rrule import rruleset
+
+# An occurrence is identified by its original start: a timestamp, or a date for all-day events
+OccurrenceKey = Union[int, str]
+
+UNTIL = re.compile(r'UNTIL=([0-9TZ]+)', re.IGNORECASE)
+
+def occurrence_key(value: Dict[str, str]) -> OccurrenceKey:
+    """The key of an occurrence from an event's start or originalStartTime object."""
+    if 'date' in value:
+        return value['date']
+    moment = datetime.fromisoformat(value['dateTime'].replace('Z', '+00:00'))
+    if moment.tzinfo is None:
+        moment = pytz.timezone(value.get('timeZone', 'UTC')).localize(moment)
+    return int(moment.timestamp())
+
+class RecurringSeries:
+    """
+    A recurring event master, expanded into its occurrences on demand.
+
+    Rules are evaluated in the event's wall-clock time (its start timeZone,
+    else the calendar's), so a 9:00 meeting stays at 9:00 across daylight
+    saving changes. The parsed rule set is built on first use and caches the
+    occurrences it has generated, so later windows only pay for new ones.
+    """
+
+    def __init__(self, master: Dict[str, Any], timezone_name: str):
+        self.master = master
+        self.id = master['id']
+        self.all_day = 'date' in master['start']
+        self.tz = pytz.timezone(master['start'].get('timeZone') or timezone_name)
+        self.start = self._local(master['start'])
+        self.duration = self._local(master.get('end', master['start'])) - self.start
+        self._instance_base = {k: v for k, v in master.items() if k != 'recurrence'}
+        self._rules: Optional['rruleset'] = None
+        self._finite = None
+        self._last_end: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def first_start(self) -> float:
+        return self._aware(self.start).timestamp()
+
+    def last_end(self) -> float:
+        """When the last occurrence ends, or infinity for a series without an end."""
+        rules = self._rule_set()
+        if not self._finite:
+            return float('inf')
+        if self._last_end is None:
+            last = rules.before(datetime.max, inc=True)
+            self._last_end = self._aware(last + self.duration).timestamp() if last else float('-inf')
+        return self._last_end
+
+    def occurrences(self, low: float, high: float,
+                    skip: frozenset = frozenset()) -> Iterator[Tuple[float, str, Dict[str, Any]]]:
+        """
+        Yields (start timestamp, id, instance) for occurrences overlapping
+        [low, high), in start order, as events.list with singleEvents would
+        return them. Occurrences whose key is in skip (changed or cancelled
+        ones, which are stored as events of their own) are left out.
+        """
+        rules = self._rule_set()
+        after = self.start
+        if low != float('-inf'):
+            after = max(after, datetime.fromtimestamp(low, self.tz).replace(tzinfo=None) - self.duration)
+        for local_start in rules.xafter(after, inc=True):
+            start = self._aware(local_start)
+            if start.timestamp() >= high:
+                return
+            end = self._aware(local_start + self.duration)
+            if end.timestamp() <= low:
+                continue
+            if skip and self._key(local_start, start) in skip:
+                continue
+            instance = self._instance(local_start, start, end)
+            yield start.timestamp(), instance['id'], instance
+
+    def _key(self, local_start: datetime, start: datetime) -> OccurrenceKey:
+        return local_start.date().isoformat() if self.all_day else int(start.timestamp())
+
+    def _instance(self, local_start: datetime, start: datetime, end: datetime) -> Dict[str, Any]:
+        instance = dict(self._instance_base)
+        if self.all_day:
+            start_value = {'date': local_start.date().isoformat()}
+            end_value = {'date': (local_start + self.duration).date().isoformat()}
+            suffix = local_start.strftime('%Y%m%d')
+        else:
+            start_value = {'dateTime': start.isoformat(), 'timeZone': self.tz.zone}
+            end_value = {'dateTime': end.isoformat(), 'timeZone': self.tz.zone}
+            suffix = start.astimezone(pytz.utc).strftime('%Y%m%dT%H%M%SZ')
+        instance.update(id=f"{self.id}_{suffix}", start=start_value, end=end_value,
+                        recurringEventId=self.id, originalStartTime=dict(start_value))
+        return instance
+
+    def _rule_set(self) -> 'rruleset':
+        with self._lock:
+            if self._rules is None:
+                self._rules, self._finite = self._build()
+            return self._rules
+
+    def _build(self) -> Tuple['rruleset', bool]:
+        # dateutil is only loaded once a recurring event is expanded
+        from dateutil.rrule import rrulestr, rruleset
+
+        rules = rruleset(cache=True)
+        has_rule = False
+        finite = True
+        for line in self.master.get('recurrence', []):
+            head, _, value = line.partition(':')
+            name, *params = head.split(';')
+            name = name.upper()
+            params = {key.upper(): param for key, _, param in (p.partition('=') for p in params)}
+            if name in ('RRULE', 'EXRULE'):
+                rule = rrulestr(self._until_to_local(value), dtstart=self.start)
+                if name == 'RRULE':
+                    rules.rrule(rule)
+                    has_rule = True
+                    finite = finite and ('COUNT=' in value.upper() or 'UNTIL=' in value.upper())
+                else:
+                    rules.exrule(rule)
+            elif name in ('RDATE', 'EXDATE'):
+                for item in value.split(','):
+                    moment = self._parse_date_value(item.strip(), params)
+                    (rules.rdate if name == 'RDATE' else rules.exdate)(moment)
+        if not has_rule:
+            # Without a rule the start is still the first occurrence
+            rules.rdate(self.start)
+        return rules, finite
+
+    def _until_to_local(self, rule: str) -> str:
+        """dateutil needs UNTIL in the same (naive, local) form as the start."""
+        def convert(match):
+            value = match.group(1)
+            if len(value) == 8:
+                # A date-only UNTIL includes that whole day
+                return f"UNTIL={value}T235959"
+            return f"UNTIL={self._parse_date_value(value, {}).strftime('%Y%m%dT%H%M%S')}"
+        return UNTIL.sub(convert, rule)
+
+    def _parse_date_value(self, value: str, params: Dict[str, str]) -> datetime:
+        """An RDATE/EXDATE/UNTIL value as naive wall-clock time in the series' timezone."""
+        if params.get('VALUE') == 'DATE' or len(value) == 8:
+            day = datetime.strptime(value[:8], '%Y%m%d')
+            return day if self.all_day else day.replace(hour=self.start.hour, minute=self.start.minute,
+                                                        second=self.start.second)
+        if value.endswith('Z'):
+            moment = pytz.utc.localize(datetime.strptime(value, '%Y%m%dT%H%M%SZ'))
+        else:
+            local = datetime.strptime(value, '%Y%m%dT%H%M%S')
+            if 'TZID' not in params:
+                return local
+            moment = pytz.timezone(params['TZID']).localize(local)
+        return moment.astimezone(self.tz).replace(tzinfo=None)
+
+    def _local(self, value: Dict[str, str]) -> datetime:
+        if 'date' in value:
+            return datetime.combine(date.fromisoformat(value['date']), datetime.min.time())
+        moment = datetime.fromisoformat(value['dateTime'].replace('Z', '+00:00'))
+        if moment.tzinfo is None:
+            return moment
+        return moment.astimezone(self.tz).replace(tzinfo=None)
+
+    def _aware(self, local: datetime) -> datetime:
+        # normalize moves times skipped by a DST change forward, as Google does
+        return self.tz.normalize(self.tz.localize(local))
@@ -0,0 +1,136 @@
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+from .credential_store import DEFAULT_USER, CredentialsNotFoundError
+
+logger = logging.getLogger(__name__)
+
+class ServiceRegistry:
+    """
+    Process-wide home for the shared services used by the route blueprints.
+
+    Services are built on first use, so importing the app doesn't load the
+    OpenAI and Google client libraries. warmup() builds them ahead of the
+    first request instead.
+    """
+
+    def __init__(self, timezone: str = 'America/Los_Angeles'):
+        self.timezone = timezone
+        self._llm_service = None
+        self._nlp_service = None
+        self._calendar_services = None
+        self._jobs = None
+        self._watch_channels = None
+        # Push notifications replace polling only when a webhook address is configured
+        self.watch_enabled = bool(os.getenv('WATCH_WEBHOOK_URL'))
+        self._lock = threading.Lock()
+
+    @property
+    def llm_service(self):
+        if self._llm_service is None:
+            with self._lock:
+                if self._llm_service is None:
+                    from .llm_service import LLMService
+                    self._llm_service = LLMService(timezone=self.timezone)
+        return self._llm_service
+
+    @property
+    def nlp_service(self):
+        """Routes queries by intent; building it doesn't build the LLM service."""
+        if self._nlp_service is None:
+            with self._lock:
+                if self._nlp_service is None:
+                    from .nlp_service import NLPService
+                    self._nlp_service = NLPService(timezone=self.timezone)
+        return self._nlp_service
+
+    @property
+    def calendar_services(self):
+        if self._calendar_services is None:
+            with self._lock:
+                if self._calendar_services is None:
+                    from .service_pool import CalendarServicePool
+                    self._calendar_services = CalendarServicePool(timezone=self.timezone)
+        return self._calendar_services
+
+    @property
+    def jobs(self):
+        """The write-behind JobQueue for event creation; its workers start with it."""
+        if self._jobs is None:
+            with self._lock:
+                if self._jobs is None:
+                    from functools import partial
+                    from .event_jobs import error_details, run_nlp_create_job, run_schedule_job
+                    from .job_queue import JobQueue
+                    self._jobs = JobQueue(
+                        handlers={
+                            'schedule': partial(run_schedule_job, self),
+                            'nlp_create': partial(run_nlp_create_job, self),
+                        },
+                        describe_error=error_details
+                    ).start()
+        return self._jobs
+
+    @property
+    def watch_channels(self):
+        """The WatchChannels for Calendar push notifications, or None if WATCH_WEBHOOK_URL isn't set."""
+        if self._watch_channels is None and self.watch_enabled:
+            with self._lock:
+                if self._watch_channels is None:
+                    from .watch_channels import WatchChannels
+                    self._watch_channels = WatchChannels()
+        return self._watch_channels
+
+    def resume_jobs(self) -> None:
+        """Starts the job workers if a job database exists, so jobs left by an earlier run are finished."""
+        if os.path.exists(os.getenv('JOB_QUEUE_PATH', 'jobs.db')):
+            self.jobs
+
+    def calendar_for(self, user_id: str = DEFAULT_USER):
+        """Gets the pooled CalendarService for a user, with its primary calendar watched if enabled."""
+        service = self.calendar_services.get(user_id)
+        if self.watch_enabled:
+            self.watch_channels.watch(service)
+        return service
+
+    def warmup(self, user_id: Optional[str] = DEFAULT_USER) -> Dict[str, float]:
+        """
+        Builds the shared services and loads the Calendar discovery document.
+
+        If user_id has stored credentials, its Calendar service is built too;
+        the interactive OAuth flow is never started from here. Returns the time
+        each step took in milliseconds.
+        """
+        timings = {}
+
+        started = time.perf_counter()
+        self.llm_service
+        timings['llm_service_ms'] = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        from .calendar_service import load_discovery_document
+        load_discovery_document()
+        self.calendar_services
+        timings['calendar_services_ms'] = (time.perf_counter() - started) * 1000
+
+        if user_id is not None:
+            started = time.perf_counter()
+            try:
+                self.calendar_for(user_id).get_service(interactive=False)
+            except CredentialsNotFoundError:
+                logger.info("No stored credentials for '%s'; skipping Calendar service warmup", user_id)
+            except Exception as e:
+                logger.warning("Calendar service warmup failed: %s", e)
+            timings['calendar_service_ms'] = (time.perf_counter() - started) * 1000
+
+        return timings
+
+    def close(self) -> None:
+        if self._jobs is not None:
+            self._jobs.close()
+        if self._watch_channels is not None:
+            self._watch_channels.close()
+        if self._calendar_services is not None:
+            self._calendar_services.close()
@@ -0,0 +1,88 @@
+import os
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Any, Dict, Optional
+from .calendar_service import CalendarService
+from .credential_store import CredentialStore, DEFAULT_USER, create_credential_store, validate_user_id
+
+class CalendarServicePool:
+    """
+    Bounded LRU pool of authorized CalendarService instances, one per user.
+
+    A background thread refreshes access tokens shortly before they expire,
+    so requests don't pay for a synchronous refresh.
+    """
+
+    def __init__(self, timezone: str = 'America/Los_Angeles', credential_store: Optional[CredentialStore] = None,
+                 max_size: Optional[int] = None, refresh_margin: Optional[timedelta] = None,
+                 refresh_interval: Optional[float] = None):
+        self.timezone = timezone
+        self.credential_store = credential_store or create_credential_store()
+        self.max_size = max_size or int(os.getenv('CALENDAR_POOL_SIZE', '64'))
+        self.refresh_margin = refresh_margin or timedelta(seconds=int(os.getenv('TOKEN_REFRESH_MARGIN_SECONDS', '300')))
+        self.refresh_interval = refresh_interval or float(os.getenv('TOKEN_REFRESH_INTERVAL_SECONDS', '60'))
+        self._services = OrderedDict()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._refresher = None
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'refreshes': 0, 'refresh_errors': 0}
+
+    def get(self, user_id: str = DEFAULT_USER) -> CalendarService:
+        """Gets the CalendarService for a user, creating it if needed."""
+        validate_user_id(user_id)
+        with self._lock:
+            service = self._services.get(user_id)
+            if service is not None:
+                self._services.move_to_end(user_id)
+                self._stats['hits'] += 1
+            else:
+                service = CalendarService(
+                    timezone=self.timezone,
+                    user_id=user_id,
+                    credential_store=self.credential_store
+                )
+                self._services[user_id] = service
+                self._stats['misses'] += 1
+                while len(self._services) > self.max_size:
+                    self._services.popitem(last=False)
+                    self._stats['evictions'] += 1
+            self._start_refresher()
+        return service
+
+    def refresh_expiring(self) -> int:
+        """Refreshes tokens that expire within the margin. Returns how many were refreshed."""
+        with self._lock:
+            services = list(self._services.values())
+        refreshed = 0
+        for service in services:
+            try:
+                if service.refresh_credentials(self.refresh_margin):
+                    refreshed += 1
+            except Exception:
+                with self._lock:
+                    self._stats['refresh_errors'] += 1
+        with self._lock:
+            self._stats['refreshes'] += refreshed
+        return refreshed
+
+    def close(self) -> None:
+        """Stops the background refresher."""
+        self._stop.set()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._services)
+        return stats
+
+    def _start_refresher(self) -> None:
+        """Starts the refresh thread on first use; the caller must hold the lock."""
+        if self._refresher is not None or self._stop.is_set():
+            return
+        self._refresher = threading.Thread(target=self._refresh_loop, name='token-refresher', daemon=True)
+        self._refresher.start()
+
+    def _refresh_loop(self) -> None:
+        while not self._stop.wait(self.refresh_interval):
+            self.refresh_expiring()
@@ -0,0 +1,287 @@
+import asyncio
+import copy
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+from .parse_cache import ParseCache, _Flight
+from .sqlite_db import open_connection, transaction
+
+CACHE_BACKENDS = ('memory', 'sqlite')
+
+def create_cache(namespace: str, max_size: int = 1024, ttl: float = 600.0):
+    """
+    Builds a service-level cache on the backend selected by CACHE_BACKEND:
+    'memory' (default) for a ParseCache per process, or 'sqlite' for a
+    SQLiteCache at CACHE_PATH shared by every worker process on the host.
+    """
+    backend = os.getenv('CACHE_BACKEND', 'memory')
+    if backend == 'memory':
+        return ParseCache(max_size=max_size, ttl=ttl)
+    if backend == 'sqlite':
+        return SQLiteCache(namespace=namespace, max_size=max_size, ttl=ttl)
+    raise ValueError(f"Unknown CACHE_BACKEND '{backend}'. Use one of: {', '.join(CACHE_BACKENDS)}")
+
+class SQLiteCache:
+    """
+    Bounded LRU cache with a TTL, shared between processes through SQLite in
+    WAL mode. It has the same interface as ParseCache, so services can sit
+    on either.
+
+    Entries, hit/miss counters and in-progress computations all live in the
+    database, under a namespace per cache: a value computed by one worker is
+    a hit in every other, and get_or_compute computes a key once across
+    processes. The process computing a key holds a lease on it, so a worker
+    that dies mid-computation only delays the others until the lease
+    expires. Keys are strings and values must be JSON serializable.
+
+    Lookups are plain reads, so hits in any number of workers don't contend
+    for SQLite's write lock. Their LRU touches and counters are kept in
+    memory and written together every flush_interval seconds or flush_every
+    lookups, and before any other write; get_stats includes other workers'
+    lookups once they have been written. Each thread reuses one connection.
+    """
+
+    def __init__(self, path: Optional[str] = None, namespace: str = 'default', max_size: int = 1024,
+                 ttl: float = 600.0, lease_seconds: float = 60.0, poll_interval: float = 0.05,
+                 flush_interval: float = 1.0, flush_every: int = 100, clock: Callable[[], float] = time.time):
+        self.path = path or os.getenv('CACHE_PATH', 'cache.db')
+        self.namespace = namespace
+        self.max_size = max_size
+        self.ttl = ttl
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.flush_interval = flush_interval
+        self.flush_every = flush_every
+        # Wall-clock time, since expiry times are compared across processes
+        self._clock = clock
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # Writes deferred from lookups: LRU touches, expired keys to delete and counter increments
+        self._touched: Dict[str, float] = {}
+        self._expired: Dict[str, float] = {}
+        self._counts: Dict[str, int] = {}
+        self._pending = 0
+        self._flushed_at = time.monotonic()
+        with self._db() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache_entries ('
+                'namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, '
+                'expires_at REAL NOT NULL, last_used REAL NOT NULL, PRIMARY KEY (namespace, key))'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS cache_entries_lru ON cache_entries (namespace, last_used)')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache_flights ('
+                'namespace TEXT NOT NULL, key TEXT NOT NULL, lease_until REAL NOT NULL, PRIMARY KEY (namespace, key))'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache_stats ('
+                'namespace TEXT NOT NULL, name TEXT NOT NULL, count INTEGER NOT NULL, PRIMARY KEY (namespace, name))'
+            )
+
+    def get(self, key: str) -> Any:
+        """Returns the cached value, or None if missing or expired."""
+        with self._db() as conn:
+            value = self._lookup(conn, key)
+        if value is None:
+            self._record('misses')
+        self._flush_if_due()
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        """Stores a value, evicting the least recently used entries if full."""
+        if self.max_size <= 0:
+            return
+        with self._db() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            self._flush(conn)
+            self._store(conn, key, value)
+
+    async def aget(self, key: str) -> Any:
+        """Async version of get; the database access runs in a worker thread."""
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: Any) -> None:
+        """Async version of set; the database access runs in a worker thread."""
+        await asyncio.to_thread(self.set, key, value)
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        """Returns the cached value for key, computing it at most once across threads and processes."""
+        with self._lock:
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._in_flight[key] = flight
+
+        if not leader:
+            self._record('coalesced')
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return copy.deepcopy(flight.value)
+
+        try:
+            flight.value = self._get_or_compute_shared(key, compute)
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            flight.done.set()
+        return copy.deepcopy(flight.value)
+
+    def clear(self) -> None:
+        with self._db() as conn:
+            conn.execute('DELETE FROM cache_entries WHERE namespace = ?', (self.namespace,))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Returns hit/miss/eviction counters and the current size, totalled over all processes."""
+        self._flush_if_due(force=True)
+        stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'evictions': 0, 'expirations': 0}
+        with self._db() as conn:
+            for row in conn.execute('SELECT name, count FROM cache_stats WHERE namespace = ?', (self.namespace,)):
+                stats[row['name']] = row['count']
+            stats['size'] = conn.execute('SELECT COUNT(*) FROM cache_entries WHERE namespace = ?',
+                                         (self.namespace,)).fetchone()[0]
+        lookups = stats['hits'] + stats['misses'] + stats['coalesced']
+        stats['hit_rate'] = (stats['hits'] + stats['coalesced']) / lookups if lookups else 0.0
+        return stats
+
+    def _db(self):
+        """A transaction block on this thread's connection, opened on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            # A connection inherited across fork must not be used by the child
+            conn = open_connection(self.path)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return transaction(conn)
+
+    def _get_or_compute_shared(self, key: str, compute: Callable[[], Any]) -> Any:
+        """Finds key in the database or claims it and computes it, waiting while another process does."""
+        first = True
+        while True:
+            with self._db() as conn:
+                value = self._lookup(conn, key, record=first)
+            if value is not None:
+                self._flush_if_due()
+                return value
+            with self._db() as conn:
+                conn.execute('BEGIN IMMEDIATE')
+                self._flush(conn)
+                # Another process may have stored it since the read
+                value = self._lookup(conn, key, record=first)
+                if value is not None:
+                    return value
+                now = self._clock()
+                claimed = conn.execute(
+                    'INSERT INTO cache_flights (namespace, key, lease_until) VALUES (?, ?, ?) '
+                    'ON CONFLICT (namespace, key) DO UPDATE SET lease_until = excluded.lease_until '
+                    'WHERE cache_flights.lease_until <= ?',
+                    (self.namespace, key, now + self.lease_seconds, now)
+                ).rowcount == 1
+                if claimed:
+                    self._count(conn, 'misses')
+                elif first:
+                    self._count(conn, 'coalesced')
+            if claimed:
+                break
+            first = False
+            time.sleep(self.poll_interval)
+
+        try:
+            value = compute()
+        except Exception:
+            with self._db() as conn:
+                self._release(conn, key)
+            raise
+        with self._db() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            self._flush(conn)
+            if self.max_size > 0:
+                self._store(conn, key, value)
+            self._release(conn, key)
+        return value
+
+    def _lookup(self, conn: sqlite3.Connection, key: str, record: bool = True) -> Any:
+        """Reads key; its LRU touch, or the deletion of an expired entry, waits for the next flush."""
+        row = conn.execute('SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?',
+                           (self.namespace, key)).fetchone()
+        if row is None:
+            return None
+        now = self._clock()
+        if row['expires_at'] <= now:
+            with self._lock:
+                self._expired[key] = now
+                self._pending += 1
+            if record:
+                self._record('expirations')
+            return None
+        with self._lock:
+            self._touched[key] = now
+            self._pending += 1
+        if record:
+            self._record('hits')
+        return json.loads(row['value'])
+
+    def _record(self, name: str) -> None:
+        with self._lock:
+            self._counts[name] = self._counts.get(name, 0) + 1
+            self._pending += 1
+
+    def _flush_if_due(self, force: bool = False) -> None:
+        """Writes the deferred lookup writes if there are enough of them or they are old enough."""
+        with self._lock:
+            due = self._pending and (force or self._pending >= self.flush_every
+                                     or time.monotonic() - self._flushed_at >= self.flush_interval)
+        if due:
+            with self._db() as conn:
+                conn.execute('BEGIN IMMEDIATE')
+                self._flush(conn)
+
+    def _flush(self, conn: sqlite3.Connection) -> None:
+        """Writes the deferred lookup writes; the caller must hold a write transaction."""
+        with self._lock:
+            touched, self._touched = self._touched, {}
+            expired, self._expired = self._expired, {}
+            counts, self._counts = self._counts, {}
+            self._pending = 0
+            self._flushed_at = time.monotonic()
+        if touched:
+            conn.executemany('UPDATE cache_entries SET last_used = MAX(last_used, ?) WHERE namespace = ? AND key = ?',
+                             [(now, self.namespace, key) for key, now in touched.items()])
+        if expired:
+            # Only if it wasn't stored again since it was seen expired
+            conn.executemany('DELETE FROM cache_entries WHERE namespace = ? AND key = ? AND expires_at <= ?',
+                             [(self.namespace, key, now) for key, now in expired.items()])
+        for name, amount in counts.items():
+            self._count(conn, name, amount)
+
+    def _store(self, conn: sqlite3.Connection, key: str, value: Any) -> None:
+        now = self._clock()
+        conn.execute(
+            'INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at, last_used) VALUES (?, ?, ?, ?, ?)',
+            (self.namespace, key, json.dumps(value), now + self.ttl, now)
+        )
+        evicted = conn.execute(
+            'DELETE FROM cache_entries WHERE namespace = ? AND key IN ('
+            'SELECT key FROM cache_entries WHERE namespace = ? ORDER BY last_used DESC LIMIT -1 OFFSET ?)',
+            (self.namespace, self.namespace, self.max_size)
+        ).rowcount
+        if evicted:
+            self._count(conn, 'evictions', evicted)
+
+    def _release(self, conn: sqlite3.Connection, key: str) -> None:
+        conn.execute('DELETE FROM cache_flights WHERE namespace = ? AND key = ?', (self.namespace, key))
+
+    def _count(self, conn: sqlite3.Connection, name: str, amount: int = 1) -> None:
+        conn.execute(
+            'INSERT INTO cache_stats (namespace, name, count) VALUES (?, ?, ?) '
+            'ON CONFLICT (namespace, name) DO UPDATE SET count = count + excluded.count',
+            (self.namespace, name, amount)
+        )
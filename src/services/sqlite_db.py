@@ -0,0 +1,38 @@
+"""SQLite access shared by the stores that keep their state in a database file."""
+import sqlite3
+from contextlib import contextmanager
+from typing import Iterator
+
+def open_connection(path: str) -> sqlite3.Connection:
+    """
+    Opens path in autocommit mode with rows as sqlite3.Row, waiting up to
+    10 seconds for locks held by other processes.
+    """
+    conn = sqlite3.connect(path, timeout=10, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+@contextmanager
+def transaction(conn: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    """
+    Commits a transaction begun in the block (BEGIN IMMEDIATE) when it
+    exits, or rolls it back if it raises. Statements outside one autocommit.
+    """
+    try:
+        yield conn
+        if conn.in_transaction:
+            conn.execute('COMMIT')
+    except Exception:
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')
+        raise
+
+@contextmanager
+def connect(path: str) -> Iterator[sqlite3.Connection]:
+    """Opens path as open_connection does for one transaction block, closing it afterwards."""
+    conn = open_connection(path)
+    try:
+        with transaction(conn):
+            yield conn
+    finally:
+        conn.close()
@@ -0,0 +1,165 @@
+import json
+import re
+from typing import Any, List, Optional, Tuple
+from .model_cascade import InvalidCompletionError
+
+SCALAR_RE = re.compile(r'^(?:true|false|null|-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?)$')
+SCALAR_CHARS = set('truefalsn0123456789.+-E')
+
+class StreamingJSONValidator:
+    """
+    Checks a JSON object as it streams in, one chunk at a time.
+
+    Raises InvalidCompletionError as soon as the text can no longer be valid
+    JSON, or ValueError as soon as the LLM's top-level "error" message is
+    complete, so callers can stop reading the completion early. feed() returns the scalar fields
+    completed by the chunk as (dotted path, value) pairs, e.g.
+    ('event.summary', 'Team sync').
+    """
+
+    def __init__(self):
+        self.text = []
+        # One frame per open container: [kind, state, current key]
+        self._stack = []
+        self._started = False
+        self._done = False
+        self._in_string = False
+        self._escape = False
+        self._string = []
+        self._scalar = []
+
+    @property
+    def complete(self) -> bool:
+        return self._done
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        self.text.append(chunk)
+        fields = []
+        for char in chunk:
+            field = self._feed_char(char)
+            if field is not None:
+                fields.append(field)
+        return fields
+
+    def result(self) -> Any:
+        """Decodes the whole document; raises ValueError if it is incomplete."""
+        if not self._done:
+            raise InvalidCompletionError("Incomplete response from LLM")
+        return json.loads(''.join(self.text))
+
+    def _feed_char(self, char: str) -> Optional[Tuple[str, Any]]:
+        if self._in_string:
+            self._string.append(char)
+            if self._escape:
+                self._escape = False
+            elif char == '\\':
+                self._escape = True
+            elif char == '"':
+                self._in_string = False
+                return self._end_string(json.loads('"' + ''.join(self._string)))
+            elif char < ' ':
+                self._fail()
+            return None
+
+        if self._scalar:
+            if char in SCALAR_CHARS:
+                self._scalar.append(char)
+                return None
+            field = self._end_scalar()
+            self._feed_char(char)
+            return field
+
+        if char.isspace():
+            return None
+        if self._done:
+            self._fail()
+
+        if not self._started:
+            if char != '{':
+                self._fail()
+            self._started = True
+            self._stack.append(['object', 'first', None])
+            return None
+
+        frame = self._stack[-1]
+        kind, state = frame[0], frame[1]
+        if state == 'colon':
+            if char != ':':
+                self._fail()
+            frame[1] = 'value'
+        elif state == 'comma':
+            if char == ',':
+                frame[1] = 'key' if kind == 'object' else 'value'
+            elif char == ('}' if kind == 'object' else ']'):
+                self._close()
+            else:
+                self._fail()
+        elif state == 'key' or (kind == 'object' and state == 'first'):
+            if char == '"':
+                self._start_string()
+            elif char == '}' and state == 'first':
+                self._close()
+            else:
+                self._fail()
+        else:
+            self._start_value(char, frame)
+        return None
+
+    def _start_value(self, char: str, frame: list) -> None:
+        path = self._path()
+        if path == ['error'] and char != '"':
+            raise ValueError("Query is not a valid calendar request")
+        if path == ['event'] and char != '{':
+            raise InvalidCompletionError("Invalid response structure from LLM")
+
+        if char == ']' and frame[0] == 'array' and frame[1] == 'first':
+            self._close()
+        elif char == '"':
+            self._start_string()
+        elif char == '{':
+            self._stack.append(['object', 'first', None])
+        elif char == '[':
+            self._stack.append(['array', 'first', None])
+        elif char in SCALAR_CHARS:
+            self._scalar.append(char)
+        else:
+            self._fail()
+
+    def _start_string(self) -> None:
+        self._in_string = True
+        self._string = []
+
+    def _end_string(self, value: str) -> Optional[Tuple[str, Any]]:
+        frame = self._stack[-1]
+        if frame[0] == 'object' and frame[1] in ('key', 'first'):
+            frame[2] = value
+            frame[1] = 'colon'
+            return None
+        return self._end_value(value)
+
+    def _end_scalar(self) -> Optional[Tuple[str, Any]]:
+        text = ''.join(self._scalar)
+        self._scalar = []
+        if not SCALAR_RE.match(text):
+            self._fail()
+        return self._end_value(json.loads(text))
+
+    def _end_value(self, value: Any) -> Optional[Tuple[str, Any]]:
+        path = self._path()
+        self._stack[-1][1] = 'comma'
+        if path == ['error']:
+            raise ValueError(value)
+        return '.'.join(str(part) for part in path), value
+
+    def _close(self) -> None:
+        self._stack.pop()
+        if self._stack:
+            self._stack[-1][1] = 'comma'
+        else:
+            self._done = True
+
+    def _path(self) -> List[Any]:
+        return [frame[2] for frame in self._stack if frame[0] == 'object']
+
+    def _fail(self) -> None:
+        raise InvalidCompletionError("Malformed JSON in LLM response")
@@ -0,0 +1,268 @@
+import hmac
+import logging
+import os
+import secrets
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Optional, Tuple
+from .sqlite_db import connect
+
+logger = logging.getLogger(__name__)
+
+# A notification with this state only confirms that a new channel works
+SYNC_STATE = 'sync'
+
+class WatchChannels:
+    """
+    Calendar push notifications in place of polling.
+
+    For each calendar this process mirrors, a push channel (events.watch)
+    is kept open pointing at WATCH_WEBHOOK_URL, and renewed renew_margin
+    seconds before it expires. While a calendar has a live channel, its
+    mirror and free/busy data only poll every WATCH_FALLBACK_SECONDS, in
+    case a notification is lost; changes arrive as notifications instead.
+
+    Channels and per-calendar change counters live in SQLite, so any worker
+    process can receive a notification: receiving one only bumps the
+    calendar's version. Each process's watcher thread then runs one
+    incremental sync of its own copy of that calendar, once notifications
+    have been quiet for debounce seconds, or max_delay seconds after the
+    first, so a burst of changes costs a single sync. Calendars nobody has
+    used for idle_after seconds are no longer renewed and their channels
+    lapse.
+    """
+
+    def __init__(self, address: Optional[str] = None, path: Optional[str] = None, ttl: Optional[float] = None,
+                 renew_margin: Optional[float] = None, debounce: Optional[float] = None,
+                 max_delay: Optional[float] = None, idle_after: Optional[float] = None,
+                 poll_interval: float = 0.5, lease_seconds: float = 300.0,
+                 clock: Callable[[], float] = time.time):
+        self.address = address or os.getenv('WATCH_WEBHOOK_URL')
+        if not self.address:
+            raise ValueError("WATCH_WEBHOOK_URL environment variable is not set")
+        self.path = path or os.getenv('WATCH_CHANNELS_PATH', 'watch.db')
+        self.ttl = ttl or float(os.getenv('WATCH_CHANNEL_TTL_SECONDS', '604800'))
+        self.renew_margin = renew_margin or float(os.getenv('WATCH_RENEW_MARGIN_SECONDS', '3600'))
+        self.debounce = debounce if debounce is not None else float(os.getenv('WATCH_DEBOUNCE_SECONDS', '2'))
+        self.max_delay = max_delay if max_delay is not None else float(os.getenv('WATCH_MAX_DELAY_SECONDS', '10'))
+        self.idle_after = idle_after or float(os.getenv('WATCH_IDLE_SECONDS', '86400'))
+        self.poll_interval = poll_interval
+        # How long a process has to open a channel before another may try; also the retry delay after a failure
+        self.lease_seconds = lease_seconds
+        # Wall-clock time, since it is compared across processes
+        self._clock = clock
+        # (user id, calendar id) -> state of the calendar in this process
+        self._watched: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._stats = {'notifications': 0, 'rejected': 0, 'refreshes': 0, 'refresh_errors': 0,
+                       'channels_opened': 0, 'channels_stopped': 0, 'watch_errors': 0}
+        with connect(self.path) as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS watch_calendars ('
+                'user_id TEXT NOT NULL, calendar_id TEXT NOT NULL, version INTEGER NOT NULL DEFAULT 0, '
+                'notified_at REAL, lease_until REAL NOT NULL DEFAULT 0, PRIMARY KEY (user_id, calendar_id))'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS watch_channels ('
+                'channel_id TEXT PRIMARY KEY, user_id TEXT NOT NULL, calendar_id TEXT NOT NULL, '
+                'resource_id TEXT NOT NULL, token TEXT NOT NULL, expiration REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS watch_channels_calendar '
+                         'ON watch_channels (user_id, calendar_id, expiration)')
+
+    def watch(self, calendar_service, calendar_id: str = 'primary') -> None:
+        """
+        Has a calendar watched, starting the watcher thread on first use.
+        Called on every request, so it only touches memory once the
+        calendar is known.
+        """
+        key = (calendar_service.user_id, calendar_id)
+        now = self._clock()
+        with self._lock:
+            state = self._watched.get(key)
+            if state is not None:
+                state['used_at'] = now
+                if state['service'] is not calendar_service:
+                    # The pool built a new service for this user; it starts out polling
+                    state['service'] = calendar_service
+                    calendar_service.set_watched(calendar_id, state['live'])
+                return
+
+        with connect(self.path) as conn:
+            conn.execute('INSERT OR IGNORE INTO watch_calendars (user_id, calendar_id) VALUES (?, ?)', key)
+            version = conn.execute('SELECT version FROM watch_calendars WHERE user_id = ? AND calendar_id = ?',
+                                   key).fetchone()['version']
+        with self._lock:
+            self._watched.setdefault(key, {'service': calendar_service, 'seen': version, 'pending_since': None,
+                                           'retry_at': 0.0, 'live': False, 'used_at': now})
+            self._start()
+        self._wakeup.set()
+
+    def notify(self, channel_id: str, token: str, resource_id: str, state: str) -> bool:
+        """
+        Records a notification from the X-Goog-* headers of a webhook call.
+        Returns False if it doesn't come from a live channel of ours.
+        """
+        now = self._clock()
+        with connect(self.path) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT * FROM watch_channels WHERE channel_id = ?', (channel_id,)).fetchone()
+            valid = (row is not None and row['expiration'] > now and row['resource_id'] == resource_id
+                     and hmac.compare_digest(row['token'], token or ''))
+            if valid and state != SYNC_STATE:
+                conn.execute('UPDATE watch_calendars SET version = version + 1, notified_at = ? '
+                             'WHERE user_id = ? AND calendar_id = ?', (now, row['user_id'], row['calendar_id']))
+        with self._lock:
+            self._stats['notifications' if valid else 'rejected'] += 1
+        if valid:
+            self._wakeup.set()
+        return valid
+
+    def run_once(self) -> None:
+        """One pass of the watcher: refreshes calendars with pending changes, then opens and renews channels."""
+        now = self._clock()
+        with self._lock:
+            for key in [key for key, state in self._watched.items() if now - state['used_at'] >= self.idle_after]:
+                state = self._watched.pop(key)
+                state['service'].set_watched(key[1], False)
+            watched = dict(self._watched)
+        if not watched:
+            return
+        with connect(self.path) as conn:
+            conn.execute('DELETE FROM watch_channels WHERE expiration <= ?', (now,))
+            rows = conn.execute('SELECT * FROM watch_calendars').fetchall()
+            live = dict(((row['user_id'], row['calendar_id']), row['expiration']) for row in conn.execute(
+                'SELECT user_id, calendar_id, MAX(expiration) AS expiration FROM watch_channels '
+                'WHERE expiration > ? GROUP BY user_id, calendar_id', (now,)))
+        for row in rows:
+            key = (row['user_id'], row['calendar_id'])
+            if key in watched:
+                self._refresh_if_due(key, watched[key], row, now)
+        for key, state in watched.items():
+            expiration = live.get(key, 0)
+            opened = expiration <= now + self.renew_margin and self._open_channel(key, state, now)
+            self._set_live(key, state, opened or expiration > now)
+
+    def close(self, timeout: float = 5.0) -> None:
+        """
+        Stops the watcher thread. Channels are left open, since other
+        processes may be receiving on them; they lapse when they expire.
+        """
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """This process's notification, refresh and channel counters, plus the channels open for it."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['watched'] = len(self._watched)
+            stats['live'] = sum(1 for state in self._watched.values() if state['live'])
+        return stats
+
+    def _refresh_if_due(self, key: Tuple[str, str], state: Dict[str, Any], row: sqlite3.Row, now: float) -> None:
+        """Syncs a calendar with unseen notifications once they have settled."""
+        if row['version'] <= state['seen'] or now < state['retry_at']:
+            return
+        if state['pending_since'] is None:
+            state['pending_since'] = now
+        if now - row['notified_at'] < self.debounce and now - state['pending_since'] < self.max_delay:
+            return
+        try:
+            state['service'].refresh_calendar(key[1])
+        except Exception:
+            logger.exception("Refreshing calendar %s of '%s' after a notification failed", key[1], key[0])
+            state['retry_at'] = now + self.max_delay
+            with self._lock:
+                self._stats['refresh_errors'] += 1
+            return
+        # Changes notified after row was read are picked up by the next pass
+        state['seen'] = row['version']
+        state['pending_since'] = None
+        with self._lock:
+            self._stats['refreshes'] += 1
+
+    def _open_channel(self, key: Tuple[str, str], state: Dict[str, Any], now: float) -> bool:
+        """
+        Opens a channel for a calendar, unless another process is doing it,
+        then stops the ones it replaces. Returns whether it opened one.
+        """
+        with connect(self.path) as conn:
+            claimed = conn.execute(
+                'UPDATE watch_calendars SET lease_until = ? WHERE user_id = ? AND calendar_id = ? AND lease_until <= ?',
+                (now + self.lease_seconds, key[0], key[1], now)
+            ).rowcount == 1
+        if not claimed:
+            return False
+
+        user_id, calendar_id = key
+        channel_id = uuid.uuid4().hex
+        token = secrets.token_urlsafe(32)
+        calendar_service = state['service']
+        try:
+            channel = calendar_service.watch_events({
+                'id': channel_id,
+                'type': 'web_hook',
+                'address': self.address,
+                'token': token,
+                'params': {'ttl': str(int(self.ttl))}
+            }, calendar_id)
+        except Exception as e:
+            # The lease is kept, so the next attempt waits lease_seconds
+            logger.warning("Opening a watch channel for calendar %s of '%s' failed: %s", calendar_id, user_id, e)
+            with self._lock:
+                self._stats['watch_errors'] += 1
+            return False
+
+        expiration = int(channel['expiration']) / 1000 if channel.get('expiration') else now + self.ttl
+        with connect(self.path) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('INSERT INTO watch_channels (channel_id, user_id, calendar_id, resource_id, token, '
+                         'expiration) VALUES (?, ?, ?, ?, ?, ?)',
+                         (channel_id, user_id, calendar_id, channel['resourceId'], token, expiration))
+            replaced = conn.execute('SELECT channel_id, resource_id FROM watch_channels '
+                                    'WHERE user_id = ? AND calendar_id = ? AND channel_id != ?',
+                                    (user_id, calendar_id, channel_id)).fetchall()
+            conn.execute('UPDATE watch_calendars SET lease_until = 0 WHERE user_id = ? AND calendar_id = ?', key)
+        with self._lock:
+            self._stats['channels_opened'] += 1
+
+        for old in replaced:
+            try:
+                calendar_service.stop_channel(old['channel_id'], old['resource_id'])
+            except Exception as e:
+                # It still expires on its own
+                logger.warning("Stopping watch channel %s failed: %s", old['channel_id'], e)
+            with connect(self.path) as conn:
+                conn.execute('DELETE FROM watch_channels WHERE channel_id = ?', (old['channel_id'],))
+            with self._lock:
+                self._stats['channels_stopped'] += 1
+        return True
+
+    def _set_live(self, key: Tuple[str, str], state: Dict[str, Any], live: bool) -> None:
+        if state['live'] != live:
+            state['live'] = live
+            state['service'].set_watched(key[1], live)
+
+    def _start(self) -> None:
+        """Starts the watcher thread on first use; the caller must hold the lock."""
+        if self._thread is None and not self._stop.is_set():
+            self._thread = threading.Thread(target=self._work, name='watch-channels', daemon=True)
+            self._thread.start()
+
+    def _work(self) -> None:
+        while not self._stop.is_set():
+            self._wakeup.clear()
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Watch channel worker error")
+            self._wakeup.wait(self.poll_interval)
@@ -0,0 +1,73 @@
+import pytest
+from datetime import datetime, timedelta
+import pytz
+from src.services.availability_service import AvailabilityService, BusyIntervals, SchedulingConflictError
+
+TZ = pytz.timezone('America/Los_Angeles')
+
+def local(day, hour, minute=0):
+    return TZ.localize(datetime(2026, 10, day, hour, minute))
+
+class FakeCalendarService:
+    timezone = 'America/Los_Angeles'
+
+    def __init__(self, busy):
+        self.busy = busy
+        self.calls = 0
+
+    def get_busy_intervals(self, time_min, time_max, calendar_id='primary'):
+        self.calls += 1
+        return [{'start': start.isoformat(), 'end': end.isoformat()} for start, end in self.busy]
+
+def timed_event(start, end):
+    return {
+        'summary': 'Focus time',
+        'start': {'dateTime': start.isoformat(), 'timeZone': 'America/Los_Angeles'},
+        'end': {'dateTime': end.isoformat(), 'timeZone': 'America/Los_Angeles'}
+    }
+
+@pytest.fixture
+def availability():
+    calendar = FakeCalendarService([
+        (local(19, 9), local(19, 10)),
+        (local(19, 10), local(19, 11, 30)),
+        (local(19, 13), local(19, 14)),
+        (local(19, 15), local(19, 19, 45)),
+    ])
+    return AvailabilityService(calendar, clock=lambda: 0.0)
+
+def test_busy_intervals_merge_and_search():
+    """Test that overlapping and touching intervals merge and searches skip them."""
+    busy = BusyIntervals([(10, 20), (20, 30), (25, 40), (50, 60)])
+
+    assert len(busy) == 2
+    assert busy.conflicts(40, 50) == []
+    assert busy.conflicts(35, 55) == [(10, 40), (50, 60)]
+    assert busy.first_free(15, 10) == 40
+    assert busy.first_free(15, 11) == 60
+
+def test_first_free_slot_skips_busy_time(availability):
+    """Test that the first free slot respects busy time and working hours."""
+    assert availability.first_free_slot(timedelta(hours=1), after=local(19, 9)) == local(19, 11, 30)
+    assert availability.first_free_slot(timedelta(hours=2), after=local(19, 9)) == local(20, 8)
+    assert availability.first_free_slot(timedelta(minutes=30), after=local(19, 6, 5)) == local(19, 8)
+
+def test_place_event_rejects_or_shifts_conflicts(availability):
+    """Test the reject and shift conflict policies."""
+    event = timed_event(local(19, 13, 30), local(19, 14, 30))
+
+    with pytest.raises(SchedulingConflictError) as exc_info:
+        availability.place_event(event, on_conflict='reject')
+    assert exc_info.value.conflicts == [{'start': local(19, 13).isoformat(), 'end': local(19, 14).isoformat()}]
+
+    shifted = availability.place_event(event, on_conflict='shift')
+    assert shifted['start']['dateTime'] == local(19, 14).isoformat()
+    assert shifted['end']['dateTime'] == local(19, 15).isoformat()
+    assert availability.place_event(event) is event
+
+def test_created_events_count_as_busy(availability):
+    """Test that events created by this process block slots before the next refresh."""
+    assert availability.first_free_slot(timedelta(hours=1), after=local(19, 9)) == local(19, 11, 30)
+    availability.add_event(timed_event(local(19, 11, 30), local(19, 13)))
+    assert availability.first_free_slot(timedelta(hours=1), after=local(19, 9)) == local(19, 14)
+    assert availability.calendar_service.calls == 1
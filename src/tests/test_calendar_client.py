@@ -0,0 +1,113 @@
+import io
+import json
+import pytest
+import requests
+from src.client.calendar_client import CalendarClient
+from src.tools.fakes import FakeAPIServer
+
+class FakeAssistantServer(FakeAPIServer):
+    """Answers /nlp/create like the server; queries containing 'bad' fail to parse."""
+
+    def __init__(self, batch: bool = True, **kwargs):
+        super().__init__(**kwargs)
+        self.batch = batch
+        self.paths = []
+
+    def handle(self, method, path, params, body):
+        self.paths.append(path)
+        if path == '/nlp/create':
+            result = self.result(body['query'])
+            return (200 if result['status'] == 'success' else 400), result
+        if path == '/nlp/create/batch' and self.batch:
+            return 200, {'status': 'success', 'results': [self.result(query) for query in body['queries']]}
+        return 404, {'status': 'error', 'message': 'Not found'}
+
+    def result(self, query):
+        if 'bad' in query:
+            return {'status': 'error', 'message': 'Could not parse query'}
+        return {'status': 'success', 'event': {'summary': query}}
+
+QUERIES = "Standup at 9\n\nbad query\nLunch with Sam\n" + "".join(f"Reminder {i}\n" for i in range(20))
+
+def run_bulk(server, **kwargs):
+    output = io.StringIO()
+    counts = CalendarClient(server.url).bulk_create(io.StringIO(QUERIES), output, **kwargs)
+    return counts, [json.loads(line) for line in output.getvalue().splitlines()]
+
+@pytest.mark.parametrize('batch_size', [None, 5])
+def test_bulk_results_in_input_order(batch_size):
+    """Test that results come out one per query, in input order, with input line numbers."""
+    with FakeAssistantServer() as server:
+        counts, results = run_bulk(server, concurrency=4, batch_size=batch_size)
+
+    assert counts == {'succeeded': 22, 'failed': 1}
+    assert [r['line'] for r in results] == [1, 3, 4] + list(range(5, 25))
+    assert results[0]['event'] == {'summary': 'Standup at 9'}
+    assert results[1]['query'] == 'bad query'
+    assert results[1]['status'] == 'error'
+    assert results[1]['message'] == 'Could not parse query'
+    assert results[-1]['event'] == {'summary': 'Reminder 19'}
+
+def test_bulk_uses_batch_endpoint():
+    with FakeAssistantServer() as server:
+        run_bulk(server, batch_size=10)
+    assert server.paths == ['/nlp/create/batch'] * 3
+
+def test_bulk_falls_back_without_batch_endpoint():
+    """Test that a server without /nlp/create/batch gets one request per query."""
+    with FakeAssistantServer(batch=False) as server:
+        counts, results = run_bulk(server, concurrency=1, batch_size=10)
+    assert counts == {'succeeded': 22, 'failed': 1}
+    assert server.paths.count('/nlp/create') == 23
+
+def test_run_id_sends_idempotency_keys():
+    """Test that each batch gets a key stable across runs, and each single query one with its line."""
+    client = CalendarClient()
+    sent = []
+
+    def post(url, json=None, headers=None, timeout=None):
+        sent.append((url.rsplit('/', 2)[-1], headers.get('Idempotency-Key')))
+        raise requests.ConnectionError('offline')
+
+    client.session.post = post
+    queries = ["Standup at 9", "", "Lunch", "Review"]
+    counts = client.bulk_create(queries, io.StringIO(), concurrency=1, batch_size=2, run_id='nightly')
+    client.bulk_create(queries, io.StringIO(), concurrency=1, batch_size=None, run_id='nightly')
+
+    assert counts['failed'] == 3
+    assert sent[:2] == [('batch', 'nightly:1'), ('batch', 'nightly:4')]
+    assert [url for url, _ in sent[2:]] == ['create'] * 3
+    assert [key.rsplit(':', 1)[0] for _, key in sent[2:]] == ['nightly:1', 'nightly:3', 'nightly:4']
+
+def test_every_post_has_an_idempotency_key():
+    """Test that runs without run_id still send keys, so retried 503s can't create duplicates."""
+    with FakeAssistantServer() as server:
+        client = CalendarClient(server.url)
+        post = client.session.post
+        keys = []
+
+        def keyed_post(url, **kwargs):
+            keys.append(kwargs['headers']['Idempotency-Key'])
+            return post(url, **kwargs)
+
+        client.session.post = keyed_post
+        client.bulk_create(["Standup at 9", "Lunch"], io.StringIO(), batch_size=1)
+
+    assert len(keys) == len(set(keys)) == 2
+
+class ShortBatchServer(FakeAssistantServer):
+    def handle(self, method, path, params, body):
+        status, response = super().handle(method, path, params, body)
+        if path == '/nlp/create/batch':
+            response['results'] = response['results'][:-1]
+        return status, response
+
+def test_missing_batch_results_become_errors():
+    """Test that a batch response with too few results reports the lines it left out."""
+    with ShortBatchServer() as server:
+        counts, results = run_bulk(server, batch_size=10)
+
+    assert len(results) == 23
+    assert counts == {'succeeded': 19, 'failed': 4}
+    assert results[9]['line'] == 11
+    assert results[9]['message'] == 'Server returned 9 results for 10 queries'
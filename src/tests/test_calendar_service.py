@@ -0,0 +1,153 @@
+import pytest
+from datetime import datetime, timezone
+from src.services.calendar_service import CalendarService
+
+class FakeRequest:
+    def __init__(self, method, **kwargs):
+        self.method = method
+        self.kwargs = kwargs
+
+class FakeBatch:
+    def __init__(self, service, callback):
+        self.service = service
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id=None):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        self.service.batches.append(len(self.requests))
+        for request_id, request in self.requests:
+            body = request.kwargs['body']
+            if body['summary'] == 'fail':
+                self.callback(request_id, None, RuntimeError('Rate Limit Exceeded'))
+            else:
+                self.callback(request_id, dict(body, id=f"evt{request_id}"), None)
+
+class FakeEvents:
+    def insert(self, **kwargs):
+        return FakeRequest('insert', **kwargs)
+
+class FakeService:
+    def __init__(self):
+        self.batches = []
+
+    def events(self):
+        return FakeEvents()
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatch(self, callback)
+
+@pytest.fixture
+def calendar_service():
+    service = CalendarService()
+    service._service = FakeService()
+    return service
+
+def test_create_events_batch_preserves_order(calendar_service):
+    """Test that batch results line up with the input and keep per-item errors."""
+    events = [{'summary': f'Event {i}'} for i in range(120)]
+    events[7] = {'summary': 'fail'}
+
+    results = calendar_service.create_events_batch(events)
+
+    assert calendar_service._service.batches == [50, 50, 20]
+    assert len(results) == 120
+    assert isinstance(results[7], RuntimeError)
+    assert results[0]['id'] == 'evt0'
+    assert results[119]['summary'] == 'Event 119'
+
+class FakeFreeBusy:
+    def query(self, body):
+        return FakeRequest('freebusy', body=body)
+
+class FakeFreeBusyBatch(FakeBatch):
+    def execute(self):
+        self.service.batches.append(len(self.requests))
+        for request_id, request in self.requests:
+            items = request.kwargs['body']['items']
+            self.callback(request_id, {'calendars': {
+                item['id']: {'busy': [{'start': '2026-10-19T16:00:00Z', 'end': '2026-10-19T17:00:00Z'}]}
+                for item in items if item['id'] != 'missing'
+            }}, None)
+
+class FakeFreeBusyService(FakeService):
+    def freebusy(self):
+        return FakeFreeBusy()
+
+    def new_batch_http_request(self, callback=None):
+        return FakeFreeBusyBatch(self, callback)
+
+def test_get_free_busy_batches_queries_for_large_groups(calendar_service):
+    """Test that groups beyond one freeBusy query go out as one batch and missing calendars get errors."""
+    calendar_service._service = FakeFreeBusyService()
+    calendar_ids = [f'user{i}@example.com' for i in range(120)] + ['missing']
+
+    calendars = calendar_service.get_free_busy(calendar_ids, datetime(2026, 10, 19, tzinfo=timezone.utc),
+                                               datetime(2026, 10, 20, tzinfo=timezone.utc))
+
+    assert calendar_service._service.batches == [3]
+    assert len(calendars) == 121
+    assert calendars['user119@example.com']['busy'][0]['start'] == '2026-10-19T16:00:00Z'
+    assert calendars['missing'] == {'errors': [{'reason': 'notFound'}]}
+
+def test_watched_calendars_only_poll_as_a_fallback(calendar_service):
+    """Test that a watched calendar's mirror polls at the fallback interval and is marked stale on each switch."""
+    calendar_service.mirror_refresh_interval = 30
+    calendar_service.watch_fallback_interval = 900
+    mirror = calendar_service.get_mirror()
+    mirror._last_sync = 0.0
+
+    calendar_service.set_watched('primary', True)
+    assert mirror.refresh_interval == 900
+    assert mirror._last_sync is None
+    assert calendar_service.get_mirror('other').refresh_interval == 30
+
+    calendar_service.set_watched('primary', False)
+    assert mirror.refresh_interval == 30
+
+def test_retried_batch_returns_existing_events_and_rejects_deleted_ones(tmp_path, monkeypatch):
+    """Test that a batch insert repeated with the same ids answers 409s with the events already created."""
+    from google.oauth2.credentials import Credentials
+    from src.services.credential_store import FileCredentialStore
+    from src.tools.fakes import FakeCalendarServer
+
+    store = FileCredentialStore(str(tmp_path / 'tokens'))
+    store.save('alice', Credentials(token='fake-token'))
+    events = [{'id': f'batchevent{i}', 'summary': f'Event {i}',
+               'start': {'dateTime': f'2026-10-19T1{i}:00:00-07:00'},
+               'end': {'dateTime': f'2026-10-19T1{i}:30:00-07:00'}} for i in range(3)]
+    with FakeCalendarServer() as server:
+        server.insert('primary', dict(events[2], status='cancelled'))
+        monkeypatch.setenv('CALENDAR_API_ENDPOINT', server.api_endpoint)
+        service = CalendarService(user_id='alice', credential_store=store)
+
+        first = service.create_events_batch(events[:2])
+        again = service.create_events_batch([dict(event, summary='Retry') for event in events])
+        imported = service.create_events_batch(events[:1], return_existing=False)
+
+    assert [event['summary'] for event in first] == ['Event 0', 'Event 1']
+    assert again[:2] == first
+    assert isinstance(again[2], ValueError)
+    assert '409' in str(imported[0])
+
+def test_watch_calls_go_through_the_governor(tmp_path, monkeypatch):
+    """Test that opening and stopping push channels is admitted and timed like other Calendar calls."""
+    from google.oauth2.credentials import Credentials
+    from src.services.credential_store import FileCredentialStore
+    from src.services.metrics import metrics
+    from src.tools.fakes import FakeCalendarServer
+
+    store = FileCredentialStore(str(tmp_path / 'tokens'))
+    store.save('alice', Credentials(token='fake-token'))
+    with FakeCalendarServer() as server:
+        monkeypatch.setenv('CALENDAR_API_ENDPOINT', server.api_endpoint)
+        service = CalendarService(user_id='alice', credential_store=store)
+        admitted = service.governor.get_stats()['admitted']
+
+        channel = service.watch_events({'id': 'chan1', 'type': 'web_hook', 'address': 'http://127.0.0.1:9/hook'})
+        service.stop_channel('chan1', channel['resourceId'])
+
+    assert service.governor.get_stats()['admitted'] == admitted + 2
+    assert 'calendar_watch' in metrics.render() and 'calendar_channel_stop' in metrics.render()
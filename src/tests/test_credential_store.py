@@ -0,0 +1,92 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from google.oauth2.credentials import Credentials
+from src.services.credential_store import (CredentialStore, FileCredentialStore, SQLiteCredentialStore,
+                                          CredentialsNotFoundError)
+from src.services.service_pool import CalendarServicePool
+
+class RefreshingCredentials(Credentials):
+    """Credentials whose refresh just extends the expiry instead of calling Google."""
+    refreshed = 0
+
+    def refresh(self, request):
+        RefreshingCredentials.refreshed += 1
+        self.token = 'new-token'
+        self.expiry = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(hours=1)
+
+def make_credentials(expires_in, cls=Credentials):
+    return cls(
+        token='token',
+        refresh_token='refresh',
+        token_uri='https://oauth2.googleapis.com/token',
+        client_id='client',
+        client_secret='secret',
+        expiry=datetime.now(timezone.utc).replace(tzinfo=None) + expires_in
+    )
+
+@pytest.fixture(params=['file', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'file':
+        return FileCredentialStore(str(tmp_path / 'tokens'), legacy_path=str(tmp_path / 'token.pickle'))
+    return SQLiteCredentialStore(str(tmp_path / 'credentials.db'))
+
+def test_store_round_trip(store):
+    """Test that credentials are stored per user and can be removed."""
+    store.save('default', make_credentials(timedelta(hours=1)))
+    store.save('alice@example.com', make_credentials(timedelta(hours=1)))
+
+    loaded = store.load('alice@example.com')
+    assert loaded.refresh_token == 'refresh'
+    assert store.load('bob') is None
+    assert sorted(store.list_users()) == ['alice@example.com', 'default']
+
+    store.delete('alice@example.com')
+    assert store.load('alice@example.com') is None
+
+def test_store_rejects_unsafe_user_ids(store):
+    """Test that user ids can't escape the token directory."""
+    with pytest.raises(ValueError):
+        store.load('../etc/passwd')
+
+def test_unknown_user_is_not_sent_through_oauth_flow(store):
+    """Test that only the default user may trigger the interactive OAuth flow."""
+    pool = CalendarServicePool(credential_store=store)
+    with pytest.raises(CredentialsNotFoundError):
+        pool.get('mallory').get_service()
+    pool.close()
+
+def test_pool_evicts_least_recently_used(store):
+    """Test that the pool is bounded and evicts by LRU."""
+    pool = CalendarServicePool(credential_store=store, max_size=2)
+    alice = pool.get('alice')
+    pool.get('bob')
+    assert pool.get('alice') is alice
+    pool.get('carol')
+
+    assert pool.get('alice') is alice
+    assert pool.get_stats()['evictions'] == 1
+    assert pool.get_stats()['size'] == 2
+    pool.close()
+
+def test_pool_refreshes_tokens_before_expiry(store):
+    """Test that tokens close to expiry are refreshed in the background pass and saved."""
+    pool = CalendarServicePool(credential_store=store, refresh_margin=timedelta(minutes=5))
+    expiring = pool.get('alice')
+    expiring._creds = make_credentials(timedelta(minutes=2), RefreshingCredentials)
+    fresh = pool.get('bob')
+    fresh._creds = make_credentials(timedelta(minutes=30), RefreshingCredentials)
+    RefreshingCredentials.refreshed = 0
+
+    assert pool.refresh_expiring() == 1
+    assert RefreshingCredentials.refreshed == 1
+    assert store.load('alice').token == 'new-token'
+    pool.close()
+
+def test_incomplete_backend_fails_when_created():
+    """Test that a store missing part of the interface can't be instantiated."""
+    class LoadOnlyStore(CredentialStore):
+        def load(self, user_id):
+            return None
+
+    with pytest.raises(TypeError, match='abstract'):
+        LoadOnlyStore()
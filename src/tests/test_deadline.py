@@ -0,0 +1,29 @@
+import asyncio
+import time
+from src.services import deadline
+
+def test_no_deadline_by_default():
+    assert deadline.remaining() is None
+
+def test_nested_deadline_keeps_the_earlier_one():
+    with deadline.deadline(1.0):
+        assert 0.9 < deadline.remaining() <= 1.0
+        with deadline.deadline(10.0):
+            assert deadline.remaining() <= 1.0
+        with deadline.deadline(0.1):
+            assert deadline.remaining() <= 0.1
+    assert deadline.remaining() is None
+
+def test_deadline_follows_the_request_into_threads():
+    async def handler():
+        deadline.set_deadline(2.0)
+        return await asyncio.to_thread(deadline.remaining)
+
+    left = asyncio.run(handler())
+    assert 1.5 < left <= 2.0
+    assert deadline.remaining() is None
+
+def test_remaining_goes_negative_once_passed():
+    with deadline.deadline(0.01):
+        time.sleep(0.02)
+        assert deadline.remaining() < 0
@@ -0,0 +1,138 @@
+import pytest
+from datetime import datetime, timezone
+from googleapiclient.errors import HttpError
+from src.services.event_mirror import EventMirror
+
+def make_event(event_id, start, end, **extra):
+    return dict({
+        'id': event_id,
+        'summary': event_id,
+        'start': {'dateTime': start, 'timeZone': 'America/Los_Angeles'},
+        'end': {'dateTime': end, 'timeZone': 'America/Los_Angeles'}
+    }, **extra)
+
+class FakeResponse(dict):
+    def __init__(self, status):
+        super().__init__(status=str(status))
+        self.status = status
+        self.reason = 'Gone'
+
+class FakeList:
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self):
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+class FakeCalendarApi:
+    """Serves queued events.list responses and records the parameters used."""
+    def __init__(self):
+        self.responses = []
+        self.calls = []
+
+    def events(self):
+        return self
+
+    def list(self, **params):
+        self.calls.append(params)
+        return FakeList(self.responses.pop(0))
+
+@pytest.fixture
+def api():
+    return FakeCalendarApi()
+
+@pytest.fixture
+def mirror(api):
+    return EventMirror(lambda: api, refresh_interval=30, clock=lambda: 0.0)
+
+def test_range_queries_served_from_index(api, mirror):
+    """Test that a full sync follows pages and range queries use the index."""
+    api.responses = [
+        {'items': [make_event('b', '2026-10-20T10:00:00-07:00', '2026-10-20T11:00:00-07:00')],
+         'nextPageToken': 'page2'},
+        {'items': [
+            make_event('a', '2026-10-19T09:00:00-07:00', '2026-10-19T17:00:00-07:00'),
+            make_event('c', '2026-10-21T10:00:00-07:00', '2026-10-21T11:00:00-07:00'),
+            {'id': 'd', 'summary': 'Holiday', 'start': {'date': '2026-10-22'}, 'end': {'date': '2026-10-23'}}
+        ], 'nextSyncToken': 'token1'},
+    ]
+
+    events = mirror.events_between(
+        datetime(2026, 10, 19, 20, tzinfo=timezone.utc),
+        datetime(2026, 10, 21, 16, 30, tzinfo=timezone.utc)
+    )
+
+    # 'a' started before timeMin but is still running, 'c' starts after timeMax
+    assert [event['id'] for event in events] == ['a', 'b']
+    assert api.calls[1]['pageToken'] == 'page2'
+    assert 'syncToken' not in api.calls[0]
+    assert [e['id'] for e in mirror.events_between(limit=10)] == ['a', 'b', 'c', 'd']
+
+def test_incremental_sync_applies_changes(api, mirror):
+    """Test that incremental syncs move, add and remove events."""
+    api.responses = [
+        {'items': [make_event('a', '2026-10-19T09:00:00-07:00', '2026-10-19T10:00:00-07:00'),
+                   make_event('b', '2026-10-20T09:00:00-07:00', '2026-10-20T10:00:00-07:00')],
+         'nextSyncToken': 'token1'},
+        {'items': [make_event('a', '2026-10-25T09:00:00-07:00', '2026-10-25T10:00:00-07:00'),
+                   {'id': 'b', 'status': 'cancelled'},
+                   make_event('c', '2026-10-18T09:00:00-07:00', '2026-10-18T10:00:00-07:00')],
+         'nextSyncToken': 'token2'},
+    ]
+    mirror.sync()
+    mirror.sync(force=True)
+
+    assert api.calls[1]['syncToken'] == 'token1'
+    assert [e['id'] for e in mirror.events_between()] == ['c', 'a']
+    assert mirror.get_stats() == {'full_syncs': 1, 'incremental_syncs': 1, 'events': 2, 'recurring_series': 0, 'has_sync_token': True}
+
+def test_reads_within_refresh_interval_skip_api(api, mirror):
+    """Test that reads between refreshes don't call the API."""
+    api.responses = [{'items': [], 'nextSyncToken': 'token1'}]
+    mirror.events_between()
+    mirror.sync()
+    assert len(api.calls) == 1
+
+def test_invalid_sync_token_triggers_full_resync(api, mirror):
+    """Test that a 410 Gone response drops the token and resyncs everything."""
+    api.responses = [
+        {'items': [make_event('a', '2026-10-19T09:00:00-07:00', '2026-10-19T10:00:00-07:00')],
+         'nextSyncToken': 'token1'},
+        HttpError(FakeResponse(410), b'{"error": {"message": "Sync token is no longer valid"}}'),
+        {'items': [make_event('b', '2026-10-20T09:00:00-07:00', '2026-10-20T10:00:00-07:00')],
+         'nextSyncToken': 'token2'},
+    ]
+    mirror.sync()
+    mirror.sync(force=True)
+
+    assert 'syncToken' not in api.calls[2]
+    assert [e['id'] for e in mirror.events_between()] == ['b']
+    assert mirror.get_stats()['full_syncs'] == 2
+
+def test_iter_between_pages_through_index(api, mirror):
+    """Test that lazy iteration across index pages matches events_between, with and without a limit."""
+    api.responses = [{'items': [
+        make_event(f'e{day:02d}', f'2026-10-{day:02d}T09:00:00-07:00', f'2026-10-{day:02d}T10:00:00-07:00')
+        for day in range(1, 29)
+    ], 'nextSyncToken': 'token1'}]
+    time_min = datetime(2026, 10, 5, 17, tzinfo=timezone.utc)
+    time_max = datetime(2026, 10, 20, tzinfo=timezone.utc)
+
+    expected = [e['id'] for e in mirror.events_between(time_min, time_max)]
+    assert expected == [f'e{day:02d}' for day in range(6, 20)]
+    assert [e['id'] for e in mirror.iter_between(time_min, time_max, page_size=3)] == expected
+    assert [e['id'] for e in mirror.iter_between(time_min, time_max, limit=4, page_size=3)] == expected[:4]
+
+def test_only_used_fields_are_fetched_and_kept(api, mirror):
+    api.responses = [{'items': [], 'nextSyncToken': 'token1'}]
+    mirror.sync()
+    fields = api.calls[0]['fields']
+    assert fields.startswith('nextPageToken,nextSyncToken,items(id,status,')
+
+    mirror.upsert(make_event('a', '2026-10-19T09:00:00-07:00', '2026-10-19T10:00:00-07:00',
+                             creator={'email': 'me@example.com'}, htmlLink='https://calendar/a'))
+    event = mirror.events_between()[0]
+    assert 'creator' not in event
+    assert event['htmlLink'] == 'https://calendar/a'
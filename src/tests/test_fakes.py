@@ -0,0 +1,124 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+from openai import OpenAI
+from src.tools.fakes import FakeCalendarServer, FakeOpenAIServer
+from src.tools.benchmark import percentile, run_load
+
+EVENT = {
+    'summary': 'Design review',
+    'start': {'dateTime': '2026-10-19T09:00:00-07:00', 'timeZone': 'America/Los_Angeles'},
+    'end': {'dateTime': '2026-10-19T10:00:00-07:00', 'timeZone': 'America/Los_Angeles'}
+}
+
+@pytest.fixture
+def calendar():
+    with FakeCalendarServer() as server:
+        yield server
+
+def test_openai_fake_with_real_client():
+    """Test that the OpenAI client can talk to the fake, streaming or not."""
+    with FakeOpenAIServer() as server:
+        client = OpenAI(api_key='fake-key', base_url=f"{server.url}/v1")
+        messages = [{'role': 'user', 'content': 'Parse this calendar query: "Lunch with Sam tomorrow at noon"'}]
+
+        response = client.chat.completions.create(model='gpt-4o-mini', messages=messages)
+        result = json.loads(response.choices[0].message.content)
+        assert result['event']['summary']
+        assert response.usage.prompt_tokens > 0
+
+        stream = client.chat.completions.create(model='gpt-4o-mini', messages=messages, stream=True,
+                                                stream_options={'include_usage': True})
+        chunks = list(stream)
+        text = ''.join(chunk.choices[0].delta.content or '' for chunk in chunks if chunk.choices)
+        assert json.loads(text) == result
+        assert chunks[-1].usage is not None
+
+def test_calendar_fake_incremental_sync(calendar):
+    """Test that a sync token only returns events changed since it was issued."""
+    events_url = f"{calendar.api_endpoint}calendars/primary/events"
+    requests.post(events_url, json=EVENT)
+    first = requests.get(events_url).json()
+    assert len(first['items']) == 1
+
+    requests.post(events_url, json=dict(EVENT, summary='Retro'))
+    changed = requests.get(events_url, params={'syncToken': first['nextSyncToken']}).json()
+    assert [e['summary'] for e in changed['items']] == ['Retro']
+
+    assert requests.get(events_url, params={'syncToken': 'stale'}).status_code == 410
+
+def test_calendar_fake_free_busy(calendar):
+    requests.post(f"{calendar.api_endpoint}calendars/primary/events", json=EVENT)
+    body = {'timeMin': '2026-10-19T00:00:00Z', 'timeMax': '2026-10-20T00:00:00Z', 'items': [{'id': 'primary'}]}
+    busy = requests.post(f"{calendar.api_endpoint}freeBusy", json=body).json()['calendars']['primary']['busy']
+    assert busy == [{'start': '2026-10-19T16:00:00Z', 'end': '2026-10-19T17:00:00Z'}]
+
+def test_calendar_fake_posts_watch_notifications(calendar):
+    """Test that a watch channel gets a sync notification, then one per change, and stops when asked."""
+    received = []
+
+    class Webhook(BaseHTTPRequestHandler):
+        def do_POST(self):
+            received.append({key: value for key, value in self.headers.items() if key.startswith('X-Goog-')})
+            self.send_response(200 if self.headers['X-Goog-Channel-Token'] == 'secret' else 404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    webhook = ThreadingHTTPServer(('127.0.0.1', 0), Webhook)
+    threading.Thread(target=webhook.serve_forever, daemon=True).start()
+    try:
+        channel = requests.post(f"{calendar.api_endpoint}calendars/primary/events/watch", json={
+            'id': 'chan-1', 'type': 'web_hook', 'token': 'secret',
+            'address': f"http://127.0.0.1:{webhook.server_address[1]}/calendar/notifications"
+        }).json()
+        calendar.insert('primary', EVENT)
+        calendar.insert('other', EVENT)
+        deadline = time.monotonic() + 5
+        while len(calendar.notifications) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        assert calendar.notifications == [('chan-1', 'sync', 200), ('chan-1', 'exists', 200)]
+        assert [(h['X-Goog-Resource-State'], h['X-Goog-Message-Number']) for h in received] == [
+            ('sync', '1'), ('exists', '2')
+        ]
+        assert received[1]['X-Goog-Resource-ID'] == channel['resourceId']
+
+        stop = {'id': 'chan-1', 'resourceId': channel['resourceId']}
+        assert requests.post(f"{calendar.api_endpoint}channels/stop", json=stop).status_code == 204
+        assert requests.post(f"{calendar.api_endpoint}channels/stop", json=stop).status_code == 404
+    finally:
+        webhook.shutdown()
+        webhook.server_close()
+
+def test_record_then_replay(tmp_path, calendar):
+    """Test that recorded responses are replayed without the upstream server."""
+    cassette = str(tmp_path / 'calendar.json')
+    with FakeCalendarServer(mode='record', cassette=cassette, upstream=calendar.url) as recorder:
+        recorded = requests.post(f"{recorder.api_endpoint}calendars/primary/events", json=EVENT).json()
+
+    with FakeCalendarServer(mode='replay', cassette=cassette) as replayer:
+        replayed = requests.post(f"{replayer.api_endpoint}calendars/primary/events", json=EVENT)
+        missing = requests.get(f"{replayer.api_endpoint}calendars/other/events")
+
+    assert replayed.json() == recorded
+    assert missing.status_code == 404
+
+def test_injected_errors_counted_by_run_load():
+    with FakeCalendarServer(error_rate=1.0, error_status=503) as server:
+        result = run_load(server.url, 'GET', '/calendar/v3/calendars/primary/events', None,
+                          concurrency=2, total=6)
+    assert result['requests'] == 6
+    assert result['errors'] == 6
+    assert result['statuses'] == {'503': 6}
+
+def test_percentile_nearest_rank():
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 0.50) == 50.0
+    assert percentile(values, 0.99) == 99.0
+    assert percentile([], 0.5) == 0.0
@@ -0,0 +1,123 @@
+import pytest
+from datetime import datetime, timedelta
+import numpy as np
+import pytz
+from src.services.group_availability import GroupAvailability, busy_bitmap, working_hours_mask
+
+TZ = pytz.timezone('America/Los_Angeles')
+# Monday 2026-10-19, before working hours
+NOW = TZ.localize(datetime(2026, 10, 19, 6)).timestamp()
+
+def local(day, hour, minute=0):
+    return TZ.localize(datetime(2026, 10, day, hour, minute))
+
+class FakeCalendarService:
+    timezone = 'America/Los_Angeles'
+
+    def __init__(self, busy, errors=()):
+        self.busy = busy
+        self.errors = errors
+        self.calls = []
+
+    def get_free_busy(self, calendar_ids, time_min, time_max):
+        self.calls.append(list(calendar_ids))
+        return {
+            calendar_id: {'errors': [{'reason': 'notFound'}]} if calendar_id in self.errors else
+            {'busy': [{'start': start.isoformat(), 'end': end.isoformat()}
+                      for start, end in self.busy.get(calendar_id, [])]}
+            for calendar_id in calendar_ids
+        }
+
+def attendees(*ids, optional=(), zones=None):
+    return [{'id': i, 'optional': i in optional, 'timeZone': (zones or {}).get(i)} for i in ids]
+
+def find(service, people, **kwargs):
+    kwargs.setdefault('time_min', local(19, 0))
+    kwargs.setdefault('time_max', local(20, 0))
+    kwargs.setdefault('duration', timedelta(hours=1))
+    return GroupAvailability(service).find_slots(people, now=NOW, **kwargs)
+
+def test_busy_bitmap_covers_partly_busy_cells_and_clips_to_the_range():
+    """Test that a cell is busy if any interval overlaps it, and intervals outside the range are dropped."""
+    busy = busy_bitmap([np.array([[-100.0, 60.0], [290.0, 300.0]]), np.empty((0, 2)),
+                        np.array([[500.0, 700.0], [900.0, 1000.0]])], start=0, cells=4, resolution=100)
+
+    assert busy.tolist() == [
+        [True, False, True, False],
+        [False, False, False, False],
+        [False, False, False, False],
+    ]
+
+def test_working_hours_follow_each_time_zone_and_dst():
+    """Test that working hours are local to each zone, skip weekends, and stay put across a DST change."""
+    # Saturday 2026-10-31 through Tuesday 2026-11-03; US clocks go back on Sunday
+    start = int(TZ.localize(datetime(2026, 10, 31)).timestamp())
+    times = start + np.arange(4 * 24, dtype=np.int64) * 3600
+    mask = working_hours_mask(TZ, times, 3600, 9, 17)
+
+    open_hours = [datetime.fromtimestamp(int(t), TZ) for t in times[mask]]
+    assert sorted({t.date().isoformat() for t in open_hours}) == ['2026-11-02', '2026-11-03']
+    assert [t.hour for t in open_hours] == list(range(9, 17)) * 2
+
+    london = working_hours_mask(pytz.timezone('Europe/London'), times, 3600, 9, 17)
+    assert datetime.fromtimestamp(int(times[london][0]), TZ).hour == 1
+
+def test_required_attendees_must_all_be_free_and_optional_ones_rank_slots():
+    """Test that slots need every required attendee and prefer ones more optional attendees can make."""
+    service = FakeCalendarService({
+        'primary': [(local(19, 8), local(19, 9))],
+        'ana': [(local(19, 9), local(19, 10))],
+        'bo': [(local(19, 10), local(19, 20))],
+        'cy': [(local(19, 8), local(19, 11))],
+    })
+
+    result = find(service, attendees('primary', 'ana', 'bo', 'cy', optional=('bo', 'cy')), limit=3)
+
+    assert service.calls == [['primary', 'ana', 'bo', 'cy']]
+    assert result['errors'] == {}
+    # bo is busy from 10:00 and cy until 11:00, so 11:00 onwards beats 10:00 and 10:30
+    assert [slot['start'] for slot in result['slots']] == [
+        local(19, 11).isoformat(), local(19, 11, 30).isoformat(), local(19, 12).isoformat()
+    ]
+    assert result['slots'][0]['available'] == ['primary', 'ana', 'cy']
+    assert result['slots'][0]['unavailable'] == ['bo']
+    assert result['slots'][0]['end'] == local(19, 12).isoformat()
+
+def test_attendee_time_zones_and_granularity_narrow_the_slots():
+    """Test that an attendee's own working hours apply and starts follow the granularity grid."""
+    service = FakeCalendarService({})
+    people = attendees('primary', 'london', zones={'london': 'Europe/London'})
+
+    slots = find(service, people, granularity=timedelta(minutes=15), limit=100)['slots']
+
+    # London works until 20:00 there, 12:00 in Los Angeles
+    assert slots[0]['start'] == local(19, 8).isoformat()
+    assert slots[1]['start'] == local(19, 8, 15).isoformat()
+    assert slots[-1]['start'] == local(19, 11).isoformat()
+
+def test_slots_start_after_now_and_unreadable_calendars_are_reported():
+    """Test that past times aren't offered and calendars with errors are left out."""
+    service = FakeCalendarService({}, errors=('ghost',))
+    now = local(19, 14, 10).timestamp()
+
+    result = GroupAvailability(service).find_slots(
+        attendees('primary', 'ghost'), local(19, 0), local(20, 0), timedelta(hours=1), now=now
+    )
+
+    assert result['errors'] == {'ghost': 'notFound'}
+    assert result['slots'][0]['start'] == local(19, 14, 30).isoformat()
+    assert result['slots'][0]['available'] == ['primary']
+
+@pytest.mark.parametrize('kwargs, message', [
+    ({'duration': timedelta(minutes=7)}, 'multiple of 5 minutes'),
+    ({'time_max': local(19, 0) + timedelta(days=90)}, 'at most 62 days'),
+    ({'time_max': local(18, 0)}, 'timeMax must be after timeMin'),
+    ({'day_start': 18, 'day_end': 9}, 'Working hours'),
+    ({'duration': timedelta(hours=13)}, 'longer than the working day'),
+])
+def test_invalid_requests_raise_value_error(kwargs, message):
+    """Test that bad ranges, durations and working hours are rejected before any fetch."""
+    service = FakeCalendarService({})
+    with pytest.raises(ValueError, match=message):
+        find(service, attendees('primary'), **kwargs)
+    assert service.calls == []
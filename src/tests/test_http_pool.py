@@ -0,0 +1,97 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from src.services.http_pool import HttpPool
+from src.services.rate_governor import UpstreamUnavailableError
+
+class FakeHttp:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+class FakePool(HttpPool):
+    def _new_http(self):
+        return FakeHttp()
+
+def test_connections_are_bounded_and_reused():
+    pool = FakePool(size=2, max_wait=5)
+    with pool.connection() as first:
+        pass
+    with pool.connection() as again:
+        assert again is first
+
+    in_use = []
+    lock = threading.Lock()
+
+    def borrow(_):
+        with pool.connection() as http:
+            with lock:
+                in_use.append(http)
+            time.sleep(0.02)
+
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(borrow, range(16)))
+
+    stats = pool.get_stats()
+    assert len(set(map(id, in_use))) <= 2
+    assert stats['open'] == 2
+    assert stats['peak_in_use'] == 2
+    assert stats['in_use'] == 0
+    assert stats['waits'] > 0
+
+def test_exhausted_pool_times_out():
+    pool = FakePool(size=1, max_wait=0.05)
+    with pool.connection():
+        with pytest.raises(UpstreamUnavailableError):
+            with pool.connection():
+                pass
+    assert pool.get_stats()['timeouts'] == 1
+
+def test_failed_request_discards_connection():
+    pool = FakePool(size=1)
+    with pytest.raises(OSError):
+        with pool.connection() as broken:
+            raise OSError('connection reset')
+    assert broken.closed
+    with pool.connection() as fresh:
+        assert fresh is not broken
+    assert pool.get_stats()['discarded'] == 1
+
+def test_concurrent_calls_share_one_service(tmp_path, monkeypatch):
+    """Test that threads use one service object in parallel over reused pooled connections."""
+    from google.oauth2.credentials import Credentials
+    from src.services.calendar_service import CalendarService
+    from src.services.credential_store import FileCredentialStore
+    from src.tools.fakes import FakeCalendarServer
+
+    store = FileCredentialStore(str(tmp_path / 'tokens'))
+    store.save('alice', Credentials(token='fake-token'))
+    pool = HttpPool(size=4)
+    with FakeCalendarServer(latency=0.02) as server:
+        monkeypatch.setenv('CALENDAR_API_ENDPOINT', server.api_endpoint)
+        calendar = CalendarService(user_id='alice', credential_store=store, http_pool=pool)
+        event = {'summary': 'Sync', 'start': {'dateTime': '2026-10-20T09:00:00Z'},
+                 'end': {'dateTime': '2026-10-20T09:30:00Z'}}
+
+        def create(_):
+            return calendar.create_event(dict(event))['id']
+
+        with ThreadPoolExecutor(8) as executor:
+            ids = list(executor.map(create, range(24)))
+        services = set()
+        threads = [threading.Thread(target=lambda: services.add(id(calendar.get_service()))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert len(set(ids)) == 24
+    assert len(services) == 1
+    stats = pool.get_stats()
+    assert stats['open'] <= 4
+    assert stats['peak_in_use'] > 1
+    assert stats['reused'] >= 20
+    pool.close()
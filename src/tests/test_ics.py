@@ -0,0 +1,165 @@
+import pytest
+from datetime import datetime
+import pytz
+from src.services.ics import ICSParser, ICSImport, vevent_to_event, ics_lines, fold, parse_duration
+
+CALENDAR = """BEGIN:VCALENDAR\r
+VERSION:2.0\r
+X-WR-TIMEZONE:America/New_York\r
+BEGIN:VTIMEZONE\r
+TZID:Europe/Berlin\r
+BEGIN:STANDARD\r
+DTSTART:19701025T030000\r
+END:STANDARD\r
+END:VTIMEZONE\r
+BEGIN:VEVENT\r
+UID:standup@example.com\r
+DTSTART;TZID=Europe/Berlin:20261019T090000\r
+DURATION:PT15M\r
+RRULE:FREQ=WEEKLY;BYDAY=MO,WE\r
+EXDATE;TZID=Europe/Berlin:20261021T090000\r
+SUMMARY:Standup\\, daily\r
+DESCRIPTION:Line one\\nLine two that is long enough to be folded across more than one line of \r
+ the file\r
+BEGIN:VALARM\r
+TRIGGER:-PT5M\r
+DESCRIPTION:Alarm text\r
+END:VALARM\r
+END:VEVENT\r
+BEGIN:VEVENT\r
+UID:offsite@example.com\r
+DTSTART;VALUE=DATE:20261102\r
+SUMMARY:Offsite\r
+TRANSP:TRANSPARENT\r
+END:VEVENT\r
+BEGIN:VEVENT\r
+UID:flight@example.com\r
+DTSTART:20261105T140000Z\r
+DTEND:20261105T170000Z\r
+SUMMARY:Flight\r
+LOCATION:SFO\r
+END:VEVENT\r
+BEGIN:VEVENT\r
+UID:cancelled@example.com\r
+DTSTART:20261106T140000Z\r
+STATUS:CANCELLED\r
+SUMMARY:Cancelled\r
+END:VEVENT\r
+END:VCALENDAR\r
+"""
+
+def parse(text, chunk_size):
+    parser = ICSParser()
+    data = text.encode()
+    events = []
+    for offset in range(0, len(data), chunk_size):
+        events.extend(parser.feed(data[offset:offset + chunk_size]))
+    events.extend(parser.close())
+    return parser, events
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 100000])
+def test_parser_handles_any_chunking(chunk_size):
+    """Test that folded lines and CRLFs split across chunks parse the same."""
+    parser, events = parse(CALENDAR, chunk_size)
+    assert len(events) == 4
+    assert parser.calendar_timezone == 'America/New_York'
+    assert events[0]['DESCRIPTION'][0].value.endswith('more than one line of the file')
+    # The VALARM's DESCRIPTION doesn't leak into the event
+    assert len(events[0]['DESCRIPTION']) == 1
+
+def test_vevent_mapping():
+    parser, events = parse(CALENDAR, 4096)
+    standup, offsite, flight, _ = [vevent_to_event(e, 'America/New_York') for e in events]
+
+    assert standup['summary'] == 'Standup, daily'
+    assert standup['description'].startswith('Line one\nLine two')
+    assert standup['start'] == {'dateTime': '2026-10-19T09:00:00', 'timeZone': 'Europe/Berlin'}
+    assert standup['end'] == {'dateTime': '2026-10-19T09:15:00', 'timeZone': 'Europe/Berlin'}
+    assert standup['recurrence'] == ['RRULE:FREQ=WEEKLY;BYDAY=MO,WE', 'EXDATE;TZID=Europe/Berlin:20261021T090000']
+
+    assert offsite['start'] == {'date': '2026-11-02'}
+    assert offsite['end'] == {'date': '2026-11-03'}
+    assert offsite['transparency'] == 'transparent'
+
+    assert flight['start'] == {'dateTime': '2026-11-05T14:00:00+00:00'}
+    assert flight['location'] == 'SFO'
+
+def test_all_day_duration_and_utc_recurrence():
+    """Test that all-day events end on a later date and recurring UTC events get a time zone."""
+    def vevent(*lines):
+        _, events = parse("BEGIN:VCALENDAR\r\nBEGIN:VEVENT\r\n" + "".join(f"{line}\r\n" for line in lines)
+                          + "END:VEVENT\r\nEND:VCALENDAR\r\n", 4096)
+        return vevent_to_event(events[0], 'America/New_York')
+
+    assert vevent('DTSTART;VALUE=DATE:20250301', 'DURATION:PT1H')['end'] == {'date': '2025-03-02'}
+    assert vevent('DTSTART;VALUE=DATE:20250301', 'DURATION:P1DT1H')['end'] == {'date': '2025-03-03'}
+
+    weekly = vevent('DTSTART:20250301T150000Z', 'DURATION:PT30M', 'RRULE:FREQ=WEEKLY')
+    assert weekly['start'] == {'dateTime': '2025-03-01T15:00:00+00:00', 'timeZone': 'UTC'}
+    assert weekly['end'] == {'dateTime': '2025-03-01T15:30:00+00:00', 'timeZone': 'UTC'}
+
+def test_invalid_input():
+    with pytest.raises(ValueError):
+        parse("BEGIN:VEVENT\r\nEND:VEVENT\r\n", 4096)
+    with pytest.raises(ValueError):
+        parse("BEGIN:VCALENDAR\r\nBEGIN:VEVENT\r\n", 4096)
+    assert parse_duration('-P1DT2H') == -parse_duration('P1DT2H')
+
+def test_fold_respects_octets_and_characters():
+    line = 'SUMMARY:' + 'é' * 60
+    folded = fold(line)
+    assert all(len(part.encode()) <= 75 for part in folded.split('\r\n'))
+    assert folded.replace('\r\n ', '').rstrip('\r\n') == line
+
+@pytest.fixture
+def calendar_service(tmp_path, monkeypatch):
+    from google.oauth2.credentials import Credentials
+    from src.services.calendar_service import CalendarService
+    from src.services.credential_store import FileCredentialStore
+    from src.tools.fakes import FakeCalendarServer
+
+    store = FileCredentialStore(str(tmp_path / 'tokens'))
+    store.save('alice', Credentials(token='fake-token'))
+    with FakeCalendarServer() as server:
+        monkeypatch.setenv('CALENDAR_API_ENDPOINT', server.api_endpoint)
+        yield CalendarService(user_id='alice', credential_store=store)
+
+def run_import(calendar_service, text, batch_size=2):
+    importer = ICSImport(calendar_service, batch_size=batch_size)
+    data = text.encode()
+    for offset in range(0, len(data), 50):
+        importer.feed(data[offset:offset + 50])
+    return importer.close()
+
+def test_import_is_batched_and_repeatable(calendar_service):
+    """Test that an import inserts each event once, and importing again skips them."""
+    summary = run_import(calendar_service, CALENDAR)
+    assert summary == {'imported': 3, 'skipped': 1, 'failed': 0, 'errors': []}
+
+    again = run_import(calendar_service, CALENDAR)
+    assert again['imported'] == 0
+    assert again['skipped'] == 4
+    assert len(list(calendar_service.iter_events())) == 3
+
+def test_import_reports_bad_events(calendar_service):
+    text = CALENDAR.replace('DTSTART:20261105T140000Z', 'DTSTART:not-a-date')
+    summary = run_import(calendar_service, text)
+    assert summary['imported'] == 2
+    assert summary['failed'] == 1
+    assert summary['errors'][0]['uid'] == 'flight@example.com'
+
+def test_export_round_trip(calendar_service):
+    """Test that exported events import back unchanged, paging through the API."""
+    run_import(calendar_service, CALENDAR)
+    events = calendar_service.iter_events(time_min=pytz.utc.localize(datetime(2026, 1, 1)), page_size=1)
+    exported = ''.join(ics_lines(events, 'America/New_York'))
+
+    assert exported.startswith('BEGIN:VCALENDAR\r\n')
+    assert exported.endswith('END:VCALENDAR\r\n')
+    _, reparsed = parse(exported, 4096)
+    by_summary = {e['summary']: e for e in (vevent_to_event(v, 'America/New_York') for v in reparsed)}
+    assert set(by_summary) == {'Standup, daily', 'Offsite', 'Flight'}
+    assert by_summary['Standup, daily']['start'] == {'dateTime': '2026-10-19T09:00:00', 'timeZone': 'Europe/Berlin'}
+    assert by_summary['Standup, daily']['recurrence'][0] == 'RRULE:FREQ=WEEKLY;BYDAY=MO,WE'
+    assert by_summary['Offsite']['end'] == {'date': '2026-11-03'}
+    assert by_summary['Flight']['start'] == {'dateTime': '2026-11-05T14:00:00+00:00'}
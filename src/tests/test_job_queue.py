@@ -0,0 +1,195 @@
+import time
+import pytest
+from types import SimpleNamespace
+from src.services.job_queue import JobQueue, is_retryable, FAILED, QUEUED, SUCCEEDED
+from src.services.event_jobs import error_details, event_id_for, job_event_id
+from src.services.availability_service import SchedulingConflictError
+
+class FakeHttpError(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.resp = SimpleNamespace(status=status, get=lambda name: None)
+
+class RateLimitError(Exception):
+    status_code = 429
+
+def make_queue(tmp_path, handler, **kwargs):
+    return JobQueue({'schedule': handler}, path=str(tmp_path / 'jobs.db'), base_delay=0.0,
+                    describe_error=error_details, **kwargs)
+
+def test_duplicate_requests_collapse(tmp_path):
+    """Test that the same payload, or the same client key, maps to a single job."""
+    queue = make_queue(tmp_path, lambda job: {})
+    first, created = queue.enqueue('alice', 'schedule', {'event': {'summary': 'Standup'}})
+    again, created_again = queue.enqueue('alice', 'schedule', {'event': {'summary': 'Standup'}})
+    other_user, _ = queue.enqueue('bob', 'schedule', {'event': {'summary': 'Standup'}})
+
+    assert created and not created_again
+    assert again['id'] == first['id']
+    assert other_user['id'] != first['id']
+    assert job_event_id(again) == job_event_id(first) != job_event_id(other_user)
+
+    queue.enqueue('alice', 'schedule', {'event': {'summary': 'Retro'}}, idempotency_key='k1')
+    with pytest.raises(ValueError):
+        queue.enqueue('alice', 'schedule', {'event': {'summary': 'Planning'}}, idempotency_key='k1')
+
+def test_identical_requests_without_a_key_are_new_once_the_window_passes(tmp_path, monkeypatch):
+    """Test that a keyless request repeated later gets a new job and event id, unlike one with a client key."""
+    queue = make_queue(tmp_path, lambda job: {}, dedupe_window=60)
+    payload = {'query': 'standup tomorrow at 9'}
+    monday, _ = queue.enqueue('alice', 'schedule', payload)
+    keyed, _ = queue.enqueue('alice', 'schedule', payload, idempotency_key='k1')
+
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + 86400)
+    tuesday, created = queue.enqueue('alice', 'schedule', payload)
+    keyed_again, keyed_created = queue.enqueue('alice', 'schedule', payload, idempotency_key='k1')
+
+    assert created and tuesday['id'] != monday['id']
+    assert job_event_id(tuesday) != job_event_id(monday)
+    assert not keyed_created and keyed_again['id'] == keyed['id']
+    assert job_event_id(keyed) == event_id_for('alice', 'k1')
+
+def test_retryable_errors_are_retried(tmp_path):
+    """Test that 429/5xx failures are retried and the job succeeds once the call does."""
+    calls = []
+
+    def handler(job):
+        calls.append(job['attempts'])
+        if len(calls) < 3:
+            raise FakeHttpError(503 if len(calls) == 1 else 429)
+        return {'id': 'evt1'}
+
+    queue = make_queue(tmp_path, handler)
+    job, _ = queue.enqueue('alice', 'schedule', {'event': {}})
+    queue.run_pending()
+
+    job = queue.get(job['id'])
+    assert calls == [1, 2, 3]
+    assert job['status'] == SUCCEEDED
+    assert job['result'] == {'id': 'evt1'}
+
+def test_permanent_errors_fail_the_job(tmp_path):
+    """Test that a non-retryable error fails at once and keeps the endpoint's status code."""
+    def handler(job):
+        raise SchedulingConflictError([{'start': 'a', 'end': 'b'}])
+
+    queue = make_queue(tmp_path, handler)
+    job, _ = queue.enqueue('alice', 'schedule', {'event': {}})
+    queue.run_pending()
+
+    job = queue.get(job['id'])
+    assert job['status'] == FAILED
+    assert job['attempts'] == 1
+    assert job['error']['code'] == 409
+    assert job['error']['conflicts'] == [{'start': 'a', 'end': 'b'}]
+
+def test_retries_stop_at_max_attempts(tmp_path):
+    def handler(job):
+        raise FakeHttpError(500)
+
+    queue = make_queue(tmp_path, handler, max_attempts=2)
+    job, _ = queue.enqueue('alice', 'schedule', {'event': {}})
+    queue.run_pending()
+
+    job = queue.get(job['id'])
+    assert job['status'] == FAILED
+    assert job['attempts'] == 2
+
+def test_expired_lease_is_reclaimed(tmp_path):
+    """Test that a job left running by a crashed worker runs again after its lease."""
+    queue = make_queue(tmp_path, lambda job: {'id': 'evt1'}, lease_seconds=0.01)
+    job, _ = queue.enqueue('alice', 'schedule', {'event': {}})
+    assert queue._claim()['id'] == job['id']
+    assert queue._claim() is None
+
+    time.sleep(0.02)
+    assert queue.run_pending() == 1
+    assert queue.get(job['id'])['attempts'] == 2
+
+def test_workers_run_jobs_in_background(tmp_path):
+    queue = make_queue(tmp_path, lambda job: {'id': job['payload']['event']['summary']}, workers=2).start()
+    try:
+        jobs = [queue.enqueue('alice', 'schedule', {'event': {'summary': f'e{i}'}})[0] for i in range(5)]
+        deadline = time.time() + 5
+        while queue.get_stats()[SUCCEEDED] < 5 and time.time() < deadline:
+            time.sleep(0.01)
+    finally:
+        queue.close()
+
+    assert [queue.get(job['id'])['result']['id'] for job in jobs] == [f'e{i}' for i in range(5)]
+    assert queue.get_stats()[QUEUED] == 0
+
+def test_jobs_are_private_to_their_user(tmp_path):
+    queue = make_queue(tmp_path, lambda job: {})
+    job, _ = queue.enqueue('alice', 'schedule', {'event': {}})
+    assert queue.get(job['id'], user_id='alice') is not None
+    assert queue.get(job['id'], user_id='bob') is None
+
+def test_retryable_classification():
+    """Test that wrapped rate-limit errors retry but validation errors don't."""
+    try:
+        try:
+            raise RateLimitError('rate limited')
+        except RateLimitError:
+            raise ValueError("Failed to parse query with LLM: rate limited")
+    except ValueError as wrapped:
+        assert is_retryable(wrapped)
+
+    assert is_retryable(ConnectionResetError())
+    assert not is_retryable(ValueError("Query cannot be empty"))
+    assert not is_retryable(FakeHttpError(400))
+
+def test_event_id_is_stable_and_valid():
+    event_id = event_id_for('alice', 'key-1')
+    assert event_id == event_id_for('alice', 'key-1') != event_id_for('bob', 'key-1')
+    # Calendar event ids use base32hex characters
+    assert set(event_id) <= set('0123456789abcdefghijklmnopqrstuv')
+    assert event_id_for('alice', None) is None
+
+def test_create_event_with_id_is_idempotent(tmp_path, monkeypatch):
+    """Test that repeating an insert with the same event id returns the first event instead of a duplicate."""
+    from google.oauth2.credentials import Credentials
+    from src.services.calendar_service import CalendarService
+    from src.services.credential_store import FileCredentialStore
+    from src.tools.fakes import FakeCalendarServer
+
+    store = FileCredentialStore(str(tmp_path / 'tokens'))
+    store.save('alice', Credentials(token='fake-token'))
+    event = {
+        'summary': 'Design review',
+        'start': {'dateTime': '2026-10-19T09:00:00-07:00'},
+        'end': {'dateTime': '2026-10-19T10:00:00-07:00'}
+    }
+    with FakeCalendarServer() as server:
+        monkeypatch.setenv('CALENDAR_API_ENDPOINT', server.api_endpoint)
+        service = CalendarService(user_id='alice', credential_store=store)
+        event_id = event_id_for('alice', 'key-1')
+
+        first = service.create_event(event, event_id=event_id)
+        second = service.create_event(dict(event, summary='Design review (retry)'), event_id=event_id)
+        listed = service.get_service().events().list(calendarId='primary').execute()
+
+    assert first['id'] == second['id'] == event_id
+    assert second['summary'] == 'Design review'
+    assert len(listed['items']) == 1
+
+def test_create_event_with_the_id_of_a_deleted_event_fails(tmp_path, monkeypatch):
+    """Test that a 409 for an event that was deleted since isn't reported as the event being created."""
+    from google.oauth2.credentials import Credentials
+    from src.services.calendar_service import CalendarService
+    from src.services.credential_store import FileCredentialStore
+    from src.tools.fakes import FakeCalendarServer
+
+    store = FileCredentialStore(str(tmp_path / 'tokens'))
+    store.save('alice', Credentials(token='fake-token'))
+    event_id = event_id_for('alice', 'key-1')
+    with FakeCalendarServer() as server:
+        server.insert('primary', {'id': event_id, 'summary': 'Design review', 'status': 'cancelled',
+                                  'start': {'dateTime': '2026-10-19T09:00:00-07:00'},
+                                  'end': {'dateTime': '2026-10-19T10:00:00-07:00'}})
+        monkeypatch.setenv('CALENDAR_API_ENDPOINT', server.api_endpoint)
+        service = CalendarService(user_id='alice', credential_store=store)
+
+        with pytest.raises(ValueError, match='deleted'):
+            service.create_event({'summary': 'Design review'}, event_id=event_id)
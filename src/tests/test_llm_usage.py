@@ -0,0 +1,75 @@
+from datetime import date, timedelta
+import json
+import pytest
+from types import SimpleNamespace
+from src.services.llm_service import LLMService, COMPACT_SYSTEM_PROMPT
+
+# Parsed events must start near today to pass the LLM service's checks
+TOMORROW = (date.today() + timedelta(days=1)).isoformat()
+
+RESULT = {'timeSpecified': True, 'event': {
+    'summary': 'Design review',
+    'start': {'dateTime': f'{TOMORROW}T09:00:00-07:00', 'timeZone': 'America/Los_Angeles'},
+    'end': {'dateTime': f'{TOMORROW}T10:00:00-07:00', 'timeZone': 'America/Los_Angeles'}
+}}
+
+def usage(prompt, completion, cached=0):
+    return SimpleNamespace(prompt_tokens=prompt, completion_tokens=completion,
+                           prompt_tokens_details=SimpleNamespace(cached_tokens=cached))
+
+class FakeClient:
+    """Returns RESULT with fixed token usage and records the request arguments."""
+    def __init__(self):
+        self.chat = self
+        self.completions = self
+        self.requests = []
+
+    def create(self, **kwargs):
+        self.requests.append(kwargs)
+        if kwargs.get('stream'):
+            delta = SimpleNamespace(content=json.dumps(RESULT))
+            return FakeStream([SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None),
+                               SimpleNamespace(choices=[], usage=usage(120, 40))])
+        message = SimpleNamespace(content=json.dumps(RESULT))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage(100, 30, cached=64))
+
+class FakeStream(list):
+    def close(self):
+        pass
+
+QUERY = "design review sometime before lunch-ish"
+
+def test_compact_prompt_has_stable_prefix():
+    """Test that compact mode sends the same short system prompt every call."""
+    client = FakeClient()
+    service = LLMService(client=client, prompt_mode='compact')
+    verbose = LLMService(client=client)
+
+    first = service._completion_request("lunch with Sam tomorrow")['messages']
+    second = service._completion_request("dentist friday 3pm")['messages']
+
+    assert first[0]['content'] == second[0]['content'] == COMPACT_SYSTEM_PROMPT
+    assert '"dentist friday 3pm"' in second[1]['content']
+    assert len(COMPACT_SYSTEM_PROMPT) < len(verbose._completion_request(QUERY)['messages'][0]['content']) / 2
+
+def test_unknown_prompt_mode_rejected():
+    with pytest.raises(ValueError):
+        LLMService(client=FakeClient(), prompt_mode='terse')
+
+def test_usage_recorded_per_route():
+    """Test that token counts and latency are aggregated per route, including streamed calls."""
+    client = FakeClient()
+    service = LLMService(client=client)
+
+    service.parse_calendar_query(QUERY, route='/nlp/create')
+    service.parse_calendar_query(QUERY, route='/nlp/create')
+    list(service.stream_calendar_query(QUERY + " too", route='/nlp/stream'))
+
+    stats = service.get_stats()['usage']
+    # The second identical query is served from the cache
+    assert stats['/nlp/create']['calls'] == 1
+    assert stats['/nlp/create']['prompt_tokens'] == 100
+    assert stats['/nlp/create']['cached_prompt_tokens'] == 64
+    assert stats['/nlp/stream']['completion_tokens'] == 40
+    assert stats['/nlp/stream']['avg_latency_ms'] >= 0
+    assert client.requests[-1]['stream_options'] == {'include_usage': True}
@@ -0,0 +1,119 @@
+import pytest
+from datetime import datetime
+from src.services.local_parser import LocalQueryParser
+from src.services.llm_service import LLMService
+
+# Sunday, October 18 2026, 11am Pacific
+NOW = datetime(2026, 10, 18, 11, 0)
+
+@pytest.fixture
+def parser():
+    return LocalQueryParser()
+
+class FailingClient:
+    """Stands in for the OpenAI client and fails the test if it is used."""
+    @property
+    def chat(self):
+        pytest.fail("LLM should not be called for simple queries")
+
+@pytest.mark.parametrize("query,summary,start,end", [
+    pytest.param(
+        "dentist next Friday at 2pm",
+        "Dentist", "2026-10-23T14:00:00-07:00", "2026-10-23T15:00:00-07:00",
+        id="weekday_and_time"
+    ),
+    pytest.param(
+        "meeting tomorrow 10am for 45 minutes",
+        "Meeting", "2026-10-19T10:00:00-07:00", "2026-10-19T10:45:00-07:00",
+        id="explicit_duration"
+    ),
+    pytest.param(
+        "Set up a cleaning session tomorrow morning",
+        "Cleaning session", "2026-10-19T09:00:00-07:00", "2026-10-19T10:00:00-07:00",
+        id="morning_default"
+    ),
+    pytest.param(
+        "Create an event for grocery shopping this Saturday at 3pm",
+        "Grocery shopping", "2026-10-24T15:00:00-07:00", "2026-10-24T17:00:00-07:00",
+        id="shopping_default_duration"
+    ),
+    pytest.param(
+        "Lunch with Sarah 12-1pm on November 3",
+        "Lunch with Sarah", "2026-11-03T12:00:00-08:00", "2026-11-03T13:00:00-08:00",
+        id="time_range_and_month_day"
+    ),
+    pytest.param(
+        "Team sync in 2 days at noon for an hour and a half",
+        "Team sync", "2026-10-20T12:00:00-07:00", "2026-10-20T13:30:00-07:00",
+        id="relative_days"
+    ),
+])
+def test_simple_queries_parse_locally(parser, query, summary, start, end):
+    """Test that formulaic queries are parsed with high confidence."""
+    result, confidence = parser.parse(query, now=NOW)
+
+    assert confidence >= 0.8
+    event = result['event']
+    assert event['summary'] == summary
+    assert event['start'] == {'dateTime': start, 'timeZone': 'America/Los_Angeles'}
+    assert event['end'] == {'dateTime': end, 'timeZone': 'America/Los_Angeles'}
+
+@pytest.mark.parametrize("query,summary,start,confidence", [
+    pytest.param("lunch tomorrow at 1:30", "Lunch", "2026-10-19T13:30:00-07:00", 0.85, id="afternoon"),
+    pytest.param("pick up kids at 3:15 friday", "Pick up kids", "2026-10-23T15:15:00-07:00", 0.85, id="before_day"),
+    pytest.param("standup tomorrow at 9:30", "Standup", "2026-10-19T09:30:00-07:00", 0.85, id="morning_guess"),
+    pytest.param("call mom tonight at 7:30", "Call mom", "2026-10-18T19:30:00-07:00", 1.0, id="part_of_day"),
+    pytest.param("deploy tomorrow at 14:30", "Deploy", "2026-10-19T14:30:00-07:00", 1.0, id="24_hour"),
+    pytest.param("backup tomorrow at 06:45", "Backup", "2026-10-19T06:45:00-07:00", 1.0, id="leading_zero"),
+])
+def test_colon_times_without_meridiem(parser, query, summary, start, confidence):
+    """Test that H:MM without am/pm is read like "at H", and only 24-hour readings are certain."""
+    result, actual = parser.parse(query, now=NOW)
+
+    assert result['event']['summary'] == summary
+    assert result['event']['start']['dateTime'] == start
+    assert actual == confidence
+
+@pytest.mark.parametrize("query", [
+    pytest.param("maybe do something sometime", id="vague_time"),
+    pytest.param("schedule an event", id="vague_purpose"),
+    pytest.param("asdfghjkl", id="nonsense"),
+    pytest.param("standup every weekday at 9am", id="recurring"),
+    pytest.param("coffee with Ana 4 or 5 tomorrow", id="ambiguous_time"),
+])
+def test_unclear_queries_have_low_confidence(parser, query):
+    """Test that anything the parser does not fully understand is left to the LLM."""
+    result, confidence = parser.parse(query, now=NOW)
+    assert result is None or confidence < 0.8
+
+def test_fast_path_skips_llm():
+    """Test that confident local parses never reach the LLM and are counted."""
+    service = LLMService(client=FailingClient())
+
+    result = service.parse_calendar_query("Schedule dentist appointment next Friday at 2pm")
+
+    assert service._validate_response(result)
+    stats = service.get_stats()
+    assert stats['fast_path_hits'] == 1
+    assert stats['llm_calls'] == 0
+    assert stats['fast_path_hit_rate'] == 1.0
+
+def test_empty_query_rejected_locally():
+    """Test that empty queries are rejected without an LLM call."""
+    service = LLMService(client=FailingClient())
+    with pytest.raises(ValueError):
+        service.parse_calendar_query("   ")
+
+def test_batch_parsing_keeps_order_and_errors():
+    """Test that batch parsing returns one result or error per query, in order."""
+    service = LLMService(client=FailingClient())
+
+    results = service.parse_calendar_queries([
+        "dentist next Friday at 2pm",
+        "",
+        "yoga tomorrow at 7am for 30 minutes"
+    ])
+
+    assert results[0]['event']['summary'] == 'Dentist'
+    assert isinstance(results[1], ValueError)
+    assert results[2]['event']['summary'] == 'Yoga'
@@ -0,0 +1,57 @@
+import json
+import pytest
+from types import SimpleNamespace
+from src.services.metrics import MetricsRegistry, metrics
+from src.services.llm_service import LLMService
+
+def test_histogram_buckets_are_cumulative():
+    """Test that bucket counts accumulate and +Inf equals the total count."""
+    registry = MetricsRegistry()
+    for seconds in (0.003, 0.02, 0.02, 45.0):
+        registry.observe('llm_call', seconds)
+
+    text = registry.render()
+    assert 'calendar_assistant_stage_duration_seconds_bucket{stage="llm_call",le="0.005"} 1' in text
+    assert 'calendar_assistant_stage_duration_seconds_bucket{stage="llm_call",le="0.025"} 3' in text
+    assert 'calendar_assistant_stage_duration_seconds_bucket{stage="llm_call",le="30.0"} 3' in text
+    assert 'calendar_assistant_stage_duration_seconds_bucket{stage="llm_call",le="+Inf"} 4' in text
+    assert 'calendar_assistant_stage_duration_seconds_count{stage="llm_call"} 4' in text
+
+def test_timer_counts_errors_by_type():
+    """Test that a failing stage is both timed and counted by exception type."""
+    registry = MetricsRegistry()
+    with pytest.raises(TimeoutError):
+        with registry.time('calendar_insert'):
+            raise TimeoutError()
+
+    text = registry.render()
+    assert 'calendar_assistant_errors_total{stage="calendar_insert",type="TimeoutError"} 1' in text
+    assert 'calendar_assistant_stage_duration_seconds_count{stage="calendar_insert"} 1' in text
+
+def test_request_labels_are_escaped():
+    registry = MetricsRegistry()
+    registry.observe_request('/odd"route', 500, 0.1)
+    assert 'route="/odd\\"route",status="500"' in registry.render()
+
+class FakeClient:
+    def __init__(self, content):
+        self.content = content
+        self.chat = self
+        self.completions = self
+
+    def create(self, **kwargs):
+        message = SimpleNamespace(content=self.content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+def test_llm_stages_recorded():
+    """Test that the LLM call and decoding are timed separately and decode errors are counted."""
+    metrics.reset()
+    service = LLMService(client=FakeClient(json.dumps({'error': 'Query is not a valid calendar request'})))
+
+    with pytest.raises(ValueError):
+        service.parse_calendar_query("zzz qqq")
+
+    text = metrics.render()
+    assert 'calendar_assistant_stage_duration_seconds_count{stage="local_parse"} 1' in text
+    assert 'calendar_assistant_stage_duration_seconds_count{stage="llm_call"} 1' in text
+    assert 'calendar_assistant_errors_total{stage="llm_decode",type="ValueError"} 1' in text
@@ -0,0 +1,160 @@
+import asyncio
+import json
+import threading
+import time
+from types import SimpleNamespace
+from datetime import date, timedelta
+import pytest
+from src.services.llm_service import LLMService
+from src.services.model_cascade import InvalidCompletionError, ModelCascade
+from src.services.rate_governor import RateGovernor
+
+QUERY = "catch up with Sam sometime-ish"
+TOMORROW = (date.today() + timedelta(days=1)).isoformat()
+
+def event(start=f'{TOMORROW}T09:00:00', end=f'{TOMORROW}T10:00:00', summary='Catch up'):
+    return {'event': {'summary': summary,
+                      'start': {'dateTime': start, 'timeZone': 'America/Los_Angeles'},
+                      'end': {'dateTime': end, 'timeZone': 'America/Los_Angeles'}}}
+
+class FakeCompletion:
+    def __init__(self, content):
+        message = type('Message', (), {'content': content})
+        self.choices = [type('Choice', (), {'message': message})]
+
+class TieredClient:
+    """Answers each model with its own reply after its own delay, like chat.completions.create."""
+    def __init__(self, replies, delays=None):
+        self.replies = replies
+        self.delays = delays or {}
+        self.calls = []
+        self.lock = threading.Lock()
+        self.chat = self
+        self.completions = self
+
+    def create(self, **kwargs):
+        model = kwargs['model']
+        with self.lock:
+            self.calls.append(model)
+        time.sleep(self.delays.get(model, 0))
+        reply = self.replies[model]
+        return FakeCompletion(reply if isinstance(reply, str) else json.dumps(reply))
+
+class AsyncTieredClient(TieredClient):
+    async def create(self, **kwargs):
+        model = kwargs['model']
+        self.calls.append(model)
+        await asyncio.sleep(self.delays.get(model, 0))
+        reply = self.replies[model]
+        return FakeCompletion(reply if isinstance(reply, str) else json.dumps(reply))
+
+def service_for(client, models=('small', 'large'), hedge_after=None, async_client=None):
+    return LLMService(client=client, async_client=async_client,
+                      governor=RateGovernor('openai', limits={'requests': (100.0, 100.0), 'tokens': (1e6, 1e6)}),
+                      cascade=ModelCascade(list(models), hedge_after=hedge_after))
+
+def test_valid_answer_from_first_tier_is_not_escalated():
+    client = TieredClient({'small': event(), 'large': event(summary='Large')})
+    service = service_for(client)
+
+    assert service.parse_calendar_query(QUERY)['event']['summary'] == 'Catch up'
+    assert client.calls == ['small']
+    tiers = service.get_stats()['cascade']['tiers']
+    assert tiers['small']['used'] == 1 and tiers['small']['hit_rate'] == 1.0
+    assert tiers['large']['calls'] == 0
+
+@pytest.mark.parametrize('reply', [
+    pytest.param('not json', id='malformed'),
+    pytest.param({'event': {'summary': 'No times'}}, id='missing_fields'),
+    pytest.param(event(end=f'{TOMORROW}T08:00:00'), id='ends_before_start'),
+    pytest.param(event(start='1999-01-01T09:00:00', end='1999-01-01T10:00:00'), id='implausible_date'),
+])
+def test_invalid_answers_escalate_to_the_next_tier(reply):
+    client = TieredClient({'small': reply, 'large': event(summary='Large')})
+    service = service_for(client)
+
+    assert service.parse_calendar_query(QUERY)['event']['summary'] == 'Large'
+    assert client.calls == ['small', 'large']
+    tiers = service.get_stats()['cascade']['tiers']
+    assert tiers['small']['invalid'] == 1 and tiers['small']['hit_rate'] == 0.0
+    assert tiers['large']['used'] == 1
+
+def test_last_tier_invalid_raises_and_error_replies_are_not_escalated():
+    client = TieredClient({'small': 'not json', 'large': 'not json'})
+    with pytest.raises(InvalidCompletionError):
+        service_for(client).parse_calendar_query(QUERY)
+
+    client = TieredClient({'small': {'error': 'Not a calendar request'}, 'large': event()})
+    with pytest.raises(ValueError, match='Not a calendar request'):
+        service_for(client).parse_calendar_query(QUERY)
+    assert client.calls == ['small']
+
+def test_hedged_mode_takes_the_first_valid_answer():
+    client = TieredClient({'small': event(summary='Small'), 'large': event(summary='Large')},
+                          delays={'small': 0.5, 'large': 0.01})
+    service = service_for(client, hedge_after=0.05)
+
+    started = time.monotonic()
+    result = service.parse_calendar_query(QUERY)
+    assert time.monotonic() - started < 0.4
+    assert result['event']['summary'] == 'Large'
+    stats = service.get_stats()['cascade']
+    assert stats['hedge_after_ms'] == 50
+    assert stats['tiers']['large']['hedged'] == 1
+    assert stats['tiers']['large']['used'] == 1
+
+def test_hedged_mode_without_hedging_when_the_first_tier_is_fast():
+    client = TieredClient({'small': event(summary='Small'), 'large': event(summary='Large')})
+    service = service_for(client, hedge_after=0.5)
+
+    assert service.parse_calendar_query(QUERY)['event']['summary'] == 'Small'
+    assert client.calls == ['small']
+
+def test_async_hedge_cancels_the_slower_call():
+    async_client = AsyncTieredClient({'small': event(summary='Small'), 'large': event(summary='Large')},
+                                     delays={'small': 1.0, 'large': 0.01})
+    service = service_for(object(), hedge_after=0.05, async_client=async_client)
+
+    result = asyncio.run(service.aparse_calendar_query(QUERY))
+    assert result['event']['summary'] == 'Large'
+    tiers = service.get_stats()['cascade']['tiers']
+    assert tiers['small']['abandoned'] == 1
+    assert tiers['large']['used'] == 1
+
+class FakeStream:
+    def __init__(self, content, size=8):
+        self.chunks = [SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content[i:i + size]))],
+                                       usage=None) for i in range(0, len(content), size)]
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def close(self):
+        pass
+
+class StreamingTieredClient(TieredClient):
+    """Streams replies when asked to, as stream_calendar_query does for the first model."""
+    def create(self, **kwargs):
+        completion = super().create(**kwargs)
+        return FakeStream(completion.choices[0].message.content) if kwargs.get('stream') else completion
+
+def test_invalid_stream_escalates_to_the_next_tier():
+    client = StreamingTieredClient({'small': event(end=f'{TOMORROW}T08:00:00'), 'large': event(summary='Large')})
+    service = service_for(client)
+
+    updates = list(service.stream_calendar_query(QUERY))
+    assert updates[0]['type'] == 'field'
+    assert updates[-1] == {'type': 'result', 'result': event(summary='Large')}
+    assert client.calls == ['small', 'large']
+    assert service.get_stats()['cascade']['tiers']['small']['invalid'] == 1
+
+def test_cascade_from_environment(monkeypatch):
+    monkeypatch.setenv('LLM_MODELS', 'gpt-4o-mini, gpt-4o')
+    monkeypatch.setenv('LLM_HEDGE_MS', '800')
+    cascade = ModelCascade()
+    assert cascade.models == ['gpt-4o-mini', 'gpt-4o']
+    assert cascade.hedge_after == 0.8
+
+    monkeypatch.setenv('LLM_MODELS', 'gpt-4o-mini')
+    # Nothing to hedge with a single model
+    assert ModelCascade().hedge_after is None
@@ -0,0 +1,104 @@
+import pytest
+from datetime import datetime
+import pytz
+from src.services.intent_router import IntentRouter
+from src.services.nlp_service import NLPService
+
+TZ = pytz.timezone('America/Los_Angeles')
+# A Monday afternoon
+NOW = TZ.localize(datetime(2026, 10, 19, 15, 0))
+
+def local(day, hour=0, minute=0):
+    return TZ.localize(datetime(2026, 10, day, hour, minute))
+
+@pytest.mark.parametrize('query, intent', [
+    ("What do I have tomorrow?", 'list'),
+    ("what's on my calendar next week", 'list'),
+    ("Any meetings on Oct 30?", 'list'),
+    ("Am I free Friday afternoon?", 'availability'),
+    ("do I have any free time this weekend", 'availability'),
+    ("is my calendar free from 2 to 4pm on 10/22?", 'availability'),
+    ("Lunch with Sam tomorrow at noon", 'create'),
+    ("Remind me to check what's on the agenda", 'create'),
+    ("dentist friday 2pm", 'create'),
+    ("What time is lunch with Sam", 'list'),
+    ("when's the dentist", 'list'),
+    ("What time are Ana and Bo available tomorrow", 'availability'),
+    ("When is Sarah free this week?", 'availability'),
+])
+def test_classify(query, intent):
+    assert IntentRouter().classify(query) == intent
+
+@pytest.mark.parametrize('query, start, end', [
+    ("What do I have tomorrow?", local(20), local(21)),
+    ("Am I free Friday afternoon?", local(23, 12), local(23, 17)),
+    ("am I free at 4 for 30 minutes", local(19, 16), local(19, 16, 30)),
+    # 9 o'clock has passed today, so it means tomorrow morning
+    ("am I free at 9", local(20, 9), local(20, 10)),
+    # Without am/pm, 1:30 is read within waking hours
+    ("Am I free at 1:30 tomorrow?", local(20, 13, 30), local(20, 14, 30)),
+    ("am I free tomorrow morning at 10:15", local(20, 10, 15), local(20, 11, 15)),
+    ("am I free at 18:00", local(19, 18), local(19, 19)),
+    ("what's next?", NOW, local(21)),
+    ("anything this week?", NOW, local(26)),
+    ("free time on the weekend?", local(24), local(26)),
+])
+def test_time_range(query, start, end):
+    assert IntentRouter().time_range(query, NOW) == (start, end)
+
+class FakeAvailability:
+    def __init__(self, busy):
+        self.busy = busy
+
+    def find_conflicts(self, start, end):
+        return [b for b in self.busy if b['start'] < end.isoformat() and b['end'] > start.isoformat()]
+
+class FakeCalendarService:
+    def __init__(self, events):
+        self.events = events
+        self.availability = FakeAvailability([
+            {'start': e['start']['dateTime'], 'end': e['end']['dateTime']} for e in events if 'dateTime' in e['start']
+        ])
+
+    def list_events(self, time_min=None, time_max=None, limit=None):
+        return [e for e in self.events
+                if e['start'].get('dateTime', '') < time_max.isoformat() and e['end'].get('dateTime', 'z') > time_min.isoformat()]
+
+def event(summary, start, end):
+    return {'id': summary.lower(), 'summary': summary,
+            'start': {'dateTime': start.isoformat()}, 'end': {'dateTime': end.isoformat()}}
+
+@pytest.fixture
+def nlp():
+    class NoLLM:
+        def parse_calendar_query(self, query):
+            raise AssertionError('the LLM must not be called')
+    return NLPService(llm=NoLLM())
+
+def test_read_queries_are_answered_from_calendar_data(nlp):
+    calendar = FakeCalendarService([
+        event('Standup', local(20, 9), local(20, 9, 15)),
+        event('Design review', local(23, 13), local(23, 14)),
+    ])
+
+    listed = nlp.answer_query("What do I have tomorrow?", calendar, now=NOW)
+    assert listed['intent'] == 'list'
+    assert [e['id'] for e in listed['events']] == ['standup']
+    assert listed['answer'] == "You have 1 event on Tue Oct 20: Standup at 9:00 AM."
+
+    busy = nlp.answer_query("Am I free Friday afternoon?", calendar, now=NOW)
+    assert busy['free'] is False
+    assert busy['answer'] == "You're busy on Fri Oct 23 from 12:00 PM to 5:00 PM: Design review at 1:00 PM."
+
+    free = nlp.answer_query("am I free thursday morning?", calendar, now=NOW)
+    assert free['free'] is True
+    assert free['timeMin'] == local(22, 8).isoformat()
+
+    assert nlp.answer_query("Lunch with Sam tomorrow at noon", calendar, now=NOW) is None
+    assert nlp.get_stats() == {'intents': {'create': 1, 'list': 1, 'availability': 2}}
+
+def test_invalid_queries(nlp):
+    with pytest.raises(ValueError):
+        nlp.answer_query("  ", FakeCalendarService([]))
+    with pytest.raises(ValueError):
+        nlp.answer_query("what do I have on 2/30?", FakeCalendarService([]))
@@ -0,0 +1,163 @@
+from datetime import date, timedelta
+import asyncio
+import json
+import threading
+import time
+import pytest
+from src.services.parse_cache import ParseCache
+from src.services.llm_service import LLMService
+
+# Parsed events must start near today to pass the LLM service's checks
+TOMORROW = (date.today() + timedelta(days=1)).isoformat()
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+def test_lru_eviction(clock):
+    """Test that the least recently used entry is evicted when full."""
+    cache = ParseCache(max_size=2, ttl=60, clock=clock)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+    assert cache.get_stats()['evictions'] == 1
+
+def test_ttl_expiry(clock):
+    """Test that entries expire after the TTL."""
+    cache = ParseCache(max_size=10, ttl=60, clock=clock)
+    cache.set('a', {'event': {}})
+    clock.now = 59
+    assert cache.get('a') == {'event': {}}
+    clock.now = 61
+    assert cache.get('a') is None
+    assert cache.get_stats()['expirations'] == 1
+
+def test_cached_values_are_copies(clock):
+    """Test that callers can't mutate cached results."""
+    cache = ParseCache(clock=clock)
+    value = cache.get_or_compute('a', lambda: {'event': {'summary': 'Lunch'}})
+    value['event']['summary'] = 'Changed'
+    assert cache.get('a') == {'event': {'summary': 'Lunch'}}
+
+def test_concurrent_misses_are_coalesced():
+    """Test that identical in-flight computations run only once."""
+    cache = ParseCache()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(timeout=5)
+        return {'event': {'summary': 'Standup'}}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute('q', compute)))
+               for _ in range(5)]
+    threads[0].start()
+    started.wait(timeout=5)
+    for thread in threads[1:]:
+        thread.start()
+    while cache.get_stats()['coalesced'] < 4:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert len(calls) == 1
+    assert results == [{'event': {'summary': 'Standup'}}] * 5
+    stats = cache.get_stats()
+    assert stats['misses'] == 1
+    assert stats['coalesced'] == 4
+
+def test_errors_are_shared_but_not_cached():
+    """Test that a failed computation is raised to waiters and retried later."""
+    cache = ParseCache()
+
+    def fail():
+        raise ValueError("Query is not a valid calendar request")
+
+    with pytest.raises(ValueError):
+        cache.get_or_compute('q', fail)
+    assert cache.get_or_compute('q', lambda: 'ok') == 'ok'
+
+class FakeCompletion:
+    def __init__(self, content):
+        message = type('Message', (), {'content': content})
+        self.choices = [type('Choice', (), {'message': message})]
+
+class FakeAsyncClient:
+    """Mimics AsyncOpenAI().chat.completions.create with a short delay."""
+    def __init__(self):
+        self.calls = 0
+        self.chat = self
+        self.completions = self
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return FakeCompletion(json.dumps({'event': {
+            'summary': 'Standup',
+            'start': {'dateTime': f'{TOMORROW}T09:00:00-07:00', 'timeZone': 'America/Los_Angeles'},
+            'end': {'dateTime': f'{TOMORROW}T09:15:00-07:00', 'timeZone': 'America/Los_Angeles'}
+        }}))
+
+def test_async_parse_coalesces_and_caches():
+    """Test that concurrent identical async queries share one LLM call and are cached."""
+    async_client = FakeAsyncClient()
+    service = LLMService(client=object(), async_client=async_client)
+    query = "quick standup sometime after breakfast"
+
+    async def run():
+        results = await asyncio.gather(*(service.aparse_calendar_query(query) for _ in range(5)))
+        results.append(await service.aparse_calendar_query(query))
+        return results
+
+    results = asyncio.run(run())
+
+    assert async_client.calls == 1
+    assert all(result['event']['summary'] == 'Standup' for result in results)
+    assert service.get_stats()['cache']['hits'] == 1
+
+def test_async_parse_keeps_sqlite_cache_off_the_event_loop(tmp_path):
+    """Test that the shared cache's disk access runs in worker threads, not on the event loop."""
+    from src.services.shared_cache import SQLiteCache
+
+    class RecordingCache(SQLiteCache):
+        threads = []
+
+        def get(self, key):
+            self.threads.append(threading.current_thread())
+            return super().get(key)
+
+        def set(self, key, value):
+            self.threads.append(threading.current_thread())
+            super().set(key, value)
+
+    async_client = FakeAsyncClient()
+    service = LLMService(client=object(), async_client=async_client,
+                         cache=RecordingCache(str(tmp_path / 'cache.db')))
+    query = "quick standup sometime after breakfast"
+
+    async def run():
+        first = await service.aparse_calendar_query(query)
+        return first, await service.aparse_calendar_query(query)
+
+    first, second = asyncio.run(run())
+
+    assert first == second and async_client.calls == 1
+    assert len(RecordingCache.threads) == 3
+    assert threading.main_thread() not in RecordingCache.threads
@@ -0,0 +1,240 @@
+import asyncio
+import threading
+import time
+import pytest
+from types import SimpleNamespace
+from src.services.rate_governor import (RateGovernor, CircuitBreaker, DeadlineExceededError,
+                                        UpstreamUnavailableError)
+from src.services.deadline import deadline
+from src.services.llm_service import LLMService
+from src.services.event_jobs import error_details
+from src.services.metrics import MetricsRegistry
+
+class RateLimitError(Exception):
+    """Shaped like openai.RateLimitError: status_code plus the httpx response."""
+    status_code = 429
+
+    def __init__(self, retry_after='3'):
+        super().__init__('Rate limit reached for requests')
+        self.response = SimpleNamespace(headers={'retry-after': retry_after})
+
+def test_bursts_beyond_quota_are_shed():
+    """Test that calls which can't get quota within max_wait fail fast with a retry hint."""
+    governor = RateGovernor('test', limits={'requests': (1.0, 2.0)}, max_wait=0.1)
+    for _ in range(2):
+        with governor.slot():
+            pass
+
+    with pytest.raises(UpstreamUnavailableError) as error:
+        with governor.slot():
+            pass
+    assert error.value.retry_after == pytest.approx(1.0, abs=0.1)
+    assert governor.get_stats()['shed'] == 1
+
+def test_short_waits_are_queued():
+    governor = RateGovernor('test', limits={'requests': (20.0, 1.0)}, max_wait=1.0)
+    started = time.monotonic()
+    for _ in range(3):
+        with governor.slot():
+            pass
+
+    assert time.monotonic() - started >= 0.09
+    stats = governor.get_stats()
+    assert stats['admitted'] == 3
+    assert stats['shed'] == 0
+    assert stats['max_wait_ms'] > 0
+
+def test_max_wait_can_be_raised_per_call():
+    """Test that bulk callers can wait for quota that would shed an interactive call."""
+    governor = RateGovernor('test', limits={'requests': (10.0, 1.0)}, max_wait=0.01)
+    with governor.slot():
+        pass
+    with governor.slot(max_wait=1.0):
+        pass
+    assert governor.get_stats()['shed'] == 0
+
+def test_upstream_429_pauses_callers():
+    """Test that a 429 is turned into a 503 error, honours Retry-After and halves concurrency."""
+    governor = RateGovernor('openai', limits={'requests': (100.0, 100.0)}, max_wait=0.1, max_concurrency=8)
+    with pytest.raises(UpstreamUnavailableError) as error:
+        with governor.slot():
+            raise RateLimitError(retry_after='3')
+    assert error.value.retry_after == 3.0
+    assert isinstance(error.value.__cause__, RateLimitError)
+
+    with pytest.raises(UpstreamUnavailableError):
+        with governor.slot():
+            pass
+    stats = governor.get_stats()
+    assert stats['rate_limited'] == 1
+    assert stats['concurrency_limit'] == 4
+    assert stats['blocked_for_seconds'] > 2
+
+def test_concurrency_limit_and_queue_depth():
+    governor = RateGovernor('test', limits={'requests': (100.0, 100.0)}, max_wait=0.2, max_concurrency=1)
+    entered = threading.Event()
+    release = threading.Event()
+
+    def hold():
+        with governor.slot():
+            entered.set()
+            release.wait(2)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    entered.wait(2)
+
+    def wait_for_slot():
+        with governor.slot():
+            pass
+
+    waiter = threading.Thread(target=wait_for_slot)
+    waiter.start()
+    time.sleep(0.05)
+    assert governor.get_stats()['queue_depth'] == 1
+    assert governor.get_stats()['in_flight'] == 1
+
+    release.set()
+    holder.join()
+    waiter.join()
+    assert governor.get_stats()['shed'] == 0
+    assert governor.get_stats()['admitted'] == 2
+
+def test_per_key_quota_is_separate():
+    """Test that one user exhausting their quota doesn't block another."""
+    governor = RateGovernor('calendar', limits={'requests': (100.0, 100.0)},
+                            per_key_limits={'requests': (1.0, 1.0)}, max_wait=0.05)
+    with governor.slot(key='alice'):
+        pass
+    with pytest.raises(UpstreamUnavailableError):
+        with governor.slot(key='alice'):
+            pass
+    with governor.slot(key='bob'):
+        pass
+
+def test_concurrency_adapts_to_latency():
+    governor = RateGovernor('test', limits={'requests': (100.0, 100.0)}, max_concurrency=16, min_concurrency=2)
+    for _ in range(5):
+        governor._adapt(0.1)
+    assert governor.get_stats()['concurrency_limit'] == 16
+
+    for _ in range(20):
+        governor._adapt(1.0)
+    assert governor.get_stats()['concurrency_limit'] < 16
+    assert governor.get_stats()['concurrency_limit'] >= 2
+
+def test_async_slot_sheds_without_blocking():
+    governor = RateGovernor('test', limits={'requests': (1.0, 1.0)}, max_wait=0.1)
+
+    async def run():
+        async with governor.aslot():
+            pass
+        with pytest.raises(UpstreamUnavailableError):
+            async with governor.aslot():
+                pass
+
+    asyncio.run(run())
+    assert governor.get_stats()['queue_depth'] == 0
+
+class RateLimitedClient:
+    def __init__(self):
+        self.chat = self
+        self.completions = self
+
+    def create(self, **kwargs):
+        raise RateLimitError(retry_after='2')
+
+def test_llm_rate_limit_maps_to_503():
+    """Test that an OpenAI 429 reaches the routes as a 503 instead of a 400 parse failure."""
+    governor = RateGovernor('openai', limits={'requests': (100.0, 100.0), 'tokens': (1e6, 1e6)})
+    service = LLMService(client=RateLimitedClient(), governor=governor)
+
+    with pytest.raises(UpstreamUnavailableError) as error:
+        service.parse_calendar_query("catch up with Sam sometime-ish")
+
+    details = error_details(error.value)
+    assert details['code'] == 503
+    assert details['retry_after'] == 2.0
+
+class ServerError(Exception):
+    """Shaped like openai.InternalServerError."""
+    status_code = 500
+
+class BadRequestError(Exception):
+    status_code = 400
+
+def test_breaker_opens_after_repeated_failures_and_recovers():
+    clock = [0.0]
+    breaker = CircuitBreaker('test', failure_threshold=3, reset_timeout=10.0, clock=lambda: clock[0])
+    governor = RateGovernor('test', limits={'requests': (100.0, 100.0)}, breaker=breaker)
+
+    def call(error=None):
+        with governor.slot():
+            if error is not None:
+                raise error
+
+    # Client errors say nothing about the upstream's health
+    for _ in range(5):
+        with pytest.raises(BadRequestError):
+            call(BadRequestError())
+    assert breaker.state == 'closed'
+
+    for _ in range(3):
+        with pytest.raises(ServerError):
+            call(ServerError())
+    assert breaker.state == 'open'
+    with pytest.raises(UpstreamUnavailableError) as error:
+        call()
+    assert error.value.retry_after == 10.0
+    assert breaker.get_stats()['rejected'] == 1
+
+    # Half-open: a failed probe reopens the breaker, a successful one closes it
+    clock[0] = 10.0
+    assert breaker.state == 'half_open'
+    with pytest.raises(ServerError):
+        call(ServerError())
+    assert breaker.state == 'open'
+    clock[0] = 20.0
+    call()
+    assert breaker.state == 'closed'
+    assert governor.get_stats()['breaker']['opened'] == 2
+
+def test_half_open_breaker_admits_one_probe_at_a_time():
+    clock = [0.0]
+    breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=1.0, clock=lambda: clock[0])
+    breaker.record(True)
+    clock[0] = 1.0
+    assert breaker.allow() is True
+    with pytest.raises(UpstreamUnavailableError):
+        breaker.allow()
+    # A probe that never reached the upstream frees the slot for the next one
+    breaker.record(None, probe=True)
+    assert breaker.allow() is True
+
+def test_deadline_cuts_waits_short_and_refuses_hopeless_calls():
+    governor = RateGovernor('test', limits={'requests': (1.0, 1.0)}, max_wait=5.0)
+    with governor.slot():
+        pass
+
+    started = time.monotonic()
+    with deadline(0.5):
+        # The next token is a second away, past the deadline
+        with pytest.raises(UpstreamUnavailableError):
+            with governor.slot():
+                pass
+    assert time.monotonic() - started < 0.5
+
+    with deadline(0.01):
+        with pytest.raises(DeadlineExceededError):
+            with governor.slot():
+                pass
+    stats = governor.get_stats()
+    assert stats['deadline_exceeded'] == 1
+    assert error_details(DeadlineExceededError('test', 0.0))['code'] == 503
+
+def test_gauges_rendered():
+    registry = MetricsRegistry()
+    registry.register_gauge('upstream_queue_depth', 'Waiting calls.', lambda: [({'upstream': 'openai'}, 3)])
+    text = registry.render()
+    assert '# TYPE calendar_assistant_upstream_queue_depth gauge' in text
+    assert 'calendar_assistant_upstream_queue_depth{upstream="openai"} 3' in text
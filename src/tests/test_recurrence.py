@@ -0,0 +1,99 @@
+from datetime import datetime
+import pytz
+from src.services.availability_service import AvailabilityService
+from src.services.event_mirror import EventMirror
+from src.services.recurrence import RecurringSeries
+from src.tests.test_event_mirror import FakeCalendarApi, make_event
+
+TZ = pytz.timezone('America/Los_Angeles')
+
+def local(month, day, hour=0, minute=0):
+    return TZ.localize(datetime(2026, month, day, hour, minute))
+
+def standup(**extra):
+    return make_event('standup', '2026-10-26T09:00:00', '2026-10-26T09:15:00',
+                      recurrence=['RRULE:FREQ=WEEKLY;BYDAY=MO,WE'], **extra)
+
+def starts(events):
+    return [e['start'].get('dateTime', e['start'].get('date')) for e in events]
+
+def test_expansion_keeps_wall_clock_time_across_dst():
+    """Test that a 9:00 meeting stays at 9:00 local when daylight saving ends on Nov 1."""
+    series = RecurringSeries(standup(), 'UTC')
+    occurrences = list(series.occurrences(local(10, 26).timestamp(), local(11, 5).timestamp()))
+
+    assert [o[2]['start']['dateTime'] for o in occurrences] == [
+        '2026-10-26T09:00:00-07:00', '2026-10-28T09:00:00-07:00',
+        '2026-11-02T09:00:00-08:00', '2026-11-04T09:00:00-08:00',
+    ]
+    first = occurrences[0][2]
+    assert first['id'] == 'standup_20261026T160000Z'
+    assert first['recurringEventId'] == 'standup'
+    assert first['originalStartTime'] == first['start']
+    assert 'recurrence' not in first
+    assert series.last_end() == float('inf')
+
+def test_exdate_until_and_all_day():
+    series = RecurringSeries(make_event(
+        'review', '2026-10-26T09:00:00', '2026-10-26T10:00:00',
+        recurrence=['RRULE:FREQ=DAILY;UNTIL=20261029T235959Z', 'EXDATE:20261027T160000Z']
+    ), 'UTC')
+    occurrences = list(series.occurrences(float('-inf'), float('inf')))
+    assert [o[2]['start']['dateTime'][:10] for o in occurrences] == ['2026-10-26', '2026-10-28', '2026-10-29']
+    assert series.last_end() == local(10, 29, 10).timestamp()
+
+    birthday = RecurringSeries({'id': 'bday', 'start': {'date': '2026-03-01'}, 'end': {'date': '2026-03-02'},
+                                'recurrence': ['RRULE:FREQ=YEARLY;COUNT=3']}, 'America/Los_Angeles')
+    occurrences = list(birthday.occurrences(local(6, 1).timestamp(), float('inf')))
+    assert [o[2]['start'] for o in occurrences] == [{'date': '2027-03-01'}, {'date': '2028-03-01'}]
+    assert occurrences[0][2]['id'] == 'bday_20270301'
+
+def test_mirror_expands_series_and_applies_exceptions():
+    """Test that the mirror syncs masters once and merges occurrences with changed ones."""
+    api = FakeCalendarApi()
+    api.responses = [
+        {'items': [
+            standup(),
+            make_event('lunch', '2026-10-28T12:00:00-07:00', '2026-10-28T13:00:00-07:00'),
+            # Wednesday's standup moved to 11:00, the next Monday's cancelled
+            make_event('standup_20261028T160000Z', '2026-10-28T11:00:00-07:00', '2026-10-28T11:15:00-07:00',
+                       recurringEventId='standup',
+                       originalStartTime={'dateTime': '2026-10-28T09:00:00-07:00'}),
+            {'id': 'standup_20261102T170000Z', 'status': 'cancelled', 'recurringEventId': 'standup',
+             'originalStartTime': {'dateTime': '2026-11-02T17:00:00Z'}},
+        ], 'nextSyncToken': 'token1'},
+        {'items': [{'id': 'standup_20261028T160000Z', 'status': 'cancelled', 'recurringEventId': 'standup',
+                    'originalStartTime': {'dateTime': '2026-10-28T09:00:00-07:00'}}],
+         'nextSyncToken': 'token2'},
+    ]
+    now = [0.0]
+    mirror = EventMirror(lambda: api, refresh_interval=30, clock=lambda: now[0])
+
+    events = mirror.events_between(local(10, 26), local(11, 5))
+    assert api.calls[0]['singleEvents'] is False
+    assert [e['id'] for e in events] == ['standup_20261026T160000Z', 'standup_20261028T160000Z',
+                                         'lunch', 'standup_20261104T170000Z']
+    assert starts(events)[1] == '2026-10-28T11:00:00-07:00'
+    assert [e['id'] for e in mirror.events_between(local(10, 26), local(11, 5), limit=2)] == \
+        ['standup_20261026T160000Z', 'standup_20261028T160000Z']
+    assert mirror.get_stats()['recurring_series'] == 1
+
+    # Cancelling the moved occurrence removes it without bringing back the 9:00 one
+    now[0] = 60.0
+    assert [e['id'] for e in mirror.events_between(local(10, 28), local(10, 29))] == ['lunch']
+
+def test_availability_from_mirror(monkeypatch):
+    monkeypatch.setenv('AVAILABILITY_SOURCE', 'mirror')
+    api = FakeCalendarApi()
+    api.responses = [{'items': [standup()], 'nextSyncToken': 'token1'}]
+    mirror = EventMirror(lambda: api, refresh_interval=30, clock=lambda: 0.0)
+
+    class Calendar:
+        timezone = 'America/Los_Angeles'
+
+        def get_mirror(self, calendar_id='primary'):
+            return mirror
+
+    availability = AvailabilityService(Calendar(), clock=lambda: 0.0)
+    assert not availability.is_free(local(11, 2, 9, 10), local(11, 2, 9, 30))
+    assert availability.is_free(local(11, 3, 9), local(11, 3, 10))
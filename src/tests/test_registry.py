@@ -0,0 +1,59 @@
+import os
+import subprocess
+import sys
+import pytest
+from src.services import calendar_service
+from src.services.credential_store import SQLiteCredentialStore, CredentialsNotFoundError
+from src.services.registry import ServiceRegistry
+
+def test_light_imports_skip_client_libraries():
+    """Test that importing the registry and route helpers doesn't load the OpenAI or Google clients."""
+    code = (
+        "import sys\n"
+        "import src.services.registry, src.services.availability_service, src.services.credential_store\n"
+        "print(','.join(m for m in ('openai', 'googleapiclient.discovery', 'google.oauth2.credentials')"
+        " if m in sys.modules))"
+    )
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ''
+
+def test_apps_load_numpy_and_dateutil_on_first_use():
+    """Test that importing either app doesn't load the libraries only some requests need."""
+    code = (
+        "import sys\n"
+        "import app, asgi\n"
+        "print(','.join(m for m in ('numpy', 'dateutil', 'openai', 'googleapiclient.discovery') if m in sys.modules))"
+    )
+    src = os.path.join(os.path.dirname(__file__), '..')
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True, cwd=src)
+    assert result.stdout.strip() == ''
+
+def test_discovery_document_loaded_once(monkeypatch):
+    """Test that the bundled discovery document is parsed once and reused."""
+    monkeypatch.setattr(calendar_service, '_discovery_document', None)
+    first = calendar_service.load_discovery_document()
+    assert first['name'] == 'calendar'
+    assert calendar_service.load_discovery_document() is first
+
+def test_non_interactive_service_never_starts_oauth(tmp_path):
+    """Test that a non-interactive build for the default user fails instead of opening a browser."""
+    store = SQLiteCredentialStore(str(tmp_path / 'credentials.db'))
+    service = calendar_service.CalendarService(credential_store=store)
+    with pytest.raises(CredentialsNotFoundError):
+        service.get_service(interactive=False)
+
+def test_warmup_builds_shared_services(tmp_path, monkeypatch):
+    """Test that warmup builds each shared service once and tolerates missing credentials."""
+    monkeypatch.setenv('OPENAI_API_KEY', 'test-key')
+    monkeypatch.setenv('CREDENTIAL_STORE', 'sqlite')
+    monkeypatch.setenv('CREDENTIAL_STORE_PATH', str(tmp_path / 'credentials.db'))
+    registry = ServiceRegistry()
+
+    timings = registry.warmup()
+    llm_service = registry.llm_service
+    registry.warmup()
+
+    assert set(timings) == {'llm_service_ms', 'calendar_services_ms', 'calendar_service_ms'}
+    assert registry.llm_service is llm_service
+    assert registry.calendar_for('alice') is registry.calendar_for('alice')
+    registry.close()
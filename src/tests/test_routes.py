@@ -0,0 +1,236 @@
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+import pytest
+import pytz
+from google.oauth2.credentials import Credentials
+
+# The apps import their modules the way `python app.py` run from src does
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app import create_app
+from asgi import create_asgi_app
+from services.credential_store import FileCredentialStore
+from services.registry import ServiceRegistry
+from services.sqlite_db import connect
+from tools.fakes import FakeCalendarServer, FakeOpenAIServer
+
+ALICE = {'X-User-Id': 'alice'}
+EVENT = {
+    'summary': 'Design review',
+    'start': {'dateTime': '2026-10-19T09:00:00-07:00', 'timeZone': 'America/Los_Angeles'},
+    'end': {'dateTime': '2026-10-19T10:00:00-07:00', 'timeZone': 'America/Los_Angeles'}
+}
+ICS = (
+    "BEGIN:VCALENDAR\r\nVERSION:2.0\r\n"
+    "BEGIN:VEVENT\r\nUID:standup-1@example.com\r\nSUMMARY:Standup\r\n"
+    "DTSTART:20261020T160000Z\r\nDTEND:20261020T161500Z\r\nEND:VEVENT\r\n"
+    "END:VCALENDAR\r\n"
+)
+
+@pytest.fixture
+def fakes(tmp_path, monkeypatch):
+    """Fake Calendar and OpenAI APIs, with credentials for alice and all state under tmp_path."""
+    with FakeCalendarServer() as calendar, FakeOpenAIServer() as openai:
+        monkeypatch.setenv('OPENAI_API_KEY', 'fake-key')
+        monkeypatch.setenv('OPENAI_BASE_URL', f"{openai.url}/v1")
+        monkeypatch.setenv('CALENDAR_API_ENDPOINT', calendar.api_endpoint)
+        monkeypatch.setenv('CREDENTIAL_STORE', 'file')
+        monkeypatch.setenv('CREDENTIAL_STORE_PATH', str(tmp_path / 'tokens'))
+        monkeypatch.setenv('JOB_QUEUE_PATH', str(tmp_path / 'jobs.db'))
+        monkeypatch.setenv('WATCH_CHANNELS_PATH', str(tmp_path / 'watch.db'))
+        monkeypatch.delenv('WATCH_WEBHOOK_URL', raising=False)
+        FileCredentialStore(str(tmp_path / 'tokens')).save('alice', Credentials(token='fake-token'))
+        yield calendar
+
+@pytest.fixture
+def registry(fakes):
+    registry = ServiceRegistry(timezone='America/Los_Angeles')
+    yield registry
+    registry.close()
+
+@pytest.fixture
+def client(registry):
+    return create_app(registry).test_client()
+
+def wait_for_job(client, location, headers=ALICE, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        job = client.get(location, headers=headers).get_json()['job']
+        if job['status'] in ('succeeded', 'failed') or time.monotonic() > deadline:
+            return job
+        time.sleep(0.05)
+
+def test_schedule_replays_idempotency_key(client, fakes):
+    """Test that retrying /schedule with the same Idempotency-Key returns the first event."""
+    headers = dict(ALICE, **{'Idempotency-Key': 'retry-1'})
+    first = client.post('/calendar/schedule', json={'event': EVENT}, headers=headers)
+    again = client.post('/calendar/schedule', json={'event': dict(EVENT, summary='Retried')}, headers=headers)
+    other = client.post('/calendar/schedule', json={'event': EVENT}, headers=ALICE)
+
+    assert first.status_code == again.status_code == other.status_code == 200
+    assert again.get_json()['event'] == first.get_json()['event']
+    assert other.get_json()['event']['id'] != first.get_json()['event']['id']
+    assert client.post('/calendar/schedule', json={'event': EVENT},
+                       headers={'X-User-Id': 'bob'}).status_code == 401
+    assert client.post('/calendar/schedule', json={'event': {'summary': 'x'}}, headers=ALICE).status_code == 400
+
+def test_async_schedule_is_polled_through_jobs(client):
+    """Test that a respond-async request returns 202 and its job is only visible to its user."""
+    headers = dict(ALICE, Prefer='respond-async')
+    response = client.post('/calendar/schedule', json={'event': EVENT}, headers=headers)
+
+    assert response.status_code == 202
+    location = response.headers['Location']
+    assert location == f"/jobs/{response.get_json()['job']['id']}"
+    job = wait_for_job(client, location)
+    assert job['status'] == 'succeeded'
+    assert job['event']['summary'] == 'Design review'
+    assert client.get(location, headers={'X-User-Id': 'bob'}).status_code == 404
+    assert client.get('/jobs/missing', headers=ALICE).status_code == 404
+
+def test_batch_create_replays_idempotency_key(client):
+    """Test that a retried batch with the same Idempotency-Key gets the events the first one created."""
+    body = {'queries': ['Lunch with Sam tomorrow at 1pm', 'Dentist tomorrow at 4pm']}
+    headers = dict(ALICE, **{'Idempotency-Key': 'batch-1'})
+    first = client.post('/nlp/create/batch', json=body, headers=headers)
+    again = client.post('/nlp/create/batch', json=body, headers=headers)
+
+    assert first.status_code == again.status_code == 200
+    results = first.get_json()['results']
+    assert [result['status'] for result in results] == ['success', 'success']
+    assert again.get_json()['results'] == results
+    assert len({result['event']['id'] for result in results}) == 2
+    assert client.post('/nlp/create/batch', json={'queries': []}, headers=ALICE).status_code == 400
+    assert client.post('/nlp/create/batch', json=body, headers={'X-User-Id': 'bob'}).status_code == 401
+
+def test_batch_create_reports_conflicts_per_item(client):
+    """Test that onConflict=reject fails only the items that overlap."""
+    tz = pytz.timezone('America/Los_Angeles')
+    tomorrow = datetime.now(tz).date() + timedelta(days=1)
+    start = tz.localize(datetime(tomorrow.year, tomorrow.month, tomorrow.day, 9))
+    busy = {'summary': 'Standup', 'start': {'dateTime': start.isoformat()},
+            'end': {'dateTime': (start + timedelta(hours=1)).isoformat()}}
+    client.post('/calendar/schedule', json={'event': busy}, headers=ALICE)
+    body = {'queries': ['Design sync tomorrow at 9am', 'Dentist tomorrow at 4pm'], 'onConflict': 'reject'}
+    response = client.post('/nlp/create/batch', json=body, headers=ALICE)
+
+    results = response.get_json()['results']
+    assert response.status_code == 200
+    assert results[0]['status'] == 'error'
+    assert results[0]['code'] == 409
+    assert results[1]['status'] == 'success'
+
+def test_import_then_export(client):
+    """Test that an imported .ics file is skipped on re-import and comes back in the export."""
+    first = client.post('/calendar/import', data=ICS, content_type='text/calendar', headers=ALICE)
+    again = client.post('/calendar/import', data=ICS, content_type='text/calendar', headers=ALICE)
+    export = client.get('/calendar/export?timeMin=2026-10-20T00:00:00Z&timeMax=2026-10-21T00:00:00Z',
+                        headers=ALICE)
+
+    assert first.status_code == again.status_code == 200
+    assert first.get_json()['imported'] == 1
+    assert again.get_json()['imported'] == 0
+    assert export.status_code == 200
+    assert export.mimetype == 'text/calendar'
+    body = export.get_data(as_text=True)
+    assert 'SUMMARY:Standup' in body and body.rstrip().endswith('END:VCALENDAR')
+    assert client.get('/calendar/export?timeMin=bad', headers=ALICE).status_code == 400
+
+def test_availability(client, fakes):
+    """Test that group availability skips busy times and rejects bad payloads."""
+    fakes.insert('bob@example.com', dict(EVENT, id='busy1'))
+    body = {'attendees': ['bob@example.com'], 'durationMinutes': 60, 'granularityMinutes': 60,
+            'timeMin': '2026-10-19T09:00:00-07:00', 'timeMax': '2026-10-19T12:00:00-07:00', 'includeSelf': False}
+    response = client.post('/calendar/availability', json=body, headers=ALICE)
+
+    assert response.status_code == 200
+    slots = response.get_json()['slots']
+    assert [slot['start'] for slot in slots] == ['2026-10-19T10:00:00-07:00', '2026-10-19T11:00:00-07:00']
+    assert client.post('/calendar/availability', json={'durationMinutes': 30}, headers=ALICE).status_code == 400
+
+def test_notifications_need_a_live_channel_and_its_token(registry, fakes, monkeypatch):
+    """Test that the webhook accepts the token of a channel it opened and 404s anything else."""
+    assert create_app(registry).test_client().post('/calendar/notifications').status_code == 404
+
+    monkeypatch.setenv('WATCH_WEBHOOK_URL', 'http://127.0.0.1:9/calendar/notifications')
+    watching = ServiceRegistry(timezone='America/Los_Angeles')
+    try:
+        client = create_app(watching).test_client()
+        watching.calendar_for('alice')
+        deadline = time.monotonic() + 10
+        row = None
+        while row is None and time.monotonic() < deadline:
+            with connect(watching.watch_channels.path) as conn:
+                row = conn.execute('SELECT channel_id, resource_id, token FROM watch_channels').fetchone()
+            time.sleep(0.05)
+        assert row is not None
+
+        headers = {'X-Goog-Channel-ID': row['channel_id'], 'X-Goog-Resource-ID': row['resource_id'],
+                   'X-Goog-Resource-State': 'exists', 'X-Goog-Channel-Token': row['token']}
+        assert client.post('/calendar/notifications', headers=headers).status_code == 200
+        headers['X-Goog-Channel-Token'] = 'forged'
+        assert client.post('/calendar/notifications', headers=headers).status_code == 404
+        assert watching.watch_channels.get_stats()['rejected'] == 1
+    finally:
+        watching.close()
+
+def test_metrics_count_requests_by_route(client):
+    """Test that served requests show up in the Prometheus metrics under their route."""
+    client.get('/jobs/missing', headers=ALICE)
+    response = client.get('/health/metrics')
+
+    assert response.status_code == 200
+    assert response.mimetype.startswith('text/plain')
+    assert '/jobs/<job_id>' in response.get_data(as_text=True)
+
+def test_asgi_routes(registry, fakes):
+    """Test the async app's new endpoints: idempotent create, batch, jobs, availability and metrics."""
+    async def run():
+        client = create_asgi_app(registry).test_client()
+        headers = dict(ALICE, **{'Idempotency-Key': 'async-1'})
+        first = await client.post('/nlp/create', json={'query': 'Lunch with Sam tomorrow at 1pm'}, headers=headers)
+        again = await client.post('/nlp/create', json={'query': 'Lunch with Sam tomorrow at 1pm'}, headers=headers)
+        assert first.status_code == again.status_code == 200
+        assert (await again.get_json())['event']['id'] == (await first.get_json())['event']['id']
+
+        body = {'queries': ['Dentist tomorrow at 4pm'], 'onConflict': 'allow'}
+        batch = await client.post('/nlp/create/batch', json=body, headers=dict(ALICE, **{'Idempotency-Key': 'b'}))
+        retry = await client.post('/nlp/create/batch', json=body, headers=dict(ALICE, **{'Idempotency-Key': 'b'}))
+        assert batch.status_code == 200
+        assert (await retry.get_json())['results'] == (await batch.get_json())['results']
+        assert (await client.post('/nlp/create/batch', json={}, headers=ALICE)).status_code == 400
+
+        queued = await client.post('/calendar/schedule', json={'event': EVENT},
+                                   headers=dict(ALICE, Prefer='respond-async'))
+        assert queued.status_code == 202
+        job = await client.get(queued.headers['Location'], headers=ALICE)
+        assert job.status_code == 200
+        assert (await client.get(queued.headers['Location'], headers={'X-User-Id': 'bob'})).status_code == 404
+
+        availability = await client.post('/calendar/availability', json={'attendees': 'bob'}, headers=ALICE)
+        assert availability.status_code == 400
+        assert (await client.post('/calendar/notifications')).status_code == 404
+        imported = await client.post('/calendar/import', data=ICS,
+                                     headers=dict(ALICE, **{'Content-Type': 'text/calendar'}))
+        assert (await imported.get_json())['imported'] == 1
+        export = await client.get('/calendar/export?timeMin=2026-10-20T00:00:00Z', headers=ALICE)
+        assert 'SUMMARY:Standup' in await export.get_data(as_text=True)
+        metrics = await client.get('/health/metrics')
+        assert '/nlp/create/batch' in await metrics.get_data(as_text=True)
+
+    asyncio.run(run())
+
+def test_both_apps_share_request_hooks(registry):
+    """Test that the Flask and Quart apps both get the request hooks from setup_app."""
+    headers = dict(ALICE, **{'X-Request-Timeout': 'soon'})
+    assert create_app(registry).test_client().get('/jobs/missing', headers=headers).status_code == 400
+
+    async def run():
+        client = create_asgi_app(registry).test_client()
+        assert (await client.get('/jobs/missing', headers=headers)).status_code == 400
+        assert (await client.get('/jobs/missing', headers=ALICE)).status_code == 404
+
+    asyncio.run(run())
@@ -0,0 +1,119 @@
+import threading
+import time
+import pytest
+from src.services.parse_cache import ParseCache
+from src.services.shared_cache import SQLiteCache, create_cache
+from src.services.sqlite_db import connect
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'cache.db')
+
+def test_get_set_ttl_and_eviction(path):
+    clock = FakeClock()
+    cache = SQLiteCache(path, max_size=2, ttl=10, clock=clock)
+    cache.set('a', {'event': {'summary': 'A'}})
+    cache.set('b', {'event': {'summary': 'B'}})
+    clock.now += 1
+    assert cache.get('a') == {'event': {'summary': 'A'}}
+
+    # 'b' is now the least recently used
+    cache.set('c', {'event': {'summary': 'C'}})
+    assert cache.get('b') is None
+
+    clock.now += 10
+    assert cache.get('a') is None
+    stats = cache.get_stats()
+    assert stats['evictions'] == 1
+    assert stats['expirations'] == 1
+    assert stats['size'] == 1
+
+def test_entries_and_stats_are_shared(path):
+    """Test that a value computed by one worker is a hit in another, and stats add up across them."""
+    first = SQLiteCache(path, namespace='parse')
+    second = SQLiteCache(path, namespace='parse')
+    other = SQLiteCache(path, namespace='other')
+
+    assert first.get_or_compute('q', lambda: {'n': 1}) == {'n': 1}
+    assert second.get_or_compute('q', lambda: pytest.fail('computed twice')) == {'n': 1}
+    assert other.get('q') is None
+
+    stats = second.get_stats()
+    assert (stats['hits'], stats['misses'], stats['hit_rate']) == (1, 1, 0.5)
+
+def test_get_or_compute_once_across_processes(path):
+    """Test that concurrent misses in separate caches, as in separate workers, compute once."""
+    caches = [SQLiteCache(path, poll_interval=0.01) for _ in range(3)]
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return {'value': 42}
+
+    results = []
+    threads = [threading.Thread(target=lambda c=c: results.append(c.get_or_compute('key', compute)))
+               for c in caches for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [{'value': 42}] * 6
+    stats = caches[0].get_stats()
+    assert stats['misses'] == 1
+    assert stats['coalesced'] == 5
+
+def test_hits_are_reads(path):
+    """Test that hits don't wait for the write lock, and their LRU touches and counters are written later."""
+    cache = SQLiteCache(path, flush_interval=3600, flush_every=1000)
+    cache.set('a', {'n': 1})
+    with connect(cache.path) as conn:
+        # Another worker holding the write lock for longer than the hits take
+        conn.execute('BEGIN IMMEDIATE')
+        started = time.monotonic()
+        assert [cache.get('a') for _ in range(50)] == [{'n': 1}] * 50
+        assert cache.get_or_compute('a', lambda: pytest.fail('computed on a hit')) == {'n': 1}
+        assert time.monotonic() - started < 1
+    assert cache.get_stats()['hits'] == 51
+
+def test_failed_computation_releases_the_key(path):
+    cache = SQLiteCache(path)
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute('key', lambda: (_ for _ in ()).throw(RuntimeError('upstream down')))
+    assert cache.get_or_compute('key', lambda: 'ok') == 'ok'
+
+def test_abandoned_lease_expires(path):
+    """Test that a key claimed by a worker that died is computed again once its lease runs out."""
+    clock = FakeClock()
+    cache = SQLiteCache(path, lease_seconds=5, poll_interval=0, clock=clock)
+    with connect(cache.path) as conn:
+        conn.execute("INSERT INTO cache_flights VALUES ('default', 'key', ?)", (clock.now + 5,))
+
+    def advance():
+        # Each poll moves time on, so the waiting caller eventually takes over the lease
+        clock.now += 1
+        return None
+
+    original_lookup = cache._lookup
+    cache._lookup = lambda conn, key, record=True: advance() or original_lookup(conn, key, record)
+    assert cache.get_or_compute('key', lambda: 'recomputed') == 'recomputed'
+
+def test_create_cache_switch(path, monkeypatch):
+    assert isinstance(create_cache('parse'), ParseCache)
+    monkeypatch.setenv('CACHE_BACKEND', 'sqlite')
+    monkeypatch.setenv('CACHE_PATH', path)
+    cache = create_cache('parse', max_size=5)
+    assert isinstance(cache, SQLiteCache)
+    assert (cache.path, cache.namespace, cache.max_size) == (path, 'parse', 5)
+    monkeypatch.setenv('CACHE_BACKEND', 'redis')
+    with pytest.raises(ValueError):
+        create_cache('parse')
@@ -0,0 +1,135 @@
+from datetime import date, timedelta
+import asyncio
+import json
+import pytest
+from src.services.stream_parser import StreamingJSONValidator
+from src.services.llm_service import LLMService
+
+# Parsed events must start near today to pass the LLM service's checks
+TOMORROW = (date.today() + timedelta(days=1)).isoformat()
+
+EVENT = {
+    'timeSpecified': True,
+    'event': {
+        'summary': 'Quarterly "planning"',
+        'description': 'Line one\nline two',
+        'start': {'dateTime': f'{TOMORROW}T09:00:00-07:00', 'timeZone': 'America/Los_Angeles'},
+        'end': {'dateTime': f'{TOMORROW}T10:00:00-07:00', 'timeZone': 'America/Los_Angeles'},
+        'attendees': [{'email': 'a@example.com', 'optional': False}],
+        'reminders': {}
+    }
+}
+
+def test_fields_reported_as_they_complete():
+    """Test that feeding one character at a time yields each field once and decodes the whole object."""
+    validator = StreamingJSONValidator()
+    fields = []
+    for char in json.dumps(EVENT, indent=2):
+        fields.extend(validator.feed(char))
+
+    assert validator.result() == EVENT
+    assert fields[:2] == [('timeSpecified', True), ('event.summary', 'Quarterly "planning"')]
+    assert ('event.start.dateTime', f'{TOMORROW}T09:00:00-07:00') in fields
+    assert ('event.attendees.optional', False) in fields
+
+@pytest.mark.parametrize('text, message', [
+    ('Sure! {"event"', 'Malformed JSON'),
+    ('{"event": {"summary" "Lunch"', 'Malformed JSON'),
+    ('{"event": {"summary": tru, ', 'Malformed JSON'),
+    ('{"event": "Lunch tomorrow"', 'Invalid response structure'),
+    ('{"error": "Query must specify an event purpose", "de', 'Query must specify an event purpose'),
+])
+def test_fails_before_the_end_of_the_output(text, message):
+    """Test that bad output raises as soon as it is seen."""
+    with pytest.raises(ValueError, match=message):
+        StreamingJSONValidator().feed(text)
+
+def test_incomplete_output_is_rejected():
+    """Test that a stream cut off mid-object is not decoded."""
+    validator = StreamingJSONValidator()
+    validator.feed('{"event": {"summary": "Lunch"')
+    with pytest.raises(ValueError, match='Incomplete'):
+        validator.result()
+
+def chunk(text):
+    delta = type('Delta', (), {'content': text})
+    return type('Chunk', (), {'choices': [type('Choice', (), {'delta': delta})]})
+
+class FakeStream:
+    """Streams a completion a few characters at a time and records how much was read."""
+    def __init__(self, content, size=4):
+        self.chunks = [chunk(content[i:i + size]) for i in range(0, len(content), size)]
+        self.read = 0
+        self.closed = False
+
+    def __iter__(self):
+        for item in self.chunks:
+            self.read += 1
+            yield item
+
+    async def __aiter__(self):
+        for item in self:
+            yield item
+
+    def close(self):
+        self.closed = True
+
+class FakeStreamingClient:
+    def __init__(self, content):
+        self.stream = FakeStream(content)
+        self.chat = self
+        self.completions = self
+        self.kwargs = None
+
+    def create(self, **kwargs):
+        self.kwargs = kwargs
+        return self.stream
+
+class FakeAsyncStream(FakeStream):
+    async def close(self):
+        self.closed = True
+
+class FakeAsyncStreamingClient(FakeStreamingClient):
+    def __init__(self, content):
+        super().__init__(content)
+        self.stream = FakeAsyncStream(content)
+
+    async def create(self, **kwargs):
+        return super().create(**kwargs)
+
+QUERY = "sync with the design folks sometime soonish"
+
+def test_stream_yields_fields_then_cached_result():
+    """Test that a streamed parse reports fields, returns the result and caches it."""
+    client = FakeStreamingClient(json.dumps(EVENT))
+    service = LLMService(client=client)
+
+    updates = list(service.stream_calendar_query(QUERY))
+
+    assert client.kwargs['stream'] is True
+    assert updates[0] == {'type': 'field', 'field': 'timeSpecified', 'value': True}
+    assert updates[-1] == {'type': 'result', 'result': EVENT}
+    assert list(service.stream_calendar_query(QUERY)) == [{'type': 'result', 'result': EVENT}]
+    assert service.get_stats()['llm_calls'] == 1
+
+def test_stream_stops_reading_on_error_reply():
+    """Test that an error reply aborts the stream without reading the rest of it."""
+    content = json.dumps({'error': 'Query is not a valid calendar request', 'padding': 'x' * 400})
+    client = FakeStreamingClient(content)
+    service = LLMService(client=client)
+
+    with pytest.raises(ValueError, match='not a valid calendar request'):
+        list(service.stream_calendar_query(QUERY))
+    assert client.stream.closed
+    assert client.stream.read < len(client.stream.chunks) // 4
+
+def test_async_stream_matches_sync():
+    """Test that the async stream yields the same updates."""
+    service = LLMService(client=object(), async_client=FakeAsyncStreamingClient(json.dumps(EVENT)))
+
+    async def run():
+        return [update async for update in service.astream_calendar_query(QUERY)]
+
+    updates = asyncio.run(run())
+    assert updates[-1] == {'type': 'result', 'result': EVENT}
+    assert ('event.summary', 'Quarterly "planning"') in [(u.get('field'), u.get('value')) for u in updates]
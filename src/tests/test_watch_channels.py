@@ -0,0 +1,202 @@
+import pytest
+from src.services.watch_channels import WatchChannels
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+class FakeRequest:
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self):
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+class FakeAPI:
+    """The events.watch and channels.stop parts of a Calendar service object."""
+    def __init__(self, clock, ttl=3600):
+        self.clock = clock
+        self.ttl = ttl
+        self.watched = []
+        self.stopped = []
+        self.fail = None
+
+    def events(self):
+        return self
+
+    def channels(self):
+        return self
+
+    def watch(self, calendarId, body):
+        self.watched.append(body)
+        if self.fail:
+            return FakeRequest(self.fail)
+        return FakeRequest({'id': body['id'], 'resourceId': f'res-{calendarId}',
+                            'expiration': str(int((self.clock() + self.ttl) * 1000))})
+
+    def stop(self, body):
+        self.stopped.append(body['id'])
+        return FakeRequest({})
+
+class FakeCalendarService:
+    def __init__(self, api, user_id='alice'):
+        self.api = api
+        self.user_id = user_id
+        self.watched = {}
+        self.refreshes = []
+
+    def watch_events(self, body, calendar_id='primary'):
+        return self.api.events().watch(calendarId=calendar_id, body=body).execute()
+
+    def stop_channel(self, channel_id, resource_id):
+        self.api.channels().stop(body={'id': channel_id, 'resourceId': resource_id}).execute()
+
+    def set_watched(self, calendar_id, watched):
+        self.watched[calendar_id] = watched
+
+    def refresh_calendar(self, calendar_id='primary'):
+        self.refreshes.append(calendar_id)
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+def channels_for(tmp_path, clock, **kwargs):
+    kwargs.setdefault('debounce', 2.0)
+    kwargs.setdefault('max_delay', 10.0)
+    return WatchChannels(address='https://example.com/calendar/notifications', path=str(tmp_path / 'watch.db'),
+                         renew_margin=600, clock=clock, **kwargs)
+
+def watched(tmp_path, clock, **kwargs):
+    """A WatchChannels with alice's primary calendar watched and its channel open, and no worker thread."""
+    channels = channels_for(tmp_path, clock, **kwargs)
+    api = FakeAPI(clock)
+    calendar = FakeCalendarService(api)
+    channels._start = lambda: None
+    channels.watch(calendar)
+    channels.run_once()
+    return channels, api, calendar
+
+def headers(api, index=-1, token=None):
+    body = api.watched[index]
+    return body['id'], body['token'] if token is None else token, 'res-primary'
+
+def test_watch_opens_a_channel_and_switches_the_calendar_to_push(tmp_path, clock):
+    """Test that a watched calendar gets a channel at the webhook address and stops polling."""
+    channels, api, calendar = watched(tmp_path, clock)
+
+    assert len(api.watched) == 1
+    assert api.watched[0]['type'] == 'web_hook'
+    assert api.watched[0]['address'] == 'https://example.com/calendar/notifications'
+    assert calendar.watched == {'primary': True}
+    assert channels.get_stats()['live'] == 1
+
+    # Nothing to do until the channel nears expiry
+    channels.run_once()
+    assert len(api.watched) == 1
+
+def test_notifications_are_checked_against_the_channel(tmp_path, clock):
+    """Test that only notifications with the channel's id, token and resource are accepted."""
+    channels, api, calendar = watched(tmp_path, clock)
+    channel_id, token, resource_id = headers(api)
+
+    assert channels.notify(channel_id, token, resource_id, 'sync')
+    assert not channels.notify(channel_id, 'guess', resource_id, 'exists')
+    assert not channels.notify('unknown', token, resource_id, 'exists')
+    assert not channels.notify(channel_id, token, 'res-other', 'exists')
+
+    clock.now += 60
+    channels.run_once()
+    # The sync message isn't a change
+    assert calendar.refreshes == []
+    stats = channels.get_stats()
+    assert stats['notifications'] == 1 and stats['rejected'] == 3
+
+def test_a_burst_of_notifications_causes_one_refresh_after_it_settles(tmp_path, clock):
+    """Test that notifications are debounced into a single refresh of the affected calendar."""
+    channels, api, calendar = watched(tmp_path, clock)
+
+    for _ in range(5):
+        assert channels.notify(*headers(api), 'exists')
+        clock.now += 0.5
+        channels.run_once()
+    assert calendar.refreshes == []
+
+    clock.now += 2
+    channels.run_once()
+    channels.run_once()
+    assert calendar.refreshes == ['primary']
+    assert channels.get_stats()['refreshes'] == 1
+
+def test_a_steady_stream_of_notifications_still_refreshes_after_max_delay(tmp_path, clock):
+    """Test that a storm that never settles is refreshed max_delay after its first notification."""
+    channels, api, calendar = watched(tmp_path, clock)
+
+    for _ in range(12):
+        channels.notify(*headers(api), 'exists')
+        channels.run_once()
+        clock.now += 1
+    assert calendar.refreshes == ['primary']
+
+def test_notifications_received_by_another_process_refresh_this_one(tmp_path, clock):
+    """Test that a webhook call handled by another worker process refreshes every process's copy."""
+    channels, api, calendar = watched(tmp_path, clock)
+    other = channels_for(tmp_path, clock)
+
+    assert other.notify(*headers(api), 'exists')
+    clock.now += 3
+    channels.run_once()
+    assert calendar.refreshes == ['primary']
+
+def test_channels_are_renewed_before_they_expire(tmp_path, clock):
+    """Test that a new channel replaces one close to expiry, and the old one is stopped."""
+    channels, api, calendar = watched(tmp_path, clock)
+    old = headers(api)
+
+    clock.now += 3600 - 300
+    channels.run_once()
+
+    assert len(api.watched) == 2
+    assert api.stopped == [old[0]]
+    assert not channels.notify(*old, 'exists')
+    assert channels.notify(*headers(api), 'exists')
+    assert calendar.watched == {'primary': True}
+
+def test_failed_watch_keeps_polling_and_retries_after_the_lease(tmp_path, clock):
+    """Test that a calendar whose channel can't be opened keeps polling, and opening is retried later."""
+    channels = channels_for(tmp_path, clock, lease_seconds=300)
+    channels._start = lambda: None
+    api = FakeAPI(clock)
+    api.fail = RuntimeError('Unauthorized WebHook callback channel')
+    calendar = FakeCalendarService(api)
+
+    channels.watch(calendar)
+    channels.run_once()
+    channels.run_once()
+    assert len(api.watched) == 1
+    assert calendar.watched == {}
+    assert channels.get_stats()['watch_errors'] == 1
+
+    api.fail = None
+    clock.now += 300
+    channels.run_once()
+    assert len(api.watched) == 2
+    assert calendar.watched == {'primary': True}
+
+def test_idle_calendars_go_back_to_polling(tmp_path, clock):
+    """Test that calendars nobody uses are dropped, so their channels aren't renewed."""
+    channels, api, calendar = watched(tmp_path, clock, idle_after=1800)
+
+    clock.now += 1800
+    channels.run_once()
+    assert calendar.watched == {'primary': False}
+    assert channels.get_stats()['watched'] == 0
+
+    clock.now += 3600
+    channels.run_once()
+    assert len(api.watched) == 1
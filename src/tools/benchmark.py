@@ -0,0 +1,185 @@
+"""
+Load test for /nlp/create, /calendar/schedule and /calendar/events/upcoming.
+
+    cd src && python -m tools.benchmark --concurrency 16 --requests 400 --llm-latency 0.4
+
+By default the app runs in-process against the local OpenAI and Calendar
+stand-ins from tools.fakes, so no network access or credentials are
+needed. Use --mode record once to capture real API responses into
+--cassette-dir, then --mode replay to rerun against them deterministically.
+--target benchmarks an app that is already running instead.
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import pytz
+import requests
+from .fakes import MODES, FakeCalendarServer, FakeOpenAIServer
+
+BENCH_USER = 'bench'
+TIMEZONE = 'America/Los_Angeles'
+
+# A mix of queries the local parser answers and ones that go to the LLM
+QUERIES = [
+    "Team meeting tomorrow at 2pm",
+    "Dentist appointment tomorrow at 3:30pm for 45 minutes",
+    "Grocery shopping tomorrow morning",
+    "Catch up with Priya sometime tomorrow afternoon-ish",
+    "Quick sync with design later this week",
+    "Lunch with Sam next Tuesday at noon",
+]
+
+def schedule_body(index: int) -> Dict[str, Any]:
+    """A /calendar/schedule payload on its own half-hour slot, so requests don't pile up on one time."""
+    tz = pytz.timezone(TIMEZONE)
+    day = datetime.now(tz).date() + timedelta(days=2 + index // 24)
+    start = tz.localize(datetime(day.year, day.month, day.day, 8)) + timedelta(minutes=30 * (index % 24))
+    return {'event': {
+        'summary': f'Benchmark event {index}',
+        'start': {'dateTime': start.isoformat(), 'timeZone': TIMEZONE},
+        'end': {'dateTime': (start + timedelta(minutes=30)).isoformat(), 'timeZone': TIMEZONE}
+    }}
+
+# name -> (method, path, body for the nth request)
+SCENARIOS: Dict[str, Tuple[str, str, Optional[Callable[[int], Any]]]] = {
+    'nlp_create': ('POST', '/nlp/create', lambda i: {'query': QUERIES[i % len(QUERIES)]}),
+    'schedule': ('POST', '/calendar/schedule', schedule_body),
+    'upcoming': ('GET', '/calendar/events/upcoming?limit=10', None),
+}
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+def run_load(base_url: str, method: str, path: str, body: Optional[Callable[[int], Any]],
+             concurrency: int, total: int, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """
+    Sends total requests with concurrency workers, each reusing one
+    connection, and returns throughput, error count and latency percentiles.
+    """
+    counter = itertools.count()
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def worker():
+        session = requests.Session()
+        session.headers.update(headers or {})
+        while True:
+            index = next(counter)
+            if index >= total:
+                return
+            started = time.perf_counter()
+            try:
+                response = session.request(method, base_url + path, json=body(index) if body else None, timeout=60)
+                status = response.status_code
+            except requests.RequestException:
+                status = 'connection_error'
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in range(concurrency):
+            executor.submit(worker)
+    duration = time.perf_counter() - started
+
+    return {
+        'requests': len(latencies),
+        'errors': sum(count for status, count in statuses.items() if status == 'connection_error' or status >= 400),
+        'statuses': {str(status): count for status, count in statuses.items()},
+        'throughput_rps': len(latencies) / duration if duration else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+    }
+
+def start_app(credentials_dir: str):
+    """Runs the Flask app in a background thread, with fake credentials for BENCH_USER."""
+    from google.oauth2.credentials import Credentials
+    from werkzeug.serving import make_server
+    from services.credential_store import FileCredentialStore
+
+    os.environ['CREDENTIAL_STORE'] = 'file'
+    os.environ['CREDENTIAL_STORE_PATH'] = credentials_dir
+    FileCredentialStore(credentials_dir).save(BENCH_USER, Credentials(token='fake-token'))
+
+    from app import create_app
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, create_app(), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    parser.add_argument('--target', help='base URL of a running app to benchmark instead')
+    parser.add_argument('--user', default=BENCH_USER, help='X-User-Id sent with every request')
+    parser.add_argument('--mode', choices=MODES, default='fake', help='how the stand-ins answer')
+    parser.add_argument('--cassette-dir', default='cassettes')
+    parser.add_argument('--llm-latency', type=float, default=0.3)
+    parser.add_argument('--calendar-latency', type=float, default=0.05)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    servers = []
+    app_server = None
+    base_url = args.target
+    if base_url is None:
+        if args.mode != 'fake':
+            os.makedirs(args.cassette_dir, exist_ok=True)
+        common = {'mode': args.mode, 'jitter': args.jitter, 'error_rate': args.error_rate, 'seed': args.seed}
+        openai_server = FakeOpenAIServer(latency=args.llm_latency,
+                                         cassette=os.path.join(args.cassette_dir, 'openai.json'), **common)
+        calendar_server = FakeCalendarServer(latency=args.calendar_latency,
+                                             cassette=os.path.join(args.cassette_dir, 'calendar.json'), **common)
+        servers = [openai_server.start(), calendar_server.start()]
+        os.environ['OPENAI_BASE_URL'] = f"{openai_server.url}/v1"
+        os.environ['CALENDAR_API_ENDPOINT'] = calendar_server.api_endpoint
+        if args.mode != 'record':
+            os.environ['OPENAI_API_KEY'] = 'fake-key'
+        app_server = start_app(tempfile.mkdtemp(prefix='bench-tokens-'))
+        base_url = f"http://127.0.0.1:{app_server.server_port}"
+
+    results = {}
+    try:
+        for name in args.scenarios:
+            method, path, body = SCENARIOS[name]
+            results[name] = run_load(base_url, method, path, body, args.concurrency, args.requests,
+                                     headers={'X-User-Id': args.user})
+    finally:
+        if app_server is not None:
+            app_server.shutdown()
+        for server in servers:
+            server.stop()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'scenario':<12}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, r in results.items():
+        print(f"{name:<12}{r['requests']:>10}{r['errors']:>8}{r['throughput_rps']:>10.1f}"
+              f"{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Compares parse accuracy, latency and token usage of the LLM prompt modes.
+
+    cd src && python -m tools.compare_prompts --runs 3
+
+Every query goes to the LLM (the local parser and the cache are skipped), and
+results are checked against the expected start, duration or error.
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+import pytz
+from dotenv import load_dotenv
+from services.llm_service import LLMService, PROMPT_MODES
+
+TIMEZONE = 'America/Los_Angeles'
+
+# (query, expected): expected is (days from today, hour, minute, duration in minutes),
+# or None for queries the LLM should reject
+CASES = [
+    ("Team meeting tomorrow at 2pm", (1, 14, 0, 60)),
+    ("Dentist appointment tomorrow at 3:30pm for 45 minutes", (1, 15, 30, 45)),
+    ("Grocery shopping tomorrow morning", (1, 9, 0, 120)),
+    ("Dinner with Alex tomorrow evening", (1, 18, 0, 60)),
+    ("Call mom the day after tomorrow at 11am for 30 minutes", (2, 11, 0, 30)),
+    ("Yoga class tomorrow at 7am for 90 minutes", (1, 7, 0, 90)),
+    ("Run errands tomorrow at 1pm", (1, 13, 0, 120)),
+    ("Project review tomorrow from 4pm to 5:30pm", (1, 16, 0, 90)),
+    ("xyzzy plugh", None),
+    ("purple elephant dancing", None),
+]
+
+def check(result, expected, today):
+    """Returns True if a parse result (or raised ValueError) matches the expectation."""
+    if expected is None:
+        return isinstance(result, ValueError)
+    if isinstance(result, Exception):
+        return False
+    days, hour, minute, duration = expected
+    tz = pytz.timezone(TIMEZONE)
+    start = datetime.fromisoformat(result['event']['start']['dateTime'])
+    end = datetime.fromisoformat(result['event']['end']['dateTime'])
+    if start.tzinfo is None:
+        start, end = tz.localize(start), tz.localize(end)
+    start = start.astimezone(tz)
+    return (start.date() == today + timedelta(days=days)
+            and (start.hour, start.minute) == (hour, minute)
+            and end - start == timedelta(minutes=duration))
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def evaluate(service, runs=1):
+    """Runs every case runs times and returns accuracy, latency and token averages."""
+    today = datetime.now(pytz.timezone(TIMEZONE)).date()
+    correct = 0
+    latencies = []
+    for _ in range(runs):
+        for query, expected in CASES:
+            started = time.perf_counter()
+            try:
+                result = service._parse_with_llm(query, route='compare')
+            except ValueError as e:
+                result = e
+            latencies.append((time.perf_counter() - started) * 1000)
+            correct += check(result, expected, today)
+
+    usage = service.usage.get_stats()['compare']
+    return {
+        'mode': service.prompt_mode,
+        'accuracy': correct / len(latencies),
+        'calls': usage['calls'],
+        'p50_latency_ms': percentile(latencies, 0.5),
+        'p95_latency_ms': percentile(latencies, 0.95),
+        'avg_prompt_tokens': usage['avg_prompt_tokens'],
+        'avg_completion_tokens': usage['avg_completion_tokens'],
+        'cached_prompt_tokens': usage['cached_prompt_tokens'],
+    }
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', nargs='+', choices=PROMPT_MODES, default=list(PROMPT_MODES))
+    parser.add_argument('--runs', type=int, default=1, help='times to run each query per mode')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    results = [evaluate(LLMService(timezone=TIMEZONE, prompt_mode=mode), args.runs) for mode in args.modes]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'mode':<10}{'accuracy':>10}{'p50 ms':>10}{'p95 ms':>10}{'prompt tok':>12}{'compl. tok':>12}{'cached tok':>12}")
+    for r in results:
+        print(f"{r['mode']:<10}{r['accuracy']:>10.0%}{r['p50_latency_ms']:>10.0f}{r['p95_latency_ms']:>10.0f}"
+              f"{r['avg_prompt_tokens']:>12.0f}{r['avg_completion_tokens']:>12.0f}{r['cached_prompt_tokens']:>12}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,614 @@
+"""
+Local stand-ins for the OpenAI chat-completions API and the Calendar v3
+events, freeBusy and push notification APIs, for benchmarks and tests
+without network access.
+
+    cd src && python -m tools.fakes --llm-latency 0.4 --calendar-latency 0.08
+
+Point the app at them with OPENAI_BASE_URL and CALENDAR_API_ENDPOINT (the
+command prints both). Each server can add latency and inject errors, and
+can record responses from the real API once and replay them afterwards.
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import random
+import re
+import threading
+import queue
+import time
+import uuid
+from http.client import HTTPConnection, HTTPSConnection
+from datetime import datetime, timedelta
+from email.parser import BytesParser
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+import pytz
+
+MODES = ('fake', 'record', 'replay')
+
+class FakeAPIServer:
+    """
+    A threaded HTTP server answering like a remote API.
+
+    In 'fake' mode responses come from handle(). In 'record' mode requests
+    are forwarded to upstream and the responses saved to the cassette file;
+    in 'replay' mode they are served from it, in recorded order for repeated
+    requests. Latency and errors are injected in 'fake' and 'replay' modes.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 error_status: int = 500, seed: int = 0, mode: str = 'fake',
+                 cassette: Optional[str] = None, upstream: Optional[str] = None,
+                 host: str = '127.0.0.1', port: int = 0):
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode '{mode}'. Use one of: {', '.join(MODES)}")
+        if mode != 'fake' and not cassette:
+            raise ValueError(f"A cassette file is needed in {mode} mode")
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.mode = mode
+        self.cassette = cassette
+        self.upstream = upstream
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._recordings: Dict[str, List[Dict[str, Any]]] = {}
+        self._replay_positions: Dict[str, int] = {}
+        self.requests = 0
+        if mode == 'replay':
+            with open(cassette) as f:
+                self._recordings = json.load(f)
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'FakeAPIServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self.mode == 'record':
+            self.save()
+
+    def save(self) -> None:
+        with self._lock:
+            recordings = dict(self._recordings)
+        with open(self.cassette, 'w') as f:
+            json.dump(recordings, f, indent=2, sort_keys=True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def handle(self, method: str, path: str, params: Dict[str, str], body: Any) -> Tuple[int, Any]:
+        """Returns (status, JSON body) for a request in 'fake' mode."""
+        raise NotImplementedError
+
+    def cassette_key(self, method: str, path: str, params: Dict[str, str], body: Any) -> str:
+        """Identifies a request for record/replay; ignores fields that change on every call."""
+        digest = hashlib.sha256(json.dumps(body, sort_keys=True).encode()).hexdigest()[:16]
+        query = '&'.join(f"{k}={v}" for k, v in sorted(params.items()))
+        return f"{method} {path}?{query} {digest}"
+
+    def error_body(self, status: int) -> Dict[str, Any]:
+        return {'error': {'code': status, 'message': 'Injected error'}}
+
+    def render(self, status: int, payload: Any) -> Tuple[str, List[bytes]]:
+        """Returns the content type and body chunks; chunks after the first can be delayed."""
+        return 'application/json', [json.dumps(payload).encode()]
+
+    def _respond(self, method: str, raw_path: str, headers, raw_body: bytes) -> Tuple[int, str, List[bytes]]:
+        split = urlsplit(raw_path)
+        params = {key: values[-1] for key, values in parse_qs(split.query).items()}
+        body = json.loads(raw_body) if raw_body else None
+        with self._lock:
+            self.requests += 1
+
+        if self.mode == 'record':
+            return self._record(method, raw_path, headers, raw_body, split.path, params, body)
+
+        self._sleep()
+        with self._lock:
+            inject_error = self._random.random() < self.error_rate
+        if inject_error:
+            return self.error_status, 'application/json', [json.dumps(self.error_body(self.error_status)).encode()]
+
+        if self.mode == 'replay':
+            return self._replay(method, split.path, params, body)
+
+        status, payload = self.handle(method, split.path, params, body)
+        content_type, chunks = self.render(status, payload)
+        return status, content_type, chunks
+
+    def _sleep(self) -> None:
+        with self._lock:
+            delay = self.latency + self._random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _record(self, method, raw_path, headers, raw_body, path, params, body):
+        import requests
+
+        forwarded = {key: value for key, value in headers.items()
+                     if key.lower() in ('authorization', 'content-type', 'accept')}
+        response = requests.request(method, self.upstream.rstrip('/') + raw_path, headers=forwarded,
+                                    data=raw_body or None, timeout=120)
+        content_type = response.headers.get('Content-Type', 'application/json')
+        key = self.cassette_key(method, path, params, body)
+        with self._lock:
+            self._recordings.setdefault(key, []).append({
+                'status': response.status_code,
+                'content_type': content_type,
+                'body': response.text
+            })
+        return response.status_code, content_type, [response.content]
+
+    def _replay(self, method, path, params, body):
+        key = self.cassette_key(method, path, params, body)
+        with self._lock:
+            recorded = self._recordings.get(key)
+            if not recorded:
+                return 404, 'application/json', [json.dumps({'error': {'message': f'No recording for {key}'}}).encode()]
+            position = self._replay_positions.get(key, 0)
+            self._replay_positions[key] = position + 1
+        item = recorded[min(position, len(recorded) - 1)]
+        return item['status'], item['content_type'], [item['body'].encode()]
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _serve(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                raw_body = self.rfile.read(length) if length else b''
+                status, content_type, chunks = server._respond(self.command, self.path, self.headers, raw_body)
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(sum(len(chunk) for chunk in chunks)))
+                self.end_headers()
+                for index, chunk in enumerate(chunks):
+                    if index:
+                        server._sleep_between_chunks()
+                    self.wfile.write(chunk)
+                    self.wfile.flush()
+
+            do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _serve
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def _sleep_between_chunks(self) -> None:
+        pass
+
+# Words that make a query look like a calendar request to the fake LLM
+TIME_WORDS = {
+    'today', 'tonight', 'tomorrow', 'morning', 'afternoon', 'evening', 'noon', 'weekend', 'week',
+    'monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday', 'am', 'pm',
+    'soon', 'soonish', 'later', 'sometime', 'next'
+}
+QUERY_PATTERNS = (re.compile(r'Parse this calendar query: "(.*)"'), re.compile(r'Query: (".*")'))
+
+class FakeOpenAIServer(FakeAPIServer):
+    """
+    Answers POST /v1/chat/completions, streaming or not, with a plausible
+    calendar parse of the query in the prompt.
+
+    The default responder is a few rules, not a parser: it puts the event
+    tomorrow at the time mentioned (10am otherwise) and rejects queries
+    without any time words. Pass responder to return something else.
+    """
+
+    def __init__(self, responder=None, timezone: str = 'America/Los_Angeles',
+                 chunk_delay: float = 0.0, upstream: str = 'https://api.openai.com', **kwargs):
+        super().__init__(upstream=upstream, **kwargs)
+        self.responder = responder or self.default_response
+        self.timezone = timezone
+        self.chunk_delay = chunk_delay
+        self._ids = itertools.count(1)
+
+    def handle(self, method, path, params, body):
+        if method != 'POST' or not path.endswith('/chat/completions'):
+            return 404, {'error': {'message': f'Unknown endpoint {path}'}}
+        query = self.extract_query(body)
+        content = json.dumps(self.responder(query))
+        prompt_text = ''.join(message.get('content', '') for message in body.get('messages', []))
+        usage = {
+            'prompt_tokens': len(prompt_text) // 4,
+            'completion_tokens': len(content) // 4,
+            'total_tokens': (len(prompt_text) + len(content)) // 4
+        }
+        completion = {
+            'id': f"chatcmpl-fake-{next(self._ids)}",
+            'created': int(time.time()),
+            'model': body.get('model', 'gpt-3.5-turbo'),
+            'content': content,
+            'usage': usage,
+            'stream': bool(body.get('stream')),
+            'include_usage': bool((body.get('stream_options') or {}).get('include_usage'))
+        }
+        return 200, completion
+
+    def render(self, status, payload):
+        if status != 200:
+            return super().render(status, payload)
+        base = {'id': payload['id'], 'created': payload['created'], 'model': payload['model']}
+        if not payload['stream']:
+            return super().render(status, dict(base, object='chat.completion', usage=payload['usage'], choices=[{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': payload['content']},
+                'finish_reason': 'stop'
+            }]))
+
+        def event(data):
+            return f"data: {json.dumps(dict(base, object='chat.completion.chunk', **data))}\n\n".encode()
+
+        content = payload['content']
+        chunks = [event({'choices': [{'index': 0, 'delta': {'role': 'assistant', 'content': ''}, 'finish_reason': None}]})]
+        for offset in range(0, len(content), 8):
+            chunks.append(event({'choices': [{'index': 0, 'delta': {'content': content[offset:offset + 8]},
+                                              'finish_reason': None}]}))
+        chunks.append(event({'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]}))
+        if payload['include_usage']:
+            chunks.append(event({'choices': [], 'usage': payload['usage']}))
+        chunks.append(b"data: [DONE]\n\n")
+        return 'text/event-stream', chunks
+
+    def _sleep_between_chunks(self):
+        if self.chunk_delay:
+            time.sleep(self.chunk_delay)
+
+    def cassette_key(self, method, path, params, body):
+        # The prompt contains the current time, so recordings are keyed on the query itself
+        stream = 'stream' if (body or {}).get('stream') else 'complete'
+        return f"{method} {path} {(body or {}).get('model')} {stream} {self.extract_query(body)}"
+
+    def error_body(self, status):
+        return {'error': {'message': 'Injected error', 'type': 'server_error', 'code': None}}
+
+    def extract_query(self, body: Any) -> str:
+        messages = (body or {}).get('messages') or [{}]
+        prompt = messages[-1].get('content', '')
+        for pattern in QUERY_PATTERNS:
+            match = pattern.search(prompt)
+            if match:
+                text = match.group(1)
+                return json.loads(text) if text.startswith('"') else text
+        return prompt.strip()
+
+    def default_response(self, query: str) -> Dict[str, Any]:
+        words = set(re.findall(r'[a-z]+', query.lower()))
+        if not words & TIME_WORDS and not re.search(r'\d', query):
+            return {'error': 'Query is not a valid calendar request'}
+
+        tz = pytz.timezone(self.timezone)
+        hour, minute = 10, 0
+        match = re.search(r'\b(\d{1,2})(?::(\d{2}))?\s*(am|pm)\b', query, re.IGNORECASE)
+        if match:
+            hour = int(match.group(1)) % 12 + (12 if match.group(3).lower() == 'pm' else 0)
+            minute = int(match.group(2) or 0)
+        duration = 60
+        match = re.search(r'\bfor (\d+) minutes?\b', query, re.IGNORECASE)
+        if match:
+            duration = int(match.group(1))
+
+        tomorrow = datetime.now(tz).date() + timedelta(days=1)
+        start = tz.localize(datetime(tomorrow.year, tomorrow.month, tomorrow.day, hour, minute))
+        end = tz.normalize(start + timedelta(minutes=duration))
+        return {
+            'timeSpecified': True,
+            'event': {
+                'summary': query.strip()[:60],
+                'description': '',
+                'start': {'dateTime': start.isoformat(), 'timeZone': self.timezone},
+                'end': {'dateTime': end.isoformat(), 'timeZone': self.timezone}
+            }
+        }
+
+class FakeCalendarServer(FakeAPIServer):
+    """
+    In-memory Calendar v3: events insert, get and list (with paging and
+    sync tokens), freeBusy query and batch requests of these. Set
+    CALENDAR_API_ENDPOINT to api_endpoint.
+
+    events.watch channels are served too: like Google, the server posts a
+    'sync' notification to a new channel's address, then an 'exists' one
+    whenever an event is inserted into its calendar, including by insert()
+    from a test. Deliveries are kept in notifications.
+    """
+
+    def __init__(self, upstream: str = 'https://www.googleapis.com', **kwargs):
+        super().__init__(upstream=upstream, **kwargs)
+        self._calendars: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._version = 0
+        self._data_lock = threading.Lock()
+        self._channels: Dict[str, Dict[str, Any]] = {}
+        self._outbox: 'queue.Queue[Tuple[List[str], str]]' = queue.Queue()
+        self._courier = None
+        # (channel id, resource state, HTTP status of the webhook's answer or None if it failed)
+        self.notifications: List[Tuple[str, str, Optional[int]]] = []
+
+    @property
+    def api_endpoint(self) -> str:
+        return f"{self.url}/calendar/v3/"
+
+    def handle(self, method, path, params, body):
+        parts = [part for part in path.split('/') if part]
+        if parts[:2] != ['calendar', 'v3']:
+            return 404, self._error(404, 'Not Found')
+        parts = parts[2:]
+        if method == 'POST' and parts == ['freeBusy']:
+            return 200, self._free_busy(body)
+        if method == 'POST' and parts == ['channels', 'stop']:
+            with self._data_lock:
+                channel = self._channels.get(body.get('id'))
+                if channel is None or channel['resourceId'] != body.get('resourceId'):
+                    return 404, self._error(404, 'Channel not found')
+                del self._channels[body['id']]
+            return 204, None
+        if method == 'POST' and len(parts) == 4 and parts[0] == 'calendars' and parts[2:] == ['events', 'watch']:
+            return 200, self._watch(parts[1], body)
+        if len(parts) == 3 and parts[0] == 'calendars' and parts[2] == 'events':
+            if method == 'POST':
+                created = self.insert(parts[1], body)
+                if created is None:
+                    return 409, self._error(409, 'The requested identifier already exists.')
+                return 200, created
+            if method == 'GET':
+                return self._list(parts[1], params)
+        if len(parts) == 4 and parts[0] == 'calendars' and parts[2] == 'events' and method == 'GET':
+            event = self._calendars.get(parts[1], {}).get(parts[3])
+            if event is None:
+                return 404, self._error(404, 'Not Found')
+            return 200, self._public(event)
+        return 404, self._error(404, 'Not Found')
+
+    def _respond(self, method, raw_path, headers, raw_body):
+        if self.mode == 'fake' and method == 'POST' and urlsplit(raw_path).path == '/batch/calendar/v3':
+            with self._lock:
+                self.requests += 1
+            self._sleep()
+            return self._batch(headers.get('Content-Type', ''), raw_body)
+        return super()._respond(method, raw_path, headers, raw_body)
+
+    def _batch(self, content_type: str, raw_body: bytes):
+        """Answers a multipart/mixed batch request, running each part through handle()."""
+        message = BytesParser().parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode() + raw_body)
+        boundary = f"batch_{uuid.uuid4().hex}"
+        chunks = []
+        for part in message.get_payload():
+            request_text = part.get_payload()
+            head, _, body = request_text.replace('\r\n', '\n').partition('\n\n')
+            part_method, url = head.split()[:2]
+            split = urlsplit(url)
+            params = {key: values[-1] for key, values in parse_qs(split.query).items()}
+            status, payload = self.handle(part_method, split.path, params, json.loads(body) if body.strip() else None)
+            content_id = part['Content-ID'].strip('<>')
+            chunks.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\nContent-Type: application/json\r\n\r\n"
+                f"{json.dumps(payload)}\r\n"
+            )
+        chunks.append(f"--{boundary}--\r\n")
+        return 200, f"multipart/mixed; boundary={boundary}", [''.join(chunks).encode()]
+
+    def render(self, status, payload):
+        if status == 204:
+            return 'application/json', []
+        return super().render(status, payload)
+
+    def _watch(self, calendar_id, body):
+        ttl = float(body.get('params', {}).get('ttl', 604800))
+        channel = {
+            'kind': 'api#channel',
+            'id': body['id'],
+            'resourceId': 'res-' + hashlib.sha256(calendar_id.encode()).hexdigest()[:16],
+            'resourceUri': f"{self.api_endpoint}calendars/{calendar_id}/events",
+            'token': body.get('token', ''),
+            'expiration': str(int((time.time() + ttl) * 1000)),
+        }
+        with self._data_lock:
+            self._channels[body['id']] = dict(channel, address=body['address'], calendar_id=calendar_id, messages=0)
+        self._deliver([body['id']], 'sync')
+        return channel
+
+    def _deliver(self, channel_ids: List[str], state: str) -> None:
+        """Queues notifications for the channels; a background thread posts them in order, as Google does."""
+        with self._data_lock:
+            if self._courier is None:
+                self._courier = threading.Thread(target=self._post_notifications, daemon=True)
+                self._courier.start()
+        self._outbox.put((channel_ids, state))
+
+    def _post_notifications(self) -> None:
+        while True:
+            channel_ids, state = self._outbox.get()
+            for channel_id in channel_ids:
+                with self._data_lock:
+                    channel = self._channels.get(channel_id)
+                    if channel is None:
+                        continue
+                    channel['messages'] += 1
+                    headers = {
+                        'X-Goog-Channel-ID': channel['id'],
+                        'X-Goog-Channel-Token': channel['token'],
+                        'X-Goog-Channel-Expiration': time.strftime(
+                            '%a, %d %b %Y %H:%M:%S GMT', time.gmtime(int(channel['expiration']) / 1000)),
+                        'X-Goog-Resource-ID': channel['resourceId'],
+                        'X-Goog-Resource-URI': channel['resourceUri'],
+                        'X-Goog-Resource-State': state,
+                        'X-Goog-Message-Number': str(channel['messages']),
+                        'Content-Length': '0',
+                    }
+                    address = urlsplit(channel['address'])
+                connection_class = HTTPSConnection if address.scheme == 'https' else HTTPConnection
+                connection = connection_class(address.netloc, timeout=10)
+                try:
+                    connection.request('POST', address.path or '/', headers=headers)
+                    status = connection.getresponse().status
+                except OSError:
+                    status = None
+                finally:
+                    connection.close()
+                with self._data_lock:
+                    self.notifications.append((channel_id, state, status))
+
+    def insert(self, calendar_id: str, event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Stores an event as events.insert would and returns it, or None if its id is taken."""
+        with self._data_lock:
+            if event.get('id') in self._calendars.get(calendar_id, {}):
+                return None
+            self._version += 1
+            event = dict(event)
+            event.setdefault('id', f"fake{self._version:08d}")
+            event.setdefault('status', 'confirmed')
+            event['htmlLink'] = f"{self.url}/event?eid={event['id']}"
+            event['_version'] = self._version
+            self._calendars.setdefault(calendar_id, {})[event['id']] = event
+            watching = [channel_id for channel_id, channel in self._channels.items()
+                        if channel['calendar_id'] == calendar_id]
+        if watching:
+            self._deliver(watching, 'exists')
+        return self._public(event)
+
+    def _list(self, calendar_id, params):
+        with self._data_lock:
+            events = list(self._calendars.get(calendar_id, {}).values())
+            version = self._version
+
+        sync_token = params.get('syncToken')
+        if sync_token is not None:
+            if not sync_token.isdigit():
+                return 410, self._error(410, 'Sync token is no longer valid, a full sync is required.')
+            events = [e for e in events if e['_version'] > int(sync_token)]
+        else:
+            events = [e for e in events if e.get('status') != 'cancelled']
+            time_min = self._parse(params['timeMin']) if params.get('timeMin') else None
+            time_max = self._parse(params['timeMax']) if params.get('timeMax') else None
+            events = [e for e in events
+                      if (time_min is None or self._bounds(e)[1] > time_min)
+                      and (time_max is None or self._bounds(e)[0] < time_max)]
+            if params.get('orderBy') == 'startTime':
+                events.sort(key=lambda e: self._bounds(e)[0])
+
+        offset = int(params.get('pageToken') or 0)
+        page_size = int(params.get('maxResults') or 250)
+        page = events[offset:offset + page_size]
+        result = {'kind': 'calendar#events', 'items': [self._public(e) for e in page]}
+        if offset + page_size < len(events):
+            result['nextPageToken'] = str(offset + page_size)
+        else:
+            result['nextSyncToken'] = str(version)
+        if params.get('fields'):
+            result = self._select(result, params['fields'])
+        return 200, result
+
+    def _free_busy(self, body):
+        time_min, time_max = self._parse(body['timeMin']), self._parse(body['timeMax'])
+        calendars = {}
+        with self._data_lock:
+            for item in body.get('items', []):
+                busy = []
+                for event in self._calendars.get(item['id'], {}).values():
+                    if event.get('status') == 'cancelled' or event.get('transparency') == 'transparent':
+                        continue
+                    if 'dateTime' not in event.get('start', {}):
+                        continue
+                    start, end = self._bounds(event)
+                    if start < time_max and end > time_min:
+                        busy.append((start, end))
+                calendars[item['id']] = {'busy': [
+                    {'start': self._utc(start), 'end': self._utc(end)} for start, end in sorted(busy)
+                ]}
+        return {'kind': 'calendar#freeBusy', 'timeMin': body['timeMin'], 'timeMax': body['timeMax'],
+                'calendars': calendars}
+
+    def cassette_key(self, method, path, params, body):
+        # Time windows move with the clock, so they are left out of the key
+        stable = {k: v for k, v in params.items() if k not in ('timeMin', 'timeMax')}
+        if isinstance(body, dict):
+            body = {k: v for k, v in body.items() if k not in ('timeMin', 'timeMax')}
+        return super().cassette_key(method, path, stable, body)
+
+    def _select(self, value, fields: str):
+        """Applies a partial-response selector such as 'nextPageToken,items(id,start)'."""
+        selected = {}
+        for field in re.findall(r'(\w+)(?:\(([^)]*)\))?', fields):
+            name, nested = field
+            if name not in value:
+                continue
+            if nested and isinstance(value[name], list):
+                selected[name] = [self._select(item, nested) for item in value[name]]
+            else:
+                selected[name] = value[name]
+        return selected
+
+    def _bounds(self, event):
+        start, end = event['start'], event['end']
+        if 'dateTime' in start:
+            return self._parse(start['dateTime']), self._parse(end['dateTime'])
+        return (pytz.utc.localize(datetime.fromisoformat(start['date'])),
+                pytz.utc.localize(datetime.fromisoformat(end['date'])))
+
+    def _parse(self, value):
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        return parsed if parsed.tzinfo else pytz.utc.localize(parsed)
+
+    def _utc(self, value):
+        return value.astimezone(pytz.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    def _public(self, event):
+        return {k: v for k, v in event.items() if not k.startswith('_')}
+
+    def _error(self, status, message):
+        return {'error': {'code': status, 'message': message, 'errors': [{'message': message}]}}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=MODES, default='fake')
+    parser.add_argument('--cassette-dir', default='cassettes', help='where record/replay cassettes live')
+    parser.add_argument('--openai-port', type=int, default=8001)
+    parser.add_argument('--calendar-port', type=int, default=8002)
+    parser.add_argument('--llm-latency', type=float, default=0.0, help='seconds added to each LLM response')
+    parser.add_argument('--calendar-latency', type=float, default=0.0, help='seconds added to each Calendar response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='extra random latency, up to this many seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with a 500')
+    args = parser.parse_args()
+
+    if args.mode != 'fake':
+        os.makedirs(args.cassette_dir, exist_ok=True)
+    common = {'mode': args.mode, 'jitter': args.jitter, 'error_rate': args.error_rate}
+    openai_server = FakeOpenAIServer(latency=args.llm_latency, port=args.openai_port,
+                                     cassette=os.path.join(args.cassette_dir, 'openai.json'), **common).start()
+    calendar_server = FakeCalendarServer(latency=args.calendar_latency, port=args.calendar_port,
+                                         cassette=os.path.join(args.cassette_dir, 'calendar.json'), **common).start()
+    print(f"OPENAI_BASE_URL={openai_server.url}/v1")
+    print(f"CALENDAR_API_ENDPOINT={calendar_server.api_endpoint}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        openai_server.stop()
+        calendar_server.stop()
+
+if __name__ == '__main__':
+    main()